@@ -11,6 +11,8 @@ class AbandonedBase(ModuleBase):
 
     def get_active_resources(self, cloud_account_ids, start_date,
                              resource_type):
+        if not self.has_active_resources([resource_type], cloud_account_ids):
+            return {x: [] for x in cloud_account_ids}
         resources = self.mongo_client.restapi.resources.find({
             'cloud_account_id': {
                 '$in': cloud_account_ids
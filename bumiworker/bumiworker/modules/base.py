@@ -1,5 +1,6 @@
 import json
 import logging
+import threading
 from collections import OrderedDict
 from contextlib import ContextDecorator
 from datetime import datetime, timedelta
@@ -12,12 +13,30 @@ from pymongo import MongoClient, UpdateOne
 from optscale_client.rest_api_client.client_v2 import Client as RestClient
 
 from bumiworker.bumiworker.consts import ArchiveReason
+from bumiworker.bumiworker.organization_context import (
+    OrganizationContext, get_s3_client)
 
 ACTIVITIES_EXCHANGE_NAME = 'activities-tasks'
 ACTIVITIES_EXCHANGE = Exchange(ACTIVITIES_EXCHANGE_NAME, type='topic')
 BULK_SIZE = 2000
 DAYS_IN_MONTH = 30
 LOG = logging.getLogger(__name__)
+# checklists saved by previous versions keep data in the document, items of
+# new ones are saved to checklist_items
+CHECKLIST_DATA_FILTER = {'$or': [{'data': {'$type': 'array'}},
+                                 {'items_count': {'$type': 'number'}}]}
+# mongo client is thread safe and keeps a connection pool, it's shared by
+# all modules of the process
+_mongo_clients = {}
+_mongo_clients_lock = threading.Lock()
+
+
+def get_mongo_client(mongo_conn_string):
+    with _mongo_clients_lock:
+        if mongo_conn_string not in _mongo_clients:
+            _mongo_clients[mongo_conn_string] = MongoClient(
+                mongo_conn_string)
+        return _mongo_clients[mongo_conn_string]
 
 
 class time_measure(ContextDecorator):
@@ -47,6 +66,8 @@ class ServiceBase(object):
         self._mongo_client = None
         self.option_ordered_map = {}
         self._options = None
+        self._context = None
+        self._context_loaded = False
 
     @classmethod
     def get_name(cls):
@@ -69,9 +90,25 @@ class ServiceBase(object):
         if not self._mongo_client:
             mongo_params = self.config_cl.mongo_params()
             mongo_conn_string = "mongodb://%s:%s@%s:%s" % mongo_params[:-1]
-            self._mongo_client = MongoClient(mongo_conn_string)
+            self._mongo_client = get_mongo_client(mongo_conn_string)
         return self._mongo_client
 
+    @property
+    def context(self):
+        """
+        Organization snapshot of the checklist run, None if it's not stored
+        """
+        if not self._context_loaded:
+            self._context_loaded = True
+            try:
+                self._context = OrganizationContext.load(
+                    get_s3_client(self.config_cl), self.organization_id,
+                    self.created_at)
+            except Exception as exc:
+                LOG.warning('Unable to load context of organization %s: %s',
+                            self.organization_id, str(exc))
+        return self._context
+
     def get_options(self):
         if self._options is None:
             self._options = OrderedDict()
@@ -89,8 +126,11 @@ class ServiceBase(object):
         return self._options
 
     def _get_stored_options(self):
+        option_name = 'recommendation_' + self.get_name()
+        if self.context:
+            return json.loads(self.context.options.get(option_name, '{}'))
         _, response = self.rest_client.organization_option_get(
-            self.organization_id, 'recommendation_' + self.get_name())
+            self.organization_id, option_name)
         return json.loads(response['value'])
 
     def _set_stored_options(self, options):
@@ -105,6 +145,19 @@ class ServiceBase(object):
     def _get(self):
         raise NotImplementedError()
 
+    def get_checklist_data(self, checklist, fields=None):
+        if 'data' in checklist:
+            return checklist['data']
+        if checklist.get('items_count') is None:
+            return None
+        projection = ['data.%s' % x for x in fields] if fields else ['data']
+        items = self.mongo_client.restapi.checklist_items.find({
+            'organization_id': checklist['organization_id'],
+            'created_at': checklist['created_at'],
+            'module': checklist['module'],
+        }, projection).sort('_id', 1)
+        return [x.get('data', {}) for x in items]
+
     def _publish_activities_tasks(self, tasks, routing_key):
         queue_conn = QConnection(
             'amqp://{user}:{pass}@{host}:{port}'.format(
@@ -165,19 +218,26 @@ class ModuleBase(ServiceBase):
             hour=0, minute=0, second=0, microsecond=0)
 
     def get_organization_currency(self):
+        if self.context:
+            return self.context.organization.get('currency', 'USD')
         _, organization = self.rest_client.organization_get(
             self.organization_id)
         return organization.get('currency', 'USD')
 
     def get_employees(self):
+        if self.context:
+            return {x['id']: x for x in self.context.employees}
         _, response = self.rest_client.employee_list(self.organization_id)
         return {x['id']: x for x in response['employees']}
 
     def get_cloud_accounts(self, supported_cloud_types=None,
                            skip_cloud_accounts=None, only_type=False):
-        _, response = self.rest_client.cloud_account_list(
-            self.organization_id, process_recommendations=True)
-        cloud_accounts = response['cloud_accounts']
+        if self.context:
+            cloud_accounts = self.context.cloud_accounts
+        else:
+            _, response = self.rest_client.cloud_account_list(
+                self.organization_id, process_recommendations=True)
+            cloud_accounts = response['cloud_accounts']
         cloud_account_map = {}
         for cloud_account in cloud_accounts:
             cloud_account_id = cloud_account['id']
@@ -195,6 +255,8 @@ class ModuleBase(ServiceBase):
         return cloud_account_map
 
     def get_pools(self):
+        if self.context:
+            return {x['id']: x for x in self.context.pools}
         _, organization = self.rest_client.organization_get(
             self.organization_id)
         _, org_pool = self.rest_client.pool_get(
@@ -203,6 +265,12 @@ class ModuleBase(ServiceBase):
         pools[org_pool['id']] = org_pool
         return pools
 
+    def has_active_resources(self, resource_types, cloud_account_ids):
+        if not self.context:
+            return True
+        return self.context.has_active_resources(
+            resource_types, cloud_account_ids)
+
     def _extract_owner(self, employee_id, employees_map):
         employee = employees_map.get(employee_id)
         if employee_id and employee:
@@ -331,19 +399,14 @@ class ModuleBase(ServiceBase):
         return module_result
 
     def load_previous_result(self):
-        pipeline = [
-            {'$match': {'$and': [
-                {'organization_id': self.organization_id},
-                {'module': self.get_name()},
-                {'data': {'$type': "array"}}
-            ]}},
-            {'$sort': {'created_at': -1}},
-            {'$limit': 1},
-            {'$unwind': "$data"},
-            {'$replaceRoot': {'newRoot': "$data"}}
-        ]
-        return list(self.mongo_client.restapi.checklists.aggregate(
-            pipeline, allowDiskUse=True))
+        checklist = self.mongo_client.restapi.checklists.find_one({
+            'organization_id': self.organization_id,
+            'module': self.get_name(),
+            **CHECKLIST_DATA_FILTER
+        }, sort=[('created_at', -1)])
+        if not checklist:
+            return []
+        return self.get_checklist_data(checklist)
 
     def get_record_key(self, record):
         return tuple(record[k] for k in self.unique_record_keys)
@@ -412,16 +475,11 @@ class ArchiveBase(ModuleBase):
         Load 2 latest checklists which supposed to be compared
         :return: list of checklists
         """
-        pipeline = [
-            {'$match': {'$and': [
-                {'organization_id': self.organization_id},
-                {'module': self.get_name()},
-                {'data': {'$type': "array"}}
-            ]}},
-            {'$sort': {'created_at': -1}},
-            {'$limit': 2},
-        ]
-        return list(self.mongo_client.restapi.checklists.aggregate(pipeline))
+        return list(self.mongo_client.restapi.checklists.find({
+            'organization_id': self.organization_id,
+            'module': self.get_name(),
+            **CHECKLIST_DATA_FILTER
+        }).sort('created_at', -1).limit(2))
 
     def get_archive_candidates(self, module_data, previous_module_data,
                                cloud_accounts_map):
@@ -487,8 +545,11 @@ class ArchiveBase(ModuleBase):
                     skip_cloud_accounts = previous_options['skip_cloud_accounts']
                     cloud_accounts_map = self.get_cloud_accounts(
                         self.supported_cloud_types, skip_cloud_accounts)
+                    # only keys of current records are compared
                     archive_candidates = self.get_archive_candidates(
-                        current.get('data', []), previous.get('data', []),
+                        self.get_checklist_data(
+                            current, self.unique_record_keys) or [],
+                        self.get_checklist_data(previous) or [],
                         cloud_accounts_map)
                     if archive_candidates:
                         res = self._get(previous_options, archive_candidates,
@@ -42,6 +42,9 @@ class InstanceGenerationUpgrade(ModuleBase):
         return organization.get('currency', 'USD')
 
     def get_instances_map(self, cloud_account_ids):
+        if not self.has_active_resources(['Instance', 'RDS Instance'],
+                                         cloud_account_ids):
+            return {}
         instances = self.mongo_client.restapi.resources.find({
             '$and': [
                 {'resource_type': {'$in': ['Instance', 'RDS Instance']}},
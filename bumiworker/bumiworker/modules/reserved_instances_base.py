@@ -42,6 +42,8 @@ class ReservedInstancesBase(ModuleBase):
         raise NotImplementedError
 
     def get_instances_map(self, cloud_account_ids, range_start_ts):
+        if not self.has_active_resources(['Instance'], cloud_account_ids):
+            return {}
         instances = list(self.mongo_client.restapi.resources.find({
             '$and': [
                 {'resource_type': 'Instance'},
@@ -1,7 +1,9 @@
 from enum import Enum
+import json
 import logging
 
 from collections import defaultdict
+from concurrent.futures.thread import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from math import ceil
 
@@ -18,6 +20,8 @@ from bumiworker.bumiworker.modules.base import (
 LOG = logging.getLogger(__name__)
 BULK_SIZE = 500
 METRICS_BULK_SIZE = 50
+FLAVORS_BULK_SIZE = 100
+FLAVORS_PARALLEL_REQUESTS = 4
 HOURS_IN_DAY = 24
 SECONDS_IN_HOUR = 3600
 SECONDS_IN_DAY = HOURS_IN_DAY * SECONDS_IN_HOUR
@@ -39,6 +43,9 @@ class RightsizingBase(ModuleBase):
         self._metroculus_cl = None
         self.excluded_flavor_regex_key = 'excluded_flavor_regex'
         self.cloud_account_map = {}
+        self._currency = None
+        # flavor search params -> flavor, filled during the run
+        self._flavors = {}
 
     @property
     def insider_cl(self):
@@ -59,9 +66,9 @@ class RightsizingBase(ModuleBase):
         return self._metroculus_cl
 
     def get_organization_currency(self):
-        _, organization = self.rest_client.organization_get(
-            self.organization_id)
-        return organization.get('currency', 'USD')
+        if self._currency is None:
+            self._currency = super().get_organization_currency()
+        return self._currency
 
     def _get_supported_func_map(self):
         raise NotImplementedError
@@ -86,17 +93,21 @@ class RightsizingBase(ModuleBase):
             flavor_cpu / optimization_metric_limit * relevant_instance_metric)
         return recommended
 
+    @staticmethod
+    def _get_recommended_cpu_list(flavor_cpu, min_recommended,
+                                  recommended_flavor_cpu_min):
+        if not min_recommended:
+            return []
+        return [x for x in range(int(min_recommended), flavor_cpu)
+                if x >= recommended_flavor_cpu_min and bool(
+                    x == 1 or x > 1 and x % 2 == 0)]
+
     def get_recommended_cpu(self, flavor_cpu, instance_metrics,
                             optimization_metric, recommended_flavor_cpu_min):
-        recommended_cpu_list = []
         min_recommended = self._get_base_recommended_cpu(
             flavor_cpu, instance_metrics, optimization_metric)
-        if min_recommended:
-            recommended_cpu_list = [
-                x for x in range(int(min_recommended), flavor_cpu)
-                if x >= recommended_flavor_cpu_min and bool(
-                    x == 1 or x > 1 and x % 2 == 0)]
-        return recommended_cpu_list
+        return self._get_recommended_cpu_list(
+            flavor_cpu, min_recommended, recommended_flavor_cpu_min)
 
     @staticmethod
     def get_common_match_pipeline(resource_ids, cloud_account_ids):
@@ -200,18 +211,141 @@ class RightsizingBase(ModuleBase):
                     })
         return result
 
-    def _find_flavor(self, cloud_type, region, family_specs, mode, **params):
+    def _get_flavor_request(self, cloud_type, region, family_specs, mode,
+                            **params):
+        request = {
+            'cloud_type': cloud_type,
+            'resource_type': self.get_insider_resource_type(),
+            'region': region,
+            'family_specs': family_specs,
+            'mode': mode,
+            'currency': self.get_organization_currency(),
+        }
+        request.update(params)
+        return request
+
+    def _find_flavors_bulk(self, requests):
         try:
-            currency = self.get_organization_currency()
-            _, flavor = self.insider_cl.find_flavor(
-                cloud_type, self.get_insider_resource_type(),
-                region, family_specs, mode, currency=currency,
-                **params)
-            return flavor
+            _, response = self.insider_cl.find_flavors(requests)
         except HTTPError as ex:
             if ex.response.status_code == 403:
                 raise
-            LOG.warning('Unable to get %s flavor: %s', mode, str(ex))
+            LOG.warning('Unable to get flavors: %s', str(ex))
+            return None
+        result = []
+        for request, flavor_result in zip(requests, response['flavors']):
+            status_code = flavor_result['status_code']
+            if status_code == 403:
+                raise HTTPError('Unable to get %s flavor: %s' % (
+                    request['mode'], flavor_result['error']['reason']))
+            if status_code != 200:
+                LOG.warning('Unable to get %s flavor: %s', request['mode'],
+                            flavor_result['error']['reason'])
+            result.append(flavor_result.get('flavor'))
+        return result
+
+    def _find_flavors(self, requests):
+        keys = [json.dumps(x, sort_keys=True) for x in requests]
+        missing = {}
+        for key, request in zip(keys, requests):
+            if key not in self._flavors:
+                missing[key] = request
+        if not missing:
+            return [self._flavors.get(x) for x in keys]
+        missing_keys = list(missing.keys())
+        bulks = [missing_keys[i:i + FLAVORS_BULK_SIZE]
+                 for i in range(0, len(missing_keys), FLAVORS_BULK_SIZE)]
+        with ThreadPoolExecutor(
+                max_workers=FLAVORS_PARALLEL_REQUESTS) as executor:
+            bulks_flavors = executor.map(
+                lambda bulk: self._find_flavors_bulk(
+                    [missing[x] for x in bulk]), bulks)
+            for bulk, flavors in zip(bulks, bulks_flavors):
+                # failed requests are not saved to be retried on next search
+                if flavors is not None:
+                    self._flavors.update(zip(bulk, flavors))
+        return [self._flavors.get(x) for x in keys]
+
+    def _find_flavor(self, cloud_type, region, family_specs, mode, **params):
+        return self._find_flavors([self._get_flavor_request(
+            cloud_type, region, family_specs, mode, **params)])[0]
+
+    @staticmethod
+    def _get_projected_cpu(usage, current_cpu, target_cpu):
+        return min(usage * current_cpu / target_cpu, 100)
+
+    def _get_recommendations(self, current_flavor_params, cloud_account,
+                             write_stat_func, optimization_metric,
+                             metrics_map, resource_info_map,
+                             recommended_flavor_cpu_min):
+        # recommended flavor depends only on the minimal cpu of the
+        # instance, so it's found once for every minimal cpu of the flavor
+        # group. Flavors are searched in two batches: current flavors and
+        # flavors of all candidate cpus
+        cloud_type = cloud_account['type']
+        requests = []
+        for params in current_flavor_params:
+            if cloud_type == 'nebius':
+                params['flavor_params']['cloud_account_id'] = cloud_account[
+                    'id']
+            requests.append(self._get_flavor_request(
+                cloud_type, params['region'], params['family_specs'],
+                'current', **params['flavor_params']))
+        current_flavors = self._find_flavors(requests)
+        groups = []
+        requests = []
+        for params, current_flavor in zip(current_flavor_params,
+                                          current_flavors):
+            if not current_flavor:
+                continue
+            current_cpu = current_flavor.get('cpu', 0)
+            if current_cpu <= recommended_flavor_cpu_min:
+                for _ in params['resource_ids']:
+                    write_stat_func('current_cpu_too_low')
+                groups.append((params, current_flavor, None, None))
+                continue
+            min_cpus = {}
+            for res_id in params['resource_ids']:
+                instance_metrics = metrics_map.get(
+                    resource_info_map[res_id]['_id'])
+                if instance_metrics is not None:
+                    min_cpus[res_id] = self._get_base_recommended_cpu(
+                        current_cpu, instance_metrics, optimization_metric)
+            cpu_lists = {
+                x: self._get_recommended_cpu_list(
+                    current_cpu, x, recommended_flavor_cpu_min)
+                for x in set(min_cpus.values())
+            }
+            cpus = sorted(set(x for cpu_list in cpu_lists.values()
+                              for x in cpu_list))
+            for cpu in cpus:
+                requests.append(self._get_flavor_request(
+                    cloud_type, params['region'], params['family_specs'],
+                    'search_relevant', **dict(params['flavor_params'],
+                                              cpu=cpu)))
+            groups.append((params, current_flavor, min_cpus,
+                           (cpu_lists, cpus)))
+        flavors = iter(self._find_flavors(requests))
+        result = []
+        for params, current_flavor, min_cpus, cpu_info in groups:
+            if min_cpus is None:
+                result.append((params, current_flavor, None))
+                continue
+            cpu_lists, cpus = cpu_info
+            cpu_flavors = {x: next(flavors) for x in cpus}
+            recommendations = {}
+            for min_cpu, cpu_list in cpu_lists.items():
+                if not cpu_list:
+                    recommendations[min_cpu] = 'no_recommended_cpu'
+                    continue
+                # the first found flavor of the smallest cpu is recommended
+                recommendations[min_cpu] = next(
+                    (cpu_flavors[x] for x in cpu_list if cpu_flavors[x]),
+                    'unable_to_get_flavor')
+            result.append((params, current_flavor, {
+                res_id: recommendations[min_cpu]
+                for res_id, min_cpu in min_cpus.items()}))
+        return result
 
     def _handle_instances(self, current_flavor_params, cloud_account,
                           write_stat_func, optimization_metric, metrics_map,
@@ -219,128 +353,101 @@ class RightsizingBase(ModuleBase):
                           recommended_flavor_cpu_min, excluded_pools,
                           excluded_flavor_prog):
         result = []
+        cloud_type = cloud_account['type']
         unable_to_get_current_flavor = set(
             x for params in current_flavor_params
             for x in params['resource_ids'])
-        for params in current_flavor_params:
+        recommendations = self._get_recommendations(
+            current_flavor_params, cloud_account, write_stat_func,
+            optimization_metric, metrics_map, resource_info_map,
+            recommended_flavor_cpu_min)
+        for params, current_flavor, recommended_flavors in recommendations:
             res_ids = params['resource_ids']
             region = params['region']
-            family_specs = params['family_specs']
             flavor_params = params['flavor_params']
-            if cloud_account['type'] == 'nebius':
-                flavor_params['cloud_account_id'] = cloud_account['id']
-            current_flavor = self._find_flavor(
-                cloud_account['type'], region, family_specs, 'current',
-                **flavor_params)
-            if not current_flavor:
+            unable_to_get_current_flavor.difference_update(res_ids)
+            if recommended_flavors is None:
                 continue
             current_cpu = current_flavor.get('cpu', 0)
-            if current_cpu <= recommended_flavor_cpu_min:
-                for res_id in res_ids:
-                    unable_to_get_current_flavor.discard(res_id)
-                    write_stat_func('current_cpu_too_low')
-                continue
-            cpu_flavor_map = {}
+            current_price = current_flavor.get('price')
             for res_id in res_ids:
-                unable_to_get_current_flavor.discard(res_id)
-
                 current_r_info = r_info[res_id][0]
-                if (cloud_account['type'] == 'azure_cnr' and
-                        len(r_info[res_id]) != 1):
+                if cloud_type == 'azure_cnr' and len(r_info[res_id]) != 1:
                     meter_id = flavor_params['meter_id']
                     current_r_info = [x for x in r_info[res_id]
                                       if x['meter_id'] == meter_id][0]
 
                 instance = resource_info_map[res_id]
                 meta = instance['meta']
-                instance_metrics = metrics_map.get(instance['_id'])
-                if instance_metrics is None:
+                if res_id not in recommended_flavors:
                     write_stat_func('no_metric')
                     continue
-                recommended_cpu_list = self.get_recommended_cpu(
-                    current_cpu, instance_metrics, optimization_metric,
-                    recommended_flavor_cpu_min)
+                recommended_flavor = recommended_flavors[res_id]
+                if isinstance(recommended_flavor, str):
+                    write_stat_func(recommended_flavor)
+                    continue
                 flavor = meta.get('flavor')
                 platform_name = meta.get('platform_name')
-                if not recommended_cpu_list:
-                    write_stat_func('no_recommended_cpu')
+                if (recommended_flavor['flavor'] == flavor or
+                        platform_name and not flavor and
+                        recommended_flavor['flavor'] != platform_name):
+                    write_stat_func('no_recommended_flavor')
                     continue
-                for i, recommended_cpu in enumerate(recommended_cpu_list):
-                    if not cpu_flavor_map.get(recommended_cpu):
-                        flavor_params['cpu'] = recommended_cpu
-                        recommended_flavor = self._find_flavor(
-                            cloud_account['type'], region, family_specs,
-                            'search_relevant', **flavor_params)
-                        if (not recommended_flavor and
-                                i == len(recommended_cpu_list) - 1):
-                            write_stat_func('unable_to_get_flavor')
-                            break
-                        cpu_flavor_map[recommended_cpu] = recommended_flavor
-                    else:
-                        recommended_flavor = cpu_flavor_map[recommended_cpu]
-                    if not recommended_flavor:
-                        continue
-                    if (recommended_flavor['flavor'] == flavor or
-                            platform_name and not flavor and
-                            recommended_flavor['flavor'] != platform_name):
-                        write_stat_func('no_recommended_flavor')
-                        break
-                    current_cost = current_r_info.get(
-                        'day_cost', 0) * DAYS_IN_MONTH
-                    discount_multiplier = current_r_info.get(
-                        'discount_multiplier', 1)
-                    multiplier = HOURS_IN_DAY * DAYS_IN_MONTH * discount_multiplier
-                    recommended_cost = recommended_flavor.get(
-                        'price') * multiplier
-                    current_flavor_cost = current_flavor.get(
-                        'price') * multiplier
-                    if recommended_cost >= current_flavor_cost:
-                        write_stat_func('current_cost_less_recommended')
-                        break
-                    saving = current_flavor_cost - recommended_cost
-                    is_pool_excluded = instance.get('pool_id') in excluded_pools
-                    is_flavor_excluded = bool(excluded_flavor_prog.pattern and
-                                              excluded_flavor_prog.match(
-                                                  flavor or platform_name))
-                    write_stat_func('success')
-                    cpu_peak = instance_metrics['max']
-                    cpu_qtl_50 = instance_metrics['qtl50']
-                    cpu_qtl_99 = instance_metrics['qtl99']
-                    target_cpu = recommended_flavor['cpu']
-                    project_cpu_avg = min([instance_metrics['avg'] * current_cpu / target_cpu, 100])  # max 100
-                    project_cpu_peak = min([cpu_peak * current_cpu / target_cpu, 100])  # max 100
-                    projected_cpu_qtl_50 = min([cpu_qtl_50 * current_cpu / target_cpu, 100])  # max 100
-                    projected_cpu_qtl_99 = min([cpu_qtl_99 * current_cpu / target_cpu, 100])  # max 100
-
-                    result.append({
-                        'cloud_resource_id': instance['cloud_resource_id'],
-                        'resource_name': instance.get('name'),
-                        'resource_id': instance['_id'],
-                        'cloud_account_id': instance['cloud_account_id'],
-                        'cloud_type': cloud_account['type'],
-                        'cloud_account_name': cloud_account['name'],
-                        'region': region,
-                        'flavor': flavor or platform_name,
-                        'recommended_flavor': recommended_flavor['flavor'],
-                        'saving': round(saving, 2),
-                        'saving_percent': round(
-                            saving / current_cost * 100, 2) if current_cost else 0,
-                        'current_cost': round(current_cost, 2),
-                        'recommended_flavor_cost': round(recommended_cost, 2),
-                        'cpu': current_cpu,
-                        'recommended_flavor_cpu': target_cpu,
-                        'recommended_flavor_ram': recommended_flavor['ram'],
-                        'cpu_usage': round(instance_metrics['avg'], 2),
-                        'is_excluded': is_pool_excluded or is_flavor_excluded,
-                        'cpu_peak': round(cpu_peak, 2),
-                        'cpu_quantile_50': round(cpu_qtl_50, 2),
-                        'cpu_quantile_99': round(cpu_qtl_99, 2),
-                        'project_cpu_avg': round(project_cpu_avg, 2),
-                        'project_cpu_peak': round(project_cpu_peak, 2),
-                        'projected_cpu_qtl_50': round(projected_cpu_qtl_50, 2),
-                        'projected_cpu_qtl_99': round(projected_cpu_qtl_99, 2),
-                    })
-                    break
+                current_cost = current_r_info.get(
+                    'day_cost', 0) * DAYS_IN_MONTH
+                discount_multiplier = current_r_info.get(
+                    'discount_multiplier', 1)
+                multiplier = HOURS_IN_DAY * DAYS_IN_MONTH * discount_multiplier
+                recommended_cost = recommended_flavor.get(
+                    'price') * multiplier
+                current_flavor_cost = current_price * multiplier
+                if recommended_cost >= current_flavor_cost:
+                    write_stat_func('current_cost_less_recommended')
+                    continue
+                saving = current_flavor_cost - recommended_cost
+                is_pool_excluded = instance.get('pool_id') in excluded_pools
+                is_flavor_excluded = bool(excluded_flavor_prog.pattern and
+                                          excluded_flavor_prog.match(
+                                              flavor or platform_name))
+                write_stat_func('success')
+                instance_metrics = metrics_map[instance['_id']]
+                cpu_avg = instance_metrics['avg']
+                cpu_peak = instance_metrics['max']
+                cpu_qtl_50 = instance_metrics['qtl50']
+                cpu_qtl_99 = instance_metrics['qtl99']
+                target_cpu = recommended_flavor['cpu']
+                result.append({
+                    'cloud_resource_id': instance['cloud_resource_id'],
+                    'resource_name': instance.get('name'),
+                    'resource_id': instance['_id'],
+                    'cloud_account_id': instance['cloud_account_id'],
+                    'cloud_type': cloud_type,
+                    'cloud_account_name': cloud_account['name'],
+                    'region': region,
+                    'flavor': flavor or platform_name,
+                    'recommended_flavor': recommended_flavor['flavor'],
+                    'saving': round(saving, 2),
+                    'saving_percent': round(
+                        saving / current_cost * 100, 2) if current_cost else 0,
+                    'current_cost': round(current_cost, 2),
+                    'recommended_flavor_cost': round(recommended_cost, 2),
+                    'cpu': current_cpu,
+                    'recommended_flavor_cpu': target_cpu,
+                    'recommended_flavor_ram': recommended_flavor['ram'],
+                    'cpu_usage': round(cpu_avg, 2),
+                    'is_excluded': is_pool_excluded or is_flavor_excluded,
+                    'cpu_peak': round(cpu_peak, 2),
+                    'cpu_quantile_50': round(cpu_qtl_50, 2),
+                    'cpu_quantile_99': round(cpu_qtl_99, 2),
+                    'project_cpu_avg': round(self._get_projected_cpu(
+                        cpu_avg, current_cpu, target_cpu), 2),
+                    'project_cpu_peak': round(self._get_projected_cpu(
+                        cpu_peak, current_cpu, target_cpu), 2),
+                    'projected_cpu_qtl_50': round(self._get_projected_cpu(
+                        cpu_qtl_50, current_cpu, target_cpu), 2),
+                    'projected_cpu_qtl_99': round(self._get_projected_cpu(
+                        cpu_qtl_99, current_cpu, target_cpu), 2),
+                })
         for _ in unable_to_get_current_flavor:
             write_stat_func('unable_to_get_current_flavor')
         return result
@@ -22,7 +22,7 @@ class ResourceRecommendations(ServiceBase):
         })
         recommendations_map = {}
         for r in checklists:
-            data = r.get('data', {})
+            data = self.get_checklist_data(r)
             if not isinstance(data, list):
                 continue
             module_name = r.get('module')
@@ -1,5 +1,6 @@
 import logging
 from collections import OrderedDict
+from itertools import chain
 from bumiworker.bumiworker.modules.base import ServiceBase
 from bumiworker.bumiworker.modules.module import get_email_module_name
 
@@ -31,28 +32,32 @@ class SavingSpikeNotification(ServiceBase):
             {'$sort': {'_id': -1}},
             {'$limit': 2}
         ])
+        run_match = {"$match": {
+            "organization_id": self.organization_id,
+            "created_at": {"$in": [x['_id'] for x in created_at]}}}
         pipeline = [
-            {"$match": {"organization_id": self.organization_id,
-                        "created_at": {"$in": [x['_id'] for x in created_at]}}},
-            {"$unwind": "$data"},
             {"$match": {"data.is_excluded": {"$ne": True},
                         "data.is_dismissed": {"$ne": True},
                         "data.saving": {"$exists": True}}},
             {"$group": {"_id": {"created_at": "$created_at",
                                 "module": "$module"},
-                        "data": {"$addToSet": "$data"}}}
+                        "count": {"$sum": 1},
+                        "saving": {"$sum": "$data.saving"}}}
         ]
-        results = self.mongo_client.restapi['checklists'].aggregate(
-            pipeline)
+        # data of checklists saved by previous versions is in the document
+        results = chain(
+            self.mongo_client.restapi['checklists'].aggregate(
+                [run_match, {"$unwind": "$data"}] + pipeline),
+            self.mongo_client.restapi['checklist_items'].aggregate(
+                [run_match] + pipeline))
         for r in results:
-            opt = r.get('data', [])
             module = r['_id']['module']
-            total = sum([item.get('saving', 0) for item in opt])
+            total = r['saving']
             if r['_id']['created_at'] == self.created_at:
                 module_name = get_email_module_name(module)
                 current_total += total
                 modules_data.append({'module': module_name,
-                                     'count': len(opt),
+                                     'count': r['count'],
                                      'saving': total})
             else:
                 previous_total += total
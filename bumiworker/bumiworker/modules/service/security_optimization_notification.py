@@ -37,8 +37,10 @@ class SecurityOptimizationNotification(ServiceBase):
                 results = self.mongo_client.restapi['checklists'].aggregate(
                     pipeline)
                 for r in results:
+                    data = self.get_checklist_data(
+                        r, unique_fields + ['is_excluded']) or []
                     run_result = [tuple(item[f] for f in unique_fields)
-                                  for item in r.get('data', [])
+                                  for item in data
                                   if isinstance(item, dict) and
                                   not item.get('is_excluded')]
                     if r['created_at'] == self.created_at:
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+from io import BytesIO
+
+import boto3
+from boto3.session import Config as BotoConfig
+from botocore.exceptions import ClientError
+
+LOG = logging.getLogger(__name__)
+BUCKET_NAME = 'bumi-data'
+CONTEXT_FILE_NAME = 'context.json'
+
+
+def get_s3_client(config_cl):
+    s3_params = config_cl.read_branch('/minio')
+    s3_client = boto3.client(
+        's3',
+        endpoint_url='http://{}:{}'.format(
+            s3_params['host'], s3_params['port']),
+        aws_access_key_id=s3_params['access'],
+        aws_secret_access_key=s3_params['secret'],
+        config=BotoConfig(s3={'addressing_style': 'path'})
+    )
+    try:
+        s3_client.create_bucket(Bucket=BUCKET_NAME)
+    except s3_client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    return s3_client
+
+
+def get_context_path(organization_id, created_at):
+    # stored next to the modules results folders, so it's removed by
+    # cleanup of the next run
+    return os.path.join(organization_id, str(created_at), CONTEXT_FILE_NAME)
+
+
+class OrganizationContext(object):
+    """
+    Snapshot of organization data shared by modules of a checklist run:
+    organization, cloud accounts, employees, pools, options and the number
+    of active resources by resource type and cloud account. It's built once
+    when the checklist is initialized and stored in minio, modules load it
+    on the first use and request the data themselves if it's missing.
+    """
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def organization(self):
+        return self.data['organization']
+
+    @property
+    def cloud_accounts(self):
+        return self.data['cloud_accounts']
+
+    @property
+    def employees(self):
+        return self.data['employees']
+
+    @property
+    def pools(self):
+        return self.data['pools']
+
+    @property
+    def options(self):
+        return self.data['options']
+
+    @property
+    def resources_count(self):
+        return self.data['resources_count']
+
+    @classmethod
+    def build(cls, rest_cl, mongo_cl, organization_id):
+        _, organization = rest_cl.organization_get(organization_id)
+        _, response = rest_cl.cloud_account_list(
+            organization_id, process_recommendations=True)
+        cloud_accounts = response['cloud_accounts']
+        _, response = rest_cl.employee_list(organization_id)
+        employees = response['employees']
+        _, org_pool = rest_cl.pool_get(organization['pool_id'], children=True)
+        _, response = rest_cl.organization_options_list(
+            organization_id, with_values=True)
+        options = {x['name']: x['value'] for x in response['options']}
+        resources_count = {}
+        if cloud_accounts:
+            groups = mongo_cl.restapi.resources.aggregate([
+                {'$match': {
+                    'cloud_account_id': {
+                        '$in': [x['id'] for x in cloud_accounts]},
+                    'active': True
+                }},
+                {'$group': {
+                    '_id': {'resource_type': '$resource_type',
+                            'cloud_account_id': '$cloud_account_id'},
+                    'count': {'$sum': 1}
+                }}
+            ])
+            for group in groups:
+                resource_type = group['_id']['resource_type']
+                cloud_account_id = group['_id']['cloud_account_id']
+                resources_count.setdefault(
+                    resource_type, {})[cloud_account_id] = group['count']
+        return cls({
+            'organization': organization,
+            'cloud_accounts': cloud_accounts,
+            'employees': employees,
+            'pools': [org_pool] + org_pool.pop('children', []),
+            'options': options,
+            'resources_count': resources_count,
+        })
+
+    def save(self, s3_client, organization_id, created_at):
+        s3_client.upload_fileobj(
+            BytesIO(json.dumps(self.data).encode()), BUCKET_NAME,
+            get_context_path(organization_id, created_at))
+
+    @classmethod
+    def load(cls, s3_client, organization_id, created_at):
+        buffer = BytesIO()
+        try:
+            s3_client.download_fileobj(
+                BUCKET_NAME, get_context_path(organization_id, created_at),
+                buffer)
+        except ClientError as exc:
+            if exc.response.get('Error', {}).get('Code') not in [
+                    '404', 'NoSuchKey']:
+                raise
+            return None
+        return cls(json.loads(buffer.getvalue()))
+
+    def has_active_resources(self, resource_types, cloud_account_ids):
+        for resource_type in resource_types:
+            count_map = self.resources_count.get(resource_type, {})
+            if any(count_map.get(x) for x in cloud_account_ids):
+                return True
+        return False
@@ -3,25 +3,24 @@ import json
 import os
 import uuid
 
-import boto3
-from boto3.session import Config as BotoConfig
-
 from kombu.log import get_logger
 
-from pymongo import MongoClient, UpdateOne
+from pymongo import MongoClient
 
 from bumiworker.bumiworker.consts import TaskState
 from bumiworker.bumiworker.modules.module import call_module, list_modules
+from bumiworker.bumiworker.organization_context import (
+    BUCKET_NAME, OrganizationContext, get_s3_client)
 
 from optscale_client.herald_client.client_v2 import Client as HeraldClient
 from optscale_client.rest_api_client.client_v2 import Client as RestClient
 
 
 LOG = get_logger(__name__)
-BUCKET_NAME = 'bumi-data'
 SERVICE_FOLDER = 'service'
 ARCHIVE_FOLDER = 'archive'
 RECOMMENDATION_FOLDER = 'recommendations'
+ITEMS_BULK_SIZE = 1000
 
 
 def task_str(task):
@@ -61,19 +60,7 @@ class Base(object):
     @property
     def s3_client(self):
         if self._s3_client is None:
-            s3_params = self.config_cl.read_branch('/minio')
-            self._s3_client = boto3.client(
-                's3',
-                endpoint_url='http://{}:{}'.format(
-                    s3_params['host'], s3_params['port']),
-                aws_access_key_id=s3_params['access'],
-                aws_secret_access_key=s3_params['secret'],
-                config=BotoConfig(s3={'addressing_style': 'path'})
-            )
-            try:
-                self._s3_client.create_bucket(Bucket=BUCKET_NAME)
-            except self._s3_client.exceptions.BucketAlreadyOwnedByYou:
-                pass
+            self._s3_client = get_s3_client(self.config_cl)
         return self._s3_client
 
     @property
@@ -87,6 +74,36 @@ class Base(object):
     def _execute(self):
         raise NotImplementedError()
 
+    def _iter_result_lines(self, key):
+        body = self.s3_client.get_object(Bucket=BUCKET_NAME, Key=key)['Body']
+        try:
+            for line in body.iter_lines():
+                if line:
+                    yield json.loads(line)
+        finally:
+            body.close()
+
+    def read_result(self, key):
+        # module result file has the result without data on the first line
+        # and data items on the next lines, so data is read as a stream
+        lines = self._iter_result_lines(key)
+        result = next(lines)
+        if 'data' in result:
+            # result is saved as a single document by the previous version
+            lines.close()
+            data = result.pop('data')
+            result['items_count'] = len(data) if isinstance(
+                data, list) else None
+            lines = iter(data or [])
+        return result, lines
+
+    def read_result_header(self, key):
+        lines = self._iter_result_lines(key)
+        result = next(lines)
+        lines.close()
+        result.pop('data', None)
+        return result
+
     def can_continue(self, ex):
         return not isinstance(
             ex, BumiTaskTimeoutError
@@ -200,20 +217,8 @@ class CompleteBase(Base):
                 module_folder)
             s3_objects = self.s3_client.list_objects_v2(
                 Bucket=BUCKET_NAME, Prefix=prefix)
-            modules_result = []
-            for s3_object in s3_objects.get('Contents', []):
-                temp_file_path = str(uuid.uuid4())
-                try:
-                    with open(temp_file_path, 'wb') as f_res:
-                        self.s3_client.download_fileobj(
-                            BUCKET_NAME, s3_object['Key'], f_res)
-                    with open(temp_file_path, 'r') as f_in:
-                        res = json.load(f_in)
-                        if res:
-                            modules_result.append(res)
-                finally:
-                    if os.path.exists(temp_file_path):
-                        os.remove(temp_file_path)
+            modules_result = [self.read_result_header(x['Key'])
+                              for x in s3_objects.get('Contents', [])]
             for module in modules_result:
                 error = module.get('error') or module.get('timeout_error')
                 if error:
@@ -305,6 +310,18 @@ class InitializeChecklist(InitializeChildrenBase):
     def update_task_state(self):
         self.body['state'] = TaskState.INITIALIZED_CHECKLIST
 
+    def save_context(self):
+        organization_id = self.body['organization_id']
+        try:
+            context = OrganizationContext.build(
+                self.rest_cl, self.mongo_cl, organization_id)
+            context.save(self.s3_client, organization_id,
+                         self.body['created_at'])
+        except Exception as exc:
+            # modules request organization data themselves
+            LOG.warning('Unable to save context of task %s: %s',
+                        task_str(self.body), str(exc))
+
     def _execute(self):
         modules = list_modules(self.module_type)
         if not modules:
@@ -312,6 +329,7 @@ class InitializeChecklist(InitializeChildrenBase):
             # Nothing to do, update checklist & complete
             self.body['state'] = TaskState.WAITED_SERVICE
         else:
+            self.save_context()
             self.create_children_tasks(modules)
             self.body['children_count'] = len(modules)
             self.update_task_state()
@@ -371,20 +389,30 @@ class WaitArchive(WaitTasksResult):
 
 
 class CollectCheckResult(CheckTimeoutThreshold):
-    def save_result(self, modules_result):
-        update_fields = ['data']
-        filter_filed = ['module', 'created_at', 'organization_id']
-        self.mongo_cl.restapi['checklists'].bulk_write([
-            UpdateOne(
-                filter={k: res[k] for k in filter_filed},
-                update={
-                    '$set': {k: res[k] for k in update_fields},
-                    '$setOnInsert': {k: v for k, v in res.items()
-                                     if k not in update_fields},
-                },
-                upsert=True,
-            ) for res in modules_result
-        ])
+    def save_result(self, result, items):
+        key_fields = ['module', 'created_at', 'organization_id']
+        key = {k: result[k] for k in key_fields}
+        items_collection = self.mongo_cl.restapi['checklist_items']
+        # items saved by the previous try of the task
+        items_collection.delete_many(key)
+        bulk = []
+        for item in items:
+            bulk.append({**key, 'data': item})
+            if len(bulk) == ITEMS_BULK_SIZE:
+                items_collection.insert_many(bulk)
+                bulk = []
+        if bulk:
+            items_collection.insert_many(bulk)
+        update_fields = ['items_count']
+        self.mongo_cl.restapi['checklists'].update_one(
+            filter=key,
+            update={
+                '$set': {k: result[k] for k in update_fields},
+                '$setOnInsert': {k: v for k, v in result.items()
+                                 if k not in update_fields + key_fields},
+            },
+            upsert=True,
+        )
 
     def _execute(self):
         prefix = '%s/' % os.path.join(
@@ -392,28 +420,14 @@ class CollectCheckResult(CheckTimeoutThreshold):
             RECOMMENDATION_FOLDER)
         s3_objects = self.s3_client.list_objects_v2(
             Bucket=BUCKET_NAME, Prefix=prefix)
-        modules_result = []
-        need_raise = False
-        for s3_object in s3_objects.get('Contents', []):
-            temp_file_path = str(uuid.uuid4())
-            try:
-                with open(temp_file_path, 'wb') as f_res:
-                    self.s3_client.download_fileobj(
-                        BUCKET_NAME, s3_object['Key'], f_res)
-                with open(temp_file_path, 'r') as f_in:
-                    res = json.load(f_in)
-                    if res.get('timeout_error'):
-                        need_raise = True
-                    else:
-                        modules_result.append(res)
-            finally:
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
+        keys = [x['Key'] for x in s3_objects.get('Contents', [])]
+        need_raise = any(self.read_result_header(x).get('timeout_error')
+                         for x in keys)
         if need_raise:
             self.body['state'] = TaskState.ERROR
         else:
-            if modules_result:
-                self.save_result(modules_result)
+            for key in keys:
+                self.save_result(*self.read_result(key))
             self.body['state'] = TaskState.COLLECTED_CHECK_RESULT
         super()._execute()
 
@@ -427,19 +441,10 @@ class CheckArchiveResult(CheckTimeoutThreshold):
         s3_objects = self.s3_client.list_objects_v2(
             Bucket=BUCKET_NAME, Prefix=prefix)
         for s3_object in s3_objects.get('Contents', []):
-            temp_file_path = str(uuid.uuid4())
-            try:
-                with open(temp_file_path, 'wb') as f_res:
-                    self.s3_client.download_fileobj(
-                        BUCKET_NAME, s3_object['Key'], f_res)
-                with open(temp_file_path, 'r') as f_in:
-                    res = json.load(f_in)
-                    if res.get('timeout_error') or res.get('error'):
-                        self.body['state'] = TaskState.ERROR
-                        break
-            finally:
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
+            res = self.read_result_header(s3_object['Key'])
+            if res.get('timeout_error') or res.get('error'):
+                self.body['state'] = TaskState.ERROR
+                break
         super()._execute()
 
 
@@ -479,18 +484,24 @@ class UpdateChecklist(Continue):
 
 class HandleTaskTimeout(CheckTimeoutThreshold):
     def save_result_to_file(self, module_data):
+        data = module_data.pop('data', None)
         result = {
             'organization_id': self.body['organization_id'],
             'created_at': self.body['created_at'],
             'module': self.body['module'],
+            'items_count': len(data) if isinstance(data, list) else None,
             **module_data
         }
         temp_file_path = str(uuid.uuid4())
         module_obj_path = os.path.join(
             self.body['organization_id'], str(self.body['created_at']),
             self.body['module_type'], '%s.json' % self.body['module'])
+        # result is saved as json lines: the result without data and an
+        # item of data per line
         with open(temp_file_path, 'w') as outfile:
-            json.dump(result, outfile)
+            outfile.write(json.dumps(result) + '\n')
+            for item in data or []:
+                outfile.write(json.dumps(item) + '\n')
         try:
             with open(temp_file_path, 'rb') as f_res:
                 self.s3_client.upload_fileobj(
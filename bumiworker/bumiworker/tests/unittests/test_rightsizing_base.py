@@ -0,0 +1,74 @@
+import copy
+import json
+import os
+import re
+import unittest
+from collections import Counter
+from unittest.mock import MagicMock
+
+from bumiworker.bumiworker.modules.recommendations.rightsizing_instances import (
+    RightsizingInstances)
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class FakeInsiderClient:
+    def __init__(self, flavors):
+        # (mode, region, source flavor, cpu) -> flavor
+        self.flavors = {
+            (x['mode'], x['region'], x['source_flavor_id'], x['cpu']):
+                x['flavor'] for x in flavors
+        }
+
+    def find_flavors(self, requests):
+        result = []
+        for request in requests:
+            flavor = self.flavors.get((
+                request['mode'], request['region'],
+                request['family_specs']['source_flavor_id'],
+                request.get('cpu')))
+            if flavor is None:
+                result.append({'status_code': 404, 'error': {
+                    'reason': 'flavor not found'}})
+            else:
+                result.append({'status_code': 200, 'flavor': flavor})
+        return 200, {'flavors': result}
+
+
+class TestRightsizingBase(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # recommendations and stats of the fixture are made by the
+        # per-instance implementation of the recommendations
+        with open(os.path.join(FIXTURES_PATH,
+                               'rightsizing_instances.json'),
+                  encoding='utf-8') as f:
+            self.fixture = json.load(f)
+
+    def _handle_instances(self, case):
+        module = RightsizingInstances('org_id', MagicMock(), 0)
+        module._currency = 'USD'
+        module._insider_cl = FakeInsiderClient(self.fixture['flavors'])
+        stats = Counter()
+        recommendations = module._handle_instances(
+            copy.deepcopy(self.fixture['current_flavor_params']),
+            self.fixture['cloud_account'], lambda x: stats.update([x]),
+            case['optimization_metric'], self.fixture['metrics'],
+            self.fixture['resources'], self.fixture['resources_info'],
+            case['recommended_flavor_cpu_min'], case['excluded_pools'],
+            re.compile(case['excluded_flavor_regex']))
+        return recommendations, dict(stats)
+
+    def test_handle_instances(self):
+        for case in self.fixture['cases']:
+            with self.subTest(metric=case['optimization_metric'],
+                              cpu_min=case['recommended_flavor_cpu_min']):
+                recommendations, stats = self._handle_instances(case)
+                self.assertEqual(recommendations,
+                                 case['expected_recommendations'])
+                self.assertEqual(stats, case['expected_stats'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+import argparse
+import csv
+import gzip
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from diworker.diworker.importers.aws import (
+    AWSReportImporter, AWS_CUR_PREFIX_MAP, DATETIME_FORMAT)
+
+CLOUD_ACCOUNT_ID = 'benchmark-cloud-account'
+ACCOUNT_ID = '123456789012'
+FORMATS = ['legacy', 'cur2']
+LEGACY_COLUMNS = [
+    'identity/LineItemId', 'identity/TimeInterval',
+    'bill/BillingPeriodStartDate', 'bill/BillingPeriodEndDate',
+    'bill/PayerAccountId', 'lineItem/UsageAccountId',
+    'lineItem/LineItemType', 'lineItem/UsageStartDate',
+    'lineItem/UsageEndDate', 'lineItem/ProductCode', 'lineItem/UsageType',
+    'lineItem/Operation', 'lineItem/AvailabilityZone', 'lineItem/ResourceId',
+    'lineItem/UsageAmount', 'lineItem/BlendedRate', 'lineItem/BlendedCost',
+    'lineItem/UnblendedRate', 'lineItem/UnblendedCost',
+    'lineItem/LineItemDescription', 'product/ProductName', 'product/region',
+    'product/instanceType', 'product/servicecode', 'product/productFamily',
+    'pricing/term', 'pricing/unit', 'reservation/ReservationARN',
+    'savingsPlan/SavingsPlanARN', 'resourceTags/user:Name',
+    'resourceTags/user:env',
+]
+
+
+class BenchmarkImporter(AWSReportImporter):
+    # importer without cloud account and storages, parsed rows are only
+    # counted
+    def __init__(self):
+        # pylint: disable=super-init-not-called
+        self.cloud_acc_id = CLOUD_ACCOUNT_ID
+        self._cloud_acc = {'config': {}}
+        self.__dict__['min_date_import_threshold'] = datetime(
+            2024, 1, 1, tzinfo=timezone.utc)
+        self.detected_cloud_accounts = set()
+        self.current_billing_period = None
+        self.import_start_ts = int(datetime.utcnow().timestamp())
+        self.rows_count = 0
+
+    def update_raw_records(self, chunk):
+        self.rows_count += len(chunk)
+
+
+class LegacyBenchmarkImporter(BenchmarkImporter):
+    # per row processing used before the row transformer was compiled from
+    # the report header
+    def _extract_nested_objects(self, obj):
+        updates = {}
+        removed_keys = set()
+        for k in AWS_CUR_PREFIX_MAP.keys():
+            values = obj.get(k)
+            if not values:
+                continue
+            try:
+                nested_objects = json.loads(values)
+            except Exception:
+                continue
+            for new_key, new_value in nested_objects.items():
+                csv_key = self._get_legacy_csv_key(f'{k}_{new_key}')
+                updates[csv_key] = new_value
+            removed_keys.add(k)
+        for k in removed_keys:
+            obj.pop(k)
+        obj.update(updates)
+        return obj
+
+    @staticmethod
+    def _datetime_from_value(value):
+        dt_format = DATETIME_FORMAT
+        if re.match(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z", value):
+            dt_format = '%Y-%m-%dT%H:%M:%S.%fZ'
+        return datetime.strptime(value, dt_format).replace(tzinfo=timezone.utc)
+
+    def load_csv_report(self, report_path, account_id_ca_id_map,
+                        billing_period, skipped_accounts):
+        with self.open_csv_report(report_path) as csvfile:
+            reader = csv.DictReader(csvfile)
+            reader.fieldnames = self._convert_to_legacy_csv_columns(
+                reader.fieldnames)
+            chunk = []
+            record_number = 0
+            for row in reader:
+                row = self._extract_nested_objects(row)
+                if billing_period is None:
+                    billing_period = row['bill/BillingPeriodStartDate']
+                if len(chunk) == 200:
+                    self.update_raw_records(chunk)
+                    chunk = []
+                cloud_account_id = account_id_ca_id_map.get(
+                    row['lineItem/UsageAccountId'])
+                if cloud_account_id is None:
+                    skipped_accounts.add(row['lineItem/UsageAccountId'])
+                    continue
+                record_number += 1
+                row['_rec_n'] = record_number
+                row['cloud_account_id'] = cloud_account_id
+                if 'lineItem/ResourceId' in row:
+                    row['resource_id'] = self.short_resource_id(
+                        row['lineItem/ResourceId'])
+                start_date = self._datetime_from_value(
+                    row['lineItem/UsageStartDate']).replace(
+                    hour=0, minute=0, second=0)
+                if (start_date < self.min_date_import_threshold and
+                        row['lineItem/LineItemType'] != 'RIFee'):
+                    continue
+                row['start_date'] = start_date
+                row['end_date'] = self._datetime_from_value(
+                    row['lineItem/UsageEndDate'])
+                row['cost'] = float(row['lineItem/BlendedCost']) if row[
+                    'lineItem/BlendedCost'] else 0
+                if self._is_flavor_usage(row):
+                    row['box_usage'] = True
+                for k, v in row.copy().items():
+                    if v == '':
+                        del row[k]
+                self._set_resource_id(row)
+                row['created_at'] = self.import_start_ts
+                chunk.append(row)
+            if chunk:
+                self.update_raw_records(chunk)
+        return billing_period, skipped_accounts
+
+
+def _to_cur2_column(column):
+    prefix, name = column.split('/', 1)
+    prefix = re.sub(r'(?<!^)(?=[A-Z])', '_', prefix).lower()
+    name = re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+    return f'{prefix}_{name}'
+
+
+def generate_rows(count, seed=0):
+    rnd = random.Random(seed)
+    period_start = datetime(2024, 1, 1)
+    for _ in range(count):
+        start_date = period_start + timedelta(hours=rnd.randint(0, 24 * 28))
+        instance = rnd.randint(0, count // 50)
+        cost = rnd.random()
+        yield {
+            'identity/LineItemId': '%032x' % rnd.getrandbits(128),
+            'identity/TimeInterval': '2024-01-01T00:00:00Z/2024-02-01T00:00:00Z',
+            'bill/BillingPeriodStartDate': '2024-01-01T00:00:00Z',
+            'bill/BillingPeriodEndDate': '2024-02-01T00:00:00Z',
+            'bill/PayerAccountId': ACCOUNT_ID,
+            'lineItem/UsageAccountId': ACCOUNT_ID,
+            'lineItem/LineItemType': 'Usage',
+            'lineItem/UsageStartDate': start_date.strftime(DATETIME_FORMAT),
+            'lineItem/UsageEndDate': (start_date + timedelta(
+                hours=1)).strftime(DATETIME_FORMAT),
+            'lineItem/ProductCode': 'AmazonEC2',
+            'lineItem/UsageType': 'BoxUsage:t3.micro',
+            'lineItem/Operation': 'RunInstances',
+            'lineItem/AvailabilityZone': 'us-east-1a',
+            'lineItem/ResourceId': 'i-%012d' % instance,
+            'lineItem/UsageAmount': '1.0',
+            'lineItem/BlendedRate': str(cost),
+            'lineItem/BlendedCost': str(cost),
+            'lineItem/UnblendedRate': str(cost),
+            'lineItem/UnblendedCost': str(cost),
+            'lineItem/LineItemDescription': 'usage %s' % rnd.randint(0, 10),
+            'product/ProductName': 'Amazon Elastic Compute Cloud',
+            'product/region': 'us-east-1',
+            'product/instanceType': 't3.micro',
+            'product/servicecode': 'AmazonEC2',
+            'product/productFamily': 'Compute Instance',
+            'pricing/term': 'OnDemand',
+            'pricing/unit': 'Hrs',
+            'reservation/ReservationARN': '',
+            'savingsPlan/SavingsPlanARN': '',
+            'resourceTags/user:Name': 'instance %s' % instance,
+            'resourceTags/user:env': rnd.choice(['', 'prod', 'dev']),
+        }
+
+
+def write_report(path, report_format, count):
+    if report_format == 'legacy':
+        columns = LEGACY_COLUMNS
+    else:
+        # CUR 2.0 keeps product and resource tags as json map columns
+        columns = [_to_cur2_column(c) for c in LEGACY_COLUMNS
+                   if not c.startswith(('product/', 'resourceTags/'))]
+        columns.extend(['product', 'resource_tags'])
+    with gzip.open(path, 'wt', newline='') as f_report:
+        writer = csv.writer(f_report)
+        writer.writerow(columns)
+        for row in generate_rows(count):
+            if report_format == 'legacy':
+                writer.writerow([row[c] for c in LEGACY_COLUMNS])
+                continue
+            values = [row[c] for c in LEGACY_COLUMNS
+                      if not c.startswith(('product/', 'resourceTags/'))]
+            product = {_to_cur2_column(k)[len('product_'):]: v
+                       for k, v in row.items() if k.startswith('product/')}
+            tags = {'user_' + k.split(':', 1)[1].lower(): v
+                    for k, v in row.items() if k.startswith('resourceTags/')}
+            values.extend([json.dumps(product), json.dumps(tags)])
+            writer.writerow(values)
+
+
+def load_rows(importer, report_path):
+    started_at = time.time()
+    importer.load_csv_report(report_path, {ACCOUNT_ID: CLOUD_ACCOUNT_ID},
+                             None, set())
+    return importer.rows_count / (time.time() - started_at)
+
+
+def main(rows, formats):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for report_format in formats:
+            report_path = os.path.join(tmp_dir, f'{report_format}.csv.gz')
+            write_report(report_path, report_format, rows)
+            legacy_rate = load_rows(LegacyBenchmarkImporter(), report_path)
+            compiled_rate = load_rows(BenchmarkImporter(), report_path)
+            print('%s report: per row processing %.0f rows/sec, compiled '
+                  'transformer %.0f rows/sec (x%.2f)' % (
+                      report_format, legacy_rate, compiled_rate,
+                      compiled_rate / legacy_rate))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark of AWS CSV report rows processing')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS,
+                        default=FORMATS)
+    arguments = parser.parse_args()
+    main(arguments.rows, arguments.formats)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import MongoClient
+
+from diworker.diworker.importers.aws import AWSReportImporter
+from diworker.diworker.importers.base import RAW_WRITE_MODES
+
+CHUNK_SIZE = 200
+CLOUD_ACCOUNT_ID = 'benchmark-cloud-account'
+INDEX_NAME = 'AWSRawSearch'
+INDEX_FIELDS = ['cloud_account_id', 'bill/BillingPeriodStartDate',
+                'resource_id']
+
+
+class BenchmarkRestClient:
+    # only the cloud account is requested by the importer on creation
+    request_count = 0
+
+    @staticmethod
+    def cloud_account_get(cloud_account_id):
+        # raw expenses of previous imports are compared like after a
+        # successful import
+        return 200, {'id': cloud_account_id, 'type': 'aws_cnr',
+                     'config': {}, 'last_import_modified_at': 0,
+                     'last_import_at': int(time.time())}
+
+
+class BenchmarkConfigClient:
+    def __init__(self, raw_write_mode):
+        self.raw_write_mode = raw_write_mode
+
+    def diworker_settings(self):
+        return {'raw_write_mode': self.raw_write_mode}
+
+
+def generate_rows(count, seed=0):
+    rnd = random.Random(seed)
+    period_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        start_date = period_start + timedelta(hours=rnd.randint(0, 24 * 28))
+        resource_id = 'i-%012d' % rnd.randint(0, count // 50)
+        cost = rnd.random()
+        yield {
+            'bill/BillingPeriodStartDate': '2024-01-01T00:00:00Z',
+            'lineItem/LineItemDescription': 'usage %s' % rnd.randint(0, 10),
+            'lineItem/LineItemType': 'Usage',
+            'lineItem/UsageType': 'BoxUsage:t3.micro',
+            'lineItem/Operation': 'RunInstances',
+            'lineItem/ProductCode': 'AmazonEC2',
+            'lineItem/ResourceId': resource_id,
+            'lineItem/AvailabilityZone': 'us-east-1a',
+            'lineItem/UsageStartDate': start_date.strftime(
+                '%Y-%m-%dT%H:%M:%SZ'),
+            'lineItem/UsageEndDate': (start_date + timedelta(
+                hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'lineItem/BlendedCost': str(cost),
+            'resourceTags/user:Name': 'benchmark',
+            'cloud_account_id': CLOUD_ACCOUNT_ID,
+            'resource_id': resource_id,
+            'start_date': start_date.replace(hour=0),
+            'end_date': start_date + timedelta(hours=1),
+            'cost': cost,
+            'box_usage': True,
+            '_rec_n': i + 1,
+        }
+
+
+def import_rows(mongo_raw, raw_write_mode, rows):
+    # importer without report files, only raw expenses writing is used
+    importer = AWSReportImporter(
+        CLOUD_ACCOUNT_ID, BenchmarkRestClient(),
+        BenchmarkConfigClient(raw_write_mode), mongo_raw, None, None,
+        detect_period_start=False)
+    count = 0
+    started_at = time.time()
+    chunk = []
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == CHUNK_SIZE:
+                importer.update_raw_records(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            importer.update_raw_records(chunk)
+            count += len(chunk)
+        importer.flush_raw_records()
+        importer.clear_rudiments()
+    finally:
+        importer.cleanup()
+    return count / (time.time() - started_at)
+
+
+def main(mongo_url, database, rows, modes):
+    mongo_raw = MongoClient(mongo_url)[database]['raw_expenses']
+    for mode in modes:
+        mongo_raw.drop()
+        mongo_raw.create_index([(f, 1) for f in INDEX_FIELDS],
+                               name=INDEX_NAME)
+        mongo_raw.create_index([('report_identity', 1)])
+        # the second import rewrites the same rows like daily re-imports
+        for attempt in ['initial', 'repeated']:
+            rate = import_rows(mongo_raw, mode, generate_rows(rows))
+            print('%s write mode, %s import: %.0f rows/sec' % (
+                mode, attempt, rate))
+    mongo_raw.drop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark of raw expenses write modes')
+    parser.add_argument('--mongo_url', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='diworker_benchmark')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--modes', nargs='+', choices=RAW_WRITE_MODES,
+                        default=RAW_WRITE_MODES)
+    arguments = parser.parse_args()
+    main(arguments.mongo_url, arguments.database, arguments.rows,
+         arguments.modes)
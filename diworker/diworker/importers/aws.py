@@ -2,10 +2,7 @@
 import csv
 import gzip
 import logging
-import math
 import os
-import re
-import pyarrow
 import shutil
 import uuid
 import zipfile
@@ -14,13 +11,20 @@ from collections import defaultdict, OrderedDict
 from datetime import datetime, timedelta, timezone
 from functools import cached_property
 
-from diworker.diworker.importers.base import CSVBaseReportImporter
-
+import numpy as np
+import pyarrow
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
+from diworker.diworker.importers.base import CSVBaseReportImporter
+
 LOG = logging.getLogger(__name__)
 CHUNK_SIZE = 200
+PARQUET_BATCH_SIZE = 20000
 GZIP_ENDING = '.gz'
+PARQUET_MAGIC = b'PAR1'
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+DATETIME_CACHE_SIZE = 100000
 IGNORE_EXPENSE_TYPES = ['Credit']
 RI_PLATFORMS = [
     'Linux/UNIX',
@@ -58,6 +62,15 @@ AWS_CUR_PREFIX_MAP = {
     'resource_tags': (False, []),
     'cost_category': (False, []),
 }
+# columns which are always read from parquet reports even if they are empty
+PARQUET_REQUIRED_COLUMNS = [
+    'bill_billing_period_start_date',
+    'line_item_usage_account_id',
+    'line_item_usage_start_date',
+    'line_item_usage_end_date',
+    'line_item_line_item_type',
+    'line_item_blended_cost',
+]
 
 
 class AWSReportImporter(CSVBaseReportImporter):
@@ -133,6 +146,11 @@ class AWSReportImporter(CSVBaseReportImporter):
         return snake_str[0].lower() + snake_str[1:]
 
     def unpack_report(self, report_file, date):
+        with self.open_report_stream(report_file) as f_report:
+            if f_report.read(len(PARQUET_MAGIC)) != PARQUET_MAGIC:
+                # csv reports are parsed directly from the archive
+                return report_file
+        # parquet reader needs random access, so archive is extracted
         dest_dir = self.get_new_report_path(date)
         os.makedirs(dest_dir, exist_ok=True)
         if zipfile.is_zipfile(report_file):
@@ -145,11 +163,6 @@ class AWSReportImporter(CSVBaseReportImporter):
         else:
             return report_file
 
-    def unpack_report_files(self):
-        for date, reports in self.report_files.items():
-            self.report_files[date] = [
-                self.unpack_report(r, date) for r in self.report_files[date]]
-
     @staticmethod
     def get_unique_field_list(include_date=True):
         # todo: if this is not enough, we may lose data on raw import
@@ -232,14 +245,9 @@ class AWSReportImporter(CSVBaseReportImporter):
         account_id_ca_id_map[self.cloud_acc['account_id']] = self.cloud_acc_id
         return account_id_ca_id_map
 
-    def load_raw_data(self):
-        account_id_ca_id_map = self.get_linked_account_map()
-        report_files = []
-        for r in self.report_files.values():
-            report_files.extend(r)
-        for report_path in report_files:
-            self.load_report(report_path, account_id_ca_id_map)
-        self.clear_rudiments()
+    def prepare_report_workers(self):
+        super().prepare_report_workers()
+        LOG.info('Use EDP discount: %s', self.use_edp_discount)
 
     def load_report(self, report_path, account_id_ca_id_map):
         skipped_accounts = set()
@@ -344,36 +352,49 @@ class AWSReportImporter(CSVBaseReportImporter):
                 new_key = self.to_lower_case(new_key)
         return f'{prefix}/{new_key}'
 
-    def _extract_nested_objects(self, obj, parquet=False):
-        updates = defaultdict(dict)
-        removed_keys = set()
-        # extract nested objects
-        for k in AWS_CUR_PREFIX_MAP.keys():
-            values = obj.get(k)
-            if not values:
-                continue
-            if parquet:
-                for n, vals in values.items():
-                    if isinstance(vals, list):
-                        for postfix, value in vals:
-                            snake_key = f'{k}_{postfix}'
-                            csv_key = self._get_legacy_csv_key(snake_key)
-                            updates[csv_key][n] = value
-                        removed_keys.add(k)
-            else:
+    def _compile_csv_row_transformer(self, fieldnames):
+        # columns are analyzed once per report: every row is only zipped with
+        # legacy column names and expanded from nested json columns,
+        # empty values are never saved to raw expenses
+        fieldnames = self._convert_to_legacy_csv_columns(fieldnames)
+        nested_columns = [k for k in AWS_CUR_PREFIX_MAP if k in fieldnames]
+        nested_keys_map = {}
+
+        def transform(values):
+            row = {k: v for k, v in zip(fieldnames, values) if v}
+            for k in nested_columns:
+                value = row.get(k)
+                if not value:
+                    continue
                 try:
-                    nested_objects = json.loads(values)
+                    nested_objects = json.loads(value)
                 except Exception:
                     continue
-                for new_key, new_value in nested_objects.items():
-                    snake_key = f'{k}_{new_key}'
-                    csv_key = self._get_legacy_csv_key(snake_key)
-                    updates[csv_key] = new_value
-                removed_keys.add(k)
-        for k in removed_keys:
-            obj.pop(k)
-        obj.update(updates)
-        return obj
+                row.pop(k)
+                for nested_key, nested_value in nested_objects.items():
+                    csv_key = nested_keys_map.get((k, nested_key))
+                    if csv_key is None:
+                        csv_key = self._get_legacy_csv_key(
+                            f'{k}_{nested_key}')
+                        nested_keys_map[(k, nested_key)] = csv_key
+                    if nested_value == '':
+                        row.pop(csv_key, None)
+                    else:
+                        row[csv_key] = nested_value
+            return row
+        return transform
+
+    @staticmethod
+    def _cached_datetime_from_value(cache, value):
+        # usage dates are repeated across report rows, so every unique value
+        # is parsed once
+        result = cache.get(value)
+        if result is None:
+            if len(cache) >= DATETIME_CACHE_SIZE:
+                cache.clear()
+            result = AWSReportImporter._datetime_from_value(value)
+            cache[value] = result
+        return result
 
     def _convert_to_legacy_csv_columns(self, columns, dict_format=False):
         if not dict_format:
@@ -383,16 +404,20 @@ class AWSReportImporter(CSVBaseReportImporter):
     def load_csv_report(self, report_path, account_id_ca_id_map,
                         billing_period, skipped_accounts):
         date_start = datetime.utcnow()
-        with open(report_path, newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            reader.fieldnames = self._convert_to_legacy_csv_columns(
-                reader.fieldnames)
+        with self.open_csv_report(report_path) as csvfile:
+            reader = csv.reader(csvfile)
+            fieldnames = next(reader, None)
+            if fieldnames is None:
+                return billing_period, skipped_accounts
+            transform = self._compile_csv_row_transformer(fieldnames)
+            dates_cache = {}
+            min_date = self.min_date_import_threshold
             chunk = []
             record_number = 0
-            for row in reader:
-                row = self._extract_nested_objects(row)
+            for values in reader:
+                row = transform(values)
                 if billing_period is None:
-                    billing_period = row['bill/BillingPeriodStartDate']
+                    billing_period = row.get('bill/BillingPeriodStartDate', '')
                     LOG.info('detected billing period: %s', billing_period)
                     self.current_billing_period = billing_period
 
@@ -405,10 +430,10 @@ class AWSReportImporter(CSVBaseReportImporter):
                                  report_path, record_number)
                         date_start = now
 
-                cloud_account_id = account_id_ca_id_map.get(
-                    row['lineItem/UsageAccountId'])
+                usage_account_id = row.get('lineItem/UsageAccountId', '')
+                cloud_account_id = account_id_ca_id_map.get(usage_account_id)
                 if cloud_account_id is None:
-                    skipped_accounts.add(row['lineItem/UsageAccountId'])
+                    skipped_accounts.add(usage_account_id)
                     continue
 
                 self.detected_cloud_accounts.add(cloud_account_id)
@@ -416,27 +441,26 @@ class AWSReportImporter(CSVBaseReportImporter):
                 row['_rec_n'] = record_number
                 row['cloud_account_id'] = cloud_account_id
                 if 'lineItem/ResourceId' in row:
-                    row['resource_id'] = self.short_resource_id(
+                    resource_id = self.short_resource_id(
                         row['lineItem/ResourceId'])
-                start_date = self._datetime_from_expense(
-                    row, 'lineItem/UsageStartDate').replace(
+                    if resource_id:
+                        row['resource_id'] = resource_id
+                start_date = self._cached_datetime_from_value(
+                    dates_cache, row['lineItem/UsageStartDate']).replace(
                     hour=0, minute=0, second=0)
                 # RIFee is created once a month and is updated every day
-                if (start_date < self.min_date_import_threshold and
-                        row['lineItem/LineItemType'] != 'RIFee'):
+                if (start_date < min_date and
+                        row.get('lineItem/LineItemType') != 'RIFee'):
                     continue
                 row['start_date'] = start_date
-                row['end_date'] = self._datetime_from_expense(
-                    row, 'lineItem/UsageEndDate')
-                row['cost'] = float(row['lineItem/BlendedCost']) if row[
-                    'lineItem/BlendedCost'] else 0
+                row['end_date'] = self._cached_datetime_from_value(
+                    dates_cache, row['lineItem/UsageEndDate'])
+                blended_cost = row.get('lineItem/BlendedCost')
+                row['cost'] = float(blended_cost) if blended_cost else 0
                 if self.use_edp_discount:
                     row['cost'] += float(row.get('discount/EdpDiscount') or 0)
                 if self._is_flavor_usage(row):
                     row['box_usage'] = True
-                for k, v in row.copy().items():
-                    if v == '':
-                        del row[k]
                 self._set_resource_id(row)
                 row['created_at'] = self.import_start_ts
                 chunk.append(row)
@@ -445,79 +469,246 @@ class AWSReportImporter(CSVBaseReportImporter):
                 self.update_raw_records(chunk)
         return billing_period, skipped_accounts
 
+    @staticmethod
+    def _get_parquet_columns(parquet_file):
+        # flat columns without values in all row groups are not read as
+        # empty values are never saved to raw expenses
+        metadata = parquet_file.metadata
+        columns = parquet_file.schema_arrow.names
+        if not metadata.num_row_groups:
+            return columns
+        empty_columns = set()
+        for i in range(metadata.num_columns):
+            path = metadata.row_group(0).column(i).path_in_schema
+            if '.' in path or path in PARQUET_REQUIRED_COLUMNS:
+                continue
+            empty = True
+            for j in range(metadata.num_row_groups):
+                row_group = metadata.row_group(j)
+                stats = row_group.column(i).statistics
+                if (stats is None or not stats.has_null_count or
+                        stats.null_count != row_group.num_rows):
+                    empty = False
+                    break
+            if empty:
+                empty_columns.add(path)
+        return [c for c in columns if c not in empty_columns]
+
+    def _extract_parquet_nested_columns(self, columns, num_rows,
+                                        nested_keys_map):
+        # expand map columns (product, resource_tags, etc.) to separate
+        # columns named as legacy csv keys
+        for k in AWS_CUR_PREFIX_MAP.keys():
+            array = columns.get(k)
+            if array is None or not pyarrow.types.is_map(array.type):
+                continue
+            columns.pop(k)
+            offsets = array.offsets.to_numpy()
+            lengths = np.diff(offsets)
+            if not lengths.sum():
+                continue
+            parents = np.repeat(np.arange(num_rows), lengths)
+            keys = array.keys.slice(offsets[0], offsets[-1] - offsets[0])
+            items = array.items.slice(offsets[0], offsets[-1] - offsets[0])
+            valid = ~array.is_null().to_numpy(zero_copy_only=False)[parents]
+            encoded_keys = keys.dictionary_encode()
+            codes = encoded_keys.indices.to_numpy()[valid]
+            parents = parents[valid]
+            values = items.to_numpy(zero_copy_only=False)[valid]
+            order = np.argsort(codes, kind='stable')
+            key_names = encoded_keys.dictionary.to_pylist()
+            bounds = np.cumsum(np.bincount(codes, minlength=len(key_names)))
+            start = 0
+            for key_name, end in zip(key_names, bounds):
+                if start == end:
+                    continue
+                csv_key = nested_keys_map.get((k, key_name))
+                if csv_key is None:
+                    csv_key = self._get_legacy_csv_key(f'{k}_{key_name}')
+                    nested_keys_map[(k, key_name)] = csv_key
+                column = columns.get(csv_key)
+                column = np.full(num_rows, None, dtype=object) if (
+                    column is None) else column.to_numpy(zero_copy_only=False)
+                idx = order[start:end]
+                column[parents[idx]] = values[idx]
+                columns[csv_key] = pyarrow.array(column, type=items.type)
+                start = end
+        return columns
+
+    @staticmethod
+    def _parquet_python_values(array):
+        # timestamps are saved in csv format, NaN values are skipped as empty
+        if pyarrow.types.is_timestamp(array.type):
+            encoded = array.dictionary_encode()
+            values = [v.strftime(DATETIME_FORMAT) if v is not None else None
+                      for v in encoded.dictionary.to_pylist()]
+            return [values[i] if i is not None else None
+                    for i in encoded.indices.to_pylist()]
+        if pyarrow.types.is_floating(array.type):
+            array = pc.if_else(pc.is_nan(array), None, array)
+        return array.to_pylist()
+
+    @staticmethod
+    def _parquet_float_values(array, num_rows):
+        if array is None:
+            return np.zeros(num_rows)
+        if (pyarrow.types.is_string(array.type) or
+                pyarrow.types.is_large_string(array.type)):
+            array = pc.cast(pc.if_else(pc.equal(array, ''), None, array),
+                            pyarrow.float64())
+        return np.nan_to_num(
+            array.to_numpy(zero_copy_only=False).astype(float))
+
+    @staticmethod
+    def _parquet_datetime_values(array):
+        # parse only unique values, returns parsed values and their codes
+        encoded = array.dictionary_encode()
+        dates = []
+        for value in encoded.dictionary.to_pylist():
+            if hasattr(value, 'timestamp'):
+                value = value.strftime(DATETIME_FORMAT)
+            dates.append(AWSReportImporter._datetime_from_value(value))
+        return dates, encoded.indices
+
+    @staticmethod
+    def _parquet_flavor_usage_mask(columns, num_rows):
+        empty = pyarrow.nulls(num_rows, pyarrow.string())
+        usage_type = columns.get('lineItem/UsageType', empty)
+        service_code = columns.get('product/servicecode', empty)
+        description = columns.get('lineItem/LineItemDescription', empty)
+        item_type = columns.get('lineItem/LineItemType', empty)
+        mask = pc.or_kleene(
+            pc.match_substring(usage_type, 'BoxUsage'),
+            pc.and_kleene(pc.equal(service_code, 'AmazonECS'),
+                          pc.match_substring(usage_type, 'Fargate')))
+        mask = pc.or_kleene(mask, pc.and_kleene(
+            pc.equal(service_code, 'AmazonSageMaker'),
+            pc.or_kleene(pc.match_substring(description, 'ml.'),
+                         pc.equal(item_type, 'SavingsPlanNegation'))))
+        mask = pc.or_kleene(mask, pc.and_kleene(
+            pc.equal(service_code, 'AWSLambda'),
+            pc.match_substring(usage_type, 'Lambda-GB-Second')))
+        return pc.fill_null(mask, False).to_numpy(zero_copy_only=False)
+
+    def _normalize_parquet_batch(self, columns, num_rows,
+                                 account_id_ca_id_map, skipped_accounts):
+        # calculates fields of raw expenses for the whole batch, returns
+        # positions of rows to import and calculated values for them
+        account_ids = pc.cast(columns['lineItem/UsageAccountId'],
+                              pyarrow.string())
+        known_accounts = list(account_id_ca_id_map.keys())
+        account_idx = pc.index_in(
+            account_ids, value_set=pyarrow.array(known_accounts,
+                                                 pyarrow.string()))
+        skipped_accounts.update(pc.unique(pc.filter(
+            account_ids, pc.is_null(account_idx))).to_pylist())
+        cloud_account_ids = pc.take(
+            pyarrow.array([account_id_ca_id_map[x] for x in known_accounts],
+                          pyarrow.string()), account_idx)
+        self.detected_cloud_accounts.update(
+            x for x in pc.unique(cloud_account_ids).to_pylist() if x)
+
+        start_dates, start_codes = self._parquet_datetime_values(
+            columns['lineItem/UsageStartDate'])
+        start_dates = [d.replace(hour=0, minute=0, second=0)
+                       for d in start_dates]
+        start_ts = np.array([d.timestamp() for d in start_dates] + [np.nan])
+        start_codes = pc.fill_null(start_codes, len(start_dates)).to_numpy(
+            zero_copy_only=False)
+        end_dates, end_codes = self._parquet_datetime_values(
+            columns['lineItem/UsageEndDate'])
+        item_type = columns.get('lineItem/LineItemType')
+        # RIFee is created once a month and is updated every day
+        is_ri_fee = np.zeros(num_rows, dtype=bool) if item_type is None else (
+            pc.fill_null(pc.equal(item_type, 'RIFee'), False).to_numpy(
+                zero_copy_only=False))
+        keep = pc.is_valid(account_idx).to_numpy(zero_copy_only=False) & (
+            (start_ts[start_codes] >= self.min_date_import_threshold.timestamp())
+            | (is_ri_fee & ~np.isnan(start_ts[start_codes])))
+        positions = np.flatnonzero(keep)
+
+        cost = self._parquet_float_values(
+            columns.get('lineItem/BlendedCost'), num_rows)
+        if self.use_edp_discount:
+            cost += self._parquet_float_values(
+                columns.get('discount/EdpDiscount'), num_rows)
+        resource_ids = [None] * len(positions)
+        raw_resource_ids = columns.get('lineItem/ResourceId')
+        if raw_resource_ids is not None:
+            resource_ids = pc.replace_substring_regex(
+                raw_resource_ids.take(positions), pattern='^[^/]*/',
+                replacement='', max_replacements=1).to_pylist()
+        end_codes = end_codes.take(positions).to_pylist()
+        end_dates.append(None)
+        return positions, {
+            'cloud_account_id': cloud_account_ids.take(positions).to_pylist(),
+            'resource_id': resource_ids,
+            'start_date': [start_dates[i] for i in start_codes[positions]],
+            'end_date': [end_dates[i if i is not None else -1]
+                         for i in end_codes],
+            'cost': cost[positions].tolist(),
+            'box_usage': self._parquet_flavor_usage_mask(
+                columns, num_rows)[positions].tolist(),
+        }
+
     def load_parquet_report(self, report_path, account_id_ca_id_map,
                             billing_period, skipped_accounts):
         date_start = datetime.utcnow()
-        dataframe = pq.read_pandas(report_path).to_pandas()
-        new_columns = self._convert_to_legacy_csv_columns(
-            dataframe.columns, dict_format=True)
-        dataframe.rename(columns=new_columns, inplace=True)
-        for i in range(0, dataframe.shape[0], CHUNK_SIZE):
-            expense_chunk = self._extract_nested_objects(
-                dataframe.iloc[i:i + CHUNK_SIZE, :].to_dict(), parquet=True)
-            chunk = [{'cost': 0} for _ in range(0, CHUNK_SIZE)]
-            skipped_rows = set()
-            for field_name, values_dict in expense_chunk.items():
-                for n, value in values_dict.items():
-                    expense_num = n % CHUNK_SIZE
-                    if expense_num in skipped_rows:
-                        continue
-                    chunk[expense_num]['_rec_n'] = n
-                    if hasattr(value, 'timestamp'):
-                        value = value.strftime('%Y-%m-%dT%H:%M:%SZ')
-                    if (field_name == 'bill/BillingPeriodStartDate' and
-                            billing_period is None):
-                        billing_period = value
-                        LOG.info('detected billing period: %s', billing_period)
-                        self.current_billing_period = billing_period
-                    elif field_name == 'lineItem/UsageAccountId':
-                        cloud_account_id = account_id_ca_id_map.get(value)
-                        if cloud_account_id is None:
-                            skipped_accounts.add(value)
-                            skipped_rows.add(expense_num)
-                            continue
-                        chunk[expense_num]['cloud_account_id'] = cloud_account_id
-                        self.detected_cloud_accounts.add(cloud_account_id)
-                    elif field_name == 'lineItem/ResourceId' and value:
-                        chunk[expense_num][
-                            'resource_id'] = self.short_resource_id(value)
-                    elif field_name == 'lineItem/UsageStartDate':
-                        start_date = self._datetime_from_value(value).replace(
-                            hour=0, minute=0, second=0)
-                        chunk[expense_num]['start_date'] = start_date
-                    elif field_name == 'lineItem/UsageEndDate':
-                        chunk[expense_num]['end_date'] = self._datetime_from_value(
-                            value)
-                    elif field_name == 'lineItem/BlendedCost':
-                        chunk[expense_num]['cost'] = float(value) if value else 0
-                    elif (self.use_edp_discount and
-                          field_name == 'discount/EdpDiscount' and value):
-                        chunk[expense_num]['cost'] += float(value)
-                    elif field_name == 'lineItem/UsageType':
-                        if 'BoxUsage' in value:
-                            chunk[expense_num]['box_usage'] = True
-                    if isinstance(value, float) and math.isnan(value):
-                        value = 0
-                    if value:
-                        chunk[expense_num][field_name] = value
-
-            expenses = [x for x in chunk
-                        if chunk.index(x) not in skipped_rows and
-                        x.get('cloud_account_id') is not None and
-                        # RIFee is created once a month and is updated every day
-                        (x['start_date'] >= self.min_date_import_threshold or
-                         x['lineItem/LineItemType'] == 'RIFee')]
-            for expense in expenses:
-                expense['created_at'] = self.import_start_ts
-                if self._is_flavor_usage(expense):
+        parquet_file = pq.ParquetFile(report_path)
+        columns = self._get_parquet_columns(parquet_file)
+        legacy_columns = self._convert_to_legacy_csv_columns(
+            columns, dict_format=True)
+        nested_keys_map = {}
+        record_number = 0
+        for batch in parquet_file.iter_batches(
+                batch_size=PARQUET_BATCH_SIZE, columns=columns):
+            batch_columns = self._extract_parquet_nested_columns(
+                {legacy_columns[name]: batch.column(i)
+                 for i, name in enumerate(batch.schema.names)},
+                batch.num_rows, nested_keys_map)
+            if billing_period is None:
+                billing_period_column = batch_columns.get(
+                    'bill/BillingPeriodStartDate')
+                if billing_period_column is not None and len(
+                        billing_period_column):
+                    billing_period = self._parquet_python_values(
+                        billing_period_column.slice(0, 1))[0]
+                    LOG.info('detected billing period: %s', billing_period)
+                    self.current_billing_period = billing_period
+            positions, calculated = self._normalize_parquet_batch(
+                batch_columns, batch.num_rows, account_id_ca_id_map,
+                skipped_accounts)
+            field_names = list(batch_columns.keys())
+            field_values = [self._parquet_python_values(c.take(positions))
+                            for c in batch_columns.values()]
+            expenses = []
+            for n, row_values, cloud_account_id, resource_id, start_date, \
+                    end_date, cost, box_usage in zip(
+                        positions.tolist(), zip(*field_values),
+                        *calculated.values()):
+                expense = {k: v for k, v in zip(field_names, row_values) if v}
+                expense.update({
+                    '_rec_n': record_number + n,
+                    'cloud_account_id': cloud_account_id,
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'cost': cost,
+                    'created_at': self.import_start_ts,
+                })
+                if resource_id:
+                    expense['resource_id'] = resource_id
+                if box_usage:
                     expense['box_usage'] = True
                 self._set_resource_id(expense)
-            if expenses:
-                self.update_raw_records(expenses)
-                now = datetime.utcnow()
-                if (now - date_start).total_seconds() > 60:
-                    LOG.info('report %s: processed %s rows', report_path, i)
-                    date_start = now
+                expenses.append(expense)
+            record_number += batch.num_rows
+            for i in range(0, len(expenses), CHUNK_SIZE):
+                self.update_raw_records(expenses[i:i + CHUNK_SIZE])
+            now = datetime.utcnow()
+            if (now - date_start).total_seconds() > 60:
+                LOG.info('report %s: processed %s rows', report_path,
+                         record_number)
+                date_start = now
         return billing_period, skipped_accounts
 
     def collect_tags(self, expense):
@@ -549,8 +740,8 @@ class AWSReportImporter(CSVBaseReportImporter):
 
     @staticmethod
     def _datetime_from_value(value):
-        dt_format = '%Y-%m-%dT%H:%M:%SZ'
-        if re.match(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z", value):
+        dt_format = DATETIME_FORMAT
+        if '.' in value:
             dt_format = '%Y-%m-%dT%H:%M:%S.%fZ'
         return datetime.strptime(value, dt_format).replace(tzinfo=timezone.utc)
 
@@ -1,8 +1,13 @@
 #!/usr/bin/env python
+import itertools
 import json
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from diworker.diworker.utils import retry_backoff
+from functools import cached_property
+from pymongo import ReplaceOne
+from diworker.diworker.utils import retry_backoff, retry_mongo_upsert
 from tools.cloud_adapter.clouds.azure import (
     AzureConsumptionException, ExpenseImportScheme,
     AzureErrorResponseException, AzureAuthenticationError,
@@ -12,6 +17,9 @@ from diworker.diworker.importers.base import BaseReportImporter
 
 LOG = logging.getLogger(__name__)
 CHUNK_SIZE = 200
+DEFAULT_USAGE_WORKERS = 4
+PRICES_CACHE_TTL = 24 * 60 * 60
+PRICES_BULK_SIZE = 5000
 
 REGION_NAMES = {
   "AU Central 2": "Australia Central 2",
@@ -65,6 +73,38 @@ REGION_NAMES = {
 }
 
 
+class PriceCache:
+    # prices of the cached price list are read from mongo by meter ids of
+    # processed usages
+    def __init__(self, mongo_prices, price_list, prices=None):
+        self.mongo_prices = mongo_prices
+        self.price_list = price_list
+        self._complete = prices is not None
+        self._prices = prices or {}
+        self._loaded_meter_ids = set()
+
+    @staticmethod
+    def meter_key(price_list, meter_id):
+        return '%s:%s' % (price_list, meter_id)
+
+    def load(self, meter_ids):
+        if self._complete:
+            return
+        meter_ids = {x for x in meter_ids
+                     if x and x not in self._loaded_meter_ids}
+        if not meter_ids:
+            return
+        self._loaded_meter_ids.update(meter_ids)
+        meter_keys = {self.meter_key(self.price_list, x): x for x in meter_ids}
+        for price in self.mongo_prices.find(
+                {'_id': {'$in': list(meter_keys)}},
+                {'rates': 1, 'included': 1}):
+            self._prices[meter_keys[price['_id']]] = price
+
+    def get(self, meter_id):
+        return self._prices.get(meter_id)
+
+
 class AzureReportImporter(BaseReportImporter):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -147,22 +187,70 @@ class AzureReportImporter(BaseReportImporter):
         if import_scheme == ExpenseImportScheme.usage.value:
             self._load_usage_data()
         elif import_scheme == ExpenseImportScheme.raw_usage.value:
-            # TODO: it's better to cache prices somewhere in DB
-            LOG.info('Downloading PayAsYouGo prices')
-            prices = self.cloud_adapter.get_public_prices()
-            LOG.info('Fetched %s price entries', len(prices))
+            prices = self.get_prices(
+                'public:%s' % self.cloud_adapter.currency,
+                self.cloud_adapter.get_public_prices)
             self._load_raw_usage_data(prices)
         elif import_scheme == ExpenseImportScheme.partner_raw_usage.value:
-            # TODO: it's better to cache prices somewhere in DB
-            LOG.info('Downloading partner prices')
-            prices = self.cloud_adapter.get_partner_prices()
-            LOG.info('Fetched %s price entries', len(prices))
+            prices = self.get_prices(
+                'partner:%s:%s' % (self.cloud_acc['config'].get(
+                    'partner_tenant'), self.cloud_adapter.currency),
+                self.cloud_adapter.get_partner_prices)
             self._load_raw_usage_data(prices)
         else:
             raise Exception('Unsupported expense import scheme: {}'.format(
                 import_scheme))
         self.clear_rudiments()
 
+    @cached_property
+    def usage_workers(self):
+        return self._get_positive_int_setting(
+            'azure_usage_workers', DEFAULT_USAGE_WORKERS)
+
+    @property
+    def mongo_prices(self):
+        return self.mongo_raw.database.azure_prices
+
+    def get_prices(self, price_list, download_prices):
+        # price lists are shared by imports of all cloud accounts with the
+        # same price list and cached in mongo by meter ids
+        cached = self.mongo_prices.find_one({'_id': price_list})
+        if cached and cached.get('count'):
+            LOG.info('Using %s cached %s price entries', cached['count'],
+                     price_list)
+            return PriceCache(self.mongo_prices, price_list)
+        LOG.info('Downloading %s prices', price_list)
+        prices = download_prices()
+        LOG.info('Fetched %s price entries', len(prices))
+        # empty price list is a result of a cloud side failure, it's
+        # downloaded again by the next import
+        if prices:
+            self.cache_prices(price_list, prices)
+        return PriceCache(self.mongo_prices, price_list, prices)
+
+    def cache_prices(self, price_list, prices):
+        now = datetime.utcnow()
+        # meters expire later than the price list, so all meters of a cached
+        # price list are available
+        meters_expire_at = now + timedelta(seconds=PRICES_CACHE_TTL * 2)
+        bulk = []
+        for meter_id, price in prices.items():
+            meter_key = PriceCache.meter_key(price_list, meter_id)
+            bulk.append(ReplaceOne({'_id': meter_key}, {
+                '_id': meter_key, 'price_list': price_list,
+                'expire_at': meters_expire_at, **price}, upsert=True))
+            if len(bulk) == PRICES_BULK_SIZE:
+                retry_mongo_upsert(self.mongo_prices.bulk_write, bulk,
+                                   ordered=False)
+                bulk = []
+        if bulk:
+            retry_mongo_upsert(self.mongo_prices.bulk_write, bulk,
+                               ordered=False)
+        self.mongo_prices.replace_one({'_id': price_list}, {
+            'count': len(prices),
+            'expire_at': now + timedelta(seconds=PRICES_CACHE_TTL)
+        }, upsert=True)
+
     @retry_backoff(AzureConsumptionException,
                    raise_errors=[
                        AzureAuthenticationError,  AzureResourceNotFoundError
@@ -194,78 +282,113 @@ class AzureReportImporter(BaseReportImporter):
         return self.cloud_adapter.get_raw_usage(
             current_day, current_day + timedelta(days=1), 'Daily')
 
+    def _fetch_day_raw_usage(self, current_day):
+        LOG.info('Downloading raw expenses for %s', current_day)
+        try:
+            daily_usages = self._get_day_raw_usage(current_day)
+        except AzureErrorResponseException as exc:
+            code = getattr(exc.error, 'additional_properties', {}).get(
+                'error', {}).get('code')
+            if code == 'SubscriptionNotFound':
+                msg = exc.error.additional_properties['error'].get(
+                    'message')
+                raise AzureResourceNotFoundError(msg)
+            else:
+                raise exc
+        return list(daily_usages)
+
     def _load_raw_usage_data(self, prices):
         chunk = []
         skus_without_prices = set()
-        current_day = self.period_start.replace(
+        first_day = self.period_start.replace(
             hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
         last_day = datetime.utcnow().replace(
             hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
-        while current_day < last_day:
-            LOG.info('Processing raw expenses for %s', current_day)
-
-            # This API really likes to split usage entries in parts and returns
-            # missing parts for some day in results for other day. It also
-            # doesn't depict usage range correctly: all parts tell that they
-            # contain a full day. So, let's query expenses for each day
-            # separately, and then record the request date by which they were
-            # obtained (`obtained_by_date` unique field). This allows us to
-            # collect all usage parts without them being overwritten by each
-            # other. Later, on clean expense generation, all entries for one
-            # day will be summed together.
-            try:
-                daily_usages = self._get_day_raw_usage(current_day)
-            except AzureErrorResponseException as exc:
-                code = getattr(exc.error, 'additional_properties', {}).get(
-                    'error', {}).get('code')
-                if code == 'SubscriptionNotFound':
-                    msg = exc.error.additional_properties['error'].get(
-                        'message')
-                    raise AzureResourceNotFoundError(msg)
-                else:
-                    raise exc
-            record_number = 0
+        days = (first_day + timedelta(days=d)
+                for d in range((last_day - first_day).days))
+        # days are downloaded by usage workers ahead and processed in order
+        futures = deque()
+        with ThreadPoolExecutor(max_workers=self.usage_workers) as executor:
             try:
-                for usage_obj in daily_usages:
-                    usage_dict = usage_obj.as_dict()
-                    inst_data = json.loads(usage_dict.get('instance_data', '{}'))
-                    alt_sku_id = inst_data.get('Microsoft.Resources', {}).get(
-                        'additionalInfo', {}).get('ConsumptionMeter')
-                    price_item = prices.get(usage_dict['meter_id']) or prices.get(
-                        alt_sku_id)
-                    if price_item is None:
-                        skus_without_prices.add(usage_dict['meter_id'])
-                    usage_dict['kind'] = 'raw'
-                    usage_dict['obtained_by_date'] = self.str_from_datetime(
-                        current_day)
-                    # TODO: support rates properly
-                    usage_dict['cost'] = usage_obj.quantity * price_item[
-                        'rates'][0][1] if price_item else 0
-                    record_number += 1
-                    usage_dict['_rec_n'] = record_number
-                    self._fill_custom_fields(usage_dict)
-                    self._clean_tree(usage_dict)
-                    if usage_dict['start_date'] >= self.period_start.replace(
-                            tzinfo=timezone.utc):
-                        chunk.append(usage_dict)
-                    if len(chunk) == CHUNK_SIZE:
-                        self.update_raw_records(chunk)
-                        chunk = []
-            except AzureErrorResponseException as ex:
-                error_message = str(ex)
-                if 'Unknown error' in error_message:
-                    LOG.error('No ready reports yet in cloud for %s. Will skip the '
-                              'remaining report import days and try next time'
-                              ' later.', current_day)
-                    break
+                for current_day in itertools.islice(
+                        days, self.usage_workers * 2):
+                    futures.append((current_day, executor.submit(
+                        self._fetch_day_raw_usage, current_day)))
+                while futures:
+                    current_day, future = futures.popleft()
+                    try:
+                        daily_usages = future.result()
+                    except AzureErrorResponseException as ex:
+                        error_message = str(ex)
+                        if 'Unknown error' in error_message:
+                            LOG.error('No ready reports yet in cloud for %s. '
+                                      'Will skip the remaining report import '
+                                      'days and try next time later.',
+                                      current_day)
+                            executor.shutdown(wait=True, cancel_futures=True)
+                            break
+                        raise
+                    next_day = next(days, None)
+                    if next_day:
+                        futures.append((next_day, executor.submit(
+                            self._fetch_day_raw_usage, next_day)))
+                    chunk = self._process_day_raw_usage(
+                        current_day, daily_usages, prices, chunk,
+                        skus_without_prices)
+            except Exception:
+                executor.shutdown(wait=True, cancel_futures=True)
                 raise
-            current_day += timedelta(days=1)
         if chunk:
             self.update_raw_records(chunk)
         if skus_without_prices:
             LOG.warning('Could not find prices for SKU IDs: %s',
                         skus_without_prices)
 
+    def _process_day_raw_usage(self, current_day, daily_usages, prices,
+                               chunk, skus_without_prices):
+        LOG.info('Processing raw expenses for %s', current_day)
+        # This API really likes to split usage entries in parts and returns
+        # missing parts for some day in results for other day. It also
+        # doesn't depict usage range correctly: all parts tell that they
+        # contain a full day. So, let's query expenses for each day
+        # separately, and then record the request date by which they were
+        # obtained (`obtained_by_date` unique field). This allows us to
+        # collect all usage parts without them being overwritten by each
+        # other. Later, on clean expense generation, all entries for one
+        # day will be summed together.
+        usages = []
+        for usage_obj in daily_usages:
+            usage_dict = usage_obj.as_dict()
+            inst_data = json.loads(usage_dict.get('instance_data', '{}'))
+            alt_sku_id = inst_data.get('Microsoft.Resources', {}).get(
+                'additionalInfo', {}).get('ConsumptionMeter')
+            usages.append((usage_obj, usage_dict, alt_sku_id))
+        prices.load({x for _, usage_dict, alt_sku_id in usages
+                     for x in (usage_dict['meter_id'], alt_sku_id)})
+        record_number = 0
+        for usage_obj, usage_dict, alt_sku_id in usages:
+            price_item = prices.get(usage_dict['meter_id']) or prices.get(
+                alt_sku_id)
+            if price_item is None:
+                skus_without_prices.add(usage_dict['meter_id'])
+            usage_dict['kind'] = 'raw'
+            usage_dict['obtained_by_date'] = self.str_from_datetime(
+                current_day)
+            # TODO: support rates properly
+            usage_dict['cost'] = usage_obj.quantity * price_item[
+                'rates'][0][1] if price_item else 0
+            record_number += 1
+            usage_dict['_rec_n'] = record_number
+            self._fill_custom_fields(usage_dict)
+            self._clean_tree(usage_dict)
+            if usage_dict['start_date'] >= self.period_start.replace(
+                    tzinfo=timezone.utc):
+                chunk.append(usage_dict)
+            if len(chunk) == CHUNK_SIZE:
+                self.update_raw_records(chunk)
+                chunk = []
+        return chunk
+
     def _clean_tree(self, tree):
         for k, v in tree.copy().items():
             if isinstance(v, dict):
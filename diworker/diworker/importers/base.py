@@ -1,17 +1,26 @@
+import gzip
+import hashlib
+import io
+import itertools
 import logging
+import multiprocessing
+import pickle
 import time
 import os
 import requests
 import shutil
 import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import cached_property
 
-from collections import defaultdict
-from pymongo import UpdateOne
+from collections import defaultdict, deque
+from pymongo import ReplaceOne, UpdateOne
 from datetime import datetime, timedelta, timezone
 from dateutil.relativedelta import relativedelta
 import boto3
 from boto3.session import Config as BotoConfig
+from kombu.utils.debug import setup_logging
 from tools.cloud_adapter.cloud import Cloud as CloudAdapter
 from diworker.diworker.utils import retry_mongo_upsert, get_month_start
 
@@ -19,6 +28,43 @@ LOG = logging.getLogger(__name__)
 CHUNK_SIZE = 200
 CSV_REWRITE_DAYS = 5
 REPORTS_PATH_PREFIX = 'reports'
+DEFAULT_REPORT_WORKERS = 4
+DEFAULT_CLEAN_WORKERS = 2
+RAW_MERGE_BATCH_SIZE = 5000
+RAW_WRITE_MODES = ['merge', 'upsert']
+# merge mode changes created_at of re-imported rows to the latest import, it
+# has to be enabled explicitly
+DEFAULT_RAW_WRITE_MODE = 'upsert'
+SPOOL_ENDING = '.spool'
+GZIP_MAGIC = b'\x1f\x8b'
+REPORT_READ_BUFFER_SIZE = 1024 * 1024
+CLICKHOUSE_EXPENSE_FIELDS = ['cloud_account_id', 'resource_id', 'date', 'cost',
+                             'sign']
+# fields which are changed by every import of the same raw expense
+RAW_IMPORT_FIELDS = ['_id', 'report_identity', 'created_at']
+
+# report workers are forked by a fork server started without diworker
+# threads, so they don't inherit locks held by other threads
+REPORT_WORKERS_START_METHOD = 'forkserver'
+# clients aren't sent to report workers, the cloud adapter is created by
+# the worker
+REPORT_WORKER_EXCLUDED_ATTRS = [
+    'rest_cl', 'config_cl', 'mongo_raw', 'mongo_resources', 'clickhouse_cl',
+    '_cloud_adapter', '_s3_client', '_mongo', '_raw_spool']
+
+# importer of the current report worker process
+_report_importer = None
+
+
+def _init_report_worker(importer, log_level):
+    global _report_importer
+    setup_logging(loglevel=log_level, loggers=[''])
+    _report_importer = importer
+
+
+def _load_report_part(date, report_path, account_id_ca_id_map):
+    return _report_importer.load_report_part(
+        date, report_path, account_id_ca_id_map)
 
 
 class BaseReportImporter:
@@ -32,20 +78,50 @@ class BaseReportImporter:
         self.mongo_resources = mongo_resources
         self.clickhouse_cl = clickhouse_cl
         self.import_file = import_file
+        self._rest_request_count = rest_cl.request_count
+        self._cloud_acc = None
         self._cloud_adapter = None
         self._mongo = None
         self._s3_client = None
         self.recalculate = recalculate
         self.period_start = None
+        # cloud account id -> first date of expenses written by the import
+        self.expenses_changed_from = {}
         if detect_period_start:
             self.detect_period_start()
         self.imported_raw_dates_map = defaultdict(dict)
         self.report_identity = datetime.utcnow().timestamp()
 
+    @cached_property
+    def diworker_settings(self):
+        return self.config_cl.diworker_settings()
+
+    def _get_positive_int_setting(self, name, default):
+        try:
+            return max(int(self.diworker_settings.get(name, default)), 1)
+        except (TypeError, ValueError):
+            return default
+
+    @cached_property
+    def clean_chunk_size(self):
+        return self._get_positive_int_setting('clean_chunk_size', CHUNK_SIZE)
+
+    @cached_property
+    def clean_workers(self):
+        return self._get_positive_int_setting(
+            'clean_workers', DEFAULT_CLEAN_WORKERS)
+
     @property
     def cloud_acc(self):
-        _, cloud = self.rest_cl.cloud_account_get(self.cloud_acc_id)
-        return cloud
+        # cloud account snapshot is loaded once per import, use
+        # refresh_cloud_acc after cloud account updates
+        if self._cloud_acc is None:
+            _, self._cloud_acc = self.rest_cl.cloud_account_get(
+                self.cloud_acc_id)
+        return self._cloud_acc
+
+    def refresh_cloud_acc(self):
+        self._cloud_acc = None
 
     @property
     def cloud_adapter(self):
@@ -53,12 +129,15 @@ class BaseReportImporter:
             cloud_acc = self.cloud_acc.copy()
             cloud_acc.update(self.cloud_acc['config'])
             self._cloud_adapter = CloudAdapter.get_adapter(cloud_acc)
-            _, organization = self.rest_cl.organization_get(
-                cloud_acc['organization_id'])
-            self._cloud_adapter.set_currency(
-                organization.get('currency', 'USD'))
+            self._cloud_adapter.set_currency(self.organization_currency)
         return self._cloud_adapter
 
+    @cached_property
+    def organization_currency(self):
+        _, organization = self.rest_cl.organization_get(
+            self.cloud_acc['organization_id'])
+        return organization.get('currency', 'USD')
+
     @property
     def s3_client(self):
         if self._s3_client is None:
@@ -170,37 +249,41 @@ class BaseReportImporter:
                 }
         return clean_expenses
 
-    @staticmethod
-    def gen_clickhouse_expense(expense, new_cost=None):
-        expense = {
-            'cloud_account_id': expense['cloud_account_id'],
-            'resource_id': expense['resource_id'],
-            'date': expense['date'],
-            'cost': expense['cost'],
-            'sign': 1
-        }
-        if new_cost is not None:
-            expense.update({
-                'cost': new_cost,
-                'sign': -1
-            })
-        return expense
-
-    def get_clickhouse_expenses(self, from_dt, to_dt, resource_ids,
-                                cloud_account_id):
+    def get_clickhouse_expenses_diff(self, cloud_account_id, clean_expenses,
+                                     from_dt, to_dt):
+        # returns indexes of clean expenses which are missing in clickhouse
+        # or have another cost with the current clickhouse cost and sign
         return self.clickhouse_cl.execute("""
-            SELECT resource_id, date, cost, sign
-            FROM expenses
-            WHERE cloud_account_id = %(cloud_account_id)s
-                AND date >= %(from_dt)s
-                AND date <= %(to_dt)s
-                AND resource_id in %(resource_ids)s
+            SELECT new_expenses.idx, existing.total_cost, existing.total_sign
+            FROM new_expenses
+            LEFT JOIN (
+                SELECT resource_id, date, SUM(cost * sign) AS total_cost,
+                    SUM(sign) AS total_sign
+                FROM expenses
+                WHERE cloud_account_id = %(cloud_account_id)s
+                    AND date >= %(from_dt)s
+                    AND date <= %(to_dt)s
+                    AND resource_id IN (SELECT resource_id FROM new_expenses)
+                GROUP BY resource_id, date
+            ) AS existing
+            ON new_expenses.resource_id = existing.resource_id
+                AND new_expenses.date = existing.date
+            WHERE existing.total_sign = 0
+                OR existing.total_cost != new_expenses.cost
         """, params={
             'cloud_account_id': cloud_account_id,
             'from_dt': from_dt,
             'to_dt': to_dt,
-            'resource_ids': list(resource_ids)
-        })
+        }, settings={'join_use_nulls': 0}, external_tables=[
+            {
+                'name': 'new_expenses',
+                'structure': [('idx', 'UInt32'), ('resource_id', 'String'),
+                              ('date', 'DateTime'), ('cost', 'Float64')],
+                'data': [{'idx': i, 'resource_id': e['resource_id'],
+                          'date': e['date'], 'cost': e['cost']}
+                         for i, e in enumerate(clean_expenses)]
+            }
+        ])
 
     def get_resource_info_map(self, chunk):
         return {
@@ -209,7 +292,15 @@ class BaseReportImporter:
         }
 
     def save_clean_expenses(self, cloud_account_id, chunk,
-                            unique_id_field='resource_id'):
+                            unique_id_field='resource_id', changed_days=None):
+        self.write_clean_expenses(
+            cloud_account_id, *self.prepare_clean_expenses(
+                cloud_account_id, chunk, unique_id_field=unique_id_field,
+                changed_days=changed_days))
+
+    def prepare_clean_expenses(self, cloud_account_id, chunk,
+                               unique_id_field='resource_id',
+                               changed_days=None):
         info_map = self.get_resource_info_map(chunk)
         cloud_unique_id_field = 'cloud_%s' % unique_id_field
 
@@ -232,45 +323,53 @@ class BaseReportImporter:
             last_expense_cost = clean_expenses_map[max_resource_date]['cost']
             last_expense_info[resource_id] = (max_resource_date,
                                               last_expense_cost)
+            if changed_days is not None:
+                # only days touched by the import may differ from clickhouse
+                days = changed_days.get(r_id, set())
+                clean_expenses_map = {
+                    k: v for k, v in clean_expenses_map.items()
+                    if k.replace(tzinfo=None) in days
+                }
+                if not clean_expenses_map:
+                    continue
+                min_resource_date = min(clean_expenses_map.keys())
+                max_resource_date = max(clean_expenses_map.keys())
             if not min_date or min_resource_date < min_date:
                 min_date = min_resource_date
             if not max_date or max_resource_date > max_date:
                 max_date = max_resource_date
             clean_expenses.extend(clean_expenses_map.values())
-        resource_ids = last_expense_info.keys()
+        return clean_expenses, last_expense_info, min_date, max_date
+
+    def write_clean_expenses(self, cloud_account_id, clean_expenses,
+                             last_expense_info, min_date, max_date):
+        if not clean_expenses:
+            return
+        diff = self.get_clickhouse_expenses_diff(
+            cloud_account_id, clean_expenses, min_date, max_date)
+        # sign collapsing rows are collected by columns to be inserted at once
+        columns = [[] for _ in CLICKHOUSE_EXPENSE_FIELDS]
+        cloud_account_ids, resource_ids, dates, costs, signs = columns
+        for idx, clickhouse_cost, clickhouse_sign in diff:
+            expense = clean_expenses[idx]
+            if clickhouse_sign:
+                cloud_account_ids.append(expense['cloud_account_id'])
+                resource_ids.append(expense['resource_id'])
+                dates.append(expense['date'])
+                costs.append(clickhouse_cost)
+                signs.append(-1)
+            cloud_account_ids.append(expense['cloud_account_id'])
+            resource_ids.append(expense['resource_id'])
+            dates.append(expense['date'])
+            costs.append(expense['cost'])
+            signs.append(1)
         if resource_ids:
-            existing_expenses = self.get_clickhouse_expenses(
-                min_date, max_date, resource_ids, cloud_account_id)
-            resource_id_date_cost_map = defaultdict(dict)
-            for resource_id, date, clickhouse_cost, sign in existing_expenses:
-                if not resource_id_date_cost_map[resource_id].get(date):
-                    resource_id_date_cost_map[resource_id][date] = list()
-                resource_id_date_cost_map[resource_id][date].append(
-                    (clickhouse_cost, sign))
-            clickhouse_expenses = []
-            for expense in clean_expenses:
-                expense_date = expense['date'].replace(tzinfo=None)
-                clickhouse_expense = resource_id_date_cost_map[
-                    expense['resource_id']].get(expense_date)
-                if not clickhouse_expense:
-                    clickhouse_expenses.append(
-                        self.gen_clickhouse_expense(expense))
-                    continue
-                exists = sum([x for _, x in clickhouse_expense])
-                if exists:
-                    cost = sum([x * s for x, s in clickhouse_expense])
-                    if cost != expense['cost']:
-                        clickhouse_expenses.extend([
-                            self.gen_clickhouse_expense(expense, cost),
-                            self.gen_clickhouse_expense(expense)
-                        ])
-                else:
-                    clickhouse_expenses.append(
-                        self.gen_clickhouse_expense(expense))
-            if clickhouse_expenses:
-                self.update_clickhouse_expenses(clickhouse_expenses)
-                self.update_resource_expense_info(cloud_account_id,
-                                                  last_expense_info)
+            self.insert_clickhouse_expenses(columns)
+            changed_resource_ids = set(resource_ids)
+            self.update_resource_expense_info(cloud_account_id, {
+                r_id: info for r_id, info in last_expense_info.items()
+                if r_id in changed_resource_ids
+            })
 
     def update_resource_expense_info(self, cloud_account_id,
                                      last_expense_info):
@@ -283,7 +382,9 @@ class BaseReportImporter:
             updates = {
                 'total_cost': total_cost
             }
-            if last_expense_date.replace(tzinfo=None) >= max_date:
+            # last expense is unknown for resources without raw expenses
+            if last_expense_date and last_expense_date.replace(
+                    tzinfo=None) >= max_date:
                 updates['last_expense'] = {
                     'date': int(last_expense_date.timestamp()),
                     'cost': last_expense_cost
@@ -363,30 +464,76 @@ class BaseReportImporter:
     def _get_billing_period_filters(self, period_start):
         return {'start_date': {'$gte': period_start}}
 
+    def _read_clean_chunk(self, filters):
+        started_at = time.time()
+        chunk = self.set_raw_chunk(self.get_raw_expenses_by_filters(filters))
+        return chunk, time.time() - started_at
+
+    def _prepare_clean_chunk(self, read_future, cloud_account_id,
+                             changed_days):
+        chunk, read_time = read_future.result()
+        started_at = time.time()
+        result = self.prepare_clean_expenses(
+            cloud_account_id, chunk, changed_days=changed_days)
+        return result, read_time, time.time() - started_at
+
     def _generate_clean_records(self, resource_ids, cloud_account_id,
-                                period_start):
+                                period_start, changed_days=None):
         resource_count = len(resource_ids)
         LOG.info(
             'Generating clean expenses for %s resources in account %s for %s',
             resource_count, cloud_account_id, period_start)
+        # raw expenses reading, resources creation and clickhouse writing are
+        # overlapped: mongo reads are done by clean workers, resources are
+        # created in order by a single thread and the current thread writes
+        # prepared chunks, so each resource is processed by one chunk in order
+        chunk_size = self.clean_chunk_size
+        max_pending = self.clean_workers * 2
+        stage_times = defaultdict(float)
+        started_at = time.time()
         progress = 0
-        for i in range(0, resource_count, CHUNK_SIZE):
-            new_progress = round(i / resource_count * 100)
-            if new_progress != progress:
-                progress = new_progress
-                LOG.info('Progress: %s', progress)
-
-            filters = [
-                {'cloud_account_id': cloud_account_id},
-                self._get_billing_period_filters(period_start),
-                {'resource_id': {
-                    '$in': resource_ids[i:i + CHUNK_SIZE]}}]
-            expenses = self.get_raw_expenses_by_filters(filters)
-            chunk = self.set_raw_chunk(expenses)
-            self.save_clean_expenses(cloud_account_id, chunk)
-
-        LOG.info('Finished generating clean expenses for %s resources',
-                 resource_count)
+        pending = deque()
+
+        def write_chunk():
+            result, read_time, prepare_time = pending.popleft().result()
+            write_started_at = time.time()
+            self.write_clean_expenses(cloud_account_id, *result)
+            stage_times['read'] += read_time
+            stage_times['resources'] += prepare_time
+            stage_times['write'] += time.time() - write_started_at
+
+        with ThreadPoolExecutor(max_workers=self.clean_workers) as read_executor, \
+                ThreadPoolExecutor(max_workers=1) as prepare_executor:
+            try:
+                for i in range(0, resource_count, chunk_size):
+                    new_progress = round(i / resource_count * 100)
+                    if new_progress != progress:
+                        progress = new_progress
+                        LOG.info('Progress: %s', progress)
+                    if len(pending) >= max_pending:
+                        write_chunk()
+                    filters = [
+                        {'cloud_account_id': cloud_account_id},
+                        self._get_billing_period_filters(period_start),
+                        {'resource_id': {
+                            '$in': resource_ids[i:i + chunk_size]}}]
+                    read_future = read_executor.submit(
+                        self._read_clean_chunk, filters)
+                    pending.append(prepare_executor.submit(
+                        self._prepare_clean_chunk, read_future,
+                        cloud_account_id, changed_days))
+                while pending:
+                    write_chunk()
+            except Exception:
+                read_executor.shutdown(wait=True, cancel_futures=True)
+                prepare_executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        LOG.info('Finished generating clean expenses for %s resources in '
+                 '%.2fs (read %.2fs, resources %.2fs, write %.2fs)',
+                 resource_count, time.time() - started_at,
+                 stage_times['read'], stage_times['resources'],
+                 stage_times['write'])
 
     def generate_clean_records(self, regeneration=False):
         resource_ids = self.get_resource_ids(self.cloud_acc_id,
@@ -440,21 +587,38 @@ class BaseReportImporter:
 
         LOG.info('Creating risp processing tasks')
         self.create_risp_processing_tasks()
+        LOG.info('Rest API requests made by import: %s',
+                 self.rest_cl.request_count - self._rest_request_count)
 
         LOG.info('Processing completed')
 
     def update_clickhouse_expenses(self, expenses):
-        self.clickhouse_cl.execute('INSERT INTO expenses VALUES', expenses)
+        self.insert_clickhouse_expenses([
+            [e[f] for e in expenses] for f in CLICKHOUSE_EXPENSE_FIELDS])
+
+    def insert_clickhouse_expenses(self, columns):
+        self.clickhouse_cl.execute('INSERT INTO expenses VALUES', columns,
+                                   columnar=True)
+        # rollups are rebuilt from the first changed date
+        cloud_account_ids, _, dates = columns[:3]
+        for cloud_account_id, date in zip(cloud_account_ids, dates):
+            # expense dates are utc, but not all of them are timezone aware
+            date = date.replace(tzinfo=None)
+            changed_from = self.expenses_changed_from.get(cloud_account_id)
+            if changed_from is None or date < changed_from:
+                self.expenses_changed_from[cloud_account_id] = date
 
     def update_cloud_import_time(self, ts):
         self.rest_cl.cloud_account_update(self.cloud_acc_id,
                                           {'last_import_at': ts,
                                            'last_import_attempt_at': ts})
+        self.refresh_cloud_acc()
 
     def update_cloud_import_attempt(self, ts, error=None):
         self.rest_cl.cloud_account_update(self.cloud_acc_id,
                                           {'last_import_attempt_at': ts,
                                            'last_import_attempt_error': error})
+        self.refresh_cloud_acc()
 
     @staticmethod
     def extract_tags(raw_tags):
@@ -578,16 +742,21 @@ class BaseReportImporter:
         if not last_start_date or last_start_date < start_date:
             cl_acc_dates['last_start_date'] = start_date
 
+    def journal_removed_raw_records(self, filters):
+        pass
+
     def clear_rudiments(self):
         for cloud_account_id, dates in self.imported_raw_dates_map.items():
-            result = self.mongo_raw.delete_many({
+            filters = {
                 'cloud_account_id': cloud_account_id,
                 'start_date': {
                     '$gte': dates.get('start_date'),
                     '$lte': dates.get('last_start_date')
                 },
                 'report_identity': {'$ne': self.report_identity}
-            })
+            }
+            self.journal_removed_raw_records(filters)
+            result = self.mongo_raw.delete_many(filters)
             LOG.info('Cleared %s rudiments for cloud_account %s' %
                      (result.deleted_count, cloud_account_id))
 
@@ -601,8 +770,27 @@ class CSVBaseReportImporter(BaseReportImporter):
         self.reports_dir = f'{REPORTS_PATH_PREFIX}/{uuid.uuid4()}'
         os.makedirs(self.reports_dir)
         self.report_files = defaultdict(list)
+        self.report_keys = {}
         self.last_import_modified_at = self.cloud_acc.get(
             'last_import_modified_at', 0)
+        self._raw_spool = None
+        self._rec_n_offset = 0
+        self._max_rec_n = 0
+        self._raw_merge_documents = []
+        # cloud account id -> resource id -> days changed by the import
+        self.raw_journal = defaultdict(dict)
+        self._journal_days_map = {}
+
+    @cached_property
+    def report_workers(self):
+        return self._get_positive_int_setting(
+            'report_workers', DEFAULT_REPORT_WORKERS)
+
+    @cached_property
+    def raw_write_mode(self):
+        mode = self.diworker_settings.get(
+            'raw_write_mode', DEFAULT_RAW_WRITE_MODE)
+        return mode if mode in RAW_WRITE_MODES else DEFAULT_RAW_WRITE_MODE
 
     @cached_property
     def min_date_import_threshold(self) -> datetime:
@@ -654,23 +842,55 @@ class CSVBaseReportImporter(BaseReportImporter):
                 target_path = self.get_new_report_path(date)
                 os.makedirs(os.path.join(self.reports_dir, date),
                             exist_ok=True)
-                try:
-                    # python2 way
-                    with open(target_path, 'wb') as f_report:
-                        self.cloud_adapter.download_report_file(report['Key'],
-                                                                f_report)
-                except TypeError:
-                    # python3 way
-                    with open(target_path, 'w') as f_report:
-                        self.cloud_adapter.download_report_file(report['Key'],
-                                                                f_report)
+                # report files are downloaded on load by report workers
+                self.report_keys[target_path] = report['Key']
                 self.report_files[date].append(target_path)
         self.last_import_modified_at = int(last_import_modified_at.timestamp())
 
-    def unpack_report_files(self):
-        pass
+    def download_report_file(self, report_key, target_path):
+        try:
+            # python2 way
+            with open(target_path, 'wb') as f_report:
+                self.cloud_adapter.download_report_file(report_key, f_report)
+        except TypeError:
+            # python3 way
+            with open(target_path, 'w') as f_report:
+                self.cloud_adapter.download_report_file(report_key, f_report)
+
+    def unpack_report(self, report_path, date):
+        return report_path
 
-    def load_report(self, report_path, account_id_ca_id_ma):
+    @staticmethod
+    def open_report_stream(report_path):
+        # zip and gzip reports are decompressed on the fly while being read,
+        # only one buffer of decompressed data is kept in memory
+        if zipfile.is_zipfile(report_path):
+            with zipfile.ZipFile(report_path, 'r') as f_zip:
+                if len(f_zip.filelist) > 1:
+                    raise Exception('zip excepted to have one file inside')
+                stream = f_zip.open(f_zip.filelist[0])
+        else:
+            with open(report_path, 'rb') as f_report:
+                magic = f_report.read(len(GZIP_MAGIC))
+            if magic == GZIP_MAGIC:
+                stream = gzip.open(report_path, 'rb')
+            else:
+                return open(report_path, 'rb',
+                            buffering=REPORT_READ_BUFFER_SIZE)
+        return io.BufferedReader(stream, REPORT_READ_BUFFER_SIZE)
+
+    def open_csv_report(self, report_path):
+        return io.TextIOWrapper(self.open_report_stream(report_path),
+                                newline='')
+
+    def prepare_report_part(self, date, report_path):
+        report_key = self.report_keys.get(report_path)
+        if report_key:
+            LOG.info('downloading report %s', report_key)
+            self.download_report_file(report_key, report_path)
+        return self.unpack_report(report_path, date)
+
+    def load_report(self, report_path, account_id_ca_id_map):
         raise NotImplementedError
 
     def prepare(self):
@@ -678,7 +898,219 @@ class CSVBaseReportImporter(BaseReportImporter):
             self.download_from_object_store()
         else:
             self.download_from_cloud()
-        self.unpack_report_files()
+
+    def __getstate__(self):
+        # the importer is sent to report workers
+        state = self.__dict__.copy()
+        for name in REPORT_WORKER_EXCLUDED_ATTRS:
+            state[name] = None
+        return state
+
+    def prepare_report_workers(self):
+        # values required by report workers are cached before the importer
+        # is sent to them, workers don't have rest and config clients
+        LOG.info('Import threshold: %s', self.min_date_import_threshold)
+        LOG.info('Organization currency: %s', self.organization_currency)
+
+    def update_raw_records(self, chunk):
+        if self._raw_spool is not None:
+            pickle.dump(chunk, self._raw_spool,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            self._write_raw_records(chunk)
+
+    def _write_raw_records(self, chunk):
+        # record numbers are unique within all parts of the import
+        for expense in chunk:
+            if '_rec_n' in expense:
+                expense['_rec_n'] += self._rec_n_offset
+                self._max_rec_n = max(self._max_rec_n, expense['_rec_n'])
+        if self.raw_write_mode == 'merge':
+            # only raw expenses differing from the saved ones are journaled
+            self.merge_raw_records(chunk)
+        else:
+            for expense in chunk:
+                self.journal_raw_record(expense)
+            super().update_raw_records(chunk)
+
+    def journal_raw_record(self, expense):
+        resource_id = expense.get('resource_id')
+        if not resource_id:
+            return
+        start_date = expense['start_date']
+        end_date = expense.get('end_date') or start_date
+        days = self._journal_days_map.get((start_date, end_date))
+        if days is None:
+            # end date may point to the 00:00 on the next day
+            first_day = start_date.replace(
+                hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+            last_day = max(end_date - timedelta(seconds=1), start_date)
+            days = [first_day + timedelta(days=d) for d in range(
+                (last_day.replace(tzinfo=None) - first_day).days + 1)]
+            self._journal_days_map[(start_date, end_date)] = days
+        self.raw_journal[expense['cloud_account_id']].setdefault(
+            resource_id, set()).update(days)
+
+    def journal_removed_raw_records(self, filters):
+        # clean expenses of removed raw expenses are generated again, so
+        # days missing in the new report are cancelled
+        removed = self.mongo_raw.aggregate([
+            {'$match': filters},
+            {'$group': {'_id': {
+                'resource_id': '$resource_id',
+                'start_date': '$start_date',
+                'end_date': '$end_date'
+            }}}
+        ], allowDiskUse=True)
+        for expense in removed:
+            expense = expense['_id']
+            expense['cloud_account_id'] = filters['cloud_account_id']
+            self.journal_raw_record(expense)
+
+    @staticmethod
+    def _get_raw_compare_value(value):
+        # mongo returns naive utc dates with milliseconds precision
+        if isinstance(value, datetime):
+            if value.tzinfo:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value.replace(microsecond=value.microsecond // 1000 * 1000)
+        if isinstance(value, dict):
+            return {k: CSVBaseReportImporter._get_raw_compare_value(v)
+                    for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [CSVBaseReportImporter._get_raw_compare_value(v)
+                    for v in value]
+        return value
+
+    def journal_changed_raw_records(self, documents):
+        # raw expenses saved by a failed import may have no clean expenses,
+        # so only expenses saved before the last import are compared
+        last_import_at = self.cloud_acc['last_import_at']
+        saved_documents = {
+            x['_id']: x for x in self.mongo_raw.find(
+                {'_id': {'$in': [d['_id'] for d in documents]},
+                 'report_identity': {'$lte': last_import_at}})
+        }
+        for document in documents:
+            saved_document = saved_documents.get(document['_id'])
+            if saved_document is not None:
+                for field in RAW_IMPORT_FIELDS:
+                    saved_document.pop(field, None)
+                new_document = {k: v for k, v in document.items()
+                                if k not in RAW_IMPORT_FIELDS}
+                if (self._get_raw_compare_value(saved_document) ==
+                        self._get_raw_compare_value(new_document)):
+                    continue
+            self.journal_raw_record(document)
+
+    def get_raw_record_id(self, expense):
+        # record number is a part of the id as reports may contain several
+        # lines with the same unique fields
+        key = [(f, expense[f]) for f in self.get_unique_field_list()
+               if f in expense]
+        key.append(('_rec_n', expense.get('_rec_n')))
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    @staticmethod
+    def _expand_dotted_keys(expense):
+        # keep the same document structure as update operators create
+        result = {}
+        for k, v in expense.items():
+            *parents, key = k.split('.')
+            target = result
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[key] = v
+        return result
+
+    def merge_raw_records(self, chunk):
+        # raw expenses are replaced by deterministic ids, expenses of the
+        # previous imports are removed by clear_rudiments
+        for expense in chunk:
+            self._update_imported_raw_interval(expense)
+            document = self._expand_dotted_keys(expense)
+            document['_id'] = self.get_raw_record_id(expense)
+            self._raw_merge_documents.append(document)
+        if len(self._raw_merge_documents) >= RAW_MERGE_BATCH_SIZE:
+            self.flush_raw_records()
+
+    def flush_raw_records(self):
+        if not self._raw_merge_documents:
+            return
+        self.journal_changed_raw_records(self._raw_merge_documents)
+        bulk = [ReplaceOne({'_id': d['_id']}, d, upsert=True)
+                for d in self._raw_merge_documents]
+        r = retry_mongo_upsert(self.mongo_raw.bulk_write, bulk, ordered=False)
+        LOG.debug('merged: %s', r.bulk_api_result)
+        self._raw_merge_documents = []
+
+    def load_report_part(self, date, report_path, account_id_ca_id_map):
+        # executed by report worker process, raw expenses are saved to the
+        # spool file to be written to mongo in order by the main process
+        self.billing_periods = set()
+        report_path = self.prepare_report_part(date, report_path)
+        spool_path = report_path + SPOOL_ENDING
+        try:
+            with open(spool_path, 'wb') as self._raw_spool:
+                self.load_report(report_path, account_id_ca_id_map)
+        finally:
+            self._raw_spool = None
+            os.remove(report_path)
+        return spool_path, self.billing_periods, self.detected_cloud_accounts
+
+    def _write_spooled_raw_records(self, spool_path):
+        with open(spool_path, 'rb') as f_spool:
+            while True:
+                try:
+                    chunk = pickle.load(f_spool)
+                except EOFError:
+                    break
+                self._write_raw_records(chunk)
+        os.remove(spool_path)
+
+    def load_reports(self, report_parts, account_id_ca_id_map):
+        if self.report_workers == 1 or len(report_parts) < 2:
+            for date, report_path in report_parts:
+                self._rec_n_offset = self._max_rec_n + 1
+                report_path = self.prepare_report_part(date, report_path)
+                self.load_report(report_path, account_id_ca_id_map)
+                os.remove(report_path)
+            self.flush_raw_records()
+            return
+        LOG.info('Loading %s reports with %s workers', len(report_parts),
+                 self.report_workers)
+        self.prepare_report_workers()
+        parts = iter(report_parts)
+        futures = deque()
+        with ProcessPoolExecutor(
+                max_workers=self.report_workers,
+                mp_context=multiprocessing.get_context(
+                    REPORT_WORKERS_START_METHOD),
+                initializer=_init_report_worker,
+                initargs=(self, logging.getLogger().level)) as executor:
+            try:
+                # parse at most two parts per worker ahead of the writer
+                for date, report_path in itertools.islice(
+                        parts, self.report_workers * 2):
+                    futures.append(executor.submit(
+                        _load_report_part, date, report_path,
+                        account_id_ca_id_map))
+                while futures:
+                    spool_path, billing_periods, cloud_account_ids = (
+                        futures.popleft().result())
+                    next_part = next(parts, None)
+                    if next_part:
+                        futures.append(executor.submit(
+                            _load_report_part, *next_part,
+                            account_id_ca_id_map))
+                    self._rec_n_offset = self._max_rec_n + 1
+                    self._write_spooled_raw_records(spool_path)
+                    self.billing_periods.update(billing_periods)
+                    self.detected_cloud_accounts.update(cloud_account_ids)
+            except Exception:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+        self.flush_raw_records()
 
     def get_linked_account_map(self):
         return {self.cloud_acc['account_id']: self.cloud_acc_id}
@@ -691,9 +1123,9 @@ class CSVBaseReportImporter(BaseReportImporter):
             dates = [x for x in self.report_files]
             dates.sort(reverse=True)
             for date in dates:
-                reports = self.report_files[date]
-                for report in reports:
-                    self.load_report(report, account_id_ca_id_map)
+                self.load_reports(
+                    [(date, report) for report in self.report_files[date]],
+                    account_id_ca_id_map)
                 LOG.info('Generating clean records')
                 self.generate_clean_records()
                 self.billing_periods = set()
@@ -701,12 +1133,10 @@ class CSVBaseReportImporter(BaseReportImporter):
             super().data_import()
 
     def load_raw_data(self):
-        account_id_ca_id_map = {self.cloud_acc['account_id']: self.cloud_acc_id}
-        report_files = []
-        for r in self.report_files.values():
-            report_files.extend(r)
-        for report_path in report_files:
-            self.load_report(report_path, account_id_ca_id_map)
+        report_parts = [(date, report_path)
+                        for date, reports in self.report_files.items()
+                        for report_path in reports]
+        self.load_reports(report_parts, self.get_linked_account_map())
         self.clear_rudiments()
 
     def get_resource_ids(self, cloud_account_id, billing_period):
@@ -719,9 +1149,99 @@ class CSVBaseReportImporter(BaseReportImporter):
         billing_periods = {
             None} if not self.billing_periods else self.billing_periods
         for cc_id in self.detected_cloud_accounts:
+            # on import clean expenses are generated only for resources and
+            # days changed by the loaded raw expenses
+            changed_days = None if regeneration else self.raw_journal.get(
+                cc_id, {})
             for billing_period in sorted(billing_periods, reverse=True):
-                resource_ids = self.get_resource_ids(cc_id, billing_period)
-                self._generate_clean_records(resource_ids, cc_id, billing_period)
+                if changed_days is None:
+                    resource_ids = self.get_resource_ids(cc_id, billing_period)
+                else:
+                    resource_ids = sorted(changed_days)
+                self._generate_clean_records(resource_ids, cc_id, billing_period,
+                                             changed_days=changed_days)
+            if changed_days:
+                self.cancel_removed_clean_expenses(cc_id, changed_days)
+        self.raw_journal.clear()
+        self._journal_days_map.clear()
+
+    def get_raw_expense_days(self, cloud_account_id, resource_ids, min_date,
+                             max_date):
+        days = self.mongo_raw.aggregate([
+            {'$match': {
+                'cloud_account_id': cloud_account_id,
+                'resource_id': {'$in': resource_ids},
+                'start_date': {'$gte': min_date,
+                               '$lt': max_date + timedelta(days=1)}
+            }},
+            {'$group': {'_id': {
+                'resource_id': '$resource_id',
+                'day': {'$dateToString': {
+                    'format': '%Y-%m-%d', 'date': '$start_date'}}
+            }}}
+        ], allowDiskUse=True)
+        return {(x['_id']['resource_id'],
+                 datetime.strptime(x['_id']['day'], '%Y-%m-%d'))
+                for x in days}
+
+    def get_removed_clean_expenses(self, cloud_account_id, removed_days):
+        return self.clickhouse_cl.execute("""
+            SELECT resource_id, date, SUM(cost * sign)
+            FROM expenses
+            WHERE cloud_account_id = %(cloud_account_id)s
+                AND (resource_id, date) IN removed_days
+            GROUP BY resource_id, date
+            HAVING SUM(sign) > 0
+        """, params={
+            'cloud_account_id': cloud_account_id,
+        }, external_tables=[
+            {
+                'name': 'removed_days',
+                'structure': [('resource_id', 'String'), ('date', 'DateTime')],
+                'data': [{'resource_id': r_id, 'date': day}
+                         for r_id, day in removed_days]
+            }
+        ])
+
+    def cancel_removed_clean_expenses(self, cloud_account_id, changed_days):
+        # clean expenses of days without raw expenses left after the import
+        # are cancelled, these days are journaled by removed raw expenses
+        threshold = self.min_date_import_threshold.replace(tzinfo=None)
+        raw_resource_ids = sorted(changed_days)
+        for i in range(0, len(raw_resource_ids), self.clean_chunk_size):
+            chunk_ids = raw_resource_ids[i:i + self.clean_chunk_size]
+            days = {(r_id, day) for r_id in chunk_ids
+                    for day in changed_days[r_id] if day >= threshold}
+            if not days:
+                continue
+            removed_days = days - self.get_raw_expense_days(
+                cloud_account_id, chunk_ids, min(d for _, d in days),
+                max(d for _, d in days))
+            if not removed_days:
+                continue
+            resources_map = {
+                r['cloud_resource_id']: r['_id']
+                for r in self.mongo_resources.find({
+                    'cloud_account_id': cloud_account_id,
+                    'cloud_resource_id': {
+                        '$in': list({r_id for r_id, _ in removed_days})},
+                    'deleted_at': 0
+                }, ['cloud_resource_id'])
+            }
+            removed_expenses = self.get_removed_clean_expenses(
+                cloud_account_id, [(resources_map[r_id], day)
+                                   for r_id, day in removed_days
+                                   if r_id in resources_map])
+            if not removed_expenses:
+                continue
+            columns = [[] for _ in CLICKHOUSE_EXPENSE_FIELDS]
+            for resource_id, date, cost in removed_expenses:
+                for column, value in zip(columns, [
+                        cloud_account_id, resource_id, date, cost, -1]):
+                    column.append(value)
+            self.insert_clickhouse_expenses(columns)
+            self.update_resource_expense_info(cloud_account_id, {
+                x[0]: (None, None) for x in removed_expenses})
 
     def cleanup(self):
         shutil.rmtree(self.reports_dir, ignore_errors=True)
@@ -735,6 +1255,7 @@ class CSVBaseReportImporter(BaseReportImporter):
                 cloud_acc_id,
                 {'last_import_attempt_at': ts,
                  'last_import_attempt_error': error})
+        self.refresh_cloud_acc()
 
     def update_cloud_import_time(self, ts):
         for cloud_acc_id in self.detected_cloud_accounts:
@@ -743,3 +1264,4 @@ class CSVBaseReportImporter(BaseReportImporter):
                 {'last_import_at': ts,
                  'last_import_modified_at': self.last_import_modified_at,
                  'last_import_attempt_at': ts})
+        self.refresh_cloud_acc()
@@ -94,7 +94,7 @@ class NebiusReportImporter(CSVBaseReportImporter):
     def load_csv_report(self, report_path, account_id_ca_id_map,
                         billing_period, skipped_accounts):
         date_start = datetime.utcnow()
-        with open(report_path, newline='') as csvfile:
+        with self.open_csv_report(report_path) as csvfile:
             reader = csv.DictReader(csvfile)
             chunk = []
             record_number = 0
@@ -3,7 +3,9 @@ import os
 import time
 
 import urllib3
-from threading import Thread
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread, local
 from optscale_client.config_client.client import Client as ConfigClient
 from datetime import datetime
 from etcd import Lock as EtcdLock
@@ -20,6 +22,8 @@ from clickhouse_driver import Client as ClickHouseClient
 from diworker.diworker.importers.base import BaseReportImporter
 from diworker.diworker.importers.factory import get_importer_class
 from diworker.diworker.migrator import Migrator
+from diworker.diworker.resources_sync import ResourcesDimensionSync
+from diworker.diworker.rollups import RollupsBuilder
 
 from optscale_client.herald_client.client_v2 import Client as HeraldClient
 
@@ -39,32 +43,104 @@ task_queue = Queue(
 LOG = get_logger(__name__)
 ENVIRONMENT_CLOUD_TYPE = 'environment'
 HEARTBEAT_INTERVAL = 300
+DEFAULT_IMPORT_WORKERS = 1
+IMPORT_LOCK_TTL = HEARTBEAT_INTERVAL * 3
+IMPORT_LOCK_RETRY_INTERVAL = 60
+
+
+class ImportTask:
+    def __init__(self, body, message, report_import, organization_id):
+        self.body = body
+        self.message = message
+        self.report_import = report_import
+        self.organization_id = organization_id
+        self.received_at = time.time()
+        self.lock = None
+        self.lock_attempt_at = 0
+
+    @property
+    def report_import_id(self):
+        return self.report_import['id']
+
+    @property
+    def cloud_account_id(self):
+        return self.report_import['cloud_account_id']
 
 
 class DIWorker(ConsumerMixin):
     def __init__(self, connection, config_cl):
         self.connection = connection
         self.config_cl = config_cl
-        self._rest_cl = None
+        # rest and clickhouse clients are not shared between import workers
+        self._local = local()
         self._mongo_cl = None
-        self._clickhouse_cl = None
-        self.report_import_id = None
+        self.import_workers = self.get_import_workers()
+        self.executor = ThreadPoolExecutor(max_workers=self.import_workers)
+        # organization id -> tasks waiting for an import worker
+        self.pending_tasks = OrderedDict()
+        # future -> running task, shared with the heartbeat thread
+        self.running_tasks = {}
+        self.tasks_lock = Lock()
+        self.active_cloud_accounts = set()
         self.thread = Thread(target=self.heartbeat)
         self.thread.start()
+        self.resources_sync = ResourcesDimensionSync(config_cl)
+        self.resources_sync_thread = Thread(target=self.resources_sync.run)
+        self.resources_sync_thread.start()
+        # rollups are built after the import in their own thread, so import
+        # workers don't wait for the resources dimension sync
+        self.rollups_builder = RollupsBuilder(config_cl)
+        self.rollups_thread = Thread(target=self.rollups_builder.run)
+        self.rollups_thread.start()
+
+    def get_import_workers(self):
+        try:
+            return max(int(self.config_cl.diworker_settings().get(
+                'import_workers', DEFAULT_IMPORT_WORKERS)), 1)
+        except (TypeError, ValueError):
+            return DEFAULT_IMPORT_WORKERS
+
+    def get_running_tasks(self):
+        with self.tasks_lock:
+            return [t for f, t in self.running_tasks.items() if not f.done()]
+
+    @staticmethod
+    def refresh_lock(lock):
+        # acquire writes a new key if the lock is released, so only the
+        # existing key of the lock is prolonged
+        lock.client.write(lock.lock_key, lock.uuid, ttl=IMPORT_LOCK_TTL,
+                          prevValue=lock.uuid)
+
+    def send_heartbeats(self):
+        for task in self.get_running_tasks():
+            try:
+                self.rest_cl.report_import_update(task.report_import_id, {})
+            except Exception as exc:
+                LOG.error('Heartbeat for import %s failed: %s',
+                          task.report_import_id, str(exc))
+        # locks are released by the consumer thread when imports are done
+        with self.tasks_lock:
+            for future, task in self.running_tasks.items():
+                if future.done():
+                    continue
+                try:
+                    self.refresh_lock(task.lock)
+                except Exception as exc:
+                    LOG.error('Failed to prolong lock of cloud account %s: '
+                              '%s', task.cloud_account_id, str(exc))
 
     def heartbeat(self):
         while True:
-            if self.report_import_id:
-                self.rest_cl.report_import_update(self.report_import_id, {})
+            self.send_heartbeats()
             time.sleep(HEARTBEAT_INTERVAL)
 
     @property
     def rest_cl(self):
-        if self._rest_cl is None:
-            self._rest_cl = RestClient(
+        if getattr(self._local, 'rest_cl', None) is None:
+            self._local.rest_cl = RestClient(
                 url=self.config_cl.restapi_url(), verify=False)
-            self._rest_cl.secret = self.config_cl.cluster_secret()
-        return self._rest_cl
+            self._local.rest_cl.secret = self.config_cl.cluster_secret()
+        return self._local.rest_cl
 
     @property
     def mongo_cl(self):
@@ -76,11 +152,11 @@ class DIWorker(ConsumerMixin):
 
     @property
     def clickhouse_cl(self):
-        if not self._clickhouse_cl:
+        if getattr(self._local, 'clickhouse_cl', None) is None:
             user, password, host, db_name = self.config_cl.clickhouse_params()
-            self._clickhouse_cl = ClickHouseClient(
+            self._local.clickhouse_cl = ClickHouseClient(
                 host=host, password=password, database=db_name, user=user)
-        return self._clickhouse_cl
+        return self._local.clickhouse_cl
 
     def publish_activities_task(self, organization_id, object_id, object_type,
                                 action, routing_key):
@@ -108,29 +184,113 @@ class DIWorker(ConsumerMixin):
             queues=[task_queue],
             accept=['json'],
             callbacks=[self.process_task],
-            prefetch_count=1,
+            # tasks of several organizations are prefetched to be scheduled
+            # fairly between import workers
+            prefetch_count=self.import_workers * 2,
         )]
 
+    def get_import_task(self, body, message):
+        report_import_id = body.get('report_import_id')
+        if not report_import_id:
+            raise Exception('invalid task received: {}'.format(body))
+        _, import_dict = self.rest_cl.report_import_get(report_import_id)
+        _, ca = self.rest_cl.cloud_account_get(
+            import_dict['cloud_account_id'])
+        return ImportTask(body, message, import_dict, ca['organization_id'])
+
+    def lock_cloud_account(self, task):
+        # only one import of a cloud account is running on all workers
+        if task.cloud_account_id in self.active_cloud_accounts:
+            return False
+        now = time.time()
+        if now - task.lock_attempt_at < IMPORT_LOCK_RETRY_INTERVAL:
+            return False
+        task.lock_attempt_at = now
+        lock = EtcdLock(self.config_cl,
+                        'diworker_import_%s' % task.cloud_account_id)
+        try:
+            if not lock.acquire(blocking=False, lock_ttl=IMPORT_LOCK_TTL):
+                lock.release()
+                LOG.info('Import %s is postponed, cloud account %s is '
+                         'imported by another worker', task.report_import_id,
+                         task.cloud_account_id)
+                return False
+        except Exception as exc:
+            LOG.error('Failed to lock cloud account %s: %s',
+                      task.cloud_account_id, str(exc))
+            return False
+        task.lock = lock
+        self.active_cloud_accounts.add(task.cloud_account_id)
+        return True
+
+    def schedule_tasks(self):
+        # organizations take turns: an organization which task is started
+        # is moved to the end of the queue
+        for organization_id in list(self.pending_tasks.keys()):
+            if len(self.running_tasks) >= self.import_workers:
+                return
+            tasks = self.pending_tasks[organization_id]
+            task = next((t for t in tasks if self.lock_cloud_account(t)),
+                        None)
+            if not task:
+                continue
+            tasks.remove(task)
+            if tasks:
+                self.pending_tasks.move_to_end(organization_id)
+            else:
+                self.pending_tasks.pop(organization_id)
+            with self.tasks_lock:
+                future = self.executor.submit(self.run_import, task)
+                self.running_tasks[future] = task
+
+    def finish_tasks(self):
+        # messages are acknowledged by the consumer thread as channels are
+        # not thread safe
+        with self.tasks_lock:
+            finished_tasks = [self.running_tasks.pop(f)
+                              for f in list(self.running_tasks) if f.done()]
+            for task in finished_tasks:
+                try:
+                    task.lock.release()
+                except Exception as exc:
+                    LOG.error('Failed to unlock cloud account %s: %s',
+                              task.cloud_account_id, str(exc))
+        for task in finished_tasks:
+            self.active_cloud_accounts.discard(task.cloud_account_id)
+            try:
+                task.message.ack()
+            except Exception as exc:
+                LOG.error('Failed to ack task %s: %s', task.body, str(exc))
+
+    def on_iteration(self):
+        self.finish_tasks()
+        self.schedule_tasks()
+
+    def on_connection_revived(self):
+        # unacknowledged messages are redelivered by the new connection
+        self.pending_tasks.clear()
+
+    def run_import(self, task):
+        started_at = time.time()
+        try:
+            self.report_import(task)
+        except Exception as exc:
+            LOG.exception('Data import failed: %s', str(exc))
+        finally:
+            LOG.info('Import %s of cloud account %s: queue wait time %.0fs '
+                     '(worker wait time %.0fs), import time %.0fs',
+                     task.report_import_id, task.cloud_account_id,
+                     started_at - task.report_import['created_at'],
+                     started_at - task.received_at, time.time() - started_at)
+
     def report_import(self, task):
-        self.report_import_id = task.get('report_import_id')
-        if not self.report_import_id:
-            raise Exception('invalid task received: {}'.format(task))
-
-        _, import_dict = self.rest_cl.report_import_get(self.report_import_id)
-        cloud_acc_id = import_dict.get('cloud_account_id')
-        _, resp = self.rest_cl.report_import_list(cloud_acc_id, show_active=True)
-        imports = list(filter(
-            lambda x: x['id'] != self.report_import_id, resp['report_imports']))
-        if imports:
-            reason = 'Import cancelled due another import: %s' % imports[0]['id']
-            self.rest_cl.report_import_update(
-                self.report_import_id, {'state': 'failed',
-                                        'state_reason': reason})
-            return
+        report_import_id = task.report_import_id
+        import_dict = task.report_import
+        cloud_acc_id = task.cloud_account_id
         is_recalculation = import_dict.get('is_recalculation', False)
         LOG.info('Starting processing for task: %s, purpose %s',
-                 task, 'recalculation ' if is_recalculation else 'import')
-        self.rest_cl.report_import_update(self.report_import_id,
+                 task.body, 'recalculation ' if is_recalculation else 'import')
+        self.rest_cl.report_import_update(report_import_id,
                                           {'state': 'in_progress'})
 
         importer_params = {
@@ -152,8 +312,12 @@ class DIWorker(ConsumerMixin):
             cc_type = ca.get('type')
             importer = get_importer_class(cc_type)(**importer_params)
             importer.import_report()
+            imported_at = int(time.time())
             self.rest_cl.report_import_update(
-                self.report_import_id, {'state': 'completed'})
+                report_import_id, {'state': 'completed'})
+            self.rollups_builder.schedule(
+                cloud_acc_id, imported_at,
+                importer.expenses_changed_from.get(cloud_acc_id))
             if start_last_import_ts == 0 and cc_type != ENVIRONMENT_CLOUD_TYPE:
                 all_reports_finished = True
                 _, resp = self.rest_cl.cloud_account_list(organization_id)
@@ -172,7 +336,7 @@ class DIWorker(ConsumerMixin):
                 # pylint: disable=E1101
                 LOG.error('Mongo exception details: %s', exc.details)
             self.rest_cl.report_import_update(
-                self.report_import_id,
+                report_import_id,
                 {'state': 'failed', 'state_reason': str(exc)}
             )
             now = int(time.time())
@@ -219,11 +383,14 @@ class DIWorker(ConsumerMixin):
 
     def process_task(self, body, message):
         try:
-            self.report_import(body)
+            task = self.get_import_task(body, message)
         except Exception as exc:
             LOG.exception('Data import failed: %s', str(exc))
-        self.report_import_id = None
-        message.ack()
+            message.ack()
+            return
+        self.pending_tasks.setdefault(task.organization_id, deque()).append(
+            task)
+        self.schedule_tasks()
 
 
 if __name__ == '__main__':
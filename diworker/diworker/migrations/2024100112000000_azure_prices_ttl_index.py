@@ -0,0 +1,27 @@
+import logging
+from diworker.diworker.migrations.base import BaseMigration
+"""
+Added TTL index for cached Azure prices
+"""
+INDEX_NAME = 'AzurePricesExpiration'
+LOG = logging.getLogger(__name__)
+
+
+class Migration(BaseMigration):
+    @property
+    def mongo_prices(self):
+        return self.db.azure_prices
+
+    def upgrade(self):
+        index_names = [x['name'] for x in self.mongo_prices.list_indexes()]
+        if INDEX_NAME not in index_names:
+            LOG.info('Create index %s' % INDEX_NAME)
+            self.mongo_prices.create_index(
+                [('expire_at', 1)], name=INDEX_NAME, expireAfterSeconds=0,
+                background=True)
+
+    def downgrade(self):
+        index_names = [x['name'] for x in self.mongo_prices.list_indexes()]
+        if INDEX_NAME in index_names:
+            LOG.info('Dropping index: %s' % INDEX_NAME)
+            self.mongo_prices.drop_index(INDEX_NAME)
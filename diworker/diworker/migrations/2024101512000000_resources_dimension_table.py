@@ -0,0 +1,43 @@
+from diworker.diworker.migrations.base import BaseMigration
+from clickhouse_driver import Client as ClickHouseClient
+
+"""
+Adds a clickhouse resources dimension table replicated from mongo resources.
+"""
+
+
+class Migration(BaseMigration):
+    def _get_clickhouse_client(self):
+        user, password, host, db_name = self.config_cl.clickhouse_params()
+        return ClickHouseClient(
+            host=host, password=password, database=db_name, user=user)
+
+    def upgrade(self):
+        clickhouse_client = self._get_clickhouse_client()
+        clickhouse_client.execute(
+            """
+            CREATE TABLE IF NOT EXISTS resources_dimension (
+                resource_id String,
+                organization_id String,
+                cloud_account_id String,
+                cluster_id String,
+                cluster_type_id String,
+                pool_id String,
+                employee_id String,
+                resource_type String,
+                is_environment UInt8,
+                region String,
+                service_name String,
+                tag_keys Array(String),
+                first_seen Int64,
+                last_seen Int64,
+                deleted_at Int64,
+                is_deleted UInt8,
+                version UInt64)
+            ENGINE = ReplacingMergeTree(version)
+            ORDER BY resource_id
+            """)
+
+    def downgrade(self):
+        clickhouse_client = self._get_clickhouse_client()
+        clickhouse_client.execute('DROP TABLE IF EXISTS resources_dimension')
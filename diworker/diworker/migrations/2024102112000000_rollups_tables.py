@@ -0,0 +1,48 @@
+from diworker.diworker.migrations.base import BaseMigration
+from clickhouse_driver import Client as ClickHouseClient
+
+"""
+Adds clickhouse tables for daily expenses and resources rollups.
+"""
+
+
+class Migration(BaseMigration):
+    def _get_clickhouse_client(self):
+        user, password, host, db_name = self.config_cl.clickhouse_params()
+        return ClickHouseClient(
+            host=host, password=password, database=db_name, user=user)
+
+    def upgrade(self):
+        clickhouse_client = self._get_clickhouse_client()
+        clickhouse_client.execute(
+            """
+            CREATE TABLE IF NOT EXISTS expenses_rollup (
+                cloud_account_id String,
+                dimension LowCardinality(String),
+                value String,
+                date DateTime,
+                cost Float64,
+                removed UInt8,
+                version UInt64)
+            ENGINE = ReplacingMergeTree(version)
+            ORDER BY (cloud_account_id, dimension, value, date)
+            """)
+        clickhouse_client.execute(
+            """
+            CREATE TABLE IF NOT EXISTS resources_rollup (
+                cloud_account_id String,
+                dimension LowCardinality(String),
+                value String,
+                date DateTime,
+                started UInt32,
+                deleted UInt32,
+                removed UInt8,
+                version UInt64)
+            ENGINE = ReplacingMergeTree(version)
+            ORDER BY (cloud_account_id, dimension, value, date)
+            """)
+
+    def downgrade(self):
+        clickhouse_client = self._get_clickhouse_client()
+        clickhouse_client.execute('DROP TABLE IF EXISTS expenses_rollup')
+        clickhouse_client.execute('DROP TABLE IF EXISTS resources_rollup')
@@ -0,0 +1,42 @@
+from diworker.diworker.migrations.base import BaseMigration
+from clickhouse_driver import Client as ClickHouseClient
+
+"""
+Adds resource fields used by available filters to the clickhouse resources
+dimension table. Resources are loaded into the table again by the sync.
+"""
+COLUMNS = [
+    ('cloud_resource_id', 'String'),
+    ('k8s_node', 'String'),
+    ('k8s_namespace', 'String'),
+    ('k8s_service', 'String'),
+    ('active', 'UInt8'),
+    ('constraint_violated', 'UInt8'),
+    ('recommendations_run_timestamp', 'Int64'),
+]
+SYNC_STATE_ID = 'resources_dimension'
+
+
+class Migration(BaseMigration):
+    def _get_clickhouse_client(self):
+        user, password, host, db_name = self.config_cl.clickhouse_params()
+        return ClickHouseClient(
+            host=host, password=password, database=db_name, user=user)
+
+    def upgrade(self):
+        clickhouse_client = self._get_clickhouse_client()
+        for name, column_type in COLUMNS:
+            clickhouse_client.execute(
+                'ALTER TABLE resources_dimension ADD COLUMN IF NOT EXISTS '
+                '%s %s' % (name, column_type))
+        # existing rows don't have values of the new columns
+        self.db.clickhouse_sync.update_one(
+            {'_id': SYNC_STATE_ID},
+            {'$unset': {'resume_token': 1, 'synced_at': 1}})
+
+    def downgrade(self):
+        clickhouse_client = self._get_clickhouse_client()
+        for name, _ in COLUMNS:
+            clickhouse_client.execute(
+                'ALTER TABLE resources_dimension DROP COLUMN IF EXISTS '
+                '%s' % name)
@@ -0,0 +1,44 @@
+import logging
+from pymongo import IndexModel
+from diworker.diworker.migrations.base import BaseMigration
+"""
+Indexes for checklist items and lookups of module checklists
+"""
+LOG = logging.getLogger(__name__)
+COLLECTION_INDEXES = {
+    'checklist_items': [
+        {
+            'name': 'OrgCreatedAtModule',
+            'fields': ['organization_id', 'created_at', 'module']
+        }],
+    'checklists': [
+        {
+            'name': 'OrgModuleCreatedAt',
+            'fields': ['organization_id', 'module', 'created_at']
+        }],
+}
+
+
+class Migration(BaseMigration):
+    def upgrade(self):
+        for coll_name, indexes in COLLECTION_INDEXES.items():
+            collection = self.db[coll_name]
+            existing_indexes = [x['name'] for x in collection.list_indexes()]
+            indexes_to_create = []
+            for index in indexes:
+                if index['name'] not in existing_indexes:
+                    LOG.info('Create index %s' % index['name'])
+                    indexes_to_create.append(IndexModel(
+                        [(f, 1) for f in index['fields']],
+                        name=index['name'], background=True))
+            if indexes_to_create:
+                collection.create_indexes(indexes_to_create)
+
+    def downgrade(self):
+        for coll_name, indexes in COLLECTION_INDEXES.items():
+            collection = self.db[coll_name]
+            existing_indexes = [x['name'] for x in collection.list_indexes()]
+            for index in indexes:
+                if index['name'] in existing_indexes:
+                    LOG.info('Dropping index %s' % index['name'])
+                    collection.drop_index(index['name'])
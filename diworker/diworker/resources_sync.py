@@ -0,0 +1,287 @@
+import logging
+import time
+
+from clickhouse_driver import Client as ClickHouseClient
+from etcd import EtcdLockExpired, Lock as EtcdLock
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+
+from diworker.diworker.rollups import (
+    RESOURCES_ROLLUP_FIELDS, get_changed_rollups, mark_rollups_changed,
+    reset_rollups)
+
+LOG = logging.getLogger(__name__)
+SYNC_STATE_ID = 'resources_dimension'
+SYNC_LOCK_NAME = 'diworker_resources_sync'
+SYNC_LOCK_TTL = 300
+SYNC_RETRY_INTERVAL = 60
+SYNC_BATCH_SIZE = 5000
+FLUSH_INTERVAL = 5
+STATE_UPDATE_INTERVAL = 60
+# resume token is too old or the stream can't be resumed
+CHANGE_STREAM_LOST_CODES = [280, 286]
+RESOURCE_STRING_FIELDS = [
+    'organization_id', 'cloud_account_id', 'cluster_id', 'cluster_type_id',
+    'pool_id', 'employee_id', 'resource_type', 'region', 'service_name',
+    'cloud_resource_id', 'k8s_node', 'k8s_namespace', 'k8s_service'
+]
+RESOURCE_INT_FIELDS = ['first_seen', 'last_seen', 'deleted_at']
+RESOURCE_BOOL_FIELDS = ['is_environment', 'active', 'constraint_violated']
+# resource fields the rollups depend on, the previous row of the resource is
+# read to find changed rollups only if one of them is updated
+ROLLUP_RESOURCE_FIELDS = {
+    'cloud_account_id', 'employee_id', 'pool_id', 'region', 'service_name',
+    'resource_type', 'is_environment', 'tags', 'deleted_at', 'first_seen',
+    'last_seen'
+}
+
+
+def get_version(timestamp):
+    # bson timestamp of the change is used as the row version, so later
+    # changes of a resource replace earlier ones
+    return (timestamp.time << 32) + timestamp.inc
+
+
+def resource_to_row(resource, version):
+    row = {'resource_id': resource['_id']}
+    for field in RESOURCE_STRING_FIELDS:
+        row[field] = resource.get(field) or ''
+    for field in RESOURCE_INT_FIELDS:
+        row[field] = int(resource.get(field) or 0)
+    for field in RESOURCE_BOOL_FIELDS:
+        row[field] = int(bool(resource.get(field)))
+    row['recommendations_run_timestamp'] = int(
+        (resource.get('recommendations') or {}).get('run_timestamp') or 0)
+    row['tag_keys'] = list((resource.get('tags') or {}).keys())
+    row['is_deleted'] = 0
+    row['version'] = version
+    return row
+
+
+def deleted_resource_row(resource_id, version):
+    row = resource_to_row({'_id': resource_id}, version)
+    row['is_deleted'] = 1
+    return row
+
+
+class SyncLockLost(Exception):
+    pass
+
+
+class ResourcesDimensionSync:
+    """
+    Replicates mongo resources into the clickhouse resources_dimension
+    table. Initial load copies all resources, after that changes are read
+    from the mongo change stream. Only one worker holding the etcd lock
+    runs the sync, the resume token is saved in mongo after every flush.
+    """
+    def __init__(self, config_cl):
+        self.config_cl = config_cl
+        self._mongo_cl = None
+        self._clickhouse_cl = None
+
+    @property
+    def mongo_cl(self):
+        if self._mongo_cl is None:
+            mongo_params = self.config_cl.mongo_params()
+            mongo_conn_string = "mongodb://%s:%s@%s:%s" % mongo_params[:-1]
+            self._mongo_cl = MongoClient(mongo_conn_string)
+        return self._mongo_cl
+
+    @property
+    def clickhouse_cl(self):
+        if self._clickhouse_cl is None:
+            user, password, host, db_name = self.config_cl.clickhouse_params()
+            self._clickhouse_cl = ClickHouseClient(
+                host=host, password=password, database=db_name, user=user)
+        return self._clickhouse_cl
+
+    @property
+    def resources_collection(self):
+        return self.mongo_cl.restapi.resources
+
+    @property
+    def sync_state_collection(self):
+        return self.mongo_cl.restapi.clickhouse_sync
+
+    def run(self):
+        while True:
+            lock = EtcdLock(self.config_cl, SYNC_LOCK_NAME)
+            try:
+                if lock.acquire(blocking=False, lock_ttl=SYNC_LOCK_TTL):
+                    self.sync(lock)
+            except SyncLockLost as exc:
+                LOG.warning('Resources dimension sync is stopped: %s',
+                            str(exc))
+            except Exception as exc:
+                LOG.exception('Resources dimension sync failed: %s', str(exc))
+            finally:
+                try:
+                    lock.release()
+                except Exception:
+                    pass
+            time.sleep(SYNC_RETRY_INTERVAL)
+
+    @staticmethod
+    def renew_lock(lock):
+        # other worker may start the sync after the lock is expired, so the
+        # sync can't continue without the lock
+        try:
+            # expired lock is written again by acquire, it's not renewed
+            acquired = lock.is_acquired and lock.acquire(
+                blocking=False, lock_ttl=SYNC_LOCK_TTL)
+        except EtcdLockExpired:
+            acquired = False
+        if not acquired:
+            raise SyncLockLost('sync lock is lost')
+
+    def get_rows(self, resource_ids):
+        # previous rows of resources are needed to find rollups of the old
+        # cloud account and to ignore last_seen changes within a day. Rows
+        # are read by the primary key, FINAL is applied to these keys only
+        result = self.clickhouse_cl.execute(
+            """
+            SELECT resource_id, %s
+            FROM resources_dimension FINAL
+            WHERE resource_id IN %%(resource_ids)s
+            """ % ', '.join(RESOURCES_ROLLUP_FIELDS),
+            params={'resource_ids': resource_ids})
+        return {x[0]: dict(zip(RESOURCES_ROLLUP_FIELDS, x[1:]))
+                for x in result}
+
+    def write_rows(self, rows, rollup_resource_ids=None):
+        if not rows:
+            return
+        previous_rows = {}
+        if rollup_resource_ids:
+            previous_rows = self.get_rows(list(rollup_resource_ids))
+        self.clickhouse_cl.execute(
+            'INSERT INTO resources_dimension VALUES', rows)
+        # rollups are marked as changed after the rows are written, so a
+        # rollup built before the mark doesn't look actual
+        changes = set()
+        for row in rows:
+            if row['resource_id'] not in (rollup_resource_ids or []):
+                continue
+            previous_row = previous_rows.get(row['resource_id'])
+            cloud_account_ids = {row['cloud_account_id']}
+            if previous_row:
+                cloud_account_ids.add(previous_row['cloud_account_id'])
+            for rollup in get_changed_rollups(previous_row, row):
+                changes.update((rollup, cloud_account_id)
+                               for cloud_account_id in cloud_account_ids
+                               if cloud_account_id)
+        mark_rollups_changed(self.sync_state_collection, changes)
+
+    def save_state(self, resume_token):
+        self.sync_state_collection.update_one(
+            {'_id': SYNC_STATE_ID},
+            {'$set': {'resume_token': resume_token,
+                      'synced_at': int(time.time())}},
+            upsert=True)
+
+    def initial_load(self, lock):
+        with self.mongo_cl.start_session() as session:
+            self.sync_state_collection.find_one(
+                {'_id': SYNC_STATE_ID}, session=session)
+            start_time = session.operation_time
+        LOG.info('Loading resources dimension')
+        self.clickhouse_cl.execute('TRUNCATE TABLE resources_dimension')
+        # rollups are built from the dimension
+        reset_rollups(self.sync_state_collection)
+        version = get_version(start_time)
+        rows = []
+        count = 0
+        for resource in self.resources_collection.find():
+            rows.append(resource_to_row(resource, version))
+            if len(rows) == SYNC_BATCH_SIZE:
+                self.renew_lock(lock)
+                self.write_rows(rows)
+                count += len(rows)
+                rows = []
+        self.renew_lock(lock)
+        self.write_rows(rows)
+        count += len(rows)
+        LOG.info('Loaded %s resources into resources dimension', count)
+        return start_time
+
+    def reset_state(self):
+        # resources are loaded again on the next sync, the dimension is not
+        # used until then
+        self.sync_state_collection.update_one(
+            {'_id': SYNC_STATE_ID},
+            {'$unset': {'resume_token': 1, 'synced_at': 1}})
+
+    def sync(self, lock):
+        state = self.sync_state_collection.find_one({'_id': SYNC_STATE_ID})
+        resume_token = (state or {}).get('resume_token')
+        if resume_token:
+            watch_params = {'resume_after': resume_token}
+        else:
+            self.reset_state()
+            watch_params = {
+                'start_at_operation_time': self.initial_load(lock)}
+        try:
+            self.watch(lock, watch_params)
+        except OperationFailure as exc:
+            if exc.code not in CHANGE_STREAM_LOST_CODES:
+                raise
+            LOG.warning('Resources change stream is lost: %s', str(exc))
+            self.reset_state()
+
+    def watch(self, lock, watch_params):
+        with self.resources_collection.watch(
+                full_document='updateLookup',
+                max_await_time_ms=FLUSH_INTERVAL * 1000,
+                **watch_params) as stream:
+            # resource id -> last row, so only last change is written
+            rows = {}
+            # ids of resources with changes which may change rollups
+            rollup_resource_ids = set()
+            flushed_at = time.time()
+            state_updated_at = 0
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    if change['operationType'] == 'invalidate':
+                        self.renew_lock(lock)
+                        self.write_rows(list(rows.values()),
+                                        rollup_resource_ids)
+                        self.reset_state()
+                        return
+                    self.process_change(change, rows, rollup_resource_ids)
+                now = time.time()
+                if (len(rows) < SYNC_BATCH_SIZE and
+                        now - flushed_at < FLUSH_INTERVAL):
+                    continue
+                if rows or now - state_updated_at >= STATE_UPDATE_INTERVAL:
+                    # the lock is renewed at least every state update
+                    self.renew_lock(lock)
+                    self.write_rows(list(rows.values()), rollup_resource_ids)
+                    self.save_state(stream.resume_token)
+                    state_updated_at = now
+                    rows = {}
+                    rollup_resource_ids = set()
+                flushed_at = now
+
+    @staticmethod
+    def process_change(change, rows, rollup_resource_ids):
+        operation_type = change['operationType']
+        resource_id = change['documentKey']['_id']
+        version = get_version(change['clusterTime'])
+        resource = change.get('fullDocument')
+        if operation_type == 'delete' or resource is None:
+            # resource may be deleted before the update is read
+            rows[resource_id] = deleted_resource_row(resource_id, version)
+            rollup_resource_ids.add(resource_id)
+            return
+        rows[resource_id] = resource_to_row(resource, version)
+        update = change.get('updateDescription')
+        if operation_type != 'update' or update is None:
+            rollup_resource_ids.add(resource_id)
+            return
+        updated_fields = list(update.get('updatedFields') or {}) + list(
+            update.get('removedFields') or [])
+        if any(f.split('.')[0] in ROLLUP_RESOURCE_FIELDS
+               for f in updated_fields):
+            rollup_resource_ids.add(resource_id)
@@ -0,0 +1,323 @@
+import logging
+import queue
+import time
+from datetime import timezone
+
+from clickhouse_driver import Client as ClickHouseClient
+from pymongo import MongoClient, UpdateOne
+
+LOG = logging.getLogger(__name__)
+DAY_IN_SECONDS = 86400
+# breakdown expenses range is limited by a year and the previous period is
+# requested with it
+ROLLUP_DAYS = 2 * 365 + 1
+EXPENSES_ROLLUP = 'expenses_rollup'
+RESOURCES_ROLLUP = 'resources_rollup'
+ROLLUPS = [EXPENSES_ROLLUP, RESOURCES_ROLLUP]
+# state of the resources dimension sync, rollups are built from the
+# dimension
+RESOURCES_DIMENSION_STATE_ID = 'resources_dimension'
+RESOURCES_DIMENSION_MAX_LAG = 600
+RESOURCES_DIMENSION_WAIT = 180
+RESOURCES_DIMENSION_CHECK_INTERVAL = 5
+# rollup dimension -> resources_dimension expression, resources are also
+# rolled up by each tag key into 'tag' dimension
+ROLLUP_DIMENSIONS = {
+    'cloud_account_id': 'cloud_account_id',
+    'employee_id': 'employee_id',
+    'pool_id': 'pool_id',
+    'region': 'region',
+    'service_name': 'service_name',
+    'resource_type': (
+        "if(is_environment, concat(resource_type, ':environment'), "
+        "resource_type)"),
+}
+# resources_dimension fields rollups depend on
+EXPENSES_ROLLUP_FIELDS = [
+    'cloud_account_id', 'employee_id', 'pool_id', 'region', 'service_name',
+    'resource_type', 'is_environment', 'tag_keys', 'deleted_at', 'is_deleted'
+]
+RESOURCES_ROLLUP_FIELDS = EXPENSES_ROLLUP_FIELDS + ['first_seen', 'last_seen']
+# resource row for every rollup dimension value of the resource
+ROLLUP_RESOURCES_QUERY = """
+    SELECT
+        resource_id, dimension, value,
+        intDiv(first_seen, 86400) * 86400 AS first_day,
+        intDiv(last_seen, 86400) * 86400 AS last_day
+    FROM (
+        SELECT *, if(empty(tag_keys), [''], tag_keys) AS tags
+        FROM resources_dimension FINAL
+        WHERE cloud_account_id = %(cloud_account_id)s
+            AND NOT is_deleted
+            AND deleted_at = 0
+    )
+    ARRAY JOIN
+        arrayConcat({dimensions}, arrayMap(x -> 'tag', tags)) AS dimension,
+        arrayConcat([{values}], tags) AS value
+""".format(dimensions=list(ROLLUP_DIMENSIONS.keys()),
+           values=', '.join(ROLLUP_DIMENSIONS.values()))
+
+
+def rollup_state_id(rollup, cloud_account_id):
+    return '%s:%s' % (rollup, cloud_account_id)
+
+
+def get_changed_rollups(previous_row, row):
+    if previous_row is None:
+        # new resource doesn't have expenses before the next import
+        return [RESOURCES_ROLLUP]
+    if any(_rollup_value(previous_row, f) != _rollup_value(row, f)
+           for f in EXPENSES_ROLLUP_FIELDS):
+        return ROLLUPS
+    if any(_rollup_value(previous_row, f) != _rollup_value(row, f)
+           for f in RESOURCES_ROLLUP_FIELDS):
+        return [RESOURCES_ROLLUP]
+    return []
+
+
+def _rollup_value(row, field):
+    value = row[field]
+    if field in ['first_seen', 'last_seen']:
+        # resources are counted by days
+        return value // DAY_IN_SECONDS
+    if field == 'tag_keys':
+        return sorted(value)
+    return value
+
+
+def mark_rollups_changed(state_collection, changes):
+    """
+    Rollups of the (rollup, cloud account id) pairs aren't used until
+    they are built again
+    """
+    if changes:
+        state_collection.bulk_write([
+            UpdateOne({'_id': rollup_state_id(rollup, cloud_account_id)},
+                      {'$inc': {'changes': 1}}, upsert=True)
+            for rollup, cloud_account_id in changes
+        ])
+
+
+def reset_rollups(state_collection):
+    state_collection.delete_many(
+        {'_id': {'$regex': '^(%s):' % '|'.join(ROLLUPS)}})
+
+
+class RollupsBuilder:
+    """
+    Builds daily rollups of cloud accounts after report imports. Expenses
+    rollup keeps the cost by dimension value and date, resources rollup keeps
+    the number of resources started and last seen by dimension value and
+    date. Imports schedule the build, it's done in the builder thread when
+    resources changed by the import get to the resources dimension. A rollup
+    is rebuilt for the rollup period if resources of the rollup are changed,
+    otherwise expenses rollup is rebuilt from the first date of expenses
+    written by the import. Rows of previous builds which are not built again
+    are marked as removed. Resources sync counts changes of the rollups,
+    rollup is used by rest_api only if it's built after the last change.
+    """
+    def __init__(self, config_cl):
+        self.config_cl = config_cl
+        self._mongo_cl = None
+        self._clickhouse_cl = None
+        self.requests = queue.Queue()
+        # cloud account id -> build request waiting for the resources
+        # dimension
+        self.pending = {}
+
+    @property
+    def mongo_cl(self):
+        if self._mongo_cl is None:
+            mongo_params = self.config_cl.mongo_params()
+            mongo_conn_string = "mongodb://%s:%s@%s:%s" % mongo_params[:-1]
+            self._mongo_cl = MongoClient(mongo_conn_string)
+        return self._mongo_cl
+
+    @property
+    def clickhouse_cl(self):
+        if self._clickhouse_cl is None:
+            user, password, host, db_name = self.config_cl.clickhouse_params()
+            self._clickhouse_cl = ClickHouseClient(
+                host=host, password=password, database=db_name, user=user)
+        return self._clickhouse_cl
+
+    @property
+    def state_collection(self):
+        return self.mongo_cl.restapi.clickhouse_sync
+
+    def schedule(self, cloud_account_id, imported_at,
+                 expenses_changed_from=None):
+        changed_from = None
+        if expenses_changed_from is not None:
+            changed_from = int(expenses_changed_from.replace(
+                tzinfo=timezone.utc).timestamp())
+        self.requests.put({
+            'cloud_account_id': cloud_account_id,
+            'imported_at': imported_at,
+            'changed_from': changed_from,
+            'scheduled_at': time.time()
+        })
+
+    def add_pending(self, request):
+        # requests of several imports of the cloud account are built at once
+        pending = self.pending.get(request['cloud_account_id'])
+        if pending:
+            changed_from = [x['changed_from'] for x in [pending, request]
+                            if x['changed_from'] is not None]
+            request['changed_from'] = min(changed_from, default=None)
+        self.pending[request['cloud_account_id']] = request
+
+    def get_resources_dimension_synced_at(self):
+        state = self.state_collection.find_one(
+            {'_id': RESOURCES_DIMENSION_STATE_ID}, ['synced_at']) or {}
+        return state.get('synced_at') or 0
+
+    def run(self):
+        while True:
+            try:
+                request = self.requests.get(
+                    timeout=RESOURCES_DIMENSION_CHECK_INTERVAL)
+                while True:
+                    self.add_pending(request)
+                    request = self.requests.get_nowait()
+            except queue.Empty:
+                pass
+            if not self.pending:
+                continue
+            try:
+                self.build_pending()
+            except Exception as exc:
+                LOG.exception('Rollups build failed: %s', str(exc))
+                time.sleep(RESOURCES_DIMENSION_CHECK_INTERVAL)
+
+    def build_pending(self):
+        synced_at = self.get_resources_dimension_synced_at()
+        now = time.time()
+        for cloud_account_id, request in list(self.pending.items()):
+            # resources changed by the import should get to the dimension
+            if synced_at > request['imported_at']:
+                self.pending.pop(cloud_account_id)
+                try:
+                    self.refresh(cloud_account_id, request['changed_from'])
+                except Exception as exc:
+                    # rollups aren't used until the next successful build
+                    LOG.exception(
+                        'Rollups of cloud account %s are not built: %s',
+                        cloud_account_id, str(exc))
+            elif (synced_at < now - RESOURCES_DIMENSION_MAX_LAG or
+                  now >= request['scheduled_at'] + RESOURCES_DIMENSION_WAIT):
+                self.pending.pop(cloud_account_id)
+                LOG.warning('Rollups of cloud account %s are not built, '
+                            'resources dimension is not synced',
+                            cloud_account_id)
+
+    def refresh(self, cloud_account_id, changed_from=None):
+        started_at = time.time()
+        version = int(started_at * 1000)
+        period_start = (int(started_at) // DAY_IN_SECONDS - ROLLUP_DAYS
+                        ) * DAY_IN_SECONDS
+        for rollup, build in [
+            (EXPENSES_ROLLUP, self.build_expenses_rollup),
+            (RESOURCES_ROLLUP, self.build_resources_rollup)
+        ]:
+            state_id = rollup_state_id(rollup, cloud_account_id)
+            state = self.state_collection.find_one({'_id': state_id}) or {}
+            changes = state.get('changes', 0)
+            start_date = state.get('start_date')
+            if ('built_at' not in state or
+                    state.get('built_changes') != changes):
+                start_date = period_start
+                build_from = period_start
+            elif rollup == EXPENSES_ROLLUP and changed_from is not None:
+                build_from = max(
+                    changed_from // DAY_IN_SECONDS * DAY_IN_SECONDS,
+                    start_date)
+            else:
+                # rollup isn't changed by the import
+                build_from = None
+            if build_from is not None:
+                build(cloud_account_id, build_from, version)
+                self.remove_outdated_rows(
+                    rollup, cloud_account_id, build_from, version)
+            self.state_collection.update_one(
+                {'_id': state_id},
+                {'$set': {'built_changes': changes,
+                          'built_at': int(time.time()),
+                          'start_date': start_date}},
+                upsert=True)
+        LOG.info('Rollups of cloud account %s are built in %.0fs',
+                 cloud_account_id, time.time() - started_at)
+
+    def build_expenses_rollup(self, cloud_account_id, start_date, version):
+        self.clickhouse_cl.execute(
+            """
+            INSERT INTO expenses_rollup
+            SELECT
+                %%(cloud_account_id)s, dimension, value, date, sum(cost), 0,
+                %%(version)s
+            FROM (
+                SELECT resource_id, date, sum(cost * sign) AS cost
+                FROM expenses
+                WHERE cloud_account_id = %%(cloud_account_id)s
+                    AND date >= %%(start_date)s
+                GROUP BY resource_id, date
+            ) AS expenses
+            JOIN (%s) AS resources USING resource_id
+            GROUP BY dimension, value, date
+            """ % ROLLUP_RESOURCES_QUERY,
+            params={
+                'cloud_account_id': cloud_account_id,
+                'start_date': start_date,
+                'version': version
+            })
+
+    def build_resources_rollup(self, cloud_account_id, start_date, version):
+        # resources started before the rollup period are counted as started
+        # on its first day
+        self.clickhouse_cl.execute(
+            """
+            INSERT INTO resources_rollup
+            SELECT
+                %%(cloud_account_id)s, dimension, value,
+                toDateTime(event.1) AS date, sum(event.2), sum(event.3), 0,
+                %%(version)s
+            FROM (
+                SELECT dimension, value, arrayJoin([
+                    (greatest(first_day, %%(start_date)s), 1, 0),
+                    (last_day, 0, 1)
+                ]) AS event
+                FROM (%s) AS resources
+                WHERE last_day >= %%(start_date)s
+            )
+            GROUP BY dimension, value, date
+            """ % ROLLUP_RESOURCES_QUERY,
+            params={
+                'cloud_account_id': cloud_account_id,
+                'start_date': start_date,
+                'version': version
+            })
+
+    def remove_outdated_rows(self, rollup, cloud_account_id, start_date,
+                             version):
+        # rows of previous builds are replaced by rows with the same key, so
+        # only rows missing in the new build are left
+        columns = {
+            EXPENSES_ROLLUP: '0',
+            RESOURCES_ROLLUP: '0, 0',
+        }[rollup]
+        self.clickhouse_cl.execute(
+            """
+            INSERT INTO {rollup}
+            SELECT cloud_account_id, dimension, value, date, {columns}, 1,
+                %(version)s
+            FROM {rollup} FINAL
+            WHERE cloud_account_id = %(cloud_account_id)s
+                AND date >= %(start_date)s
+                AND version < %(version)s
+                AND NOT removed
+            """.format(rollup=rollup, columns=columns),
+            params={
+                'cloud_account_id': cloud_account_id,
+                'start_date': start_date,
+                'version': version
+            })
@@ -0,0 +1,66 @@
+import unittest
+from concurrent.futures import Future
+from threading import Lock
+from unittest.mock import MagicMock, patch
+
+from diworker.diworker.main import DIWorker, IMPORT_LOCK_TTL, ImportTask
+
+
+class TestHeartbeat(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # threads and clients of the worker are not started
+        self.worker = DIWorker.__new__(DIWorker)
+        self.worker.running_tasks = {}
+        self.worker.tasks_lock = Lock()
+        self.worker.active_cloud_accounts = set()
+        self.rest_cl = MagicMock()
+        patch('diworker.diworker.main.DIWorker.rest_cl',
+              self.rest_cl).start()
+        self.addCleanup(patch.stopall)
+
+    def add_task(self, cloud_account_id, done=False):
+        task = ImportTask({}, MagicMock(), {
+            'id': 'import_%s' % cloud_account_id,
+            'cloud_account_id': cloud_account_id}, 'org')
+        task.lock = MagicMock(lock_key='/lock/%s/1' % cloud_account_id,
+                              uuid='uuid_%s' % cloud_account_id)
+        future = Future()
+        if done:
+            future.set_result(None)
+        self.worker.running_tasks[future] = task
+        self.worker.active_cloud_accounts.add(cloud_account_id)
+        return task
+
+    def test_send_heartbeats(self):
+        running_task = self.add_task('ca1')
+        done_task = self.add_task('ca2', done=True)
+        self.worker.send_heartbeats()
+        self.rest_cl.report_import_update.assert_called_once_with(
+            'import_ca1', {})
+        running_task.lock.client.write.assert_called_once_with(
+            '/lock/ca1/1', 'uuid_ca1', ttl=IMPORT_LOCK_TTL,
+            prevValue='uuid_ca1')
+        running_task.lock.acquire.assert_not_called()
+        done_task.lock.client.write.assert_not_called()
+
+    def test_send_heartbeats_after_finish(self):
+        task = self.add_task('ca1', done=True)
+        self.worker.finish_tasks()
+        task.lock.release.assert_called_once_with()
+        task.message.ack.assert_called_once_with()
+        self.assertEqual(self.worker.active_cloud_accounts, set())
+        self.worker.send_heartbeats()
+        task.lock.client.write.assert_not_called()
+        task.lock.acquire.assert_not_called()
+
+    def test_refresh_lock_failed(self):
+        failed_task = self.add_task('ca1')
+        failed_task.lock.client.write.side_effect = Exception('not found')
+        task = self.add_task('ca2')
+        self.worker.send_heartbeats()
+        task.lock.client.write.assert_called_once_with(
+            '/lock/ca2/1', 'uuid_ca2', ttl=IMPORT_LOCK_TTL,
+            prevValue='uuid_ca2')
+        failed_task.lock.acquire.assert_not_called()
@@ -0,0 +1,149 @@
+import shutil
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import mongomock
+
+from diworker.diworker.importers.base import (
+    CSVBaseReportImporter, REPORTS_PATH_PREFIX)
+
+CLOUD_ACCOUNT_ID = 'cloud-account'
+DAY = datetime(2024, 1, 10)
+
+
+class Importer(CSVBaseReportImporter):
+    def get_unique_field_list(self):
+        return ['cloud_account_id', 'resource_id', 'start_date']
+
+    def update_raw_records(self, chunk):
+        for expense in chunk:
+            expense['report_identity'] = self.report_identity
+        super().update_raw_records(chunk)
+
+
+def get_expense(resource_id, start_date, cost, end_date=None):
+    return {
+        'cloud_account_id': CLOUD_ACCOUNT_ID,
+        'resource_id': resource_id,
+        'start_date': start_date,
+        'end_date': end_date or start_date + timedelta(hours=1),
+        'cost': cost,
+        '_rec_n': 1,
+    }
+
+
+class TestRawJournal(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        mongo = mongomock.MongoClient()
+        self.mongo_raw = mongo.restapi.raw_expenses
+        self.mongo_resources = mongo.restapi.resources
+        self.clickhouse_cl = MagicMock()
+        self.addCleanup(shutil.rmtree, REPORTS_PATH_PREFIX,
+                        ignore_errors=True)
+
+    def get_importer(self, last_import_at=0):
+        rest_cl = MagicMock(request_count=0)
+        rest_cl.cloud_account_get.return_value = (200, {
+            'id': CLOUD_ACCOUNT_ID, 'last_import_at': last_import_at,
+            'last_import_modified_at': int(DAY.replace(
+                tzinfo=timezone.utc).timestamp())
+        })
+        config_cl = MagicMock()
+        config_cl.diworker_settings.return_value = {'raw_write_mode': 'merge'}
+        return Importer(
+            CLOUD_ACCOUNT_ID, rest_cl, config_cl, self.mongo_raw,
+            self.mongo_resources, self.clickhouse_cl,
+            detect_period_start=False)
+
+    def import_expenses(self, importer, expenses):
+        importer.update_raw_records(expenses)
+        importer.flush_raw_records()
+        importer.clear_rudiments()
+        return importer.raw_journal[CLOUD_ACCOUNT_ID]
+
+    def test_journal_new_expenses(self):
+        importer = self.get_importer()
+        journal = self.import_expenses(importer, [
+            get_expense('r1', DAY, 1),
+            get_expense('r2', DAY, 2, end_date=DAY + timedelta(days=2))
+        ])
+        self.assertEqual(journal, {
+            'r1': {DAY},
+            'r2': {DAY, DAY + timedelta(days=1)}
+        })
+
+    def test_journal_changed_expenses(self):
+        self.import_expenses(self.get_importer(), [
+            get_expense('r1', DAY, 1),
+            get_expense('r2', DAY + timedelta(hours=1), 2)
+        ])
+        importer = self.get_importer(last_import_at=int(
+            datetime.utcnow().timestamp()) + 1)
+        journal = self.import_expenses(importer, [
+            get_expense('r1', DAY, 1),
+            get_expense('r2', DAY + timedelta(hours=1), 3)
+        ])
+        self.assertEqual(journal, {'r2': {DAY}})
+        self.assertEqual(self.mongo_raw.count_documents(
+            {'report_identity': importer.report_identity}), 2)
+
+    def test_journal_expenses_of_failed_import(self):
+        self.import_expenses(self.get_importer(), [
+            get_expense('r1', DAY, 1)
+        ])
+        # expenses are saved after the last successful import
+        journal = self.import_expenses(self.get_importer(), [
+            get_expense('r1', DAY, 1)
+        ])
+        self.assertEqual(journal, {'r1': {DAY}})
+
+    def test_journal_removed_expenses(self):
+        self.import_expenses(self.get_importer(), [
+            get_expense('r1', DAY, 1),
+            get_expense('r1', DAY + timedelta(days=1), 1),
+            get_expense('r2', DAY + timedelta(hours=2), 2)
+        ])
+        importer = self.get_importer(last_import_at=int(
+            datetime.utcnow().timestamp()) + 1)
+        journal = self.import_expenses(importer, [
+            get_expense('r1', DAY, 1),
+            get_expense('r1', DAY + timedelta(days=2), 1),
+        ])
+        self.assertEqual(journal, {
+            'r1': {DAY + timedelta(days=1), DAY + timedelta(days=2)},
+            'r2': {DAY}
+        })
+        self.assertEqual(self.mongo_raw.count_documents({}), 2)
+
+    def test_cancel_removed_clean_expenses(self):
+        self.mongo_resources.insert_many([
+            {'_id': 'id1', 'cloud_account_id': CLOUD_ACCOUNT_ID,
+             'cloud_resource_id': 'r1', 'deleted_at': 0},
+            {'_id': 'id2', 'cloud_account_id': CLOUD_ACCOUNT_ID,
+             'cloud_resource_id': 'r2', 'deleted_at': 0},
+        ])
+        importer = self.get_importer()
+        self.import_expenses(importer, [get_expense('r1', DAY, 1)])
+        self.clickhouse_cl.execute.side_effect = [
+            [('id2', DAY, 5)], None, [('id2', DAY, 0)]
+        ]
+        importer.cancel_removed_clean_expenses(CLOUD_ACCOUNT_ID, {
+            'r1': {DAY},
+            'r2': {DAY},
+            'r3': {DAY}
+        })
+        # only days without raw expenses of existing resources are read
+        removed_days = self.clickhouse_cl.execute.call_args_list[0][1][
+            'external_tables'][0]['data']
+        self.assertEqual(removed_days, [{'resource_id': 'id2', 'date': DAY}])
+        insert_call = self.clickhouse_cl.execute.call_args_list[1]
+        self.assertEqual(insert_call[0], (
+            'INSERT INTO expenses VALUES',
+            [[CLOUD_ACCOUNT_ID], ['id2'], [DAY], [5], [-1]]))
+        self.assertEqual(self.mongo_resources.find_one(
+            {'_id': 'id2'})['total_cost'], 0)
+        self.assertEqual(importer.expenses_changed_from,
+                         {CLOUD_ACCOUNT_ID: DAY})
@@ -0,0 +1,181 @@
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from diworker.diworker.rollups import (
+    DAY_IN_SECONDS, EXPENSES_ROLLUP, RESOURCES_DIMENSION_MAX_LAG,
+    RESOURCES_DIMENSION_STATE_ID, RESOURCES_DIMENSION_WAIT, RESOURCES_ROLLUP,
+    ROLLUP_DAYS, ROLLUPS, RollupsBuilder, get_changed_rollups)
+
+NOW = 1700000000
+TODAY = NOW // DAY_IN_SECONDS * DAY_IN_SECONDS
+PERIOD_START = TODAY - ROLLUP_DAYS * DAY_IN_SECONDS
+
+
+class StateCollection:
+    def __init__(self):
+        self.states = {}
+
+    def find_one(self, query, *args):
+        state = self.states.get(query['_id'])
+        return dict(state) if state else None
+
+    def update_one(self, query, update, upsert=False):
+        self.states.setdefault(query['_id'], {}).update(update['$set'])
+
+
+class TestRollups(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.builder = RollupsBuilder(MagicMock())
+        self.builder._clickhouse_cl = MagicMock()
+        self.state_collection = StateCollection()
+        patch('diworker.diworker.rollups.RollupsBuilder.state_collection',
+              self.state_collection).start()
+        patch('diworker.diworker.rollups.time.time',
+              return_value=NOW).start()
+        self.addCleanup(patch.stopall)
+
+    def set_state(self, rollup, **state):
+        self.state_collection.states['%s:%s' % (rollup, 'ca')] = {
+            'changes': 0, 'built_changes': 0, 'built_at': NOW - 3600,
+            'start_date': PERIOD_START - DAY_IN_SECONDS, **state}
+
+    def get_builds(self):
+        # rollup -> (build start date, removed rows start date)
+        builds = {}
+        for c in self.builder.clickhouse_cl.execute.call_args_list:
+            query = c.kwargs.get('query', c.args[0])
+            rollup = next(r for r in ROLLUPS if 'INSERT INTO %s' % r in query)
+            start_date = c.kwargs['params']['start_date']
+            builds.setdefault(rollup, []).append(start_date)
+        return builds
+
+    @staticmethod
+    def get_row(**kwargs):
+        row = {
+            'cloud_account_id': 'ca', 'employee_id': 'e', 'pool_id': 'p',
+            'region': 'r', 'service_name': 's', 'resource_type': 't',
+            'is_environment': 0, 'tag_keys': ['a', 'b'], 'deleted_at': 0,
+            'is_deleted': 0, 'first_seen': TODAY, 'last_seen': TODAY + 10
+        }
+        row.update(kwargs)
+        return row
+
+    def test_changed_rollups(self):
+        row = self.get_row()
+        self.assertEqual(get_changed_rollups(None, row), [RESOURCES_ROLLUP])
+        self.assertEqual(get_changed_rollups(row, self.get_row()), [])
+        self.assertEqual(get_changed_rollups(
+            row, self.get_row(tag_keys=['b', 'a'])), [])
+        self.assertEqual(get_changed_rollups(
+            row, self.get_row(last_seen=TODAY + 3600)), [])
+        self.assertEqual(get_changed_rollups(
+            row, self.get_row(last_seen=TODAY + DAY_IN_SECONDS)),
+            [RESOURCES_ROLLUP])
+        for field, value in [('pool_id', 'p2'), ('tag_keys', ['a']),
+                             ('is_environment', 1), ('is_deleted', 1)]:
+            self.assertEqual(get_changed_rollups(
+                row, self.get_row(**{field: value})), ROLLUPS)
+
+    def test_refresh_without_state(self):
+        self.builder.refresh('ca', TODAY - DAY_IN_SECONDS)
+        self.assertEqual(self.get_builds(), {
+            EXPENSES_ROLLUP: [PERIOD_START, PERIOD_START],
+            RESOURCES_ROLLUP: [PERIOD_START, PERIOD_START],
+        })
+        for rollup in ROLLUPS:
+            self.assertEqual(
+                self.state_collection.states['%s:ca' % rollup],
+                {'built_changes': 0, 'built_at': NOW,
+                 'start_date': PERIOD_START})
+
+    def test_refresh_from_changed_date(self):
+        for rollup in ROLLUPS:
+            self.set_state(rollup)
+        self.builder.refresh('ca', TODAY - DAY_IN_SECONDS + 3600)
+        changed_from = TODAY - DAY_IN_SECONDS
+        self.assertEqual(self.get_builds(), {
+            EXPENSES_ROLLUP: [changed_from, changed_from]})
+        for rollup in ROLLUPS:
+            self.assertEqual(
+                self.state_collection.states['%s:ca' % rollup],
+                {'changes': 0, 'built_changes': 0, 'built_at': NOW,
+                 'start_date': PERIOD_START - DAY_IN_SECONDS})
+
+    def test_refresh_changed_before_rollup_period(self):
+        self.set_state(EXPENSES_ROLLUP)
+        self.set_state(RESOURCES_ROLLUP)
+        self.builder.refresh('ca', 0)
+        start_date = PERIOD_START - DAY_IN_SECONDS
+        self.assertEqual(self.get_builds(), {
+            EXPENSES_ROLLUP: [start_date, start_date]})
+
+    def test_refresh_without_expenses(self):
+        for rollup in ROLLUPS:
+            self.set_state(rollup)
+        self.builder.refresh('ca')
+        self.assertEqual(self.get_builds(), {})
+        for rollup in ROLLUPS:
+            self.assertEqual(
+                self.state_collection.states['%s:ca' % rollup]['built_at'],
+                NOW)
+
+    def test_refresh_changed_resources(self):
+        self.set_state(EXPENSES_ROLLUP)
+        self.set_state(RESOURCES_ROLLUP, changes=2, built_changes=1)
+        self.builder.refresh('ca', TODAY)
+        self.assertEqual(self.get_builds(), {
+            EXPENSES_ROLLUP: [TODAY, TODAY],
+            RESOURCES_ROLLUP: [PERIOD_START, PERIOD_START],
+        })
+        self.assertEqual(
+            self.state_collection.states['%s:ca' % RESOURCES_ROLLUP],
+            {'changes': 2, 'built_changes': 2, 'built_at': NOW,
+             'start_date': PERIOD_START})
+
+    def test_merge_requests(self):
+        for imported_at, changed_from in [
+            (NOW - 20, datetime(2023, 11, 10, 5)),
+            (NOW - 10, None),
+            (NOW, datetime(2023, 11, 12)),
+        ]:
+            self.builder.schedule('ca', imported_at, changed_from)
+            self.builder.add_pending(self.builder.requests.get_nowait())
+        self.assertEqual(self.builder.pending, {'ca': {
+            'cloud_account_id': 'ca',
+            'imported_at': NOW,
+            'changed_from': int(datetime(
+                2023, 11, 10, 5, tzinfo=timezone.utc).timestamp()),
+            'scheduled_at': NOW
+        }})
+
+    @patch('diworker.diworker.rollups.RollupsBuilder.refresh')
+    def test_build_pending(self, p_refresh):
+        for cloud_account_id, imported_at, scheduled_at in [
+            ('ca1', NOW - 20, NOW - 20),
+            ('ca2', NOW - 5, NOW - 5),
+            ('ca3', NOW - 5, NOW - RESOURCES_DIMENSION_WAIT),
+        ]:
+            self.builder.pending[cloud_account_id] = {
+                'cloud_account_id': cloud_account_id,
+                'imported_at': imported_at,
+                'changed_from': TODAY,
+                'scheduled_at': scheduled_at
+            }
+        self.state_collection.states[RESOURCES_DIMENSION_STATE_ID] = {
+            'synced_at': NOW - 10}
+        self.builder.build_pending()
+        p_refresh.assert_called_once_with('ca1', TODAY)
+        # ca2 waits for the dimension sync, ca3 waits too long
+        self.assertEqual(list(self.builder.pending), ['ca2'])
+        self.state_collection.states[RESOURCES_DIMENSION_STATE_ID] = {
+            'synced_at': NOW - RESOURCES_DIMENSION_MAX_LAG - 1}
+        self.builder.build_pending()
+        self.assertEqual(self.builder.pending, {})
+        p_refresh.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
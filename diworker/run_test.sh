@@ -16,4 +16,9 @@ docker run -i --rm ${TEST_IMAGE} bash -c \
   "pylint --rcfile=diworker/.pylintrc --fail-under=9 --fail-on=E,F ./diworker"
 echo "<<Pylint tests"
 
+echo "Unit tests>>>"
+docker run -i --rm ${TEST_IMAGE} \
+    bash -c "python3 -m unittest discover ./diworker/diworker/tests"
+echo "<<Unit tests"
+
 docker rmi ${TEST_IMAGE}
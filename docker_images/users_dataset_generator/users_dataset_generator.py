@@ -262,18 +262,20 @@ def main(config_cl):
                 total_saving = 0
                 last_completed = _get_checklist(mydb_cl, org_id)
                 if last_completed:
-                    pipeline = [{
+                    match_stage = {
                         '$match': {'$and': [
                             {'created_at': last_completed},
-                            {'organization_id': org_id}]}}, {
-                        '$unwind': '$data'}, {
+                            {'organization_id': org_id}]}}
+                    group_stage = {
                         '$group': {'_id': '$organization_id',
                                    'total_saving': {'$sum': '$data.saving'}}}
-                    ]
+                    # checklists of previous versions keep data in the
+                    # document
                     savings = list(mongo_cl.restapi.checklists.aggregate(
-                        pipeline))
-                    if savings:
-                        total_saving = savings[0]['total_saving']
+                        [match_stage, {'$unwind': '$data'}, group_stage]))
+                    savings.extend(mongo_cl.restapi.checklist_items.aggregate(
+                        [match_stage, group_stage]))
+                    total_saving = sum(x['total_saving'] for x in savings)
 
                 total_expenses = 0
                 org_acc_ids = list(acc_cost_map.keys())
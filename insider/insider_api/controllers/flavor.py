@@ -1,4 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import cached_property
+import json
 import logging
 import re
 from datetime import datetime
@@ -11,7 +13,8 @@ from tools.cloud_adapter.clouds.gcp import Gcp
 from tools.cloud_adapter.exceptions import (RegionNotFoundException,
                                             ForbiddenException)
 from tools.optscale_exceptions.common_exc import (
-    WrongArgumentsException, ForbiddenException as OptForbidden)
+    WrongArgumentsException, ForbiddenException as OptForbidden,
+    OptException)
 from insider.insider_api.controllers.base import (BaseController,
                                                   BaseAsyncControllerWrapper,
                                                   CachedThreadPoolExecutor,
@@ -20,6 +23,9 @@ from botocore.exceptions import ClientError as AwsClientError
 from insider.insider_api.utils import handle_credentials_error
 
 LOG = logging.getLogger(__name__)   # 12 hours by default
+MAX_BATCH_SIZE = 500
+# every search runs own pool of cloud requests
+BATCH_PARALLEL_SEARCHES = 5
 
 
 class TypeNotMatchedException(Exception):
@@ -29,12 +35,18 @@ class TypeNotMatchedException(Exception):
 class FlavorController(BaseController):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.caller = CachedCloudCaller(self.mongo_client)
+        self._caller = None
         self._aws = None
         self._azure = None
         self._alibaba = None
         self.cloud_account_id = None
 
+    @property
+    def caller(self):
+        if self._caller is None:
+            self._caller = CachedCloudCaller(self.mongo_client)
+        return self._caller
+
     @property
     def aws(self):
         if self._aws is None:
@@ -115,6 +127,46 @@ class FlavorController(BaseController):
         except TypeNotMatchedException:
             return {}
 
+    def _get_batch_controller(self, cloud_account_id):
+        # clouds are initialized with credentials of the cloud account, so
+        # searches for different cloud accounts use own controllers
+        controller = FlavorController(self._config)
+        # mongo client and cloud calls cache are shared with the controller
+        controller._mongo_client = self.mongo_client
+        controller._caller = self.caller
+        controller._rest_client = self._rest_client
+        controller.cloud_account_id = cloud_account_id
+        return controller
+
+    def _find_batch_flavor(self, controller, params):
+        try:
+            return controller.find_flavor(**params), None
+        except OptException as exc:
+            return None, exc
+
+    def find_flavors(self, flavors_params):
+        """
+        Returns (flavor, exception) pairs in the order of flavors_params,
+        equal params are searched once
+        """
+        controllers = {}
+        futures = {}
+        with ThreadPoolExecutor(
+                max_workers=BATCH_PARALLEL_SEARCHES) as executor:
+            for params in flavors_params:
+                key = json.dumps(params, sort_keys=True)
+                if key in futures:
+                    continue
+                cloud_account_id = params.get('cloud_account_id')
+                if cloud_account_id not in controllers:
+                    controllers[cloud_account_id] = self._get_batch_controller(
+                        cloud_account_id)
+                futures[key] = executor.submit(
+                    self._find_batch_flavor, controllers[cloud_account_id],
+                    params)
+        return [futures[json.dumps(params, sort_keys=True)].result()
+                for params in flavors_params]
+
     def get_azure_prices(self, region, instance_family, currency='USD',
                          meter_id=None):
         discoveries = self.discoveries_collection.find(
@@ -81,3 +81,8 @@ class Err(enum.Enum):
     OI0020 = [
         "Forbidden"
     ]
+    OI0021 = [
+        "Batch size should not exceed %s",
+        ['Batch size limit'],
+        [500]
+    ]
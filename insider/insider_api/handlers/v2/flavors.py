@@ -6,12 +6,19 @@ from tools.optscale_exceptions.common_exc import (WrongArgumentsException,
                                                   ForbiddenException)
 from tools.optscale_exceptions.http_exc import OptHTTPError
 
-from insider.insider_api.controllers.flavor import FlavorAsyncController
+from insider.insider_api.controllers.flavor import (
+    FlavorAsyncController, MAX_BATCH_SIZE)
 from insider.insider_api.exceptions import Err
 from insider.insider_api.handlers.v2.base import SecretHandler
 from insider.insider_api.utils import ModelEncoder
 
 LOG = logging.getLogger(__name__)
+ERROR_STATUS_CODES = [
+    (WrongArgumentsException, 400),
+    (NotFoundException, 404),
+    (UnauthorizedException, 401),
+    (ForbiddenException, 403),
+]
 
 
 class FlavorsHandler(SecretHandler):
@@ -226,3 +233,122 @@ class FlavorsHandler(SecretHandler):
             raise OptHTTPError.from_opt_exception(403, ex)
         self.set_status(200)
         self.write(json.dumps(res, cls=ModelEncoder))
+
+
+class FlavorsBatchHandler(FlavorsHandler):
+    @staticmethod
+    def _error_result(error):
+        return {
+            'status_code': error.status_code,
+            'error': {
+                'status_code': error.status_code,
+                'error_code': error.error_code,
+                'reason': error.reason,
+                'params': error.params,
+            }
+        }
+
+    @classmethod
+    def _search_result(cls, flavor, exc):
+        if exc is None:
+            return {'status_code': 200, 'flavor': flavor}
+        for exc_class, status_code in ERROR_STATUS_CODES:
+            if isinstance(exc, exc_class):
+                return cls._error_result(
+                    OptHTTPError.from_opt_exception(status_code, exc))
+        raise exc
+
+    async def post(self, **kwargs):
+        """
+        ---
+        tags: [flavors]
+        summary: Returns suitable flavors for the list of searches
+        description: |
+            Returns suitable flavors for the list of searches, every search
+            has the same parameters as a single flavor search and is
+            processed separately
+            Required permission: cluster secret
+        parameters:
+        -   in: body
+            name: body
+            description: Flavors search parameters
+            required: true
+            schema:
+                type: object
+                required: [flavors]
+                properties:
+                    flavors:
+                        type: array
+                        description: "list of flavor search parameters
+                            (up to 500), see flavors search"
+                        items: {type: object}
+        responses:
+            200:
+                description: |
+                    search results in the order of searches, a result has
+                    the flavor if it's found or the error of the search
+                schema:
+                    type: object
+                    properties:
+                        flavors:
+                            type: array
+                            items:
+                                type: object
+                    example:
+                        flavors:
+                        -   status_code: 200
+                            flavor:
+                                cpu: 4
+                                ram: 8192
+                                flavor: t4.medium
+                                price: 0.05
+                        -   status_code: 400
+                            error:
+                                status_code: 400
+                                error_code: OI0012
+                                reason: Region test is not available
+                                params: [test]
+            400:
+                description: |
+                    Wrong arguments:
+                    - OI0004: Incorrect request body received
+                    - OI0008: Invalid flavors
+                    - OI0011: Required argument is not provided
+                    - OI0021: Batch size should not exceed limit
+            401:
+                description: |
+                    Unauthorized:
+                    - OI0007: This resource requires authorization
+            403:
+                description: |
+                    Forbidden:
+                    - OI0005: Bad secret
+        security:
+        - secret: []
+        """
+        self.check_cluster_secret()
+        body = self._request_body()
+        if not isinstance(body, dict):
+            raise OptHTTPError(400, Err.OI0004, [])
+        flavors_params = body.get('flavors')
+        if flavors_params is None:
+            raise OptHTTPError(400, Err.OI0011, ['flavors'])
+        if not isinstance(flavors_params, list):
+            raise OptHTTPError(400, Err.OI0008, ['flavors'])
+        if len(flavors_params) > MAX_BATCH_SIZE:
+            raise OptHTTPError(400, Err.OI0021, [MAX_BATCH_SIZE])
+        LOG.info('Received %s flavor searches', len(flavors_params))
+        results = [None] * len(flavors_params)
+        valid_indexes = []
+        for i, params in enumerate(flavors_params):
+            try:
+                self.validate_parameters(params)
+                valid_indexes.append(i)
+            except OptHTTPError as exc:
+                results[i] = self._error_result(exc)
+        found = await self.controller.find_flavors(
+            [flavors_params[i] for i in valid_indexes])
+        for i, (flavor, exc) in zip(valid_indexes, found):
+            results[i] = self._search_result(flavor, exc)
+        self.set_status(200)
+        self.write(json.dumps({'flavors': results}, cls=ModelEncoder))
@@ -28,6 +28,8 @@ def get_handlers(handler_kwargs):
         (urls_v2.similar_pricings,
          handlers.similar_pricings.SimilarPricingsHandler, handler_kwargs),
         (urls_v2.flavors, handlers.flavors.FlavorsHandler, handler_kwargs),
+        (urls_v2.flavors_batch, handlers.flavors.FlavorsBatchHandler,
+         handler_kwargs),
         (urls_v2.flavors_generation,
          handlers.flavors_generation.FlavorsGenerationHandler, handler_kwargs),
         (urls_v2.flavor_prices,
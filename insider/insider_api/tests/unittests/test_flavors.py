@@ -3,8 +3,14 @@ from unittest.mock import patch
 from datetime import datetime
 import mongomock
 import optscale_client.insider_client.client as insider_client
+from tools.optscale_exceptions.common_exc import WrongArgumentsException
+from insider.insider_api.controllers.base import BaseController
+from insider.insider_api.controllers.flavor import FlavorController
+from insider.insider_api.exceptions import Err
 from insider.insider_api.tests.unittests.test_api_base import TestBase
 
+MONGO_CLIENT_PROPERTY = BaseController.mongo_client
+
 
 class TestFlavorsApi(TestBase):
     def setUp(self):
@@ -343,3 +349,85 @@ class TestFlavorsApi(TestBase):
         }
         code, _ = self.client.find_flavor(**nebius_params)
         self.assertEqual(code, 200)
+
+    def test_flavors_batch(self):
+        self.find_aws_flavor.return_value = {
+            'cpu': 2, 'ram': 2048, 'flavor': 't2.small', 'price': 0.02}
+        invalid_params = self.valid_params.copy()
+        invalid_params['mode'] = 'test'
+        code, resp = self.client.find_flavors(
+            [self.valid_params, invalid_params, self.valid_params])
+        self.assertEqual(code, 200)
+        results = resp['flavors']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], {
+            'status_code': 200, 'flavor': self.find_aws_flavor.return_value})
+        self.assertEqual(results[2], results[0])
+        self.assertEqual(results[1]['status_code'], 400)
+        self.verify_error_code(results[1], 'OI0008')
+        # equal searches are processed once
+        self.assertEqual(self.find_aws_flavor.call_count, 1)
+
+    def test_flavors_batch_search_errors(self):
+        self.find_aws_flavor.side_effect = WrongArgumentsException(
+            Err.OI0012, ['test'])
+        code, resp = self.client.find_flavors([self.valid_params])
+        self.assertEqual(code, 200)
+        self.assertEqual(resp['flavors'][0]['status_code'], 400)
+        self.verify_error_code(resp['flavors'][0], 'OI0012')
+
+    def test_flavors_batch_cloud_accounts(self):
+        get_batch_controller = patch.object(
+            FlavorController, '_get_batch_controller', autospec=True,
+            side_effect=FlavorController._get_batch_controller).start()
+        params = []
+        for cloud_account_id in ['1', '2', '1', None]:
+            params.append(self.valid_params.copy())
+            params[-1]['cloud_account_id'] = cloud_account_id
+        code, resp = self.client.find_flavors(params)
+        self.assertEqual(code, 200)
+        self.assertEqual(len(resp['flavors']), 4)
+        self.assertEqual(self.find_aws_flavor.call_count, 3)
+        # searches of a cloud account share the controller
+        self.assertEqual([x[0][1] for x in get_batch_controller.call_args_list],
+                         ['1', '2', None])
+
+    def test_flavors_batch_mongo_client(self):
+        mongo_client = patch(
+            'insider.insider_api.controllers.base.MongoClient',
+            return_value=self.mongo_client).start()
+        # clients are created by the property patched by the test base
+        patch.object(BaseController, 'mongo_client',
+                     MONGO_CLIENT_PROPERTY).start()
+        patch('optscale_client.config_client.client.Client.mongo_params',
+              return_value=('user', 'pass', 'host', 27017, 'db')).start()
+        params = []
+        for cloud_account_id in ['1', '2', '3', None]:
+            params.append(self.valid_params.copy())
+            params[-1]['cloud_account_id'] = cloud_account_id
+        for _ in range(2):
+            code, resp = self.client.find_flavors(params)
+            self.assertEqual(code, 200)
+            self.assertEqual(len(resp['flavors']), 4)
+        # controllers of cloud accounts use the client of the request
+        self.assertEqual(mongo_client.call_count, 2)
+
+    def test_flavors_batch_invalid(self):
+        for body, error_code in [
+                ({}, 'OI0011'),
+                ({'flavors': 'test'}, 'OI0008'),
+                ({'flavors': [self.valid_params] * 501}, 'OI0021')]:
+            code, resp = self.client.post('flavors/batch', body)
+            self.assertEqual(code, 400)
+            self.verify_error_code(resp, error_code)
+        code, resp = self.client.post('flavors/batch', [])
+        self.assertEqual(code, 400)
+        self.verify_error_code(resp, 'OI0004')
+
+    def test_flavors_batch_bad_secret(self):
+        http_provider = insider_client.FetchMethodHttpProvider(
+            self.fetch, rethrow=False, secret='123')
+        client = insider_client.Client(http_provider=http_provider)
+        code, resp = client.find_flavors([self.valid_params])
+        self.assertEqual(code, 403)
+        self.verify_error_code(resp, 'OI0005')
@@ -4,6 +4,7 @@ class Urls:
     urls_map = {
         'similar_pricings': r"%s/cloud_types/(?P<cloud_type>[^/]+)/pricings/(?P<pricing_id>[^/]+)/similar",
         'flavors': r"%s/flavors",
+        'flavors_batch': r"%s/flavors/batch",
         'flavors_generation': r"%s/flavors_generation",
         'flavor_prices': r"%s/cloud_types/(?P<cloud_type>[^/]+)/flavor_prices",
         'family_prices': r"%s/cloud_types/(?P<cloud_type>[^/]+)/family_prices",
@@ -183,6 +183,9 @@ etcd:
     user: {{ .Values.clickhouse.db.user }}
     password: {{ .Values.clickhouse.db.password }}
     db: {{ .Values.clickhouse.db.name }}
+  redis:
+    host: {{ .Values.redis.service.name }}
+    port: {{ .Values.redis.service.externalPort }}
   cleanmongodb:
     chunk_size: {{ .Values.cleanmongodb.chunk_size }}
     rows_limit: {{ .Values.cleanmongodb.rows_limit }}
@@ -235,6 +238,13 @@ etcd:
     timeout: {{ .Values.resource_discovery_settings.timeout }}
     writing_timeout: {{ .Values.resource_discovery_settings.writing_timeout }}
     observe_timeout: {{ .Values.resource_discovery_settings.observe_timeout }}
+  diworker_settings:
+    import_workers: {{ .Values.diworker_settings.import_workers }}
+    report_workers: {{ .Values.diworker_settings.report_workers }}
+    raw_write_mode: {{ .Values.diworker_settings.raw_write_mode }}
+    clean_chunk_size: {{ .Values.diworker_settings.clean_chunk_size }}
+    clean_workers: {{ .Values.diworker_settings.clean_workers }}
+    azure_usage_workers: {{ .Values.diworker_settings.azure_usage_workers }}
   bi_settings:
     exporter_run_period: {{ .Values.bi_settings.exporter_run_period }}
     encryption_key: {{ .Values.bi_settings.encryption_key }}
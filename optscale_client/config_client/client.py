@@ -443,6 +443,14 @@ class Client(etcd.Client):
         return (params['user'], params['password'], params['host'],
                 params['db'])
 
+    def redis_params(self):
+        """
+        Get tuple with access args for redis
+        :return: ('host', 'port')
+        """
+        params = self.read_branch('/redis')
+        return params['host'], int(params['port'])
+
     def zoho_params(self):
         """
         Get tuple with args for registered app for OAuth2.0
@@ -532,3 +540,13 @@ class Client(etcd.Client):
         Get settings for bi scheduler and exporter
         """
         return self.read_branch('/bi_settings')
+
+    def diworker_settings(self):
+        """
+        Get settings for diworker
+        :return: dict
+        """
+        try:
+            return self.read_branch('/diworker_settings')
+        except etcd.EtcdKeyNotFound:
+            return {}
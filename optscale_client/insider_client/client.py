@@ -165,6 +165,13 @@ class Client:
         body.update(kwargs)
         return self.post(self.flavors_url(), body)
 
+    @staticmethod
+    def flavors_batch_url():
+        return 'flavors/batch'
+
+    def find_flavors(self, flavors):
+        return self.post(self.flavors_batch_url(), {'flavors': flavors})
+
     @staticmethod
     def flavor_prices_url(cloud_type):
         return '%s/flavor_prices' % Client.cloud_type_url(cloud_type)
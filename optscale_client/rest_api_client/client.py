@@ -172,6 +172,8 @@ class Client:
                 url, token, secret, verify)
         self._http_provider = http_provider
         self._api_version = api_version
+        # number of requests made by the client, retries are not counted
+        self.request_count = 0
 
     @property
     def token(self):
@@ -193,6 +195,7 @@ class Client:
         return "/restapi/%s/%s" % (self._api_version, sub_url)
 
     def _request(self, url, method, body=None):
+        self.request_count += 1
         data = None
         if body is not None:
             data = json.dumps(body)
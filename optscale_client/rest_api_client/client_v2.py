@@ -2203,3 +2203,10 @@ class Client(Client_v1):
     def restore_password(self, email):
         url = self.restore_password_url()
         return self.post(url, {'email': email})
+
+    @staticmethod
+    def connection_stats_url():
+        return 'connection_stats'
+
+    def connection_stats_get(self):
+        return self.get(self.connection_stats_url())
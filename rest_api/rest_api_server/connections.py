@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+
+from clickhouse_driver import Client as ClickHouseClient
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+from redis import Redis
+
+from rest_api.rest_api_server.utils import (
+    Config, EXECUTOR_WORKERS, HEAVY_EXECUTOR_WORKERS)
+
+LOG = logging.getLogger(__name__)
+# enough for every worker of tp_executor and tp_executor_heavy to hold a
+# connection
+CLICKHOUSE_POOL_SIZE = EXECUTOR_WORKERS + HEAVY_EXECUTOR_WORKERS
+CLICKHOUSE_POOL_TIMEOUT = 60
+# redis database of the result cache, default database is used by ngui
+REDIS_DB = 1
+REDIS_TIMEOUT = 1
+
+
+class ClickHousePoolTimeout(Exception):
+    pass
+
+
+class ClickHousePool:
+    """
+    Bounded pool of clickhouse clients for one database. A client is
+    checked out for a single query, so the pool is shared by all executor
+    threads of the process.
+    """
+    def __init__(self, database, size=CLICKHOUSE_POOL_SIZE,
+                 timeout=CLICKHOUSE_POOL_TIMEOUT):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._idle = LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0
+        self._timeouts = 0
+
+    def _create_client(self):
+        user, password, host, db_name = Config().clickhouse_params
+        return ClickHouseClient(host=host, password=password,
+                                database=self.database or db_name, user=user)
+
+    def _checkout(self):
+        with self._lock:
+            self._checkouts += 1
+            create = False
+            try:
+                client = self._idle.get_nowait()
+            except Empty:
+                client = None
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+                else:
+                    self._waits += 1
+            if client is not None or create:
+                self._in_use += 1
+        if client is not None:
+            return client
+        if create:
+            try:
+                return self._create_client()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                    self._in_use -= 1
+                raise
+        started_at = time.time()
+        try:
+            client = self._idle.get(timeout=self.timeout)
+        except Empty as exc:
+            with self._lock:
+                self._timeouts += 1
+            raise ClickHousePoolTimeout(
+                'No free clickhouse connection in %s seconds' % self.timeout
+            ) from exc
+        finally:
+            with self._lock:
+                self._wait_time += time.time() - started_at
+        with self._lock:
+            self._in_use += 1
+        return client
+
+    def _checkin(self, client, broken=False):
+        if broken:
+            # the connection state is unknown after a failure, the client
+            # reconnects on the next query
+            client.disconnect()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(client)
+
+    @contextmanager
+    def connection(self):
+        client = self._checkout()
+        try:
+            yield client
+        except BaseException:
+            self._checkin(client, broken=True)
+            raise
+        self._checkin(client)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': self._created - self._in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 3),
+                'timeouts': self._timeouts,
+            }
+
+
+class MongoPoolListener(ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'checkins': 0,
+            'checkout_failures': 0,
+        }
+
+    def _increase(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def connection_created(self, event):
+        self._increase('created')
+
+    def connection_closed(self, event):
+        self._increase('closed')
+
+    def connection_checked_out(self, event):
+        self._increase('checkouts')
+
+    def connection_checked_in(self, event):
+        self._increase('checkins')
+
+    def connection_check_out_failed(self, event):
+        self._increase('checkout_failures')
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            counters = self.counters.copy()
+        counters['open'] = counters['created'] - counters['closed']
+        counters['in_use'] = counters['checkouts'] - counters['checkins']
+        return counters
+
+
+class ConnectionRegistry:
+    """
+    Database clients shared by all controllers of the process. MongoClient
+    and Redis keep their own connection pools, clickhouse clients are pooled
+    per database.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mongo_client = None
+        self._redis_client = None
+        self._mongo_listener = MongoPoolListener()
+        self._clickhouse_pools = {}
+
+    @property
+    def mongo_client(self):
+        if self._mongo_client is None:
+            with self._lock:
+                if self._mongo_client is None:
+                    mongo_params = Config().mongo_params
+                    mongo_conn_string = "mongodb://%s:%s@%s:%s" % (
+                        mongo_params[:-1])
+                    self._mongo_client = MongoClient(
+                        mongo_conn_string,
+                        event_listeners=[self._mongo_listener])
+        return self._mongo_client
+
+    @property
+    def redis_client(self):
+        if self._redis_client is None:
+            with self._lock:
+                if self._redis_client is None:
+                    host, port = Config().redis_params
+                    self._redis_client = Redis(
+                        host=host, port=port, db=REDIS_DB,
+                        socket_timeout=REDIS_TIMEOUT,
+                        socket_connect_timeout=REDIS_TIMEOUT)
+        return self._redis_client
+
+    def clickhouse_pool(self, database=None):
+        pool = self._clickhouse_pools.get(database)
+        if pool is None:
+            with self._lock:
+                pool = self._clickhouse_pools.setdefault(
+                    database, ClickHousePool(database))
+        return pool
+
+    def stats(self):
+        return {
+            'mongo': self._mongo_listener.stats(),
+            'clickhouse': {
+                database or 'default': pool.stats()
+                for database, pool in list(self._clickhouse_pools.items())
+            },
+            'config': Config().stats(),
+        }
+
+
+connection_registry = ConnectionRegistry()
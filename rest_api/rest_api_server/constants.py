@@ -226,7 +226,8 @@ class UrlsV2(Urls):
             r"artifacts/(?P<artifact_id>[^/]+)",
         'tags_collection': r"%s/organizations/(?P<organization_id>[^/]+)/"
                            r"tasks/(?P<task_id>[^/]+)/tags",
-        'restore_password': r"%s/restore_password"
+        'restore_password': r"%s/restore_password",
+        'connection_stats': r"%s/connection_stats",
     })
 
 
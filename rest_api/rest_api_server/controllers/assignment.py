@@ -17,6 +17,7 @@ from rest_api.rest_api_server.exceptions import Err
 from rest_api.rest_api_server.models.enums import AssignmentRequestStatuses
 from rest_api.rest_api_server.models.models import (
     CloudAccount, Pool, Employee, AssignmentRequest)
+from rest_api.rest_api_server.result_cache import result_cache
 from rest_api.rest_api_server.utils import (
     check_string_attribute, raise_not_provided_exception,
     raise_does_not_exist_exception, check_int_attribute)
@@ -235,6 +236,7 @@ class AssignmentController(BaseController, MongoMixin):
             owner_id=owner.id,
         )
         assignment = self.create(**assignment_info)
+        result_cache.bump_generation(organization_id)
         self.publish_bulk_assignment_activity([assignment_info])
         return assignment
 
@@ -5,6 +5,7 @@ from rest_api.rest_api_server.controllers.base_async import BaseAsyncControllerW
 from tools.optscale_exceptions.common_exc import (
     WrongArgumentsException, ForbiddenException)
 from rest_api.rest_api_server.exceptions import Err
+from rest_api.rest_api_server.result_cache import result_cache
 from rest_api.rest_api_server.utils import (
     check_string_attribute, raise_not_provided_exception,
     raise_does_not_exist_exception, check_list_attribute, check_int_attribute)
@@ -152,6 +153,7 @@ class AssignmentBulkController(AssignmentController):
         if not assignments_bulk:
             return result
         self._bulk_create(assignments_bulk)
+        result_cache.bump_generation(organization_id)
         self.publish_bulk_assignment_activity(assignments_bulk)
         requests = self.invalidate_requests(assigned_resource_ids)
         self.session.bulk_save_objects(requests)
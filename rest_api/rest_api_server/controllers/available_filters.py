@@ -10,6 +10,13 @@ DAY_IN_SECONDS = 86400
 
 class AvailableFiltersController(CleanExpenseController):
     JOIN_TRAFFIC_EXPENSES = False
+    # filter values are collected from clickhouse resources_dimension if
+    # it's possible for the request filters
+    RESOURCES_DIMENSION = True
+    COLLECTED_FILTERS = [
+        'service_name', 'pool_id', 'employee_id', 'k8s_node', 'region',
+        'resource_type', 'k8s_namespace', 'k8s_service', 'cloud_account_id'
+    ]
 
     def split_params(self, organization_id, params):
         query_filters, data_filters, extra_filters = self._split_params(
@@ -46,11 +53,69 @@ class AvailableFiltersController(CleanExpenseController):
             organization_id)
         entities = self._get_join_entities(
             organization_id, organization_cloud_accs)
-        unique_values = self.collect_unique_values(resources_data, entities)
+        unique_values = self.collect_unique_values(
+            resources_data, entities, kwargs.get('dimension_condition'))
         filter_values = self.get_filter_values(unique_values, input_filters)
         return self._get_base_result(filter_values)
 
-    def collect_unique_values(self, resource_data, entities):
+    def process_dimension_data(self, condition, organization_id, filters,
+                               **kwargs):
+        resources_data = self.get_dimension_resources_data(
+            condition, kwargs['last_recommend_run'])
+        return self.process_data(resources_data, organization_id, filters,
+                                 dimension_condition=condition)
+
+    def generate_dimension_condition(self, organization_id, start_date,
+                                     end_date, params, data_filters):
+        condition = super().generate_dimension_condition(
+            organization_id, start_date, end_date, params, data_filters)
+        if condition is not None:
+            condition.add("cluster_id = ''")
+        return condition
+
+    def get_dimension_resources_data(self, condition, last_recommend_run):
+        """
+        Returns the same data as _aggregate_resource_data collected from
+        resources_dimension in one pass
+        """
+        result = self.execute_clickhouse(
+            query="""
+                SELECT
+                    cloud_account_id, cluster_type_id, is_environment,
+                    %s,
+                    groupUniqArray(active),
+                    groupUniqArray(constraint_violated),
+                    groupUniqArray(recommendations_run_timestamp != 0 AND
+                        recommendations_run_timestamp >= %%(last_run)s),
+                    groupUniqArrayArray(tag_keys)
+                FROM resources_dimension FINAL
+                WHERE %s
+                GROUP BY cloud_account_id, cluster_type_id, is_environment
+            """ % (', '.join('groupUniqArray(%s)' % f
+                             for f in self.COLLECTED_FILTERS), condition),
+            params={'last_run': last_recommend_run, **condition.params})
+        resources_data = []
+        for row in result:
+            cloud_account_id, cluster_type_id, is_environment = row[:3]
+            data = {'_id': {
+                'cloud_account_id': cloud_account_id or None,
+                'cluster_type_id': cluster_type_id or None,
+                'is_environment': bool(is_environment)
+            }}
+            values = row[3:]
+            for field, field_values in zip(self.COLLECTED_FILTERS, values):
+                # empty string is a missing value in resources_dimension
+                data[field] = [v or None for v in field_values]
+            for field, field_values in zip(
+                    ['active', 'constraint_violated', 'recommendations'],
+                    values[len(self.COLLECTED_FILTERS):]):
+                data[field] = [bool(v) for v in field_values]
+            data['tags'] = values[-1]
+            resources_data.append(data)
+        return resources_data
+
+    def collect_unique_values(self, resource_data, entities,
+                              dimension_condition=None):
         result = defaultdict(dict)
         r_sets = defaultdict(set)
         cl_resource_acc_type_map = {}
@@ -106,12 +171,29 @@ class AvailableFiltersController(CleanExpenseController):
             for entity_id, entity in entities_dict.items():
                 result[entity_name].update({
                     entity_id: {f: entity[f] for f in fields}})
-        if cl_resource_acc_type_map:
+        if dimension_condition is not None:
+            result.update(self.get_dimension_traffic_filters(
+                entities.get('cloud_account_id', {}), dimension_condition))
+        elif cl_resource_acc_type_map:
             result.update(self.get_traffic_filters(
                 list(result['cloud_account'].keys()),
                 cl_resource_acc_type_map))
         return result
 
+    @staticmethod
+    def _get_traffic_filter_values(traffic_filters):
+        result_set = defaultdict(set)
+        for cloud_type, _from, _to in traffic_filters:
+            result_set['traffic_from'].add((cloud_type, _from))
+            result_set['traffic_to'].add((cloud_type, _to))
+        result = {}
+        for k, values in result_set.items():
+            regions = [{'name': v[1], 'cloud_type': v[0]} for v in values]
+            if regions:
+                regions.append('ANY')
+            result[k] = regions
+        return result
+
     def get_traffic_filters(self, cloud_account_ids, cl_resource_acc_type_map):
         res_filters = self.execute_clickhouse(
             query="""
@@ -142,17 +224,35 @@ class AvailableFiltersController(CleanExpenseController):
                 }
             ]
         )
-        result_set = defaultdict(set)
-        for (cloud_type, _from, _to), in res_filters:
-            result_set['traffic_from'].add((cloud_type, _from))
-            result_set['traffic_to'].add((cloud_type, _to))
-        result = {}
-        for k, values in result_set.items():
-            regions = [{'name': v[1], 'cloud_type': v[0]} for v in values]
-            if regions:
-                regions.append('ANY')
-            result[k] = regions
-        return result
+        return self._get_traffic_filter_values(x for x, in res_filters)
+
+    def get_dimension_traffic_filters(self, cloud_accounts, condition):
+        if not cloud_accounts:
+            return {}
+        res_filters = self.execute_clickhouse(
+            query="""
+                SELECT DISTINCT cloud_account_id, from, to
+                FROM traffic_expenses
+                WHERE cloud_account_id IN %%(cloud_account_ids)s
+                    AND date >= %%(start_date)s
+                    AND date <= %%(end_date)s
+                    AND (cloud_account_id, resource_id) IN (
+                        SELECT cloud_account_id, cloud_resource_id
+                        FROM resources_dimension FINAL
+                        WHERE %s)
+            """ % condition,
+            params={
+                'start_date': self.start_date,
+                'end_date': self.end_date,
+                'cloud_account_ids': list(cloud_accounts.keys()),
+                **condition.params
+            })
+        traffic_filters = []
+        for cloud_account_id, _from, _to in res_filters:
+            cloud_type = cloud_accounts.get(cloud_account_id, {}).get('type')
+            if cloud_type:
+                traffic_filters.append((cloud_type, _from, _to))
+        return self._get_traffic_filter_values(traffic_filters)
 
     def generate_filters_pipeline(self, organization_id, start_date, end_date,
                                   params, data_filters):
@@ -192,13 +292,9 @@ class AvailableFiltersController(CleanExpenseController):
 
     def _aggregate_resource_data(self, match_query, **kwargs):
         last_recommend_run = kwargs['last_recommend_run']
-        collected_filters = [
-            'service_name', 'pool_id', 'employee_id', 'k8s_node', 'region',
-            'resource_type', 'k8s_namespace', 'k8s_service', 'cloud_account_id'
-        ]
         group_stage = {
             f: {'$addToSet': {'$ifNull': ['$%s' % f, None]}}
-            for f in collected_filters
+            for f in self.COLLECTED_FILTERS
         }
         for bool_field in ['active', 'constraint_violated']:
             group_stage.update({
@@ -228,21 +324,27 @@ class AvailableFiltersController(CleanExpenseController):
                 'day': {'$trunc': {
                     '$divide': ['$first_seen', DAY_IN_SECONDS]}},
             },
-            'tags': {'$addToSet': '$tags.k'},
+            # resources aren't unwound by tags, sets of tag keys are
+            # collected and merged after grouping
+            'tags': {'$addToSet': {'$map': {
+                'input': {'$objectToArray': {'$ifNull': ['$tags', {}]}},
+                'in': '$$this.k'
+            }}},
             'cloud_resource_ids': {'$addToSet': '$cloud_resource_id'},
         })
         return self.resources_collection.aggregate([
             {'$match': match_query},
-            {'$addFields': {'tags': {'$objectToArray': "$tags"}}},
-            {'$unwind': {
-                'path': "$tags",
-                'preserveNullAndEmptyArrays': True
-            }},
-            {'$group': group_stage}
+            {'$group': group_stage},
+            {'$addFields': {'tags': {'$reduce': {
+                'input': '$tags',
+                'initialValue': [],
+                'in': {'$setUnion': ['$$value', '$$this']}
+            }}}}
         ], allowDiskUse=True)
 
 
 class AvailableFiltersAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
 
     def _get_controller_class(self):
         return AvailableFiltersController
@@ -1,11 +1,11 @@
 import hashlib
 import logging
 import threading
-from clickhouse_driver import Client as ClickHouseClient
+import time
+from collections import defaultdict
 from datetime import datetime
 from kombu import Connection as QConnection, Exchange
 from kombu.pools import producers
-from pymongo import MongoClient
 import requests
 from retrying import retry
 from sqlalchemy.exc import IntegrityError, ResourceClosedError
@@ -15,6 +15,7 @@ from optscale_client.auth_client.client_v2 import Client as AuthClient
 from tools.optscale_exceptions.common_exc import (
     WrongArgumentsException, FailedDependency, ConflictException,
     UnauthorizedException, NotFoundException)
+from rest_api.rest_api_server.connections import connection_registry
 from rest_api.rest_api_server.exceptions import Err
 from rest_api.rest_api_server.models.models import (
     PermissionKeys, Checklist, CloudAccount, Organization, ProfilingToken)
@@ -33,6 +34,9 @@ PRIORITY_RETRIES = dict(
     retry_on_exception=should_retry)
 RETRY_POLICY = {'max_retries': 15, 'interval_start': 0,
                 'interval_step': 1, 'interval_max': 3}
+RESOURCES_DIMENSION_STATE_ID = 'resources_dimension'
+RESOURCES_DIMENSION_MAX_LAG = 600
+ROLLUP_STATE_ID = '%s:%s'
 
 
 class PriorityMixin:
@@ -195,17 +199,9 @@ class ResourceFormatMixin:
 
 
 class MongoMixin:
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._mongo_client = None
-
     @property
     def mongo_client(self):
-        if not self._mongo_client:
-            mongo_params = Config().mongo_params
-            mongo_conn_string = "mongodb://%s:%s@%s:%s" % mongo_params[:-1]
-            self._mongo_client = MongoClient(mongo_conn_string)
-        return self._mongo_client
+        return connection_registry.mongo_client
 
     @property
     def resources_collection(self):
@@ -215,6 +211,10 @@ class MongoMixin:
     def checklists_collection(self):
         return self.mongo_client.restapi.checklists
 
+    @property
+    def checklist_items_collection(self):
+        return self.mongo_client.restapi.checklist_items
+
     @property
     def raw_expenses_collection(self):
         return self.mongo_client.restapi.raw_expenses
@@ -229,20 +229,133 @@ class MongoMixin:
 
 
 class ClickHouseMixin:
+    # None means the database from clickhouse config
+    CLICKHOUSE_DATABASE = None
+
+    def execute_clickhouse(self, query, **params):
+        pool = connection_registry.clickhouse_pool(self.CLICKHOUSE_DATABASE)
+        with pool.connection() as clickhouse_client:
+            return clickhouse_client.execute(query=query, **params)
+
+
+class ClickHouseCondition:
+    """
+    Clickhouse WHERE condition built from parts with generated parameter
+    names, so several conditions can be used in one query.
+    """
+    def __init__(self, prefix='cond'):
+        self.prefix = prefix
+        self.parts = []
+        self.params = {}
+
+    def param(self, value):
+        name = '%s_%s' % (self.prefix, len(self.params))
+        self.params[name] = value
+        return '%%(%s)s' % name
+
+    def add(self, part):
+        self.parts.append(part)
+
+    def add_in(self, column, values):
+        if not values:
+            self.add('0')
+        else:
+            self.add('%s IN %s' % (column, self.param(list(values))))
+
+    def __str__(self):
+        return ' AND '.join('(%s)' % p for p in self.parts) or '1'
+
+
+class ClusteredResourcesMap(dict):
+    """
+    Clustered resource id -> cluster id map. Resource ids are also indexed
+    by cluster id, so clusters of the map are checked without scanning
+    its values.
+    """
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._clickhouse_client = None
+        super().__init__()
+        self.cluster_resources = defaultdict(set)
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, resource_id, cluster_id):
+        if resource_id in self:
+            self._unindex(resource_id)
+        super().__setitem__(resource_id, cluster_id)
+        self.cluster_resources[cluster_id].add(resource_id)
+
+    def __delitem__(self, resource_id):
+        self._unindex(resource_id)
+        super().__delitem__(resource_id)
+
+    def _unindex(self, resource_id):
+        cluster_id = self[resource_id]
+        resource_ids = self.cluster_resources[cluster_id]
+        resource_ids.discard(resource_id)
+        if not resource_ids:
+            del self.cluster_resources[cluster_id]
+
+    def update(self, *args, **kwargs):
+        for resource_id, cluster_id in dict(*args, **kwargs).items():
+            self[resource_id] = cluster_id
+
+    def pop(self, resource_id, *default):
+        if resource_id in self:
+            self._unindex(resource_id)
+        return super().pop(resource_id, *default)
+
+    def has_cluster(self, cluster_id):
+        return cluster_id in self.cluster_resources
 
     @property
-    def clickhouse_client(self):
-        if not self._clickhouse_client:
-            user, password, host, db_name = Config().clickhouse_params
-            self._clickhouse_client = ClickHouseClient(
-                host=host, password=password, database=db_name, user=user)
-        return self._clickhouse_client
-
-    def execute_clickhouse(self, query, **params):
-        return self.clickhouse_client.execute(query=query, **params)
+    def cluster_ids(self):
+        return self.cluster_resources.keys()
+
+
+class ResourcesDimensionMixin:
+    """
+    The mixin requires MongoMixin. resources_dimension clickhouse table is
+    replicated from mongo resources by diworker, it lets expenses be
+    filtered and grouped by resource fields in clickhouse instead of
+    sending resource ids with every query. The table is used only while
+    the replication is alive.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._resources_dimension_synced = None
+
+    def resources_dimension_synced(self):
+        if self._resources_dimension_synced is None:
+            state = self.mongo_client.restapi.clickhouse_sync.find_one(
+                {'_id': RESOURCES_DIMENSION_STATE_ID}, ['synced_at'])
+            synced_at = (state or {}).get('synced_at') or 0
+            self._resources_dimension_synced = (
+                synced_at >= time.time() - RESOURCES_DIMENSION_MAX_LAG)
+        return self._resources_dimension_synced
+
+
+class RollupsMixin:
+    """
+    The mixin requires MongoMixin. Daily expenses and resources rollups are
+    built by diworker for every cloud account after the report import. A
+    rollup is actual if it's built after the last import and resources of
+    the cloud account aren't changed since then.
+    """
+    def rollups_ready(self, rollups, cloud_accounts, start_date):
+        state_ids = [ROLLUP_STATE_ID % (rollup, cloud_account.id)
+                     for rollup in rollups for cloud_account in cloud_accounts]
+        states = {
+            x['_id']: x for x in self.mongo_client.restapi.clickhouse_sync.find(
+                {'_id': {'$in': state_ids}})
+        }
+        for rollup in rollups:
+            for cloud_account in cloud_accounts:
+                state = states.get(ROLLUP_STATE_ID % (rollup, cloud_account.id))
+                if (not state or
+                        state.get('built_changes') != state.get('changes', 0) or
+                        state['built_at'] < (cloud_account.last_import_at or 0) or
+                        state['start_date'] > start_date):
+                    return False
+        return True
 
 
 class FilterValidationMixin(SupportedFiltersMixin):
@@ -332,12 +445,9 @@ class BaseController:
                         self.model_type.__table__.columns))
 
     def on_finish(self):
-        clickhouse_cl = getattr(self, '_clickhouse_client', None)
-        if clickhouse_cl is not None:
-            clickhouse_cl.disconnect()
-        mongo_cl = getattr(self, '_mongo_client', None)
-        if mongo_cl is not None:
-            mongo_cl.close()
+        # mongo and clickhouse clients are shared by the process and stay
+        # open between requests
+        pass
 
     def _get_model_type(self):
         raise NotImplementedError
@@ -1,15 +1,17 @@
 import logging
 import functools
 from tornado.ioloop import IOLoop
-from rest_api.rest_api_server.utils import tp_executor
+from rest_api.rest_api_server.utils import tp_executor, tp_executor_heavy
 
 LOG = logging.getLogger(__name__)
 
 
 class BaseAsyncControllerWrapper(object):
     """
-    Used to wrap sync controller methods to return futures
+    Used to wrap sync controller methods to return futures. Methods of
+    controllers running analytics queries are run on the heavy executor.
     """
+    HEAVY = False
 
     def __init__(self, db_session, config=None, token=None, engine=None):
         self.session = db_session
@@ -17,7 +19,7 @@ class BaseAsyncControllerWrapper(object):
         self._db = None
         self._controller = None
         self._engine = engine
-        self.executor = tp_executor
+        self.executor = tp_executor_heavy if self.HEAVY else tp_executor
         self.io_loop = IOLoop.current()
         self.token = token
 
@@ -2,6 +2,7 @@ import logging
 from collections import defaultdict
 from datetime import datetime, timezone
 from rest_api.rest_api_server.controllers.base_async import BaseAsyncControllerWrapper
+from rest_api.rest_api_server.controllers.base import ClusteredResourcesMap
 from rest_api.rest_api_server.controllers.expense import CleanExpenseController
 from rest_api.rest_api_server.exceptions import Err
 
@@ -10,6 +11,20 @@ from tools.optscale_exceptions.common_exc import WrongArgumentsException
 LOG = logging.getLogger(__name__)
 DAY_IN_SECONDS = 86400
 DAYS_IN_YEAR = 365
+EXPENSES_ROLLUP = 'expenses_rollup'
+RESOURCES_ROLLUP = 'resources_rollup'
+# breakdown_by -> resources_dimension expression
+DIMENSION_BREAKDOWNS = {
+    None: "''",
+    'employee_id': 'employee_id',
+    'pool_id': 'pool_id',
+    'cloud_account_id': 'cloud_account_id',
+    'service_name': 'service_name',
+    'region': 'region',
+    'resource_type': (
+        "if(is_environment, concat(resource_type, ':environment'), "
+        "resource_type)"),
+}
 
 
 class BreakdownBaseController(CleanExpenseController):
@@ -64,6 +79,12 @@ class BreakdownBaseController(CleanExpenseController):
             return {}
         return entities.get(entity_key, {})
 
+    def day_aligned(self):
+        # resources rollup counts resources by days, so it can be used only
+        # for the requests of whole days
+        return (self.start_date % DAY_IN_SECONDS == 0 and
+                self.end_date % DAY_IN_SECONDS == DAY_IN_SECONDS - 1)
+
     def get_value_resource_type(self, value, is_cluster=False, is_env=False):
         if is_cluster:
             identity = self.CLUSTER_IDENTITY
@@ -76,6 +97,8 @@ class BreakdownBaseController(CleanExpenseController):
 
 
 class BreakdownExpenseController(BreakdownBaseController):
+    ROLLUPS = [EXPENSES_ROLLUP]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._previous_period_start = None
@@ -126,6 +149,25 @@ class BreakdownExpenseController(BreakdownBaseController):
             organization_id, self.previous_period_start, end_date, params,
             data_filters)
 
+    def dimension_supported(self, query_filters, data_filters, extra_params):
+        return extra_params.get(
+            'breakdown_by') in DIMENSION_BREAKDOWNS and super(
+        ).dimension_supported(query_filters, data_filters, extra_params)
+
+    def rollup_supported(self, query_filters, data_filters, extra_params):
+        return extra_params.get(
+            'breakdown_by') in DIMENSION_BREAKDOWNS and super(
+        ).rollup_supported(query_filters, data_filters, extra_params)
+
+    def rollup_start_date(self):
+        return self.previous_period_start
+
+    def generate_dimension_condition(self, organization_id, start_date,
+                                     end_date, params, data_filters):
+        return super().generate_dimension_condition(
+            organization_id, self.previous_period_start, end_date, params,
+            data_filters)
+
     def process_data(self, resources_data, organization_id, filters, **kwargs):
         breakdown_by = kwargs.get('breakdown_by')
         extracted_values = self._extract_values_from_data(
@@ -152,6 +194,40 @@ class BreakdownExpenseController(BreakdownBaseController):
             breakdown_by, breakdown_expenses, breakdown_entities)
         return result
 
+    def process_dimension_data(self, condition, organization_id, filters,
+                               **kwargs):
+        breakdown_by = kwargs.get('breakdown_by')
+        _, organization_cloud_accs = self.get_organization_and_cloud_accs(
+            organization_id)
+        cloud_account_ids = list(map(lambda x: x.id, organization_cloud_accs))
+        breakdown_expenses = self.get_dimension_breakdown_expenses(
+            cloud_account_ids, condition, breakdown_by)
+        return self._get_breakdown_result(
+            organization_id, organization_cloud_accs, breakdown_by,
+            breakdown_expenses)
+
+    def process_rollup_data(self, cloud_account_ids, organization_id,
+                            filters, **kwargs):
+        breakdown_by = kwargs.get('breakdown_by')
+        _, organization_cloud_accs = self.get_organization_and_cloud_accs(
+            organization_id)
+        breakdown_expenses = self.get_rollup_breakdown_expenses(
+            cloud_account_ids, breakdown_by)
+        return self._get_breakdown_result(
+            organization_id, organization_cloud_accs, breakdown_by,
+            breakdown_expenses)
+
+    def _get_breakdown_result(self, organization_id, organization_cloud_accs,
+                              breakdown_by, breakdown_expenses):
+        unique_values = {breakdown_by: set(
+            k for day_info in breakdown_expenses.values() for k in day_info)}
+        entities = self.get_db_entities_info(
+            organization_id, organization_cloud_accs, unique_values)
+        breakdown_entities = self.get_breakdown_entity_map(
+            entities, breakdown_by)
+        return self._get_base_result(
+            breakdown_by, breakdown_expenses, breakdown_entities)
+
     def _get_base_result(self, breakdown_by, breakdown_expenses, entities_map):
         totals = {
             'total': 0,
@@ -196,7 +272,7 @@ class BreakdownExpenseController(BreakdownBaseController):
 
     def _extract_values_from_data(self, resources_data, input_filters,
                                   breakdown_by):
-        clustered_resources_map = {}
+        clustered_resources_map = ClusteredResourcesMap()
         input_ca_ids = input_filters.get('cloud_account_id', [])
         cluster_ids = []
         breakdown_map = {}
@@ -220,15 +296,7 @@ class BreakdownExpenseController(BreakdownBaseController):
                     value = self.get_value_resource_type(
                         value, is_cluster, is_env)
                 breakdown_map[r] = value
-        ext_cluster_ids = set()
-        for cl_id in cluster_ids:
-            if cl_id not in set(clustered_resources_map.values()):
-                ext_cluster_ids.add(cl_id)
-        if ext_cluster_ids:
-            sub_resources = self.resources_collection.find(
-                {'cluster_id': {'$in': list(ext_cluster_ids)}}, ['cluster_id'])
-            for s in sub_resources:
-                clustered_resources_map[s['_id']] = s['cluster_id']
+        self.resolve_clusters(clustered_resources_map, cluster_ids)
         return clustered_resources_map, breakdown_map
 
     def get_breakdown_expenses(self, cloud_account_ids, resources):
@@ -236,6 +304,54 @@ class BreakdownExpenseController(BreakdownBaseController):
             {'id': k, 'group_field': v}
             for k, v in resources.items()
         ]
+        return self._get_breakdown_expenses(
+            cloud_account_ids, 'resources', external_tables=[{
+                'name': 'resources',
+                'structure': [
+                    ('id', 'String'),
+                    ('group_field', 'Nullable(String)'),
+                ],
+                'data': external_table
+            }])
+
+    def get_dimension_breakdown_expenses(self, cloud_account_ids, condition,
+                                         breakdown_by):
+        resources = """(
+            SELECT resource_id AS id, nullIf(%s, '') AS group_field
+            FROM resources_dimension FINAL
+            WHERE %s
+        ) AS resources""" % (DIMENSION_BREAKDOWNS[breakdown_by], condition)
+        return self._get_breakdown_expenses(
+            cloud_account_ids, resources, params=condition.params)
+
+    def get_rollup_breakdown_expenses(self, cloud_account_ids, breakdown_by):
+        # every resource has a cloud account, so expenses without breakdown
+        # are the sum of cloud account expenses
+        expenses = self.execute_clickhouse(
+            query="""
+                SELECT value, date, cost
+                FROM expenses_rollup FINAL
+                WHERE cloud_account_id IN %(cloud_account_ids)s
+                    AND dimension = %(dimension)s
+                    AND NOT removed
+                    AND date >= %(start_date)s
+                    AND date <= %(end_date)s
+            """,
+            params={
+                'cloud_account_ids': list(cloud_account_ids),
+                'dimension': breakdown_by or 'cloud_account_id',
+                'start_date': datetime.utcfromtimestamp(
+                    self.previous_period_start),
+                'end_date': datetime.utcfromtimestamp(self.end_date),
+            })
+        result = defaultdict(dict)
+        for value, date, cost in expenses:
+            value = (value or None) if breakdown_by else None
+            result[date][value] = result[date].get(value, 0) + cost
+        return result
+
+    def _get_breakdown_expenses(self, cloud_account_ids, resources,
+                                params=None, **kwargs):
         start_dt = datetime.utcfromtimestamp(self.previous_period_start)
         end_dt = datetime.utcfromtimestamp(self.end_date)
         expenses = self.execute_clickhouse(
@@ -243,25 +359,19 @@ class BreakdownExpenseController(BreakdownBaseController):
                 SELECT
                     resources.group_field, date, sum(cost*sign)
                 FROM expenses
-                JOIN resources ON expenses.resource_id = resources.id
-                WHERE expenses.date >= %(start_date)s
-                    AND expenses.date <= %(end_date)s
-                    AND cloud_account_id in %(cloud_account_ids)s
+                JOIN %s ON expenses.resource_id = resources.id
+                WHERE expenses.date >= %%(start_date)s
+                    AND expenses.date <= %%(end_date)s
+                    AND cloud_account_id in %%(cloud_account_ids)s
                 GROUP BY resources.group_field, date
-            """,
+            """ % resources,
             params={
                 'start_date': start_dt,
                 'end_date': end_dt,
-                'cloud_account_ids': list(cloud_account_ids)
+                'cloud_account_ids': list(cloud_account_ids),
+                **(params or {})
             },
-            external_tables=[{
-                'name': 'resources',
-                'structure': [
-                    ('id', 'String'),
-                    ('group_field', 'Nullable(String)'),
-                ],
-                'data': external_table
-            }],
+            **kwargs
         )
         result = defaultdict(dict)
         for value, date, cost in expenses:
@@ -290,6 +400,7 @@ class BreakdownExpenseController(BreakdownBaseController):
 
 
 class BreakdownExpenseAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
 
     def _get_controller_class(self):
         return BreakdownExpenseController
@@ -1,7 +1,8 @@
 import logging
 from collections import defaultdict
 from rest_api.rest_api_server.controllers.base_async import BaseAsyncControllerWrapper
-from rest_api.rest_api_server.controllers.breakdown_expense import BreakdownBaseController
+from rest_api.rest_api_server.controllers.breakdown_expense import (
+    BreakdownBaseController, EXPENSES_ROLLUP, RESOURCES_ROLLUP)
 from rest_api.rest_api_server.utils import encode_string
 
 LOG = logging.getLogger(__name__)
@@ -9,9 +10,15 @@ DAY_IN_SECONDS = 86400
 
 
 class BreakdownTagController(BreakdownBaseController):
+    ROLLUPS = [EXPENSES_ROLLUP, RESOURCES_ROLLUP]
+
     def split_params(self, organization_id, params):
         return self._split_params(organization_id, params)
 
+    def rollup_supported(self, query_filters, data_filters, extra_params):
+        return self.day_aligned() and super().rollup_supported(
+            query_filters, data_filters, extra_params)
+
     def _aggregate_resource_data(self, match_query, **kwargs):
         group_stage = {
             '_id': {
@@ -62,32 +69,109 @@ class BreakdownTagController(BreakdownBaseController):
         return resources_table, cnt_map
 
     def get_breakdown_expenses(self, cloud_account_ids, resources):
+        return self._get_breakdown_expenses(
+            cloud_account_ids, 'resources', external_tables=[{
+                'name': 'resources',
+                'structure': [
+                    ('id', 'String'),
+                    ('tag', 'Nullable(String)'),
+                ],
+                'data': resources
+            }])
+
+    def _get_breakdown_expenses(self, cloud_account_ids, resources,
+                                params=None, **kwargs):
         expenses = self.execute_clickhouse(
             query="""
                 SELECT resources.tag, sum(cost*sign)
                 FROM expenses
-                JOIN resources ON expenses.resource_id = resources.id
-                WHERE expenses.date >= %(start_date)s
-                    AND expenses.date <= %(end_date)s
-                    AND cloud_account_id in %(cloud_account_ids)s
+                JOIN %s ON expenses.resource_id = resources.id
+                WHERE expenses.date >= %%(start_date)s
+                    AND expenses.date <= %%(end_date)s
+                    AND cloud_account_id in %%(cloud_account_ids)s
                 GROUP BY resources.tag
-            """,
+            """ % resources,
             params={
                 'start_date': self.start_date,
                 'end_date': self.end_date,
-                'cloud_account_ids': list(cloud_account_ids)
+                'cloud_account_ids': list(cloud_account_ids),
+                **(params or {})
             },
-            external_tables=[{
-                'name': 'resources',
-                'structure': [
-                    ('id', 'String'),
-                    ('tag', 'Nullable(String)'),
-                ],
-                'data': resources
-            }],
+            **kwargs
         )
         return {e[0]: e[1] for e in expenses}
 
+    @staticmethod
+    def _dimension_tags_query(condition):
+        # resource without tags is counted once with empty tag
+        return """
+            SELECT resource_id AS id, arrayJoin(
+                if(empty(tag_keys), [''], tag_keys)) AS tag
+            FROM resources_dimension FINAL
+            WHERE %s""" % condition
+
+    def process_dimension_data(self, condition, organization_id, filters,
+                               **kwargs):
+        _, organization_cloud_accs = self.get_organization_and_cloud_accs(
+            organization_id)
+        cloud_account_ids = list(map(lambda x: x.id, organization_cloud_accs))
+        tags_query = self._dimension_tags_query(condition)
+        cnt_map = {
+            tag or None: cnt for tag, cnt in self.execute_clickhouse(
+                query="""
+                    SELECT tag, count()
+                    FROM (%s)
+                    GROUP BY tag
+                """ % tags_query,
+                params=condition.params)
+        }
+        expenses = {
+            tag or None: cost for tag, cost in self._get_breakdown_expenses(
+                cloud_account_ids, '(%s) AS resources' % tags_query,
+                params=condition.params).items()
+        }
+        return self._get_base_result(cnt_map, expenses)
+
+    def process_rollup_data(self, cloud_account_ids, organization_id,
+                            filters, **kwargs):
+        params = {
+            'cloud_account_ids': cloud_account_ids,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'last_day': self.end_date - DAY_IN_SECONDS + 1,
+        }
+        # resources seen in the range are started before its end and
+        # are not seen the last time before its start
+        cnt_map = {
+            tag or None: cnt for tag, cnt in self.execute_clickhouse(
+                query="""
+                    SELECT value, sumIf(started, date <= %(last_day)s) -
+                        sumIf(deleted, date < %(start_date)s) AS cnt
+                    FROM resources_rollup FINAL
+                    WHERE cloud_account_id IN %(cloud_account_ids)s
+                        AND dimension = 'tag'
+                        AND NOT removed
+                    GROUP BY value
+                    HAVING cnt > 0
+                """,
+                params=params)
+        }
+        expenses = {
+            tag or None: cost for tag, cost in self.execute_clickhouse(
+                query="""
+                    SELECT value, sum(cost)
+                    FROM expenses_rollup FINAL
+                    WHERE cloud_account_id IN %(cloud_account_ids)s
+                        AND dimension = 'tag'
+                        AND NOT removed
+                        AND date >= %(start_date)s
+                        AND date <= %(end_date)s
+                    GROUP BY value
+                """,
+                params=params)
+        }
+        return self._get_base_result(cnt_map, expenses)
+
     def process_data(self, resources_data, organization_id, filters, **kwargs):
         extracted_values = self._extract_values_from_data(resources_data)
         resources_table, cnt_map = extracted_values
@@ -96,6 +180,9 @@ class BreakdownTagController(BreakdownBaseController):
         cloud_account_ids = list(map(lambda x: x.id, organization_cloud_accs))
         expenses = self.get_breakdown_expenses(
             cloud_account_ids, resources_table)
+        return self._get_base_result(cnt_map, expenses)
+
+    def _get_base_result(self, cnt_map, expenses):
         breakdown = []
         for tag, cnt in cnt_map.items():
             breakdown.append({
@@ -111,5 +198,7 @@ class BreakdownTagController(BreakdownBaseController):
 
 
 class BreakdownTagAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
+
     def _get_controller_class(self):
         return BreakdownTagController
@@ -49,6 +49,7 @@ from rest_api.rest_api_server.models.models import (
 from rest_api.rest_api_server.models.enums import CloudTypes, ConditionTypes
 from rest_api.rest_api_server.controllers.base import BaseController
 from rest_api.rest_api_server.controllers.base_async import BaseAsyncControllerWrapper
+from rest_api.rest_api_server.result_cache import result_cache
 from rest_api.rest_api_server.utils import (
     check_bool_attribute, check_dict_attribute, check_float_attribute,
     check_int_attribute, check_string, check_string_attribute,
@@ -575,6 +576,7 @@ class CloudAccountController(BaseController, ClickHouseMixin):
         resource_ctrl = CloudResourceController(self._config)
         resource_ctrl.delete_cloud_resources(item_id)
         self.clean_clickhouse(cloud_account.id, cloud_account.type)
+        result_cache.bump_generation(cloud_account.organization_id)
         OrganizationConstraintController(
             self.session, self._config, self.token).delete_constraints_with_hits(
             cloud_account.organization_id,
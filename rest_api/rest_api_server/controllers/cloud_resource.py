@@ -21,6 +21,7 @@ from rest_api.rest_api_server.controllers.rule_apply import RuleApplyController
 from rest_api.rest_api_server.controllers.calendar_synchronization import (
     CalendarSynchronizationController)
 from rest_api.rest_api_server.exceptions import Err
+from rest_api.rest_api_server.result_cache import result_cache
 from rest_api.rest_api_server.models.models import (
     CloudAccount, Employee, Organization, Pool, ResourceConstraint, PoolPolicy,
     ShareableBooking, CalendarSynchronization)
@@ -169,12 +170,7 @@ class CloudResourceController(BaseController, MongoMixin, ResourceFormatMixin):
             meta = {}
             resource_pool = kwargs.get('pool_id') or resource['pool_id']
             task_type = None
-            org_id = resource.get('organization_id')
-            if not org_id:
-                cloud_acc = self.session.query(CloudAccount).filter(
-                    and_(CloudAccount.id == resource['cloud_account_id'],
-                         CloudAccount.deleted.is_(False))).one_or_none()
-                org_id = cloud_acc.organization_id
+            org_id = self._get_organization_id(resource)
             if kwargs.get('active') is not None:
                 if resource['active'] != kwargs['active']:
                     task_type = 'env_active_state_changed'
@@ -226,8 +222,19 @@ class CloudResourceController(BaseController, MongoMixin, ResourceFormatMixin):
         )
         if not r.matched_count:
             raise NotFoundException(Err.OE0002, ['Resource', item_id])
+        if 'employee_id' in kwargs or 'pool_id' in kwargs:
+            result_cache.bump_generation(self._get_organization_id(resource))
         return self.get(item_id)
 
+    def _get_organization_id(self, resource):
+        org_id = resource.get('organization_id')
+        if not org_id:
+            cloud_acc = self.session.query(CloudAccount).filter(
+                and_(CloudAccount.id == resource['cloud_account_id'],
+                     CloudAccount.deleted.is_(False))).one_or_none()
+            org_id = cloud_acc.organization_id
+        return org_id
+
     def list(self, include_deleted=False, include_subresources=True, **kwargs):
         match_filter = []
         cloud_account_id = kwargs.get('cloud_account_id')
@@ -18,6 +18,7 @@ from rest_api.rest_api_server.controllers.organization_constraint import (
 from rest_api.rest_api_server.controllers.profiling.base import (
     BaseProfilingController)
 from rest_api.rest_api_server.exceptions import Err
+from rest_api.rest_api_server.result_cache import result_cache
 from rest_api.rest_api_server.models.enums import (
     AuthenticationType, PoolPurposes, RolePurposes)
 from rest_api.rest_api_server.models.models import (
@@ -317,6 +318,7 @@ class EmployeeController(BaseController, MongoMixin):
         self.resources_collection.update_many(filter={
             "employee_id": employee.id, "deleted_at": 0
         }, update={'$set': {'employee_id': new_owner_id}})
+        result_cache.bump_generation(employee.organization_id)
 
         bookings = self._get_shareable_bookings(employee.id)
         for booking in bookings:
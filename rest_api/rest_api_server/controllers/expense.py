@@ -1,3 +1,5 @@
+import base64
+import binascii
 import json
 import logging
 import re
@@ -9,23 +11,39 @@ from tools.optscale_exceptions.common_exc import (
 from rest_api.rest_api_server.controllers.base_async import BaseAsyncControllerWrapper
 from rest_api.rest_api_server.exceptions import Err
 from rest_api.rest_api_server.models.models import (Organization, Pool,
-                                                    CloudAccount, Employee)
+                                                    CloudAccount, Employee,
+                                                    ClusterType)
 from sqlalchemy import and_
 
 from rest_api.rest_api_server.utils import (
     get_nil_uuid, encode_string, encoded_tags, timestamp_to_day_start)
 from rest_api.rest_api_server.controllers.base import (
     BaseController, BaseHierarchicalController, MongoMixin, ClickHouseMixin,
-    ResourceFormatMixin)
+    ResourceFormatMixin, ResourcesDimensionMixin, RollupsMixin,
+    ClickHouseCondition, ClusteredResourcesMap)
 
 from tools.cloud_adapter.cloud import Cloud as CloudAdapter
 
 LOG = logging.getLogger(__name__)
 NOT_SET_NAME = '(not set)'
 DAY_IN_SECONDS = 86400
-
-
-class ExpenseController(MongoMixin, ClickHouseMixin):
+# costs are rounded in page ordering, so the order doesn't depend on float
+# summation order of different queries
+COST_SORT_PRECISION = 8
+# expense field -> resources_dimension column
+DIMENSION_COLUMNS = {
+    'resource_id': 'resource_id',
+    'cloud_account_id': 'cloud_account_id',
+    'pool_id': 'pool_id',
+    'owner_id': 'employee_id',
+    'employee_id': 'employee_id',
+    'region': 'region',
+    'service_name': 'service_name',
+    'resource_type': 'resource_type',
+}
+
+
+class ExpenseController(MongoMixin, ClickHouseMixin, ResourcesDimensionMixin):
 
     def __init__(self, config=None):
         super().__init__()
@@ -45,6 +63,11 @@ class ExpenseController(MongoMixin, ClickHouseMixin):
             group_by=None):
         if not isinstance(filter_list, list):
             filter_list = list(filter_list)
+        if (filter_field in DIMENSION_COLUMNS and (
+                not group_by or group_by in DIMENSION_COLUMNS) and
+                self.resources_dimension_synced()):
+            return self._get_dimension_expenses(
+                filter_field, filter_list, start_date, end_date, group_by)
 
         # TODO: this is super ugly, remove it
         resource_field_mappings = {
@@ -108,6 +131,49 @@ class ExpenseController(MongoMixin, ClickHouseMixin):
             'cost': x[3]
         } for x in expenses_results]
 
+    def _get_dimension_expenses(self, filter_field, filter_list, start_date,
+                                end_date, group_by=None):
+        condition = ClickHouseCondition()
+        condition.add('NOT is_deleted')
+        condition.add("cloud_account_id != ''")
+        condition.add('last_seen >= %s' % condition.param(
+            int(start_date.timestamp())))
+        condition.add_in(DIMENSION_COLUMNS[filter_field],
+                         [x or '' for x in filter_list])
+        group_column = DIMENSION_COLUMNS.get(group_by, "''")
+        expenses_results = self.execute_clickhouse(
+            query="""
+                SELECT
+                    date, group_field, cloud_account_id, SUM(cost * sign) AS total_cost
+                FROM expenses
+                JOIN (
+                    SELECT resource_id, cloud_account_id,
+                        nullIf(%s, '') AS group_field
+                    FROM resources_dimension FINAL
+                    WHERE %s
+                ) AS resources ON expenses.resource_id = resources.resource_id
+                    AND expenses.cloud_account_id = resources.cloud_account_id
+                WHERE date >= %%(start_date)s
+                    AND date <= %%(end_date)s
+                GROUP BY date, group_field, cloud_account_id
+                HAVING SUM(sign) > 0
+                ORDER BY total_cost DESC
+            """ % (group_column, condition),
+            params={
+                'start_date': start_date,
+                'end_date': end_date,
+                **condition.params
+            },
+        )
+        return [{
+            '_id': {
+                'date': x[0],
+                group_by: x[1],
+                'cloud_account_id': x[2]
+            },
+            'cost': x[3]
+        } for x in expenses_results]
+
     def get_cloud_expenses_with_resource_info(self, cloud_acc_list, start_date,
                                               end_date):
         pipeline = [
@@ -236,7 +302,8 @@ class ExpenseController(MongoMixin, ClickHouseMixin):
             result = [(k, v) for k, v in result.items()]
         return {r[0]: r[1] for r in result}
 
-    def get_raw_expenses(self, start_date, end_date, filters):
+    def get_raw_expenses(self, start_date, end_date, filters, sort=None,
+                         limit=None, fields=None):
         match_filters = [{'start_date': {'$lt': end_date}}]
         if start_date:
             match_filters.append({'start_date': {'$gte': start_date}})
@@ -244,7 +311,14 @@ class ExpenseController(MongoMixin, ClickHouseMixin):
         pipeline = [
             {'$match': {'$and': match_filters}}
         ]
-        return self.raw_expenses_collection.aggregate(pipeline)
+        if sort:
+            pipeline.append({'$sort': sort})
+        if limit:
+            pipeline.append({'$limit': limit})
+        if fields:
+            pipeline.append({'$project': {f: 1 for f in fields}})
+        return self.raw_expenses_collection.aggregate(
+            pipeline, allowDiskUse=True)
 
     def get_traffic_expenses_summary(self, resources):
         external_table = []
@@ -793,9 +867,24 @@ class OrgCloudAccMixin:
 
 
 class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
-                             ResourceFormatMixin, OrgCloudAccMixin):
+                             ResourceFormatMixin, OrgCloudAccMixin,
+                             ResourcesDimensionMixin, RollupsMixin):
     EXPENSES_KEY = 'clean_expenses'
     JOIN_TRAFFIC_EXPENSES = True
+    # resources are filtered in clickhouse resources_dimension if it's
+    # possible for the request filters
+    RESOURCES_DIMENSION = True
+    # limited expenses are returned by pages, next page is requested with
+    # the cursor from the previous page
+    PAGINATED = True
+    DIMENSION_FILTERS = ['cloud_account_id', 'pool_id', 'employee_id',
+                         'region', 'resource_type', 'tag', 'without_tag',
+                         '_id']
+    DIMENSION_DATA_FILTERS = ['service_name']
+    # clickhouse rollups the controller can be answered from, requests
+    # filtered only by cloud accounts are answered from rollups
+    ROLLUPS = []
+    ROLLUP_FILTERS = ['cloud_account_id']
     CHECKED_FILTERS = {
         'pool_id': Pool,
         'cloud_account_id': CloudAccount,
@@ -880,11 +969,19 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
             self._extend_expense(resource, entities)
             result_expenses[resource_id] = resource
         expenses = sorted(list(result_expenses.values()),
-                          key=lambda x: x['cost'], reverse=True)
+                          key=lambda x: self._page_key(x['cost'], x['id']))
         return {
             self.EXPENSES_KEY: expenses,
         }
 
+    @staticmethod
+    def _get_resources_field_values(resources_map, field):
+        # only entities of the returned resources are joined
+        if resources_map is None:
+            return None
+        return list(set(filter(
+            None, (r.get(field) for r in resources_map.values()))))
+
     def _get_cluster_entities(self, resources_map):
         res = {}
         for r_id, r_val in resources_map.items():
@@ -900,8 +997,12 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
                 cloud_acc.id: cloud_acc.to_dict(
                     secure=True) for cloud_acc in organization_cloud_acc
             },
-            'owner_id': self._get_object_entities(organization_id, Employee),
-            'pool_id': self._get_object_entities(organization_id, Pool),
+            'owner_id': self._get_object_entities(
+                organization_id, Employee, self._get_resources_field_values(
+                    resources_map, 'employee_id')),
+            'pool_id': self._get_object_entities(
+                organization_id, Pool, self._get_resources_field_values(
+                    resources_map, 'pool_id')),
         }
         if resources_map:
             result.update({
@@ -930,27 +1031,62 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
         return list(result.values())
 
     def get_expenses(self, cloud_account_ids, resource_ids, start_date,
-                     end_date, limit=None) -> tuple:
+                     end_date, limit=None, cursor=None) -> tuple:
         return self._get_expenses_clickhouse(
-            cloud_account_ids, resource_ids, start_date, end_date, limit)
+            cloud_account_ids, resource_ids, start_date, end_date, limit,
+            cursor)
 
     def _get_expenses_clickhouse(self, cloud_account_ids, resource_ids,
-                                 start_date, end_date, limit) -> tuple:
+                                 start_date, end_date, limit,
+                                 cursor=None) -> tuple:
+        return self._get_resource_expenses(
+            """cloud_account_id IN cloud_account_ids
+                AND resource_id IN resource_ids""",
+            start_date, end_date, limit, cursor=cursor, external_tables=[
+                {
+                    'name': 'resource_ids',
+                    'structure': [('_id', 'String')],
+                    'data': [{'_id': r_id} for r_id in resource_ids]
+                },
+                {
+                    'name': 'cloud_account_ids',
+                    'structure': [('_id', 'String')],
+                    'data': [{'_id': r_id} for r_id in cloud_account_ids]
+                }
+            ])
+
+    def _get_dimension_expenses(self, cloud_account_ids, condition,
+                                start_date, end_date, limit) -> tuple:
+        return self._get_resource_expenses(
+            """cloud_account_id IN %%(cloud_account_ids)s
+                AND resource_id IN (
+                    SELECT resource_id FROM resources_dimension FINAL
+                    WHERE %s)""" % condition,
+            start_date, end_date, limit, params={
+                'cloud_account_ids': list(cloud_account_ids),
+                **condition.params
+            })
+
+    def _get_resource_expenses(self, resource_condition, start_date,
+                               end_date, limit, params=None, cursor=None,
+                               **kwargs):
+        having = 'SUM(sign) > 0'
+        if cursor:
+            having += ' AND ' + self._cursor_condition('total_cost')
         query = """
             SELECT
                 cloud_account_id,
                 resource_id,
                 SUM(cost * sign) AS total_cost
             FROM expenses
-            WHERE cloud_account_id IN cloud_account_ids
-                AND resource_id IN resource_ids
-                AND date >= %(start_date)s
-                AND date <= %(end_date)s
+            WHERE %s
+                AND date >= %%(start_date)s
+                AND date <= %%(end_date)s
             GROUP BY cloud_account_id, resource_id
             WITH TOTALS
-            HAVING SUM(sign) > 0
-            ORDER BY total_cost DESC
-        """
+            HAVING %s
+            ORDER BY round(total_cost, %d) DESC, resource_id
+        """ % (resource_condition, having, COST_SORT_PRECISION)
         if limit:
             query += 'LIMIT %(limit)s'
         result = self.execute_clickhouse(
@@ -958,34 +1094,111 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
             params={
                 'start_date': start_date,
                 'end_date': end_date,
-                'limit': limit
+                'limit': limit,
+                **self._cursor_params(cursor),
+                **(params or {})
             },
-            external_tables=[
-                {
-                    'name': 'resource_ids',
-                    'structure': [('_id', 'String')],
-                    'data': [{'_id': r_id} for r_id in resource_ids]
-                },
-                {
-                    'name': 'cloud_account_ids',
-                    'structure': [('_id', 'String')],
-                    'data': [{'_id': r_id} for r_id in cloud_account_ids]
-                }
-            ],
+            **kwargs
         )
         totals = result.pop(-1)
         total = next(filter(lambda k: k, totals), 0)
+        if cursor:
+            # totals are calculated after HAVING, so they miss previous pages
+            total = self._get_resource_expenses_total(
+                resource_condition, start_date, end_date, params, **kwargs)
         return [{
             'cloud_account_id': x[0],
             'resource_id': x[1],
             'cost': x[2]
         } for x in result], total
 
-    def _get_object_entities(self, organization_id, model):
-        objects = self.session.query(model).filter(
+    def _get_resource_expenses_total(self, resource_condition, start_date,
+                                     end_date, params=None, **kwargs):
+        result = self.execute_clickhouse(
+            query="""
+                SELECT SUM(total_cost)
+                FROM (
+                    SELECT SUM(cost * sign) AS total_cost
+                    FROM expenses
+                    WHERE %s
+                        AND date >= %%(start_date)s
+                        AND date <= %%(end_date)s
+                    GROUP BY cloud_account_id, resource_id
+                    HAVING SUM(sign) > 0
+                )
+            """ % resource_condition,
+            params={
+                'start_date': start_date,
+                'end_date': end_date,
+                **(params or {})
+            },
+            **kwargs
+        )
+        return result[0][0] if result else 0
+
+    @staticmethod
+    def _cursor_condition(cost_column, id_column='resource_id'):
+        return """(round({cost}, {precision}) < %(cursor_cost)s OR (
+            round({cost}, {precision}) = %(cursor_cost)s
+            AND {id} > %(cursor_id)s))""".format(
+            cost=cost_column, id=id_column, precision=COST_SORT_PRECISION)
+
+    @staticmethod
+    def _cursor_params(cursor):
+        if not cursor:
+            return {}
+        cost, resource_id = cursor
+        return {'cursor_cost': cost, 'cursor_id': resource_id}
+
+    @staticmethod
+    def _page_key(cost, resource_id):
+        # expenses page order: cost desc, resource id asc
+        return -round(cost or 0, COST_SORT_PRECISION), resource_id
+
+    @staticmethod
+    def encode_cursor(expense):
+        return base64.urlsafe_b64encode(json.dumps([
+            round(expense['cost'] or 0, COST_SORT_PRECISION),
+            expense['resource_id']
+        ]).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            cost, resource_id = json.loads(base64.urlsafe_b64decode(
+                cursor.encode()))
+            return float(cost), str(resource_id)
+        except (binascii.Error, ValueError, TypeError) as exc:
+            raise WrongArgumentsException(Err.OE0217, ['cursor']) from exc
+
+    def get_page(self, expenses, limit, cursor=None):
+        """
+        Returns the expenses page after the cursor and the cursor of the
+        next page, None for the last page
+        """
+        def key(expense):
+            return self._page_key(expense['cost'], expense['resource_id'])
+
+        if cursor:
+            cursor_key = self._page_key(*cursor)
+            expenses = [x for x in expenses if key(x) > cursor_key]
+        expenses = sorted(expenses, key=key)
+        page = expenses[:limit]
+        next_cursor = None
+        if len(expenses) > limit:
+            next_cursor = self.encode_cursor(page[-1])
+        return page, next_cursor
+
+    def _get_object_entities(self, organization_id, model, entity_ids=None):
+        query = self.session.query(model).filter(
             model.organization_id == organization_id,
             model.deleted.is_(False)
-        ).all()
+        )
+        if entity_ids is not None:
+            if not entity_ids:
+                return {}
+            query = query.filter(model.id.in_(entity_ids))
+        objects = query.all()
         return {x.id: x.to_dict() for x in objects}
 
     def get_pools_children(self, pool_ids):
@@ -1043,6 +1256,11 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
         query_filters, data_filters, extra_filters = self._split_params(
             organization_id, params)
         extra_filters['limit'] = query_filters.pop('limit', None)
+        cursor = query_filters.pop('cursor', None)
+        if cursor is not None:
+            if not extra_filters['limit']:
+                raise WrongArgumentsException(Err.OE0216, ['limit'])
+            extra_filters['cursor'] = self.decode_cursor(cursor)
         return query_filters, data_filters, extra_filters
 
     @staticmethod
@@ -1201,6 +1419,119 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
                 ]})
         return query
 
+    def _has_cluster_types(self, organization_id):
+        return self.session.query(ClusterType.id).filter(
+            ClusterType.organization_id == organization_id,
+            ClusterType.deleted.is_(False)
+        ).first() is not None
+
+    def dimension_supported(self, query_filters, data_filters, extra_params):
+        return self.RESOURCES_DIMENSION and all(
+            k in self.DIMENSION_FILTERS for k in query_filters) and all(
+            k in self.DIMENSION_DATA_FILTERS for k in data_filters)
+
+    def generate_dimension_condition(self, organization_id, start_date,
+                                     end_date, params, data_filters):
+        """
+        Clickhouse analogue of generate_filters_pipeline for
+        resources_dimension. Resources without cloud account are clusters,
+        organizations with cluster types use mongo filters.
+        """
+        if (self._has_cluster_types(organization_id) or
+                not self.resources_dimension_synced()):
+            return None
+        nil_uuid = get_nil_uuid()
+        condition = ClickHouseCondition()
+        condition.add('NOT is_deleted')
+        condition.add('deleted_at = 0')
+        condition.add('first_seen <= %s' % condition.param(end_date))
+        condition.add('last_seen >= %s' % condition.param(start_date))
+        condition.add_in('cloud_account_id', [
+            x for x in params.pop('cloud_account_id') if x != nil_uuid])
+
+        resource_types = params.pop('resource_type', [])
+        if resource_types:
+            type_conditions = []
+            for resource_type in resource_types:
+                try:
+                    type_, identity = self._parse_filter_with_type(
+                        resource_type)
+                except ValueError:
+                    raise WrongArgumentsException(
+                        Err.OE0218, ['resource_type', resource_type])
+                if identity == self.CLUSTER_IDENTITY:
+                    identity_cond = ("(cluster_type_id != '' OR "
+                                     "cluster_id != '') AND NOT is_environment")
+                elif identity == self.ENVIRONMENT_IDENTITY:
+                    identity_cond = ("cluster_type_id = '' AND cluster_id = '' "
+                                     "AND is_environment")
+                elif identity == self.REGULAR_IDENTITY:
+                    identity_cond = ("cluster_type_id = '' AND cluster_id = '' "
+                                     "AND NOT is_environment")
+                else:
+                    raise WrongArgumentsException(Err.OE0499, [])
+                type_conditions.append('%s AND resource_type = %s' % (
+                    identity_cond, condition.param(type_)))
+            condition.add(' OR '.join('(%s)' % c for c in type_conditions))
+
+        for filter_name in ['tag', 'without_tag']:
+            tag_params = params.pop(filter_name, None)
+            if not tag_params:
+                continue
+            tag_conditions = []
+            for v in tag_params:
+                if v == nil_uuid:
+                    tag_conditions.append(
+                        'empty(tag_keys)' if filter_name == 'tag'
+                        else 'notEmpty(tag_keys)')
+                else:
+                    tag_cond = 'has(tag_keys, %s)' % condition.param(v)
+                    if filter_name == 'without_tag':
+                        tag_cond = 'NOT %s' % tag_cond
+                    tag_conditions.append(tag_cond)
+            condition.add(' OR '.join(tag_conditions))
+
+        for filter_key, filter_values in list(params.items()) + [
+                (k, list(set(v))) for k, v in data_filters.items()]:
+            column = 'resource_id' if filter_key == '_id' else filter_key
+            condition.add_in(column, [
+                '' if v in [nil_uuid, None] else v for v in filter_values])
+        return condition
+
+    def get_dimension_condition(self, organization_id, query_filters,
+                                data_filters, extra_params):
+        if not self.dimension_supported(
+                query_filters, data_filters, extra_params):
+            return None
+        return self.generate_dimension_condition(
+            organization_id, self.start_date, self.end_date,
+            query_filters.copy(), data_filters)
+
+    def rollup_supported(self, query_filters, data_filters, extra_params):
+        return bool(self.ROLLUPS) and not data_filters and all(
+            k in self.ROLLUP_FILTERS for k, v in query_filters.items() if v)
+
+    def rollup_start_date(self):
+        return self.start_date
+
+    def get_rollup_cloud_account_ids(self, organization_id, query_filters,
+                                     data_filters, extra_params):
+        if (not self.rollup_supported(
+                query_filters, data_filters, extra_params) or
+                self._has_cluster_types(organization_id)):
+            return None
+        _, cloud_accs = self.get_organization_and_cloud_accs(organization_id)
+        cloud_accs = [x for x in cloud_accs
+                      if x.id in query_filters['cloud_account_id']]
+        if not self.rollups_ready(self.ROLLUPS, cloud_accs,
+                                  self.rollup_start_date()):
+            return None
+        return [x.id for x in cloud_accs]
+
+    def process_rollup_data(self, cloud_account_ids, organization_id,
+                            filters, **kwargs):
+        raise NotImplementedError
+
     def get_resources_data(self, organization_id, query_filters, data_filters,
                            extra_params):
         query = self.generate_filters_pipeline(
@@ -1225,13 +1556,11 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
                                              organization_id)
         res = {}
         last_run = self.get_last_run_ts_by_org_id(organization_id)
-        cluster_id_resources_map = defaultdict(list)
-        for resource_id, cluster_id in clustered_resources_map.items():
-            cluster_id_resources_map[cluster_id].append(resource_id)
         for r in resources:
             formatted_r = self.format_resource(r, last_run)
             res[formatted_r['id']] = formatted_r
-        for cluster_id, resources in cluster_id_resources_map.items():
+        for cluster_id, resources in (
+                clustered_resources_map.cluster_resources.items()):
             cluster = res.get(cluster_id)
             if not cluster:
                 continue
@@ -1376,20 +1705,55 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
         (not_clustered_resources, clustered_resources_map,
          joined_ids) = self._extract_unique_values_from_resources(
             resources_data, filters)
-        not_clustered_expenses, clustered_expenses = [], []
-        total_cost = 0
         cloud_account_ids = kwargs['cloud_account_id']
         limit = kwargs['limit']
         _, organization_cloud_accs = self.get_organization_and_cloud_accs(
             organization_id)
+        all_account_ids = list(map(
+            lambda x: x.id, organization_cloud_accs)) + [get_nil_uuid()]
+        next_cursor = None
+        if self.PAGINATED and limit:
+            expenses, resource_ids, total_cost, next_cursor = (
+                self.get_expenses_page(
+                    cloud_account_ids, all_account_ids,
+                    not_clustered_resources, clustered_resources_map, limit,
+                    kwargs.get('cursor')))
+        else:
+            expenses, resource_ids, total_cost = self.get_all_expenses(
+                cloud_account_ids, all_account_ids, not_clustered_resources,
+                clustered_resources_map, joined_ids, limit)
+        resources_map = self.get_resources(
+            organization_id, cloud_account_ids, list(resource_ids),
+            clustered_resources_map)
+        expenses_data = self.join_db_info(
+            resources_map, expenses, organization_id,
+            organization_cloud_accs)
+        total_count = len(not_clustered_resources
+                          ) + len(clustered_resources_map.cluster_ids)
+        res = {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'total_count': total_count,
+            'total_cost': total_cost,
+            **expenses_data
+        }
+        if limit:
+            res['limit'] = limit
+            if self.PAGINATED:
+                res['next_cursor'] = next_cursor
+        return res
+
+    def get_all_expenses(self, cloud_account_ids, all_account_ids,
+                         not_clustered_resources, clustered_resources_map,
+                         joined_ids, limit=None):
+        not_clustered_expenses, clustered_expenses = [], []
+        total_cost = 0
         if not_clustered_resources:
             not_clustered_expenses, cost = self.get_expenses(
                 cloud_account_ids, not_clustered_resources, self.start_date,
                 self.end_date, limit)
             total_cost += cost
         if clustered_resources_map:
-            all_account_ids = list(map(
-                lambda x: x.id, organization_cloud_accs)) + [get_nil_uuid()]
             clustered_expenses, cost = self.get_clustered_expenses(
                 all_account_ids, clustered_resources_map, self.start_date,
                 self.end_date)
@@ -1408,14 +1772,155 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
                 resource_ids.add(r_id)
         else:
             resource_ids.update(joined_ids)
+        return expenses, resource_ids, total_cost
+
+    def get_expenses_page(self, cloud_account_ids, all_account_ids,
+                          not_clustered_resources, clustered_resources_map,
+                          limit, cursor=None):
+        """
+        Returns expenses of the page after the cursor. Only limit + 1 not
+        clustered resources expenses are selected, resources without
+        expenses are taken into account only if the page isn't filled by
+        resources with positive cost.
+        """
+        not_clustered_expenses, clustered_expenses = [], []
+        total_cost = 0
+        if not_clustered_resources:
+            not_clustered_expenses, cost = self.get_expenses(
+                cloud_account_ids, not_clustered_resources, self.start_date,
+                self.end_date, limit + 1, cursor)
+            total_cost += cost
+        if clustered_resources_map:
+            clustered_expenses, cost = self.get_clustered_expenses(
+                all_account_ids, clustered_resources_map, self.start_date,
+                self.end_date)
+            total_cost += cost
+        expenses, next_cursor = self.get_page(
+            not_clustered_expenses + clustered_expenses, limit + 1, cursor)
+        if (len(expenses) <= limit or
+                round(expenses[-1]['cost'], COST_SORT_PRECISION) <= 0):
+            # resources without expenses can get to the page, all expenses
+            # are required to find them
+            if cursor or len(not_clustered_expenses) > limit:
+                not_clustered_expenses, _ = self.get_expenses(
+                    cloud_account_ids, not_clustered_resources,
+                    self.start_date, self.end_date)
+            expenses = not_clustered_expenses + clustered_expenses
+            expense_ids = set(x['resource_id'] for x in expenses)
+            for r_id in set(not_clustered_resources).union(
+                    clustered_resources_map.cluster_ids):
+                if r_id not in expense_ids:
+                    expenses.append({'resource_id': r_id, 'cost': 0})
+        expenses, next_cursor = self.get_page(expenses, limit, cursor)
+        resource_ids = set(x['resource_id'] for x in expenses)
+        # sub resources are required for cluster savings
+        for cluster_id in clustered_resources_map.cluster_ids & resource_ids:
+            resource_ids.update(
+                clustered_resources_map.cluster_resources[cluster_id])
+        return expenses, resource_ids, total_cost, next_cursor
+
+    def get_dimension_resource_ids(self, condition, limit=None):
+        query = """
+            SELECT resource_id
+            FROM resources_dimension FINAL
+            WHERE %s
+        """ % condition
+        if limit:
+            query += 'LIMIT %(limit)s'
+        result = self.execute_clickhouse(
+            query=query, params={'limit': limit, **condition.params})
+        return [x[0] for x in result]
+
+    def get_dimension_resources_count(self, condition):
+        result = self.execute_clickhouse(
+            query="""
+                SELECT count()
+                FROM resources_dimension FINAL
+                WHERE %s
+            """ % condition,
+            params=condition.params)
+        return result[0][0]
+
+    def get_dimension_expenses_page(self, cloud_account_ids, condition,
+                                    limit, cursor=None):
+        # resources without expenses are joined with zero cost, so the page
+        # is selected by a single query
+        query = """
+            SELECT resource_id, total_cost
+            FROM (
+                SELECT resource_id
+                FROM resources_dimension FINAL
+                WHERE {condition}
+            ) AS resources
+            LEFT JOIN (
+                SELECT resource_id, SUM(cost * sign) AS total_cost
+                FROM expenses
+                WHERE cloud_account_id IN %(cloud_account_ids)s
+                    AND resource_id IN (
+                        SELECT resource_id FROM resources_dimension FINAL
+                        WHERE {condition})
+                    AND date >= %(start_date)s
+                    AND date <= %(end_date)s
+                GROUP BY resource_id
+                HAVING SUM(sign) > 0
+            ) AS costs USING resource_id
+            {cursor_condition}
+            ORDER BY round(total_cost, {precision}) DESC, resource_id
+            LIMIT %(limit)s
+        """.format(
+            condition=condition,
+            cursor_condition='WHERE ' + self._cursor_condition(
+                'total_cost') if cursor else '',
+            precision=COST_SORT_PRECISION)
+        result = self.execute_clickhouse(
+            query=query,
+            params={
+                'cloud_account_ids': list(cloud_account_ids),
+                'start_date': self.start_date,
+                'end_date': self.end_date,
+                'limit': limit + 1,
+                **self._cursor_params(cursor),
+                **condition.params
+            })
+        expenses = [{'resource_id': x[0], 'cost': x[1]}
+                    for x in result[:limit]]
+        next_cursor = None
+        if len(result) > limit:
+            next_cursor = self.encode_cursor(expenses[-1])
+        return expenses, next_cursor
+
+    def process_dimension_data(self, condition, organization_id, filters,
+                               **kwargs):
+        cloud_account_ids = kwargs['cloud_account_id']
+        limit = kwargs['limit']
+        _, organization_cloud_accs = self.get_organization_and_cloud_accs(
+            organization_id)
+        if limit:
+            expenses, next_cursor = self.get_dimension_expenses_page(
+                cloud_account_ids, condition, limit, kwargs.get('cursor'))
+            resource_ids = [x['resource_id'] for x in expenses]
+            total_count = self.get_dimension_resources_count(condition)
+            total_cost = self._get_resource_expenses_total(
+                """cloud_account_id IN %%(cloud_account_ids)s
+                    AND resource_id IN (
+                        SELECT resource_id FROM resources_dimension FINAL
+                        WHERE %s)""" % condition,
+                self.start_date, self.end_date, params={
+                    'cloud_account_ids': list(cloud_account_ids),
+                    **condition.params
+                })
+        else:
+            expenses, total_cost = self._get_dimension_expenses(
+                cloud_account_ids, condition, self.start_date, self.end_date,
+                limit)
+            resource_ids = self.get_dimension_resource_ids(condition)
+            total_count = len(resource_ids)
         resources_map = self.get_resources(
-            organization_id, cloud_account_ids, list(resource_ids),
-            clustered_resources_map)
+            organization_id, cloud_account_ids, resource_ids,
+            ClusteredResourcesMap())
         expenses_data = self.join_db_info(
             resources_map, expenses, organization_id,
             organization_cloud_accs)
-        total_count = len(not_clustered_resources
-                          ) + len(set(clustered_resources_map.values()))
         res = {
             'start_date': self.start_date,
             'end_date': self.end_date,
@@ -1425,6 +1930,7 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
         }
         if limit:
             res['limit'] = limit
+            res['next_cursor'] = next_cursor
         return res
 
     def handle_filters(self, params, filters, organization_id):
@@ -1442,12 +1948,27 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
             organization_id, params.copy())
         traffic_expenses_map = self._process_traffic_filters(
             query_filters['cloud_account_id'], data_filters)
-        resources_data = self.get_resources_data(
-            organization_id, query_filters.copy(),
-            data_filters.copy(), extra_params.copy())
-        result = self.process_data(
-            resources_data, organization_id, filters,
-            **query_filters, **extra_params)
+        rollup_cloud_account_ids = self.get_rollup_cloud_account_ids(
+            organization_id, query_filters, data_filters, extra_params)
+        condition = None
+        if rollup_cloud_account_ids is None:
+            condition = self.get_dimension_condition(
+                organization_id, query_filters, data_filters, extra_params)
+        if rollup_cloud_account_ids is not None:
+            result = self.process_rollup_data(
+                rollup_cloud_account_ids, organization_id, filters,
+                **extra_params)
+        elif condition is not None:
+            result = self.process_dimension_data(
+                condition, organization_id, filters,
+                **query_filters, **extra_params)
+        else:
+            resources_data = self.get_resources_data(
+                organization_id, query_filters.copy(),
+                data_filters.copy(), extra_params.copy())
+            result = self.process_data(
+                resources_data, organization_id, filters,
+                **query_filters, **extra_params)
         if self.JOIN_TRAFFIC_EXPENSES:
             self.join_traffic_expenses(result, traffic_expenses_map)
         return result
@@ -1464,9 +1985,9 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
     def _extract_unique_values_from_resources(
             self, resources_data, input_filters, include_subresources=True):
         not_clustered_resources = []
-        clustered_resources_map = {}
+        clustered_resources_map = ClusteredResourcesMap()
         cloud_account_ids = set()
-        input_resource_ids = input_filters.get('resource_id', [])
+        input_resource_ids = set(input_filters.get('resource_id', []))
         input_ca_ids = input_filters.get('cloud_account_id', [])
         cluster_ids = []
         for data in resources_data:
@@ -1482,29 +2003,36 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
                     if input_ca_ids:
                         # hide clustered resources if ca_id specified
                         continue
-                    res_ids_in = list(filter(
-                        lambda x: x in input_resource_ids, r_ids))
                     # show specified clustered resources outside of cluster
-                    not_clustered_resources.extend(res_ids_in)
-                    clustered_resources_map.update(
-                        {r: cluster_id for r in r_ids if r not in res_ids_in})
+                    for r in r_ids:
+                        if r in input_resource_ids:
+                            not_clustered_resources.append(r)
+                        else:
+                            clustered_resources_map[r] = cluster_id
                 else:
                     not_clustered_resources.extend(r_ids)
-        ext_cluster_ids = set()
-        for cl_id in cluster_ids:
-            if cl_id not in set(clustered_resources_map.values()):
-                ext_cluster_ids.add(cl_id)
-        if ext_cluster_ids:
-            sub_resources = self.resources_collection.find(
-                {'cluster_id': {'$in': list(ext_cluster_ids)}}, ['cluster_id'])
-            for s in sub_resources:
-                clustered_resources_map[s['_id']] = s['cluster_id']
+        self.resolve_clusters(clustered_resources_map, cluster_ids)
         resource_ids = not_clustered_resources + list(
-            set(clustered_resources_map.values()))
+            clustered_resources_map.cluster_ids)
         if include_subresources:
             resource_ids += list(clustered_resources_map.keys())
         return not_clustered_resources, clustered_resources_map, resource_ids
 
+    def resolve_clusters(self, clustered_resources_map, cluster_ids):
+        """
+        Adds resources of the clusters which have no clustered resources
+        in the map yet, resources of all such clusters are selected with
+        one query
+        """
+        ext_cluster_ids = [cl_id for cl_id in set(cluster_ids)
+                           if not clustered_resources_map.has_cluster(cl_id)]
+        if ext_cluster_ids:
+            sub_resources = self.resources_collection.find(
+                {'cluster_id': {'$in': ext_cluster_ids}}, ['cluster_id'])
+            for s in sub_resources:
+                clustered_resources_map[s['_id']] = s['cluster_id']
+        return clustered_resources_map
+
     def format_resource(self, resource, last_run_ts):
         optional_params = ['name', 'region', 'employee_id', 'pool_id',
                            'meta', 'tags', 'last_seen', 'is_environment']
@@ -1537,6 +2065,7 @@ class CleanExpenseController(BaseController, MongoMixin, ClickHouseMixin,
 
 
 class CleanExpenseAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
 
     def _get_controller_class(self):
         return CleanExpenseController
@@ -1545,6 +2074,8 @@ class CleanExpenseAsyncController(BaseAsyncControllerWrapper):
 class RawExpenseController(CleanExpenseController):
     EXPENSES_KEY = 'raw_expenses'
     JOIN_TRAFFIC_EXPENSES = False
+    RESOURCES_DIMENSION = False
+    PAGINATED = False
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1602,6 +2133,37 @@ class RawExpenseController(CleanExpenseController):
                      end_date, limit=None) -> tuple:
         start = datetime.fromtimestamp(start_date)
         end = datetime.fromtimestamp(end_date)
+        filters = self._get_raw_expenses_filters(resource_ids)
+        expenses = list(self.expense_ctrl.get_raw_expenses(start, end, filters))
+        return expenses, self.get_expenses_total_cost(expenses)
+
+    def get_all_expenses(self, cloud_account_ids, all_account_ids,
+                         not_clustered_resources, clustered_resources_map,
+                         joined_ids, limit=None):
+        """
+        Raw expenses are not kept in memory, the total cost is counted
+        by expenses costs and expenses documents are read by the returned
+        generator while the response is written
+        """
+        resource_ids = not_clustered_resources + list(
+            clustered_resources_map.keys())
+        if not resource_ids:
+            return [], set(), 0
+        start = datetime.fromtimestamp(self.start_date)
+        end = datetime.fromtimestamp(self.end_date)
+        filters = self._get_raw_expenses_filters(resource_ids)
+        total_cost = self.get_expenses_total_cost(
+            self.expense_ctrl.get_raw_expenses(
+                start, end, filters,
+                fields=['cost', 'start_date', 'end_date']))
+        expenses = self._iter_raw_expenses(start, end, filters, limit)
+        return expenses, set(), total_cost
+
+    def _iter_raw_expenses(self, start, end, filters, limit=None):
+        yield from self.expense_ctrl.get_raw_expenses(
+            start, end, filters, sort={'cost': -1, '_id': 1}, limit=limit)
+
+    def _get_raw_expenses_filters(self, resource_ids):
         (
             cloud_resource_ids,
             cloud_resource_hashes,
@@ -1625,8 +2187,7 @@ class RawExpenseController(CleanExpenseController):
                 ]
             },
         ]
-        expenses = list(self.expense_ctrl.get_raw_expenses(start, end, filters))
-        return expenses, self.get_expenses_total_cost(expenses)
+        return filters
 
     def _get_cloud_resource_ids(self, resource_ids):
         result = self.resources_collection.aggregate([
@@ -1691,6 +2252,7 @@ class RawExpenseController(CleanExpenseController):
 
 
 class RawExpenseAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
 
     def _get_controller_class(self):
         return RawExpenseController
@@ -1826,44 +2388,47 @@ class SummaryExpenseController(CleanExpenseController):
         pipeline = [match_stage] + self._pipeline_unwind_steps() + [group_stage]
         data = self.resources_collection.aggregate(pipeline, allowDiskUse=True)
 
-        all_resource_ids = []
-        counted_resource_ids = []
+        all_resource_ids = set()
+        counted_resource_ids = set()
         cluster_savings_map = {}
-        for res_group in sorted(
-                data, key=lambda x: x['_id']['cluster_type_id'] or ''):
+        cluster_ids = set()
+        for res_group in data:
             cluster_id = res_group['_id']['cluster_id']
             cluster_type_id = res_group['_id']['cluster_type_id']
             if cluster_type_id:
-                # clusters
-                cluster_ids = list(filter(lambda x: x not in all_resource_ids,
-                                          res_group['resource_ids']))
-                sub_resources_ids, cluster_savings = self._get_sub_resources_data(
-                    cluster_ids, last_run_ts)
-                cluster_savings_map.update(cluster_savings)
-                all_resource_ids.extend(cluster_ids)
-                all_resource_ids.extend(sub_resources_ids)
-                counted_resource_ids.extend(cluster_ids)
+                # clusters, sub resources of all clusters are selected
+                # with one query after the groups are processed
+                cluster_ids.update(res_group['resource_ids'])
             elif cluster_id:
                 # clustered resources
                 if 'cloud_account_id' not in filters:
                     if cluster_id not in cluster_savings_map:
                         cluster_savings_map[cluster_id] = 0
                     cluster_savings_map[cluster_id] += res_group['total_saving']
-                    all_resource_ids.extend(res_group['resource_ids'])
-                    counted_resource_ids.append(cluster_id)
+                    all_resource_ids.update(res_group['resource_ids'])
+                    counted_resource_ids.add(cluster_id)
             else:
                 # not clustered resources
                 result['total_saving'] += res_group['total_saving']
-                all_resource_ids.extend(res_group['resource_ids'])
-                counted_resource_ids.extend(res_group['resource_ids'])
-        result['total_count'] += len(set(counted_resource_ids))
+                all_resource_ids.update(res_group['resource_ids'])
+                counted_resource_ids.update(res_group['resource_ids'])
+        cluster_ids -= all_resource_ids
+        if cluster_ids:
+            sub_resources_ids, cluster_savings = self._get_sub_resources_data(
+                list(cluster_ids), last_run_ts)
+            cluster_savings_map.update(cluster_savings)
+            all_resource_ids.update(cluster_ids)
+            all_resource_ids.update(sub_resources_ids)
+            counted_resource_ids.update(cluster_ids)
+        result['total_count'] += len(counted_resource_ids)
         result['total_cost'] = self._get_clickhouse_total_cost(
-            set(all_resource_ids))
+            all_resource_ids)
         result['total_saving'] += sum(x for x in cluster_savings_map.values())
         return result
 
 
 class SummaryExpenseAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
 
     def _get_controller_class(self):
         return SummaryExpenseController
@@ -1973,6 +2538,7 @@ class RegionExpenseController(FilteredFormattedExpenseController,
 
 
 class RegionExpenseAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
 
     def _get_controller_class(self):
         return RegionExpenseController
@@ -1342,14 +1342,14 @@ class LiveDemoController(BaseController, MongoMixin, ClickHouseMixin):
 
     def _insert_clickhouse(self, table, bulk):
         db = CLICKHOUSE_TABLE_DB_MAP[table]
-        return self.clickhouse_client.execute(
-            f'INSERT INTO {db}.{table} VALUES', bulk)
+        return self.execute_clickhouse(
+            f'INSERT INTO {db}.{table} VALUES', params=bulk)
 
     def delete_clickhouse_info(self, cloud_accounts):
         cloud_account_ids = list(map(lambda x: x.id, cloud_accounts))
         for table in CLICKHOUSE_TABLE_DB_MAP:
             db = CLICKHOUSE_TABLE_DB_MAP[table]
-            self.clickhouse_client.execute(
+            self.execute_clickhouse(
                 f'ALTER TABLE {db}.{table} DELETE '
                 f'WHERE cloud_account_id in {cloud_account_ids}')
 
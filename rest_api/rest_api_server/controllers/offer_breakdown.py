@@ -1,5 +1,4 @@
 import logging
-from clickhouse_driver import Client as ClickHouseClient
 from collections import defaultdict
 from rest_api.rest_api_server.controllers.ri_breakdown import (
     RiBreakdownController)
@@ -13,13 +12,7 @@ SUPPORTED_CLOUD_TYPES = ['aws_cnr']
 
 class OfferBreakdownController(RiBreakdownController):
 
-    @property
-    def clickhouse_client(self):
-        if not self._clickhouse_client:
-            user, password, host, _ = self._config.clickhouse_params()
-            self._clickhouse_client = ClickHouseClient(
-                host=host, password=password, database=CH_DB_NAME, user=user)
-        return self._clickhouse_client
+    CLICKHOUSE_DATABASE = CH_DB_NAME
 
     def get_ri_sp_usage(self, cloud_account_ids, start_date, end_date):
         return self.execute_clickhouse(
@@ -115,5 +108,7 @@ class OfferBreakdownController(RiBreakdownController):
 
 
 class OfferBreakdownAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
+
     def _get_controller_class(self):
         return OfferBreakdownController
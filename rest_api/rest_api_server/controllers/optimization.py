@@ -38,7 +38,18 @@ class OptimizationController(BaseController, MongoMixin, ResourceFormatMixin):
         pipeline = [
             {'$match': {'$and': and_condition}}
         ]
-        return self.checklists_collection.aggregate(pipeline)
+        for optimization in self.checklists_collection.aggregate(pipeline):
+            # optimizations saved by previous versions keep data in the
+            # document
+            if ('data' not in optimization and
+                    optimization.get('items_count') is not None):
+                optimization['data'] = [
+                    x['data'] for x in self.checklist_items_collection.find({
+                        'organization_id': optimization['organization_id'],
+                        'created_at': optimization['created_at'],
+                        'module': optimization['module']
+                    }, ['data']).sort('_id', 1)]
+            yield optimization
 
     @staticmethod
     def get_basic_response(checklist):
@@ -217,11 +228,18 @@ class OptimizationController(BaseController, MongoMixin, ResourceFormatMixin):
         ).filter(Organization.deleted.is_(False)).scalar()
         checklist = ChecklistController(
             self.session, self._config).get_by_organization(org_id)
+        optimization_filter = {
+            'organization_id': checklist.organization_id,
+            'created_at': checklist.last_completed,
+            'module': module,
+            'data.resource_id': resource_id
+        }
+        self.checklist_items_collection.update_one(
+            filter=optimization_filter,
+            update={'$set': {'data.is_dismissed': is_dismissed}}
+        )
         self.checklists_collection.update_one(
-            filter={'organization_id': checklist.organization_id,
-                    'created_at': checklist.last_completed,
-                    'module': module,
-                    'data.resource_id': resource_id},
+            filter=optimization_filter,
             update={
                 '$set': {'data.$.is_dismissed': is_dismissed}
             }
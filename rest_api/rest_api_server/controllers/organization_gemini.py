@@ -2,7 +2,6 @@ import json
 import logging
 from typing import List
 
-from clickhouse_driver import Client as ClickHouseClient
 
 from rest_api.rest_api_server.controllers.base import (
     BaseController, ClickHouseMixin)
@@ -58,13 +57,7 @@ class GeminiDataController(BaseController, ClickHouseMixin):
     """
     Controller for /restapi/v2/geminis/{id}/data
     """
-    @property
-    def clickhouse_client(self):
-        if not self._clickhouse_client:
-            user, password, host, _ = self._config.clickhouse_params()
-            self._clickhouse_client = ClickHouseClient(
-                host=host, password=password, database="gemini", user=user)
-        return self._clickhouse_client
+    CLICKHOUSE_DATABASE = "gemini"
 
     def get(self, gemini_id: str, buckets: list) -> list:
         unique_buckets = list(set(buckets))
@@ -25,6 +25,7 @@ from rest_api.rest_api_server.utils import (
     check_int_attribute, raise_does_not_exist_exception,
     raise_invalid_argument_exception, check_bool_attribute,
     BASE_POOL_EXPENSES_EXPORT_LINK_FORMAT as BASE_LINK_FORMAT)
+from rest_api.rest_api_server.result_cache import result_cache
 from tools.optscale_exceptions.common_exc import (
     WrongArgumentsException, ForbiddenException, NotFoundException,
     ConflictException, FailedDependency)
@@ -225,6 +226,7 @@ class PoolController(BaseController, MongoMixin):
             invalid_owners, new_owner = self.get_reassigned_owners(item)
             _, resources_moved = self.reassign_resources(
                 item.id, parent_pool.id, invalid_owners, new_owner)
+            result_cache.bump_generation(item.organization_id)
             rules_redirected = self.redirect_assignment_rules(
                 item.id, parent_pool.id, invalid_owners, new_owner)
             meta = {
@@ -751,21 +753,23 @@ class PoolController(BaseController, MongoMixin):
         if not last_completed:
             return 0
 
-        pipeline = [
-            {'$match': {
-                '$and': [
-                    {'organization_id': organization_id},
-                    {'created_at': last_completed}
-                ]
-            }},
-            {'$unwind': '$data'},
-            {'$group': {
-                '_id': {'organization_id': '$organization_id',
-                        'is_dismissed': '$data.is_dismissed'},
-                'saving': {'$sum': '$data.saving'},
-            }}
-        ]
-        for saving in self.checklists_collection.aggregate(pipeline):
+        match_stage = {'$match': {
+            '$and': [
+                {'organization_id': organization_id},
+                {'created_at': last_completed}
+            ]
+        }}
+        group_stage = {'$group': {
+            '_id': {'organization_id': '$organization_id',
+                    'is_dismissed': '$data.is_dismissed'},
+            'saving': {'$sum': '$data.saving'},
+        }}
+        # data of checklists saved by previous versions is in the document
+        savings = list(self.checklists_collection.aggregate(
+            [match_stage, {'$unwind': '$data'}, group_stage]))
+        savings.extend(self.checklist_items_collection.aggregate(
+            [match_stage, group_stage]))
+        for saving in savings:
             if not saving.get('_id', {}).get('is_dismissed', False):
                 return saving.get('saving', 0)
         return 0
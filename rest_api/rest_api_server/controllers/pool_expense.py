@@ -242,5 +242,7 @@ class PoolExpenseController(BaseController):
 
 
 class PoolExpenseAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
+
     def _get_controller_class(self):
         return PoolExpenseController
@@ -18,6 +18,7 @@ from rest_api.rest_api_server.models.models import (ReportImport, CloudAccount,
 from rest_api.rest_api_server.controllers.base import BaseController
 from rest_api.rest_api_server.controllers.base_async import BaseAsyncControllerWrapper
 from rest_api.rest_api_server.controllers.checklist import ChecklistController
+from rest_api.rest_api_server.result_cache import result_cache
 from rest_api.rest_api_server.utils import (raise_unexpected_exception,
                                             check_int_attribute)
 
@@ -96,6 +97,10 @@ class ReportImportBaseController(BaseController):
         kwargs['updated_at'] = int(datetime.utcnow().timestamp())
         updated_report = super().edit(item_id, **kwargs)
         state = kwargs.get('state')
+        if state == ImportStates.COMPLETED.value:
+            # expenses of the organization are changed by the import
+            result_cache.bump_generation(
+                updated_report.cloud_account.organization_id)
         if updated_report.is_recalculation:
             if state == ImportStates.COMPLETED.value:
                 self._publish_report_import_activity(updated_report,
@@ -3,7 +3,8 @@ from collections import defaultdict
 from datetime import datetime
 
 from rest_api.rest_api_server.controllers.base_async import BaseAsyncControllerWrapper
-from rest_api.rest_api_server.controllers.breakdown_expense import BreakdownBaseController
+from rest_api.rest_api_server.controllers.breakdown_expense import (
+    BreakdownBaseController, DIMENSION_BREAKDOWNS, RESOURCES_ROLLUP)
 from rest_api.rest_api_server.exceptions import Err
 
 from tools.optscale_exceptions.common_exc import WrongArgumentsException
@@ -13,8 +14,16 @@ SECONDS_IN_DAY = 86400
 
 
 class ResourceCountController(BreakdownBaseController):
+    RESOURCES_DIMENSION = False
+    ROLLUPS = [RESOURCES_ROLLUP]
     collected_filters = ['cloud_account_id', 'employee_id', 'pool_id']
 
+    def rollup_supported(self, query_filters, data_filters, extra_params):
+        return extra_params.get(
+            'breakdown_by') in DIMENSION_BREAKDOWNS and self.day_aligned(
+        ) and super().rollup_supported(
+            query_filters, data_filters, extra_params)
+
     @staticmethod
     def get_base_breakdown(start_date, end_date):
         breakdown = {}
@@ -212,6 +221,119 @@ class ResourceCountController(BreakdownBaseController):
                 }})
         return result
 
+    def _get_rollup_events(self, cloud_account_ids, dimensions):
+        # dimension -> value -> day -> (started, deleted)
+        events = self.execute_clickhouse(
+            query="""
+                SELECT dimension, value, toUnixTimestamp(date),
+                    sum(started), sum(deleted)
+                FROM resources_rollup FINAL
+                WHERE cloud_account_id IN %(cloud_account_ids)s
+                    AND dimension IN %(dimensions)s
+                    AND NOT removed
+                    AND date <= %(last_day)s
+                GROUP BY dimension, value, date
+            """,
+            params={
+                'cloud_account_ids': cloud_account_ids,
+                'dimensions': list(dimensions),
+                'last_day': self.end_date - SECONDS_IN_DAY + 1,
+            })
+        result = defaultdict(lambda: defaultdict(dict))
+        for dimension, value, day, started, deleted in events:
+            result[dimension][value][day] = (started, deleted)
+        return result
+
+    def _get_rollup_breakdowns(self, value_events, breakdowns):
+        """
+        Resource is counted on the days from its first seen day to its last
+        seen day, so the count of a day is the number of resources started
+        until the day minus the number of resources last seen before it.
+        """
+        counts, created, deleted_day_before = {}, {}, {}
+        started_total, deleted_total = 0, 0
+        for day, (started, deleted) in value_events.items():
+            if day < breakdowns[0]:
+                started_total += started
+                deleted_total += deleted
+        for i, b in enumerate(breakdowns):
+            started, deleted = value_events.get(b, (0, 0))
+            started_total += started
+            counts[str(b)] = started_total - deleted_total
+            deleted_total += deleted
+            created[str(b)] = started if i else 0
+            deleted_day_before[str(b)] = value_events.get(
+                b - SECONDS_IN_DAY, (0, 0))[1] if i else 0
+        return {
+            'count': counts,
+            'created': created,
+            'deleted_day_before': deleted_day_before,
+            'average': sum(counts.values()) / len(breakdowns),
+        }
+
+    def process_rollup_data(self, cloud_account_ids, organization_id,
+                            filters, **kwargs):
+        breakdown_by = kwargs['breakdown_by']
+        breakdown_dimension = breakdown_by or 'cloud_account_id'
+        breakdowns = self._get_breakdown_dates(self.start_date, self.end_date)
+        events = self._get_rollup_events(
+            cloud_account_ids,
+            set(self.collected_filters) | {breakdown_dimension})
+        # resources seen in the range by dimension value
+        totals = defaultdict(dict)
+        for dimension, dimension_events in events.items():
+            for value, value_events in dimension_events.items():
+                total = sum(e[0] for e in value_events.values()) - sum(
+                    e[1] for day, e in value_events.items()
+                    if day < self.start_date)
+                if total > 0:
+                    totals[dimension][value] = total
+
+        result = self.get_base_result(
+            self.start_date, self.end_date, breakdown_by)
+        result['breakdown'] = defaultdict(dict)
+        result['count'] = sum(totals['cloud_account_id'].values())
+        unique_values = {f: set(totals[f]) for f in self.collected_filters}
+        _, organization_cloud_accs = self.get_organization_and_cloud_accs(
+            organization_id)
+        entities = self.get_db_entities_info(
+            organization_id, organization_cloud_accs, unique_values)
+        breakdown_entities = self.get_breakdown_entity_map(
+            entities, breakdown_by)
+
+        # rollup values are merged into one value without breakdown
+        values = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        value_totals = defaultdict(int)
+        for value, total in totals[breakdown_dimension].items():
+            value = (value or None) if breakdown_by else None
+            value_totals[value] += total
+        for value, value_events in events[breakdown_dimension].items():
+            if not totals[breakdown_dimension].get(value):
+                continue
+            value = (value or None) if breakdown_by else None
+            for day, (started, deleted) in value_events.items():
+                values[value][day][0] += started
+                values[value][day][1] += deleted
+        result['counts'] = {}
+        for value, value_events in values.items():
+            breakdown_counters = self._get_rollup_breakdowns(
+                {day: tuple(e) for day, e in value_events.items()},
+                breakdowns)
+            result['counts'][value] = {
+                'total': value_totals[value],
+                'average': breakdown_counters['average'],
+                **breakdown_entities.get(value, {})
+            }
+            for timestamp, r_count in breakdown_counters['count'].items():
+                result['breakdown'][timestamp][value] = {
+                    'count': r_count,
+                    'created': breakdown_counters['created'][timestamp],
+                    'deleted_day_before': breakdown_counters[
+                        'deleted_day_before'][timestamp],
+                    **breakdown_entities.get(value, {})
+                }
+        return result
+
     def get_base_result(self, start_date, end_date, breakdown_by):
         res = {
             'start_date': start_date,
@@ -225,6 +347,7 @@ class ResourceCountController(BreakdownBaseController):
 
 
 class ResourceCountAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
 
     def _get_controller_class(self):
         return ResourceCountController
@@ -1,5 +1,4 @@
 import logging
-from clickhouse_driver import Client as ClickHouseClient
 from collections import defaultdict
 from datetime import datetime, timedelta
 from rest_api.rest_api_server.controllers.expense import CleanExpenseController
@@ -29,13 +28,7 @@ RI_FACTOR_MAP = {
 class RiBreakdownController(CleanExpenseController):
     RESOURCE_PREFIX = 'ri'
 
-    @property
-    def clickhouse_client(self):
-        if not self._clickhouse_client:
-            user, password, host, _ = self._config.clickhouse_params()
-            self._clickhouse_client = ClickHouseClient(
-                host=host, password=password, database=CH_DB_NAME, user=user)
-        return self._clickhouse_client
+    CLICKHOUSE_DATABASE = CH_DB_NAME
 
     def get_usage_breakdown(self, cloud_account_ids):
         return self.execute_clickhouse(
@@ -366,5 +359,7 @@ class RiBreakdownController(CleanExpenseController):
 
 
 class RiBreakdownAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
+
     def _get_controller_class(self):
         return RiBreakdownController
@@ -103,5 +103,7 @@ class RiGroupBreakdownController(RiBreakdownController):
 
 
 class RiGroupBreakdownAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
+
     def _get_controller_class(self):
         return RiGroupBreakdownController
@@ -14,6 +14,7 @@ from rest_api.rest_api_server.controllers.pool import PoolController
 from rest_api.rest_api_server.exceptions import Err
 from rest_api.rest_api_server.models.enums import ConditionTypes
 from rest_api.rest_api_server.models.models import Pool, CloudAccount, Rule, Employee
+from rest_api.rest_api_server.result_cache import result_cache
 from rest_api.rest_api_server.utils import encoded_tags
 
 
@@ -336,6 +337,8 @@ class RuleApplyController(BaseController, MongoMixin):
         for i in range(0, len(resource_update_chunk), chunk_size):
             self.resources_collection.bulk_write(
                 resource_update_chunk[i:i + chunk_size])
+        if resource_update_chunk:
+            result_cache.bump_generation(organization_id)
         for e in events:
             self.publish_cloud_acc_activities(*e)
         meta = {
@@ -130,5 +130,7 @@ class SpBreakdownController(RiBreakdownController):
 
 
 class SpBreakdownAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
+
     def _get_controller_class(self):
         return SpBreakdownController
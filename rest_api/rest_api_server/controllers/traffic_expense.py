@@ -10,6 +10,7 @@ LOG = logging.getLogger(__name__)
 
 class TrafficExpenseController(CleanExpenseController):
     JOIN_TRAFFIC_EXPENSES = False
+    RESOURCES_DIMENSION = False
 
     def _aggregate_resource_data(self, match_query, **kwargs):
         group_stage = {
@@ -160,5 +161,7 @@ class TrafficExpenseController(CleanExpenseController):
 
 
 class TrafficExpenseAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
+
     def _get_controller_class(self):
         return TrafficExpenseController
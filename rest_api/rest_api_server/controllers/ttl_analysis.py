@@ -161,5 +161,7 @@ class TtlAnalysisController(BaseController, MongoMixin, ClickHouseMixin):
 
 
 class TtlAnalysisAsyncController(BaseAsyncControllerWrapper):
+    HEAVY = True
+
     def _get_controller_class(self):
         return TtlAnalysisController
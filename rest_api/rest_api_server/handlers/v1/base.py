@@ -19,7 +19,9 @@ from rest_api.rest_api_server.models.models import (
     PoolAlert, PoolPolicy, ResourceConstraint, OrganizationBI, ShareableBooking,
     Rule, Webhook, OrganizationConstraint, OrganizationGemini, PowerSchedule)
 from rest_api.rest_api_server.utils import (ModelEncoder, Config, tp_executor,
-                                            run_task, get_http_error_info)
+                                            tp_executor_heavy, run_task,
+                                            get_http_error_info,
+                                            iter_json_chunks)
 
 LOG = logging.getLogger(__name__)
 
@@ -171,6 +173,25 @@ class BaseHandler(tornado.web.RequestHandler):
         return self.io_loop.run_in_executor(
             self.executor, functools.partial(func, *args, **kwargs))
 
+    def run_on_heavy_executor(self, func, *args, **kwargs):
+        return self.io_loop.run_in_executor(
+            tp_executor_heavy, functools.partial(func, *args, **kwargs))
+
+    async def write_json_stream(self, obj, cls=ModelEncoder, **kwargs):
+        """
+        Writes obj as json by chunks. Chunks are encoded on the heavy
+        executor, so generators of obj may read databases. Response is sent
+        with chunked transfer encoding if it doesn't fit one chunk, every
+        chunk is flushed before the next one is encoded.
+        """
+        chunks = iter_json_chunks(obj, cls=cls, **kwargs)
+        chunk = await self.run_on_heavy_executor(next, chunks, None)
+        while chunk is not None:
+            self.write(chunk)
+            chunk = await self.run_on_heavy_executor(next, chunks, None)
+            if chunk is not None:
+                await self.flush()
+
     async def _get_item(self, item_id, **kwargs):
         res = await run_task(self.controller.get, item_id, **kwargs)
         type_name = self.controller.model_type.__name__
@@ -3,6 +3,7 @@ from rest_api.rest_api_server.handlers.v2.expenses import FilteredExpensesBaseAs
 
 
 class AvailableFiltersAsyncHandler(FilteredExpensesBaseAsyncHandler):
+    RESULT_CACHE_ENDPOINT = 'available_filters'
 
     def _get_controller_class(self):
         return AvailableFiltersAsyncController
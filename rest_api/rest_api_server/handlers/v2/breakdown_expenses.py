@@ -3,6 +3,8 @@ from rest_api.rest_api_server.handlers.v2.expenses import BreakdownExpensesBaseA
 
 
 class BreakdownExpensesAsyncHandler(BreakdownExpensesBaseAsyncHandler):
+    RESULT_CACHE_ENDPOINT = 'breakdown_expenses'
+
     def _get_controller_class(self):
         return BreakdownExpenseAsyncController
 
@@ -0,0 +1,85 @@
+import json
+
+from rest_api.rest_api_server.connections import connection_registry
+from rest_api.rest_api_server.handlers.v1.base import BaseAuthHandler
+from rest_api.rest_api_server.handlers.v2.base import BaseHandler
+from rest_api.rest_api_server.result_cache import result_cache
+from rest_api.rest_api_server.utils import executors_stats
+
+
+class ConnectionStatsHandler(BaseAuthHandler, BaseHandler):
+    def _get_controller_class(self):
+        raise NotImplementedError
+
+    async def get(self):
+        """
+        ---
+        description: |
+            Get usage of process-wide mongo and clickhouse connection pools,
+            executors, etcd config cache and expenses result cache of the
+            rest api instance
+            Required permission: CLUSTER_SECRET
+        tags: [connection_stats]
+        summary: Internal API to get connection pools usage
+        responses:
+            200:
+                description: Connection pools usage
+                schema:
+                    type: object
+                    properties:
+                        mongo:
+                            type: object
+                            description: |
+                                mongo connection pool counters: created,
+                                closed, open, in_use, checkouts, checkins,
+                                checkout_failures
+                        clickhouse:
+                            type: object
+                            description: |
+                                clickhouse connection pools by database
+                                (default is the configured database), every
+                                pool has size, created, in_use, idle,
+                                checkouts, waits, wait_time (seconds) and
+                                timeouts
+                        executors:
+                            type: object
+                            description: |
+                                executors of controllers methods: light,
+                                heavy (analytics requests) and context.
+                                Every executor has workers, active, queued
+                                (tasks waiting for a free worker),
+                                submitted, completed, wait_time and
+                                max_wait_time (seconds tasks waited for a
+                                worker)
+                        config:
+                            type: object
+                            description: |
+                                etcd config cache: watching (values are
+                                cached only while the watcher is alive),
+                                cached, hits, misses
+                        result_cache:
+                            type: object
+                            description: |
+                                expenses result cache: available (cache is
+                                not used for a while after a redis failure),
+                                ttl (seconds) and endpoints counters by
+                                endpoint name: hits, misses, errors, skipped
+                                (cache is not available), oversized (result
+                                is too large to be cached), stale (resources
+                                dimension is behind the last data change)
+            401:
+                description: |
+                    Unauthorized:
+                    - OE0237: This resource requires authorization
+            403:
+                description: |
+                    Forbidden:
+                    - OE0236: Bad secret
+        security:
+        - secret: []
+        """
+        self.check_cluster_secret()
+        stats = connection_registry.stats()
+        stats['executors'] = executors_stats()
+        stats['result_cache'] = result_cache.stats()
+        self.write(json.dumps(stats))
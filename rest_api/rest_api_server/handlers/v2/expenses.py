@@ -15,6 +15,7 @@ from rest_api.rest_api_server.exceptions import Err
 from rest_api.rest_api_server.handlers.v2.base import BaseHandler
 from rest_api.rest_api_server.handlers.v1.base_async import BaseAsyncItemHandler
 from rest_api.rest_api_server.handlers.v1.base import BaseAuthHandler
+from rest_api.rest_api_server.result_cache import result_cache
 
 from rest_api.rest_api_server.utils import (
     run_task, ModelEncoder, check_int_attribute, object_to_xlsx,
@@ -570,6 +571,25 @@ class MongoEncoder(ModelEncoder):
 
 class FilteredExpensesBaseAsyncHandler(SupportedFiltersMixin,
                                        ExpenseBaseAsyncHandler):
+    # results of the endpoint are cached if set
+    RESULT_CACHE_ENDPOINT = None
+
+    async def get_result(self, organization_id, **args):
+        if not self.RESULT_CACHE_ENDPOINT:
+            return await run_task(self.controller.get, organization_id, **args)
+        # cached results are large, they are encoded on the same executor
+        # as the analytics controllers
+        cache_key, res = await self.run_on_heavy_executor(
+            result_cache.get, self.RESULT_CACHE_ENDPOINT, organization_id,
+            args)
+        if res is None:
+            res = await run_task(self.controller.get, organization_id, **args)
+            if cache_key:
+                await self.run_on_heavy_executor(
+                    result_cache.set, self.RESULT_CACHE_ENDPOINT, cache_key,
+                    res)
+        return res
+
     def get_filter_arguments(self, args):
         request_arguments = self.request.arguments.keys()
         allowed_args = (list(args.keys()) + self.list_filters +
@@ -618,7 +638,7 @@ class FilteredExpensesBaseAsyncHandler(SupportedFiltersMixin,
                 'INFO_ORGANIZATION', 'organization', organization_id)
         args = self.get_expense_arguments()
         try:
-            res = await run_task(self.controller.get, organization_id, **args)
+            res = await self.get_result(organization_id, **args)
         except NotFoundException as exc:
             raise OptHTTPError.from_opt_exception(404, exc)
         self.write(json.dumps(res, cls=ModelEncoder))
@@ -626,6 +646,8 @@ class FilteredExpensesBaseAsyncHandler(SupportedFiltersMixin,
 
 class CleanExpenseAsyncHandler(FilteredExpensesBaseAsyncHandler):
     expenses_key = 'clean_expenses'
+    PAGINATED = True
+    RESULT_CACHE_ENDPOINT = 'clean_expenses'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -636,6 +658,11 @@ class CleanExpenseAsyncHandler(FilteredExpensesBaseAsyncHandler):
     def _get_controller_class(self):
         return CleanExpenseAsyncController
 
+    def get_filter_arguments(self, args):
+        if self.PAGINATED and 'cursor' in self.request.arguments:
+            args['cursor'] = self.get_arg('cursor', str)
+        return super().get_filter_arguments(args)
+
     def _fix_expenses_data(self, expenses_data):
         """
         OS-4055: workaround to fix issue for xlsx generation, as for
@@ -709,30 +736,30 @@ class CleanExpenseAsyncHandler(FilteredExpensesBaseAsyncHandler):
         expenses = response.get(self.expenses_key)
         if expenses is None:
             return
-        processed_expenses = []
         fields_to_keep = [field.split(".") for field in fields_to_keep]
-        for expense in expenses:
-            processed_expenses.append(self._filter_expense_fields(expense, fields_to_keep))
-        response[self.expenses_key] = processed_expenses
+        # expenses may be a generator, they are filtered while the
+        # response is written
+        response[self.expenses_key] = (
+            self._filter_expense_fields(expense, fields_to_keep)
+            for expense in expenses)
 
-    def _respond_data(self, exp_format, response, fields=None):
+    async def _respond_data(self, exp_format, response, fields=None):
         self._filter_response_fields(response, fields)
         if exp_format == 'json':
             self.set_content_type('application/json; charset="utf-8"')
             expenses = response.get(self.expenses_key)
             result = expenses if expenses is not None else response
-            self.write(json.dumps(result, cls=ModelEncoder, indent=4,
-                                  sort_keys=True))
+            await self.write_json_stream(result, indent=4, sort_keys=True)
         elif exp_format == 'xlsx':
             self.set_content_type('application/vnd.openxmlformats-'
                                   'officedocument.spreadsheetml.sheet')
             expenses = response.get(self.expenses_key)
-            res_exp = expenses if expenses is not None else [response]
+            res_exp = list(expenses) if expenses is not None else [response]
             res_exp = self._fix_expenses_data(res_exp)
             res_str = json.dumps(res_exp, cls=MongoEncoder)
             self.write(object_to_xlsx(json.loads(res_str)))
         elif exp_format == 'advanced_json':
-            self.write(json.dumps(response, cls=MongoEncoder))
+            await self.write_json_stream(response, cls=MongoEncoder)
         else:
             raise OptHTTPError(400, Err.OE0473, [exp_format])
 
@@ -887,9 +914,15 @@ class CleanExpenseAsyncHandler(FilteredExpensesBaseAsyncHandler):
             in: query
             description: >
                 Limit amount of expenses returned. Must be >0. Expenses will be
-                sorted by cost (desc) before limiting
+                sorted by cost (desc) and resource id before limiting
             required: false
             type: integer
+        -   name: cursor
+            in: query
+            description: >
+                next_cursor value of the previous page. Requires limit
+            required: false
+            type: string
         -   name: name_like
             in: query
             description: name regular expression
@@ -1301,6 +1334,12 @@ class CleanExpenseAsyncHandler(FilteredExpensesBaseAsyncHandler):
                             description: >
                                 max objects amount (limit applied)
                             example: 5000
+                        next_cursor:
+                            type: string
+                            description: >
+                                cursor of the next page, null for the last
+                                page. Returned if limit is set
+                            example: WzEuNSwgInJlc291cmNlX2lkIl0=
             400:
                 description: |
                     Wrong arguments:
@@ -1341,14 +1380,16 @@ class CleanExpenseAsyncHandler(FilteredExpensesBaseAsyncHandler):
         exp_format = args.pop('format', 'advanced_json')
         fields = args.pop('field', None)
         try:
-            res = await run_task(self.controller.get, organization_id, **args)
+            res = await self.get_result(organization_id, **args)
         except NotFoundException as exc:
             raise OptHTTPError.from_opt_exception(404, exc)
-        self._respond_data(exp_format, res, fields)
+        await self._respond_data(exp_format, res, fields)
 
 
 class RawExpenseAsyncHandler(CleanExpenseAsyncHandler):
     expenses_key = 'raw_expenses'
+    PAGINATED = False
+    RESULT_CACHE_ENDPOINT = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1569,11 +1610,13 @@ class RawExpenseAsyncHandler(CleanExpenseAsyncHandler):
             res = await run_task(self.controller.get, resource_id, **args)
         except NotFoundException as exc:
             raise OptHTTPError.from_opt_exception(404, exc)
-        self._respond_data(exp_format, res)
+        await self._respond_data(exp_format, res)
 
 
 class SummaryExpenseAsyncHandler(CleanExpenseAsyncHandler):
     expenses_key = 'summary_expenses'
+    PAGINATED = False
+    RESULT_CACHE_ENDPOINT = 'summary_expenses'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1835,10 +1878,10 @@ class SummaryExpenseAsyncHandler(CleanExpenseAsyncHandler):
         args = self.get_expense_arguments()
         exp_format = args.pop('format', 'advanced_json')
         try:
-            res = await run_task(self.controller.get, organization_id, **args)
+            res = await self.get_result(organization_id, **args)
         except NotFoundException as exc:
             raise OptHTTPError.from_opt_exception(404, exc)
-        self._respond_data(exp_format, res)
+        await self._respond_data(exp_format, res)
 
 
 class BreakdownExpensesBaseAsyncHandler(FilteredExpensesBaseAsyncHandler):
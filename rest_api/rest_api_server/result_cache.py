@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from rest_api.rest_api_server.connections import connection_registry
+from rest_api.rest_api_server.controllers.base import (
+    RESOURCES_DIMENSION_MAX_LAG, RESOURCES_DIMENSION_STATE_ID)
+from rest_api.rest_api_server.utils import ModelEncoder
+
+LOG = logging.getLogger(__name__)
+RESULT_CACHE_TTL = 900
+# larger results are computed on every request
+RESULT_CACHE_MAX_SIZE = 32 * 1024 * 1024
+# cache is not used for a while after a redis failure
+RESULT_CACHE_RETRY_INTERVAL = 60
+RESULT_KEY_PREFIX = 'restapi:result'
+GENERATION_KEY_PREFIX = 'restapi:generation'
+BUMPED_AT_KEY_PREFIX = 'restapi:bumped_at'
+
+
+class ResultCache:
+    """
+    Redis cache of expenses results shared by rest api instances. Result
+    key includes organization data generation, which is increased when
+    expenses or resources assignment of the organization change, so results
+    of previous generations are not read anymore and expire by ttl. Redis
+    evicts least recently used keys with ttl when memory is full. Redis
+    failures aren't raised, results are computed without cache. Resources
+    dimension is replicated with a lag, so cache isn't used until changes
+    of the last generation increase are replicated.
+    """
+    def __init__(self, ttl=RESULT_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._disabled_until = 0
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    @property
+    def redis_client(self):
+        return connection_registry.redis_client
+
+    @property
+    def mongo_client(self):
+        return connection_registry.mongo_client
+
+    def _increase(self, endpoint, counter):
+        with self._lock:
+            self._counters[endpoint][counter] += 1
+
+    def _available(self):
+        return time.time() >= self._disabled_until
+
+    def _fail(self, endpoint, action, exc):
+        self._increase(endpoint, 'errors')
+        self._disabled_until = time.time() + RESULT_CACHE_RETRY_INTERVAL
+        LOG.warning('Result cache %s failed, cache is disabled for %ss: %s',
+                    action, RESULT_CACHE_RETRY_INTERVAL, exc)
+
+    @staticmethod
+    def _generation_key(organization_id):
+        return '%s:%s' % (GENERATION_KEY_PREFIX, organization_id)
+
+    @staticmethod
+    def _bumped_at_key(organization_id):
+        return '%s:%s' % (BUMPED_AT_KEY_PREFIX, organization_id)
+
+    def _dimension_behind(self, bumped_at):
+        # the dimension is used by expenses controllers while it's synced
+        # within the max lag, results computed from it before the changes
+        # are replicated would be cached for the whole ttl
+        state = self.mongo_client.restapi.clickhouse_sync.find_one(
+            {'_id': RESOURCES_DIMENSION_STATE_ID}, ['synced_at'])
+        synced_at = (state or {}).get('synced_at') or 0
+        return (time.time() - RESOURCES_DIMENSION_MAX_LAG <= synced_at <
+                bumped_at)
+
+    def _get_generation(self, organization_id):
+        key = self._generation_key(organization_id)
+        generation = self.redis_client.get(key)
+        if generation is None:
+            # generation starts from the current time, so a lost counter
+            # doesn't make results of previous generations actual again
+            self.redis_client.set(key, int(time.time() * 1000), nx=True)
+            generation = self.redis_client.get(key)
+        return int(generation)
+
+    @staticmethod
+    def _params_hash(params):
+        normalized = {
+            k: sorted(v, key=str) if isinstance(v, list) else v
+            for k, v in params.items()
+        }
+        return hashlib.sha256(json.dumps(
+            normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, endpoint, organization_id, params):
+        """
+        Returns result key and cached result. Result is None on cache miss,
+        key is None if cache is not available.
+        """
+        if not self._available():
+            self._increase(endpoint, 'skipped')
+            return None, None
+        try:
+            key = '%s:%s:%s:%s:%s' % (
+                RESULT_KEY_PREFIX, endpoint, organization_id,
+                self._get_generation(organization_id),
+                self._params_hash(params))
+            value = self.redis_client.get(key)
+            bumped_at = self.redis_client.get(
+                self._bumped_at_key(organization_id))
+        except Exception as exc:
+            self._fail(endpoint, 'read', exc)
+            return None, None
+        if bumped_at is not None:
+            try:
+                dimension_behind = self._dimension_behind(float(bumped_at))
+            except Exception as exc:
+                LOG.warning('Unable to get resources dimension state: %s',
+                            exc)
+                dimension_behind = True
+            if dimension_behind:
+                self._increase(endpoint, 'stale')
+                return None, None
+        if value is not None:
+            # results are stored as json, so data written to redis by other
+            # services isn't executed on read
+            try:
+                result = json.loads(value)
+            except ValueError:
+                LOG.warning('Unable to decode cached result %s', key)
+            else:
+                self._increase(endpoint, 'hits')
+                return key, result
+        self._increase(endpoint, 'misses')
+        return key, None
+
+    def set(self, endpoint, key, result):
+        value = json.dumps(result, cls=ModelEncoder).encode()
+        if len(value) > RESULT_CACHE_MAX_SIZE:
+            self._increase(endpoint, 'oversized')
+            return
+        try:
+            self.redis_client.set(key, value, ex=self.ttl)
+        except Exception as exc:
+            self._fail(endpoint, 'write', exc)
+
+    def bump_generation(self, organization_id):
+        key = self._generation_key(organization_id)
+        try:
+            pipeline = self.redis_client.pipeline()
+            pipeline.set(key, int(time.time() * 1000), nx=True)
+            pipeline.incr(key)
+            # dimension is not used if it's behind more than the max lag
+            pipeline.set(self._bumped_at_key(organization_id), time.time(),
+                         ex=RESOURCES_DIMENSION_MAX_LAG)
+            pipeline.execute()
+        except Exception as exc:
+            # results of the organization are actual only until ttl
+            LOG.warning('Unable to increase data generation of organization '
+                        '%s: %s', organization_id, exc)
+
+    def stats(self):
+        with self._lock:
+            endpoints = {k: dict(v) for k, v in self._counters.items()}
+        return {
+            'available': self._available(),
+            'ttl': self.ttl,
+            'endpoints': endpoints,
+        }
+
+
+result_cache = ResultCache()
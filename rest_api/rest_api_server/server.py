@@ -533,6 +533,9 @@ def get_handlers(handler_kwargs, version=None):
             (urls_v2.restore_password,
              h_v2.restore_passwords.RestorePasswordAsyncCollectionHandler,
              handler_kwargs),
+            (urls_v2.connection_stats,
+             h_v2.connection_stats.ConnectionStatsHandler,
+             handler_kwargs),
             *profiling_urls,
         ])
     return result
@@ -2,6 +2,7 @@ import os
 import csv
 import uuid
 import subprocess
+import time
 import tempfile
 from ast import literal_eval
 from datetime import datetime, timezone
@@ -25,6 +26,70 @@ from pymongo import UpdateMany
 from contextlib import contextmanager
 
 SECONDS_IN_DAY = 86400
+RESOURCES_DIMENSION_STRUCTURE = [
+    ('resource_id', 'String'),
+    ('organization_id', 'String'),
+    ('cloud_account_id', 'String'),
+    ('cluster_id', 'String'),
+    ('cluster_type_id', 'String'),
+    ('pool_id', 'String'),
+    ('employee_id', 'String'),
+    ('resource_type', 'String'),
+    ('is_environment', 'UInt8'),
+    ('region', 'String'),
+    ('service_name', 'String'),
+    ('tag_keys', 'Array(String)'),
+    ('first_seen', 'Int64'),
+    ('last_seen', 'Int64'),
+    ('deleted_at', 'Int64'),
+    ('is_deleted', 'UInt8'),
+]
+# rollups are built of resources_dimension rows the same way as diworker
+# builds them, but for all cloud accounts and without the rollup period
+ROLLUP_RESOURCES_QUERY = """
+    SELECT
+        cloud_account_id, resource_id, dimension, value,
+        intDiv(first_seen, 86400) * 86400 AS first_day,
+        intDiv(last_seen, 86400) * 86400 AS last_day
+    FROM (
+        SELECT *, if(empty(tag_keys), [''], tag_keys) AS tags
+        FROM resources_dimension FINAL
+        WHERE cloud_account_id != '' AND NOT is_deleted AND deleted_at = 0
+    )
+    ARRAY JOIN
+        arrayConcat(
+            ['cloud_account_id', 'employee_id', 'pool_id', 'region',
+             'service_name', 'resource_type'],
+            arrayMap(x -> 'tag', tags)) AS dimension,
+        arrayConcat([
+            cloud_account_id, employee_id, pool_id, region, service_name,
+            if(is_environment, concat(resource_type, ':environment'),
+               resource_type)
+        ], tags) AS value
+"""
+EXPENSES_ROLLUP_QUERY = """(
+    SELECT
+        cloud_account_id, dimension, value, date, sum(cost) AS cost,
+        0 AS removed
+    FROM (
+        SELECT resource_id, date, sum(cost * sign) AS cost
+        FROM expenses
+        GROUP BY resource_id, date
+    ) AS expenses
+    JOIN (%s) AS resources USING resource_id
+    GROUP BY cloud_account_id, dimension, value, date
+)""" % ROLLUP_RESOURCES_QUERY
+RESOURCES_ROLLUP_QUERY = """(
+    SELECT
+        cloud_account_id, dimension, value, toDateTime(event.1) AS date,
+        sum(event.2) AS started, sum(event.3) AS deleted, 0 AS removed
+    FROM (
+        SELECT cloud_account_id, dimension, value,
+            arrayJoin([(first_day, 1, 0), (last_day, 0, 1)]) AS event
+        FROM (%s)
+    )
+    GROUP BY cloud_account_id, dimension, value, date
+)""" % ROLLUP_RESOURCES_QUERY
 
 
 class TestApiBase(tornado.testing.AsyncHTTPTestCase):
@@ -42,6 +107,15 @@ class TestApiBase(tornado.testing.AsyncHTTPTestCase):
             'rest_api.rest_api_server.handlers.v1.base.AuthClient.authorize',
             lambda *args: (200, {'success'})).start()
         patch('rest_api.rest_api_server.utils.Config').start()
+        # redis is not available in tests, results are not cached
+        self.p_result_cache_get = patch(
+            'rest_api.rest_api_server.result_cache.ResultCache.get',
+            return_value=(None, None))
+        self.p_result_cache_get.start()
+        self.p_result_cache_bump = patch(
+            'rest_api.rest_api_server.result_cache.ResultCache.'
+            'bump_generation')
+        self.p_result_cache_bump.start()
         patch('optscale_client.config_client.client.Client.auth_url').start()
         patch('optscale_client.config_client.client.Client.restapi_url').start()
         patch('optscale_client.config_client.client.Client.public_ip').start()
@@ -91,6 +165,7 @@ class TestApiBase(tornado.testing.AsyncHTTPTestCase):
             unique=True
         )
         self.checklists_collection = self.mongo_client.restapi.checklists
+        self.checklist_items_collection = self.mongo_client.restapi.checklist_items
         self.property_history_collection = self.mongo_client.restapi.property_history
         self.archived_recommendations_collection = self.mongo_client.restapi.archived_recommendations
         patch('rest_api.rest_api_server.controllers.base.MongoMixin.mongo_client',
@@ -577,6 +652,8 @@ class TestApiBase(tornado.testing.AsyncHTTPTestCase):
         for k, v in params.items():
             if isinstance(v, datetime):
                 v = f"'{v.replace(microsecond=0)}'"
+            elif isinstance(v, str):
+                v = f"'{v}'"
             query = query.replace(f"%({k})s", f"{v}")
         query = ' '.join(list(filter(
             lambda x: x != '', query.replace('\n', ' ').split(' '))))
@@ -722,6 +799,9 @@ class TestApiBase(tornado.testing.AsyncHTTPTestCase):
             if row == '':
                 continue
             try:
+                if '\t' in row:
+                    # leading empty string column is stripped by literal_eval
+                    raise ValueError
                 t_values = (literal_eval(row),)
             except (SyntaxError, ValueError):
                 t_values = tuple(row.split('\t'))
@@ -731,6 +811,77 @@ class TestApiBase(tornado.testing.AsyncHTTPTestCase):
             response.append(result_row)
         return response
 
+    def patched_execute_dimension_clickhouse(self, query, **kwargs):
+        """
+        Executes the query with resources_dimension table made of mongo
+        resources the same way as diworker replicates them
+        """
+        rows = []
+        for r in self.resources_collection.find():
+            row = [r['_id']]
+            for field, field_type in RESOURCES_DIMENSION_STRUCTURE[1:]:
+                if field == 'tag_keys':
+                    value = list((r.get('tags') or {}).keys())
+                elif field == 'is_deleted':
+                    value = 0
+                elif field_type == 'String':
+                    value = r.get(field) or ''
+                else:
+                    value = int(r.get(field) or 0)
+                row.append(value)
+            rows.append('(%s)' % ', '.join(repr(x) for x in row))
+        structure = ', '.join(
+            '%s %s' % x for x in RESOURCES_DIMENSION_STRUCTURE)
+        # values function requires at least one row
+        dimension = "(SELECT * FROM values('%s', %s) WHERE %s)" % (
+            structure, ', '.join(rows) or '(%s)' % ', '.join(
+                "''" if t == 'String' else '[]' if t.startswith('Array')
+                else '0' for _, t in RESOURCES_DIMENSION_STRUCTURE),
+            '1' if rows else '0')
+        return self.patched_execute_clickhouse(
+            query.replace('resources_dimension FINAL', dimension), **kwargs)
+
+    def patch_resources_dimension(self, controller_path):
+        synced = patch('rest_api.rest_api_server.controllers.base.'
+                       'ResourcesDimensionMixin.resources_dimension_synced',
+                       return_value=True)
+        execute = patch(
+            '%s.execute_clickhouse' % controller_path,
+            side_effect=self.patched_execute_dimension_clickhouse)
+        return synced, execute
+
+    def assert_resources_dimension_used(self, p_execute):
+        self.assertTrue(any('resources_dimension' in c.kwargs['query']
+                            for c in p_execute.call_args_list))
+
+    def patched_execute_rollups_clickhouse(self, query, **kwargs):
+        """
+        Executes the query with expenses and resources rollups built of
+        expenses and mongo resources
+        """
+        query = query.replace(
+            'expenses_rollup FINAL', EXPENSES_ROLLUP_QUERY).replace(
+            'resources_rollup FINAL', RESOURCES_ROLLUP_QUERY)
+        return self.patched_execute_dimension_clickhouse(query, **kwargs)
+
+    def patch_rollups(self, controller_path):
+        return patch('%s.execute_clickhouse' % controller_path,
+                     side_effect=self.patched_execute_rollups_clickhouse)
+
+    def set_rollups_state(self, cloud_account_ids, rollups, **state):
+        for cloud_account_id in cloud_account_ids:
+            for rollup in rollups:
+                self.mongo_client.restapi.clickhouse_sync.update_one(
+                    {'_id': '%s:%s' % (rollup, cloud_account_id)},
+                    {'$set': {'changes': 0, 'built_changes': 0,
+                              'built_at': int(time.time()),
+                              'start_date': 0, **state}},
+                    upsert=True)
+
+    def assert_rollup_used(self, p_execute, rollup, used=True):
+        self.assertEqual(any(rollup in c.kwargs['query']
+                             for c in p_execute.call_args_list), used)
+
     @contextmanager
     def switch_user(self, user_id):
         old_user = self.p_get_meta_by_token.return_value.get('user_id')
@@ -6,6 +6,7 @@ from rest_api.rest_api_server.models.db_base import BaseDB
 from rest_api.rest_api_server.models.db_factory import DBFactory, DBType
 from rest_api.rest_api_server.models.models import Employee, Pool
 from rest_api.rest_api_server.tests.unittests.test_api_base import TestApiBase
+from rest_api.rest_api_server.utils import encode_string
 
 
 class TestAvailableFiltersApi(TestApiBase):
@@ -150,3 +151,60 @@ class TestAvailableFiltersApi(TestApiBase):
             self.org_id, min_timestamp, max_timestamp, filters)
         self.assertEqual(code, 200)
         self.assertEqual(response['filter_values']['pool'], [])
+
+    def _create_tagged_resources(self):
+        resources = []
+        for tags in [{'a': '1', 'b': '2'}, {'b': '3', 'c': '4'}, None]:
+            resource = {
+                'cloud_resource_id': self.gen_id(),
+                'name': 'resource',
+                'resource_type': 'type',
+                'first_seen': self.start_ts,
+                'last_seen': self.start_ts + 1,
+            }
+            if tags:
+                resource['tags'] = tags
+            _, resource = self.cloud_resource_create(
+                self.cloud_acc1['id'], resource)
+            resources.append(resource)
+        return resources
+
+    def test_available_filters_tags(self):
+        self._create_tagged_resources()
+        code, response = self.client.available_filters_get(
+            self.org_id, self.start_ts, self.end_ts)
+        self.assertEqual(code, 200)
+        for field in ['tag', 'without_tag']:
+            self.assertEqual(sorted(response['filter_values'][field]),
+                             ['a', 'b', 'c'])
+        code, response = self.client.available_filters_get(
+            self.org_id, self.start_ts, self.end_ts, {'tag': 'a'})
+        self.assertEqual(code, 200)
+        self.assertEqual(response['filter_values']['tag'], [])
+        self.assertEqual(response['filter_values']['without_tag'], ['b'])
+
+    def test_available_filters_resources_dimension(self):
+        resources = self._create_tagged_resources()
+        code, mongo_response = self.client.available_filters_get(
+            self.org_id, self.start_ts, self.end_ts)
+        self.assertEqual(code, 200)
+        resource = resources[0]
+        dimension_row = (
+            self.cloud_acc1['id'], '', 0, [''], [resource['pool_id']],
+            [resource['employee_id']], [''], [''], ['type'], [''], [''],
+            [self.cloud_acc1['id']], [0], [0], [0],
+            [encode_string(k) for k in ['c', 'a', 'b']])
+        patch('rest_api.rest_api_server.controllers.base.'
+              'ResourcesDimensionMixin.resources_dimension_synced',
+              return_value=True).start()
+        p_execute = patch(
+            'rest_api.rest_api_server.controllers.available_filters.'
+            'AvailableFiltersController.execute_clickhouse',
+            side_effect=lambda query, **kwargs: [dimension_row] if (
+                'groupUniqArray' in query) else []).start()
+        code, response = self.client.available_filters_get(
+            self.org_id, self.start_ts, self.end_ts)
+        self.assertEqual(code, 200)
+        self.assertEqual(p_execute.call_count, 2)
+        for field, values in mongo_response['filter_values'].items():
+            self.assertCountEqual(response['filter_values'][field], values)
@@ -779,3 +779,131 @@ class TestBreakdownExpensesApi(TestApiBase):
             self.assertEqual(resp['total'], 45)
             self.assertEqual(len(resp['counts']), 1)
             self.assertTrue(res2['cloud_account_id'] in resp['counts'])
+
+    def _create_resources_with_expenses(self, day_1_ts):
+        day_1 = datetime.utcfromtimestamp(day_1_ts)
+        for cloud_account_id, kwargs, costs in [
+            (self.cloud_acc1['id'], {
+                'r_type': 'type1', 'region': 'us-east',
+                'service_name': 'service1', 'pool_id': self.sub_pool1['id'],
+                'employee_id': self.employee1['id'], 'tags': {'tag1': 'v'}},
+             [10, 1]),
+            (self.cloud_acc1['id'], {
+                'r_type': 'type1', 'pool_id': self.org['pool_id'],
+                'employee_id': self.employee2['id']}, [5, 0]),
+            (self.cloud_acc2['id'], {
+                'r_type': 'type2', 'region': 'eu',
+                'pool_id': self.sub_pool2['id'],
+                'employee_id': self.employee2['id'], 'tags': {'tag2': 'v'}},
+             [20, 25]),
+        ]:
+            resource = self._create_resource(
+                cloud_account_id, first_seen=day_1_ts - DAY_IN_SECONDS,
+                last_seen=day_1_ts, **kwargs)
+            for i, cost in enumerate(costs):
+                self.expenses.append({
+                    'cloud_account_id': cloud_account_id,
+                    'resource_id': resource['id'],
+                    'date': day_1 - timedelta(days=i),
+                    'cost': cost,
+                    'sign': 1
+                })
+
+    def test_breakdown_expenses_resources_dimension(self):
+        day_1_ts = int(datetime(2022, 2, 1, tzinfo=timezone.utc).timestamp())
+        self._create_resources_with_expenses(day_1_ts)
+        for breakdown_by, filters in [
+            (None, None), ('employee_id', None), ('pool_id', None),
+            ('cloud_account_id', None), ('service_name', None),
+            ('region', None), ('resource_type', None),
+            ('pool_id', {'cloud_account_id': self.cloud_acc1['id']}),
+            ('region', {'tag': 'tag1'}),
+            ('employee_id', {'region': get_nil_uuid()}),
+        ]:
+            code, mongo_response = self.client.breakdown_expenses_get(
+                self.org_id, day_1_ts, day_1_ts, breakdown_by, filters)
+            self.assertEqual(code, 200)
+            p_synced, p_execute = self.patch_resources_dimension(
+                'rest_api.rest_api_server.controllers.breakdown_expense.'
+                'BreakdownExpenseController')
+            with p_synced, p_execute as p_execute:
+                code, response = self.client.breakdown_expenses_get(
+                    self.org_id, day_1_ts, day_1_ts, breakdown_by, filters)
+                self.assertEqual(code, 200)
+                self.assert_resources_dimension_used(p_execute)
+            self.assertEqual(response, mongo_response)
+
+    def test_breakdown_expenses_rollups(self):
+        day_1_ts = int(datetime(2022, 2, 1, tzinfo=timezone.utc).timestamp())
+        self._create_resources_with_expenses(day_1_ts)
+        requests = [
+            (None, None), ('employee_id', None), ('pool_id', None),
+            ('cloud_account_id', None), ('service_name', None),
+            ('region', None), ('resource_type', None),
+            ('region', {'cloud_account_id': self.cloud_acc1['id']}),
+        ]
+        mongo_responses = []
+        for breakdown_by, filters in requests:
+            code, response = self.client.breakdown_expenses_get(
+                self.org_id, day_1_ts, day_1_ts, breakdown_by, filters)
+            self.assertEqual(code, 200)
+            mongo_responses.append(response)
+        self.set_rollups_state(
+            [self.cloud_acc1['id'], self.cloud_acc2['id']],
+            ['expenses_rollup'])
+        for (breakdown_by, filters), mongo_response in zip(
+                requests, mongo_responses):
+            with self.patch_rollups(
+                    'rest_api.rest_api_server.controllers.breakdown_expense.'
+                    'BreakdownExpenseController') as p_execute:
+                code, response = self.client.breakdown_expenses_get(
+                    self.org_id, day_1_ts, day_1_ts, breakdown_by, filters)
+                self.assertEqual(code, 200)
+                self.assert_rollup_used(p_execute, 'expenses_rollup')
+            self.assertEqual(response, mongo_response)
+
+    def test_breakdown_expenses_rollups_not_ready(self):
+        day_1_ts = int(datetime(2022, 2, 1, tzinfo=timezone.utc).timestamp())
+        self._create_resources_with_expenses(day_1_ts)
+        code, mongo_response = self.client.breakdown_expenses_get(
+            self.org_id, day_1_ts, day_1_ts, 'pool_id')
+        self.assertEqual(code, 200)
+        cloud_account_ids = [self.cloud_acc1['id'], self.cloud_acc2['id']]
+        code, _ = self.client.cloud_account_update(
+            self.cloud_acc2['id'], {'last_import_at': day_1_ts})
+        self.assertEqual(code, 200)
+        for state in [
+            # resources are changed after the build
+            {'changes': 1},
+            # cloud account is imported after the build
+            {'built_at': day_1_ts - 1},
+            # previous period is out of the rollup period
+            {'start_date': day_1_ts},
+        ]:
+            self.set_rollups_state(
+                cloud_account_ids, ['expenses_rollup'], **state)
+            with self.patch_rollups(
+                    'rest_api.rest_api_server.controllers.breakdown_expense.'
+                    'BreakdownExpenseController') as p_execute:
+                code, response = self.client.breakdown_expenses_get(
+                    self.org_id, day_1_ts, day_1_ts, 'pool_id')
+                self.assertEqual(code, 200)
+                self.assert_rollup_used(p_execute, 'expenses_rollup',
+                                        used=False)
+            self.assertEqual(response, mongo_response)
+        self.set_rollups_state(cloud_account_ids, ['expenses_rollup'],
+                               start_date=day_1_ts - DAY_IN_SECONDS)
+        self.mongo_client.restapi.clickhouse_sync.delete_one(
+            {'_id': 'expenses_rollup:%s' % self.cloud_acc2['id']})
+        for rollup_used in [False, True]:
+            with self.patch_rollups(
+                    'rest_api.rest_api_server.controllers.breakdown_expense.'
+                    'BreakdownExpenseController') as p_execute:
+                code, response = self.client.breakdown_expenses_get(
+                    self.org_id, day_1_ts, day_1_ts, 'pool_id')
+                self.assertEqual(code, 200)
+                self.assert_rollup_used(p_execute, 'expenses_rollup',
+                                        used=rollup_used)
+            self.assertEqual(response, mongo_response)
+            self.set_rollups_state([self.cloud_acc2['id']],
+                                   ['expenses_rollup'])
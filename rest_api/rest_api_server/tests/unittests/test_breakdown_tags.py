@@ -440,3 +440,108 @@ class TestBreakdownTagsApi(TestApiBase):
             self.org_id, start, end)
         self.assertEqual(code, 200)
         self.assertEqual(len(response['breakdown']), 3)
+
+    def test_breakdown_tags_resources_dimension(self):
+        start = int(datetime(2022, 2, 1, tzinfo=timezone.utc).timestamp())
+        end = int(datetime(2022, 3, 1, tzinfo=timezone.utc).timestamp())
+        day_1_ts = int(datetime(2022, 2, 2, tzinfo=timezone.utc).timestamp())
+        for kwargs, cost in [
+            ({'tags': {'tag1': 'val1', 'tag2': 'val2'}, 'region': 'us-east'},
+             10),
+            ({'tags': {'tag1': 'val1'}}, 15),
+            ({'region': 'us-east'}, 7),
+            ({'tags': {'tag3': 'val3'}, 'region': 'eu'}, None),
+        ]:
+            resource = self._create_resource(
+                self.cloud_acc1['id'], first_seen=day_1_ts,
+                last_seen=day_1_ts, **kwargs)
+            if cost is not None:
+                self.expenses.append({
+                    'cloud_account_id': self.cloud_acc1['id'],
+                    'resource_id': resource['id'],
+                    'date': datetime(2022, 2, 2),
+                    'cost': cost,
+                    'sign': 1
+                })
+        for filters in [
+            None, {'region': 'us-east'}, {'region': get_nil_uuid()},
+            {'tag': 'tag1'}, {'without_tag': 'tag2'},
+            {'cloud_account_id': self.cloud_acc1['id']},
+        ]:
+            code, mongo_response = self.client.breakdown_tags_get(
+                self.org_id, start, end, filters)
+            self.assertEqual(code, 200)
+            p_synced, p_execute = self.patch_resources_dimension(
+                'rest_api.rest_api_server.controllers.breakdown_tag.'
+                'BreakdownTagController')
+            with p_synced, p_execute as p_execute:
+                code, response = self.client.breakdown_tags_get(
+                    self.org_id, start, end, filters)
+                self.assertEqual(code, 200)
+                self.assert_resources_dimension_used(p_execute)
+            for r in [mongo_response, response]:
+                r['breakdown'].sort(key=lambda x: x['tag'] or '')
+            self.assertEqual(response, mongo_response)
+
+    def test_breakdown_tags_rollups(self):
+        start = int(datetime(2022, 2, 1, tzinfo=timezone.utc).timestamp())
+        # rollups are used only for the whole days
+        end = int(datetime(2022, 3, 1, tzinfo=timezone.utc).timestamp()) - 1
+        day_1_ts = int(datetime(2022, 2, 2, tzinfo=timezone.utc).timestamp())
+        for kwargs, seen, expense_date, cost in [
+            ({'tags': {'tag1': 'val1', 'tag2': 'val2'}},
+             (day_1_ts, day_1_ts), datetime(2022, 2, 2), 10),
+            ({'tags': {'tag1': 'val1'}},
+             (day_1_ts, day_1_ts + 5 * DAY_IN_SECONDS), datetime(2022, 2, 5),
+             15),
+            ({}, (day_1_ts, day_1_ts), datetime(2022, 2, 2), 7),
+            ({'tags': {'tag3': 'val3'}}, (day_1_ts, day_1_ts), None, None),
+            ({'tags': {'tag5': 'val5'}}, (start - DAY_IN_SECONDS, start),
+             datetime(2022, 2, 1), 2),
+            # resources seen out of the range
+            ({'tags': {'tag1': 'val1'}},
+             (start - 5 * DAY_IN_SECONDS, start - DAY_IN_SECONDS),
+             datetime(2022, 1, 30), 3),
+            ({'tags': {'tag4': 'val4'}}, (end + 1, end + 1), None, None),
+        ]:
+            resource = self._create_resource(
+                self.cloud_acc1['id'], first_seen=seen[0], last_seen=seen[1],
+                **kwargs)
+            if cost is not None:
+                self.expenses.append({
+                    'cloud_account_id': self.cloud_acc1['id'],
+                    'resource_id': resource['id'],
+                    'date': expense_date,
+                    'cost': cost,
+                    'sign': 1
+                })
+        requests = [None, {'cloud_account_id': self.cloud_acc1['id']}]
+        mongo_responses = []
+        for filters in requests:
+            code, response = self.client.breakdown_tags_get(
+                self.org_id, start, end, filters)
+            self.assertEqual(code, 200)
+            mongo_responses.append(response)
+        self.set_rollups_state([self.cloud_acc1['id']],
+                               ['expenses_rollup', 'resources_rollup'])
+        for filters, mongo_response in zip(requests, mongo_responses):
+            with self.patch_rollups(
+                    'rest_api.rest_api_server.controllers.breakdown_tag.'
+                    'BreakdownTagController') as p_execute:
+                code, response = self.client.breakdown_tags_get(
+                    self.org_id, start, end, filters)
+                self.assertEqual(code, 200)
+                self.assert_rollup_used(p_execute, 'resources_rollup')
+                self.assert_rollup_used(p_execute, 'expenses_rollup')
+            for r in [mongo_response, response]:
+                r['breakdown'].sort(key=lambda x: x['tag'] or '')
+            self.assertEqual(response, mongo_response)
+        # resources rollup counts resources by days
+        with self.patch_rollups(
+                'rest_api.rest_api_server.controllers.breakdown_tag.'
+                'BreakdownTagController') as p_execute:
+            code, _ = self.client.breakdown_tags_get(
+                self.org_id, start, end + 1)
+            self.assertEqual(code, 200)
+            self.assert_rollup_used(p_execute, 'resources_rollup',
+                                    used=False)
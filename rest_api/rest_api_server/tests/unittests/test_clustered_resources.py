@@ -0,0 +1,112 @@
+import time
+import unittest
+from unittest.mock import MagicMock, PropertyMock, patch
+
+from rest_api.rest_api_server.controllers.base import ClusteredResourcesMap
+from rest_api.rest_api_server.controllers.expense import (
+    CleanExpenseController)
+
+CLUSTERS_COUNT = 2000
+CLUSTER_RESOURCES_COUNT = 50
+
+
+class ClusteredResourcesMapTest(unittest.TestCase):
+    def test_index(self):
+        clustered_map = ClusteredResourcesMap({'r1': 'c1', 'r2': 'c1'})
+        clustered_map['r3'] = 'c2'
+        self.assertEqual(clustered_map.cluster_resources,
+                         {'c1': {'r1', 'r2'}, 'c2': {'r3'}})
+        self.assertTrue(clustered_map.has_cluster('c1'))
+        self.assertFalse(clustered_map.has_cluster('r1'))
+
+    def test_reassign(self):
+        clustered_map = ClusteredResourcesMap({'r1': 'c1'})
+        clustered_map['r1'] = 'c2'
+        self.assertEqual(clustered_map, {'r1': 'c2'})
+        self.assertEqual(set(clustered_map.cluster_ids), {'c2'})
+
+    def test_remove(self):
+        clustered_map = ClusteredResourcesMap({'r1': 'c1', 'r2': 'c1',
+                                               'r3': 'c2'})
+        self.assertEqual(clustered_map.pop('r3'), 'c2')
+        self.assertIsNone(clustered_map.pop('r3', None))
+        del clustered_map['r1']
+        self.assertEqual(clustered_map.cluster_resources, {'c1': {'r2'}})
+        clustered_map.update(r2='c3')
+        self.assertEqual(set(clustered_map.cluster_ids), {'c3'})
+
+
+class ClusteredResourcesResolveTest(unittest.TestCase):
+    def setUp(self):
+        self.resources_collection = MagicMock()
+        patch('rest_api.rest_api_server.controllers.base.MongoMixin.'
+              'resources_collection', new_callable=PropertyMock,
+              return_value=self.resources_collection).start()
+        self.addCleanup(patch.stopall)
+        self.controller = CleanExpenseController(MagicMock())
+
+    @staticmethod
+    def _resources_data():
+        # half of the clusters have clustered resources in the response,
+        # resources of the other half are selected from the collection
+        data = []
+        sub_resources = []
+        for i in range(CLUSTERS_COUNT):
+            cluster_id = 'cluster_%s' % i
+            resource_ids = ['%s_res_%s' % (cluster_id, j)
+                            for j in range(CLUSTER_RESOURCES_COUNT)]
+            if i % 2:
+                sub_resources.extend({'_id': r_id, 'cluster_id': cluster_id}
+                                     for r_id in resource_ids)
+            else:
+                data.append({
+                    '_id': {'cloud_account_id': 'ca_%s' % (i % 10),
+                            'cluster_id': cluster_id},
+                    'resources': resource_ids
+                })
+        data.append({
+            '_id': {},
+            'resources': ['cluster_%s' % i for i in range(CLUSTERS_COUNT)]
+        })
+        data.append({
+            '_id': {'cloud_account_id': 'ca_0'},
+            'resources': ['res_%s' % i for i in range(1000)]
+        })
+        return data, sub_resources
+
+    def test_extract_unique_values(self):
+        data, sub_resources = self._resources_data()
+        self.resources_collection.find.return_value = sub_resources
+        started_at = time.time()
+        (not_clustered_resources, clustered_resources_map,
+         resource_ids) = self.controller._extract_unique_values_from_resources(
+            data, {})
+        duration = time.time() - started_at
+        self.assertEqual(len(not_clustered_resources), 1000)
+        self.assertEqual(len(clustered_resources_map),
+                         CLUSTERS_COUNT * CLUSTER_RESOURCES_COUNT)
+        self.assertEqual(len(clustered_resources_map.cluster_ids),
+                         CLUSTERS_COUNT)
+        self.assertEqual(len(resource_ids), 1000 + CLUSTERS_COUNT + len(
+            clustered_resources_map))
+        self.resources_collection.find.assert_called_once()
+        query = self.resources_collection.find.call_args[0][0]
+        self.assertEqual(
+            set(query['cluster_id']['$in']),
+            {'cluster_%s' % i for i in range(1, CLUSTERS_COUNT, 2)})
+        self.assertLess(duration, 2)
+
+    def test_extract_unique_values_input_resources(self):
+        data, _ = self._resources_data()
+        self.resources_collection.find.return_value = []
+        (not_clustered_resources, clustered_resources_map,
+         _) = self.controller._extract_unique_values_from_resources(
+            data, {'resource_id': ['cluster_0_res_0']})
+        self.assertIn('cluster_0_res_0', not_clustered_resources)
+        self.assertNotIn('cluster_0_res_0', clustered_resources_map)
+        self.assertEqual(len(clustered_resources_map.cluster_resources[
+            'cluster_0']), CLUSTER_RESOURCES_COUNT - 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
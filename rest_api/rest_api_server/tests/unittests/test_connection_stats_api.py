@@ -0,0 +1,117 @@
+import threading
+import time
+from unittest.mock import patch, MagicMock
+
+from rest_api.rest_api_server.connections import (
+    ClickHousePool, ClickHousePoolTimeout)
+from rest_api.rest_api_server.controllers.expense import (
+    CleanExpenseAsyncController)
+from rest_api.rest_api_server.controllers.organization import (
+    OrganizationAsyncController)
+from rest_api.rest_api_server.tests.unittests.test_api_base import TestApiBase
+from rest_api.rest_api_server.utils import (
+    MonitoredThreadPoolExecutor, tp_executor, tp_executor_heavy)
+
+
+class TestConnectionStatsApi(TestApiBase):
+    def setUp(self, version='v2'):
+        super().setUp(version)
+        self.p_clickhouse_client = patch(
+            'rest_api.rest_api_server.connections.ClickHouseClient',
+            side_effect=lambda **kwargs: MagicMock()).start()
+        config = patch(
+            'rest_api.rest_api_server.connections.Config').start()
+        config.return_value.clickhouse_params = (
+            'user', 'password', 'host', 'default')
+        config.return_value.stats.return_value = {
+            'watching': True, 'cached': 1, 'hits': 2, 'misses': 1}
+
+    def test_connection_stats(self):
+        code, resp = self.client.connection_stats_get()
+        self.assertEqual(code, 200)
+        for key in ['mongo', 'clickhouse', 'config']:
+            self.assertIn(key, resp)
+        for key in ['open', 'in_use', 'checkouts', 'checkout_failures']:
+            self.assertIn(key, resp['mongo'])
+        for key in ['watching', 'cached', 'hits', 'misses']:
+            self.assertIn(key, resp['config'])
+        for executor in ['light', 'heavy', 'context']:
+            for key in ['workers', 'active', 'queued', 'wait_time']:
+                self.assertIn(key, resp['executors'][executor])
+
+    def test_connection_stats_token(self):
+        self.client.secret = None
+        code, resp = self.client.connection_stats_get()
+        self.assertEqual(code, 403)
+        self.verify_error_code(resp, 'OE0236')
+
+    def test_connection_stats_wrong_secret(self):
+        self.client.secret = 'secret'
+        code, resp = self.client.connection_stats_get()
+        self.assertEqual(code, 403)
+        self.verify_error_code(resp, 'OE0236')
+
+    def test_clickhouse_pool_reuse(self):
+        pool = ClickHousePool('test', size=2)
+        for _ in range(5):
+            with pool.connection() as client:
+                client.execute('SELECT 1')
+        with pool.connection() as client_1:
+            with pool.connection() as client_2:
+                self.assertNotEqual(client_1, client_2)
+                stats = pool.stats()
+                self.assertEqual(stats['in_use'], 2)
+        self.assertEqual(self.p_clickhouse_client.call_count, 2)
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 2)
+        self.assertEqual(stats['checkouts'], 7)
+
+    def test_clickhouse_pool_timeout(self):
+        pool = ClickHousePool('test', size=1, timeout=0.1)
+        with pool.connection():
+            with self.assertRaises(ClickHousePoolTimeout):
+                with pool.connection():
+                    pass
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_clickhouse_pool_broken_connection(self):
+        pool = ClickHousePool('test', size=1)
+        with self.assertRaises(ValueError):
+            with pool.connection() as client:
+                raise ValueError('query failed')
+        client.disconnect.assert_called_once()
+        with pool.connection() as next_client:
+            self.assertEqual(client, next_client)
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+    def test_executor_stats(self):
+        executor = MonitoredThreadPoolExecutor(1)
+        release = threading.Event()
+        running = executor.submit(release.wait)
+        queued = [executor.submit(lambda: 1) for _ in range(2)]
+        stats = executor.stats()
+        self.assertEqual(stats['queued'], 2)
+        self.assertEqual(stats['submitted'], 3)
+        self.assertTrue(queued[1].cancel())
+        self.assertEqual(executor.stats()['queued'], 1)
+        time.sleep(0.01)
+        release.set()
+        running.result()
+        self.assertEqual(queued[0].result(), 1)
+        executor.shutdown()
+        stats = executor.stats()
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['active'], 0)
+        self.assertEqual(stats['completed'], 2)
+        self.assertGreater(stats['max_wait_time'], 0)
+
+    def test_heavy_controllers_executor(self):
+        self.assertEqual(CleanExpenseAsyncController(MagicMock()).executor,
+                         tp_executor_heavy)
+        self.assertEqual(OrganizationAsyncController(MagicMock()).executor,
+                         tp_executor)
@@ -1,3 +1,4 @@
+import threading
 import uuid
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
@@ -8,6 +9,7 @@ from tools.optscale_exceptions.http_exc import OptHTTPError
 from rest_api.rest_api_server.models.db_factory import DBFactory, DBType
 from rest_api.rest_api_server.models.db_base import BaseDB
 from rest_api.rest_api_server.models.models import Checklist
+from rest_api.rest_api_server.controllers.expense import RawExpenseController
 from rest_api.rest_api_server.exceptions import Err
 
 from rest_api.rest_api_server.utils import get_nil_uuid
@@ -2571,6 +2573,66 @@ class TestExpensesApi(TestApiBase):
                 resource1['id'], time - 100, time + 100, {'format': format_})
             self.assertEqual(code, 200)
 
+    def test_raw_expenses_streamed(self):
+        code, resource1 = self.create_cloud_resource(
+            self.cloud_acc1['id'], region='us-east')
+        self.assertEqual(code, 201)
+        dt = datetime.utcnow()
+        # the response is bigger than a stream chunk
+        raw_expenses = [{
+            'name': 'raw %s' % i,
+            'description': 'x' * 100,
+            'start_date': dt,
+            'end_date': dt + timedelta(days=1),
+            'cost': i,
+            'cloud_account_id': self.cloud_acc1['id'],
+            'resource_id': resource1['cloud_resource_id']
+        } for i in range(1000)]
+        self.raw_expenses.insert_many(raw_expenses)
+        time = int(dt.timestamp())
+        code, response = self.client.raw_expenses_get(
+            resource1['id'], time - 100, time + 100)
+        self.assertEqual(code, 200)
+        self.assertEqual(response['total_cost'], sum(range(1000)))
+        self.assertEqual([x['cost'] for x in response['raw_expenses']],
+                         list(range(999, -1, -1)))
+        code, response = self.client.raw_expenses_get(
+            resource1['id'], time - 100, time + 100,
+            {'format': 'json', 'limit': 600})
+        self.assertEqual(code, 200)
+        self.assertEqual([x['cost'] for x in response],
+                         list(range(999, 399, -1)))
+
+    def test_raw_expenses_streamed_on_heavy_executor(self):
+        code, resource1 = self.create_cloud_resource(
+            self.cloud_acc1['id'], region='us-east')
+        self.assertEqual(code, 201)
+        dt = datetime.utcnow()
+        self.raw_expenses.insert_many([{
+            'start_date': dt,
+            'end_date': dt + timedelta(days=1),
+            'cost': i,
+            'cloud_account_id': self.cloud_acc1['id'],
+            'resource_id': resource1['cloud_resource_id']
+        } for i in range(10)])
+        threads = set()
+
+        def iter_raw_expenses(*args, **kwargs):
+            for expense in iter_expenses(*args, **kwargs):
+                threads.add(threading.current_thread().name)
+                yield expense
+
+        iter_expenses = RawExpenseController._iter_raw_expenses
+        time = int(dt.timestamp())
+        with patch.object(RawExpenseController, '_iter_raw_expenses',
+                          iter_raw_expenses):
+            code, response = self.client.raw_expenses_get(
+                resource1['id'], time - 100, time + 100, {'format': 'json'})
+        self.assertEqual(code, 200)
+        self.assertEqual(len(response), 10)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads.pop().startswith('heavy'))
+
     def test_raw_clean_summary_expenses_total_cost(self):
         time = datetime(2021, 8, 1)
         time_ts = int(time.timestamp())
@@ -3138,6 +3200,66 @@ class TestExpensesApi(TestApiBase):
         self.assertEqual(code, 400)
         self.verify_error_code(response, 'OE0212')
 
+    def test_clean_expenses_cursor(self):
+        day_in_month = datetime(2020, 1, 14)
+        time = int(day_in_month.timestamp())
+        costs = [30, 10, 10, 20, 0, None]
+        resource_ids = []
+        for i, cost in enumerate(costs):
+            _, resource = self.create_cloud_resource(
+                self.cloud_acc1['id'], self.employee1['id'],
+                self.org['pool_id'], name='res%s' % i, first_seen=time,
+                last_seen=time + 1)
+            resource_ids.append(resource['id'])
+            if cost is not None:
+                self.expenses.append({
+                    'cost': cost,
+                    'date': day_in_month,
+                    'resource_id': resource['id'],
+                    'cloud_account_id': self.cloud_acc1['id'],
+                    'sign': 1
+                })
+        expected_ids = [x[1] for x in sorted(
+            zip(costs, resource_ids), key=lambda x: (-(x[0] or 0), x[1]))]
+        result_ids = []
+        params = {'limit': 4}
+        while True:
+            code, response = self.client.clean_expenses_get(
+                self.org_id, time, time + 1, params)
+            self.assertEqual(code, 200)
+            self.assertEqual(response['total_count'], len(costs))
+            self.assertEqual(response['total_cost'], 70)
+            self.assertEqual(response['limit'], 4)
+            result_ids.extend(
+                x['resource_id'] for x in response['clean_expenses'])
+            if not response['next_cursor']:
+                break
+            params['cursor'] = response['next_cursor']
+        self.assertEqual(result_ids, expected_ids)
+
+        code, response = self.client.clean_expenses_get(
+            self.org_id, time, time + 1)
+        self.assertEqual(code, 200)
+        self.assertNotIn('next_cursor', response)
+        self.assertEqual(
+            [x['resource_id'] for x in response['clean_expenses']],
+            expected_ids)
+
+    def test_clean_expenses_invalid_cursor(self):
+        time = int(datetime.utcnow().timestamp())
+        code, response = self.client.clean_expenses_get(
+            self.org_id, time, time + 1, {'limit': 1, 'cursor': 'abc'})
+        self.assertEqual(code, 400)
+        self.verify_error_code(response, 'OE0217')
+        code, response = self.client.clean_expenses_get(
+            self.org_id, time, time + 1, {'cursor': 'WzEuNSwgImlkIl0='})
+        self.assertEqual(code, 400)
+        self.verify_error_code(response, 'OE0216')
+        code, response = self.client.summary_expenses_get(
+            self.org_id, time, time + 1, {'cursor': 'WzEuNSwgImlkIl0='})
+        self.assertEqual(code, 400)
+        self.verify_error_code(response, 'OE0212')
+
     def test_summary_clean_expenses_unexpected_filters(self):
         self.end_date = datetime(2020, 4, 2, 23, 59)
         self.end_ts = int(self.end_date.timestamp())
@@ -5489,3 +5611,88 @@ class TestExpensesApi(TestApiBase):
         self.assertEqual(r['expenses']['total'], 5)
         self.assertEqual(
             r['expenses']['breakdown'][str(int(self.start_date.timestamp()))], 5)
+
+    def _create_dimension_resources(self):
+        first_seen = self.prev_start_ts
+        last_seen = self.end_ts
+        resources = []
+        for cloud_account_id, employee_id, pool_id, kwargs, costs in [
+            (self.cloud_acc1['id'], self.employee1['id'], self.org['pool_id'],
+             {'tags': {'tag1': 'val1'}, 'region': 'us-east'}, [30, 5]),
+            (self.cloud_acc1['id'], self.employee2['id'],
+             self.sub_pool1['id'], {'tags': {'tag1': 'val1', 'tag2': 'val2'}},
+             [10]),
+            (self.cloud_acc2['id'], self.employee1['id'], self.org['pool_id'],
+             {'region': 'eu', 'service_name': 'svc'}, [20, 1]),
+            (self.cloud_acc1['id'], self.employee1['id'], self.org['pool_id'],
+             {'resource_type': 'other_type'}, []),
+        ]:
+            _, resource = self.create_cloud_resource(
+                cloud_account_id, employee_id, pool_id, first_seen=first_seen,
+                last_seen=last_seen, **kwargs)
+            resources.append(resource)
+            for date, cost in zip([self.start_date, self.prev_start], costs):
+                self.expenses.append({
+                    'cost': cost,
+                    'date': date,
+                    'resource_id': resource['id'],
+                    'cloud_account_id': cloud_account_id,
+                    'sign': 1
+                })
+        return resources
+
+    def test_clean_expenses_resources_dimension(self):
+        self._create_dimension_resources()
+        for filters in [
+            {}, {'limit': 2}, {'limit': 10},
+            {'cloud_account_id': self.cloud_acc1['id']},
+            {'pool_id': self.sub_pool1['id']},
+            {'owner_id': self.employee1['id']},
+            {'region': ['eu', self.nil_uuid]},
+            {'service_name': 'svc'},
+            {'resource_type': 'other_type:regular'},
+            {'tag': 'tag1'}, {'tag': self.nil_uuid},
+            {'without_tag': 'tag2'},
+        ]:
+            code, mongo_response = self.client.clean_expenses_get(
+                self.org_id, self.start_ts, self.end_ts, filters.copy())
+            self.assertEqual(code, 200)
+            p_synced, p_execute = self.patch_resources_dimension(
+                'rest_api.rest_api_server.controllers.expense.'
+                'CleanExpenseController')
+            with p_synced, p_execute as p_execute:
+                code, response = self.client.clean_expenses_get(
+                    self.org_id, self.start_ts, self.end_ts, filters.copy())
+                self.assertEqual(code, 200)
+                self.assert_resources_dimension_used(p_execute)
+            if 'limit' not in filters:
+                for r in [mongo_response, response]:
+                    r['clean_expenses'].sort(key=lambda x: x['id'])
+            self.assertEqual(response, mongo_response)
+
+    def test_formatted_expenses_resources_dimension(self):
+        self._create_dimension_resources()
+        for request, args in [
+            (self.client.pool_breakdown_expenses_get, [self.org['pool_id']]),
+            (self.client.pool_breakdown_expenses_get,
+             [self.sub_pool1['id'], 'employee']),
+            (self.client.pool_breakdown_expenses_get,
+             [self.org['pool_id'], 'pool']),
+            (self.client.cloud_expenses_get,
+             [self.cloud_acc1['id'], 'pool']),
+            (self.client.employee_expenses_get,
+             [self.employee1['id'], 'cloud']),
+        ]:
+            resource_id, filter_by = (args + [None])[:2]
+            code, mongo_response = request(
+                resource_id, self.start_ts, self.end_ts, filter_by)
+            self.assertEqual(code, 200)
+            p_synced, p_execute = self.patch_resources_dimension(
+                'rest_api.rest_api_server.controllers.expense.'
+                'ExpenseController')
+            with p_synced, p_execute as p_execute:
+                code, response = request(
+                    resource_id, self.start_ts, self.end_ts, filter_by)
+                self.assertEqual(code, 200)
+                self.assert_resources_dimension_used(p_execute)
+            self.assertEqual(response, mongo_response)
@@ -0,0 +1,71 @@
+import json
+import unittest
+from datetime import datetime
+
+from rest_api.rest_api_server.utils import (
+    ModelEncoder, iterencode_json, iter_json_chunks)
+
+
+class JsonStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.obj = {
+            'b': 1,
+            'a': {'c': [{'x': datetime(2020, 1, 1), 'y': [1, 2]}, {}],
+                  'd': {}, 'e': []},
+            'f': [1, {'g': [1, 2]}, 'h'],
+            'i': None,
+        }
+
+    def test_same_as_dumps(self):
+        for obj in [self.obj, [self.obj, []], {}, [], 'str', 1, None]:
+            for params in [{}, {'indent': 4}, {'sort_keys': True},
+                           {'indent': 4, 'sort_keys': True}]:
+                self.assertEqual(
+                    ''.join(iterencode_json(obj, **params)),
+                    json.dumps(obj, cls=ModelEncoder, **params))
+        obj = {1: 'int', 1.5: 'float', True: 'bool', None: 'none'}
+        self.assertEqual(''.join(iterencode_json(obj)), json.dumps(obj))
+
+    def test_generators(self):
+        expected = {'a': self.obj['f'], 'b': [[0, 1]], 'c': []}
+        for params in [{}, {'indent': 4, 'sort_keys': True}]:
+            obj = {
+                'a': (x for x in self.obj['f']),
+                'b': [(x for x in range(2))],
+                'c': (x for x in []),
+            }
+            self.assertEqual(
+                ''.join(iterencode_json(obj, **params)),
+                json.dumps(expected, cls=ModelEncoder, **params))
+        self.assertEqual(''.join(iterencode_json(x for x in range(3))),
+                         '[0, 1, 2]')
+
+    def test_generator_consumed_lazily(self):
+        consumed = []
+
+        def gen():
+            for i in range(3):
+                consumed.append(i)
+                yield i
+
+        parts = iterencode_json({'a': 1, 'b': gen()})
+        self.assertEqual(''.join(next(parts) for _ in range(3)), '{"a": 1, "b": ')
+        self.assertEqual(consumed, [])
+        self.assertEqual(''.join(parts), '[0, 1, 2]}')
+        self.assertEqual(consumed, [0, 1, 2])
+
+    def test_chunks(self):
+        obj = {'a': list(range(1000)), 'b': 'value' * 100}
+        chunks = list(iter_json_chunks(obj, chunk_size=100))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(x) >= 100 for x in chunks[:-1]))
+        self.assertEqual(''.join(chunks), json.dumps(obj))
+        self.assertEqual(list(iter_json_chunks([], chunk_size=100)), ['[]'])
+
+    def test_wrong_key(self):
+        with self.assertRaises(TypeError):
+            ''.join(iterencode_json({(1, 2): 'tuple'}))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
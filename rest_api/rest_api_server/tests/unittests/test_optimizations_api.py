@@ -978,6 +978,19 @@ class TestOptimizationDataApi(TestApiBase):
         self.checklists_collection.insert_one(checklist_rec)
         return checklist_rec
 
+    def _add_checklist_items_result(self, checklist, module, data):
+        checklist_rec = {
+            'module': module,
+            'organization_id': checklist['organization_id'],
+            'created_at': checklist['last_completed'],
+        }
+        if data:
+            self.checklist_items_collection.insert_many(
+                [dict(checklist_rec, data=x) for x in data])
+        self.checklists_collection.insert_one(
+            dict(checklist_rec, items_count=len(data)))
+        return checklist_rec
+
     def _generate_instance(self, name, cost, saving):
         return {
             'cloud_resource_id': str(uuid.uuid4()),
@@ -1073,6 +1086,21 @@ class TestOptimizationDataApi(TestApiBase):
         resp_resource_ids = list(map(lambda x: x['resource_id'], response))
         self.assertEqual(resp_resource_ids, [instance_3['resource_id']])
 
+    def test_optimization_data_items(self):
+        instances = [self._generate_instance('instance %s' % i, 10, i)
+                     for i in range(3)]
+        self._add_checklist_items_result(self.checklist, 'module2', instances)
+        self._add_checklist_items_result(self.checklist, 'module3', [])
+        code, response = self.client.optimization_data_get(
+            self.org_id, 'module2')
+        self.assertEqual(code, 200)
+        self.assertEqual([r['resource_id'] for r in response],
+                         [x['resource_id'] for x in instances])
+        code, response = self.client.optimization_data_get(
+            self.org_id, 'module3')
+        self.assertEqual(code, 200)
+        self.assertEqual(response, [])
+
     def _add_optimization(self, resource, module, checklist_data):
         checklist_result = self._add_checklist_result(
             self.checklist, module, checklist_data)
@@ -1171,6 +1199,38 @@ class TestOptimizationDataApi(TestApiBase):
         for data_obj in optimization.get('data', []):
             self.assertEqual(data_obj.get('is_dismissed', False), False)
 
+    def test_suppress_resource_optimization_items(self):
+        module = 'module'
+        _, resource = self._create_cloud_resource(
+            self.cloud_acc['id'], self.valid_resource)
+        data = [dict(self._build_optimization_data(resource),
+                     cloud_account_id=self.cloud_acc['id'])]
+        self._add_checklist_items_result(self.checklist, module, data)
+        self.resources_collection.update_one(
+            filter={'_id': resource['id']},
+            update={'$set': {'recommendations': {
+                'run_timestamp': self.checklist['last_completed'],
+                'modules': [dict(data[0], name=module)]
+            }}})
+        code, response = self.client.resource_optimization_dismiss(
+            resource['id'], module)
+        self.assertEqual(code, 200)
+        self.assertTrue(module in response.get('dismissed', []))
+        item = self.checklist_items_collection.find_one(
+            {'module': module, 'data.resource_id': resource['id']})
+        self.assertTrue(item['data']['is_dismissed'])
+        code, response = self.client.optimization_data_get(
+            self.org_id, module, status='dismissed')
+        self.assertEqual(code, 200)
+        self.assertEqual([r['resource_id'] for r in response],
+                         [resource['id']])
+        code, response = self.client.resource_optimization_activate(
+            resource['id'], module)
+        self.assertEqual(code, 200)
+        item = self.checklist_items_collection.find_one(
+            {'module': module, 'data.resource_id': resource['id']})
+        self.assertFalse(item['data']['is_dismissed'])
+
     def test_unsuppress_resource_optimization_independant(self):
         module = 'module'
         module2 = 'module2'
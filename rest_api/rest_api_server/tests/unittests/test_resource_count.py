@@ -776,3 +776,55 @@ class TestResourcesCountApi(TestApiBase):
             self.org_id, self.day1, self.day2_inside, 'cloud_account_id')
         self.assertEqual(code, 200)
         self.assertEqual(res['count'], 3)
+
+    def test_breakdown_rollups(self):
+        before_day1 = self.day1 - 3 * 86400
+        for cloud_account_id, kwargs, first_seen, last_seen, count in [
+            (self.cloud_acc1['id'], {
+                'r_type': 'type1', 'employee_id': self.employee1['id'],
+                'pool_id': self.sub_pool1['id'], 'region': 'us-east'},
+             self.day1, self.day2 - 1, 2),
+            (self.cloud_acc1['id'], {
+                'r_type': 'type2', 'employee_id': self.employee2['id'],
+                'pool_id': self.sub_pool2['id'], 'service_name': 'service1'},
+             self.day2, self.day2_inside, 3),
+            (self.cloud_acc1['id'], {'r_type': 'type1', 'region': 'eu'},
+             before_day1, self.day3, 1),
+            (self.cloud_acc2['id'], {'r_type': 'type3'},
+             self.day1_inside, self.day4_inside, 1),
+            # resources seen out of the range
+            (self.cloud_acc1['id'], {'r_type': 'type1'},
+             before_day1, self.day1 - 1, 2),
+            (self.cloud_acc1['id'], {'r_type': 'type2'},
+             self.day4 + 86400, self.day4 + 86400, 1),
+        ]:
+            self._create_resource(
+                cloud_account_id, first_seen=first_seen, last_seen=last_seen,
+                count=count, **kwargs)
+        # rollups are used only for the whole days
+        end_date = self.day4 - 1
+        requests = [
+            (None, None), ('cloud_account_id', None), ('employee_id', None),
+            ('pool_id', None), ('resource_type', None), ('region', None),
+            ('service_name', None),
+            ('resource_type', {'cloud_account_id': self.cloud_acc1['id']}),
+        ]
+        mongo_responses = []
+        for breakdown_by, filters in requests:
+            code, response = self.client.resources_count_get(
+                self.org_id, self.day1, end_date, breakdown_by, filters)
+            self.assertEqual(code, 200)
+            mongo_responses.append(response)
+        self.set_rollups_state(
+            [self.cloud_acc1['id'], self.cloud_acc2['id']],
+            ['resources_rollup'])
+        for (breakdown_by, filters), mongo_response in zip(
+                requests, mongo_responses):
+            with self.patch_rollups(
+                    'rest_api.rest_api_server.controllers.resource_count.'
+                    'ResourceCountController') as p_execute:
+                code, response = self.client.resources_count_get(
+                    self.org_id, self.day1, end_date, breakdown_by, filters)
+                self.assertEqual(code, 200)
+                self.assert_rollup_used(p_execute, 'resources_rollup')
+            self.assertEqual(response, mongo_response)
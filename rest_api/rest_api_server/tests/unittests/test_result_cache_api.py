@@ -0,0 +1,203 @@
+import json
+import pickle
+import time
+from datetime import datetime
+from unittest.mock import patch, PropertyMock
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from rest_api.rest_api_server.controllers.expense import (
+    CleanExpenseController)
+from rest_api.rest_api_server.result_cache import result_cache
+from rest_api.rest_api_server.tests.unittests.test_api_base import TestApiBase
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value if isinstance(value, bytes) else str(
+            value).encode()
+        return True
+
+    def incr(self, key):
+        value = int(self.data.get(key, 0)) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def _command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return _command
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs)
+                for name, args, kwargs in self.commands]
+
+
+class TestResultCacheApi(TestApiBase):
+    def setUp(self, version='v2'):
+        super().setUp(version)
+        self.p_result_cache_get.stop()
+        self.p_result_cache_bump.stop()
+        self.redis = FakeRedis()
+        self.p_redis_client = patch(
+            'rest_api.rest_api_server.result_cache.ResultCache.redis_client',
+            new_callable=PropertyMock, return_value=self.redis).start()
+        patch('rest_api.rest_api_server.result_cache.ResultCache.mongo_client',
+              new_callable=PropertyMock, return_value=self.mongo_client).start()
+        patch.object(result_cache, '_disabled_until', 0).start()
+        patch.dict(result_cache._counters, clear=True).start()
+        config = patch('rest_api.rest_api_server.connections.Config').start()
+        config.return_value.stats.return_value = {}
+        self.p_clean_expenses_get = patch.object(
+            CleanExpenseController, 'get', autospec=True,
+            side_effect=CleanExpenseController.get).start()
+        _, self.org = self.client.organization_create(
+            {'name': "organization"})
+        self.org_id = self.org['id']
+        patch('rest_api.rest_api_server.controllers.cloud_account.'
+              'CloudAccountController._configure_report').start()
+        auth_user_id = self.gen_id()
+        _, self.employee = self.client.employee_create(
+            self.org_id, {'name': 'name', 'auth_user_id': auth_user_id})
+        _, self.employee_2 = self.client.employee_create(
+            self.org_id, {'name': 'name_2', 'auth_user_id': self.gen_id()})
+        _, self.cloud_acc = self.create_cloud_account(self.org_id, {
+            'name': 'cloud_acc',
+            'type': 'aws_cnr',
+            'config': {
+                'access_key_id': 'key',
+                'secret_access_key': 'secret',
+                'config_scheme': 'create_report'
+            }
+        }, auth_user_id=auth_user_id)
+        self.time = int(datetime(2020, 1, 14).timestamp())
+        _, self.resource = self.cloud_resource_create(
+            self.cloud_acc['id'], {
+                'cloud_resource_id': self.gen_id(), 'name': 'resource',
+                'resource_type': 'type', 'first_seen': self.time,
+                'last_seen': self.time + 1
+            })
+
+    def get_clean_expenses(self, params=None):
+        code, response = self.client.clean_expenses_get(
+            self.org_id, self.time, self.time + 1, params)
+        self.assertEqual(code, 200)
+        return response
+
+    def get_cache_stats(self, endpoint):
+        code, response = self.client.connection_stats_get()
+        self.assertEqual(code, 200)
+        return response['result_cache']['endpoints'].get(endpoint, {})
+
+    def test_cache_hit(self):
+        response_1 = self.get_clean_expenses()
+        response_2 = self.get_clean_expenses()
+        self.assertEqual(response_1, response_2)
+        self.assertEqual(self.p_clean_expenses_get.call_count, 1)
+        stats = self.get_cache_stats('clean_expenses')
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_cache_normalized_filters(self):
+        self.get_clean_expenses({'region': ['us-east-1', 'us-west-1']})
+        self.get_clean_expenses({'region': ['us-west-1', 'us-east-1']})
+        self.assertEqual(self.p_clean_expenses_get.call_count, 1)
+        self.get_clean_expenses({'region': 'us-east-1'})
+        self.assertEqual(self.p_clean_expenses_get.call_count, 2)
+
+    def test_cache_invalidated_by_assignment(self):
+        response = self.get_clean_expenses()
+        self.assertNotEqual(response['clean_expenses'][0]['employee_id'],
+                            self.employee_2['id'])
+        code, _ = self.client.cloud_resource_update(
+            self.resource['id'], {'employee_id': self.employee_2['id'],
+                                  'pool_id': self.org['pool_id']})
+        self.assertEqual(code, 200)
+        response = self.get_clean_expenses()
+        self.assertEqual(self.p_clean_expenses_get.call_count, 2)
+        self.assertEqual(response['clean_expenses'][0]['employee_id'],
+                         self.employee_2['id'])
+
+    def _set_dimension_synced_at(self, synced_at):
+        self.mongo_client.restapi.clickhouse_sync.update_one(
+            {'_id': 'resources_dimension'},
+            {'$set': {'synced_at': synced_at}}, upsert=True)
+
+    def test_cache_dimension_behind_assignment(self):
+        self._set_dimension_synced_at(int(time.time()) - 10)
+        self.get_clean_expenses()
+        self.get_clean_expenses()
+        self.assertEqual(self.p_clean_expenses_get.call_count, 1)
+        code, _ = self.client.cloud_resource_update(
+            self.resource['id'], {'employee_id': self.employee_2['id'],
+                                  'pool_id': self.org['pool_id']})
+        self.assertEqual(code, 200)
+        # changes of the assignment aren't replicated yet
+        self.get_clean_expenses()
+        self.get_clean_expenses()
+        self.assertEqual(self.p_clean_expenses_get.call_count, 3)
+        self.assertEqual(self.get_cache_stats('clean_expenses')['stale'], 2)
+        self._set_dimension_synced_at(int(time.time()) + 1)
+        self.get_clean_expenses()
+        self.get_clean_expenses()
+        self.assertEqual(self.p_clean_expenses_get.call_count, 4)
+
+    def test_cache_dimension_not_used(self):
+        # dimension which is behind more than max lag is not used
+        self._set_dimension_synced_at(int(time.time()) - 3600)
+        code, _ = self.client.cloud_resource_update(
+            self.resource['id'], {'employee_id': self.employee_2['id'],
+                                  'pool_id': self.org['pool_id']})
+        self.assertEqual(code, 200)
+        self.get_clean_expenses()
+        self.get_clean_expenses()
+        self.assertEqual(self.p_clean_expenses_get.call_count, 1)
+
+    def _get_result_keys(self):
+        return [k for k in self.redis.data
+                if k.startswith('restapi:result:clean_expenses:')]
+
+    def test_cache_stored_as_json(self):
+        response = self.get_clean_expenses()
+        keys = self._get_result_keys()
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(json.loads(self.redis.data[keys[0]]), response)
+
+    def test_cache_not_json_value(self):
+        response = self.get_clean_expenses()
+        key = self._get_result_keys()[0]
+        self.redis.data[key] = pickle.dumps(response)
+        self.assertEqual(self.get_clean_expenses(), response)
+        self.assertEqual(self.p_clean_expenses_get.call_count, 2)
+        self.assertEqual(json.loads(self.redis.data[key]), response)
+        stats = self.get_cache_stats('clean_expenses')
+        self.assertEqual(stats['misses'], 2)
+        self.assertNotIn('hits', stats)
+
+    def test_cache_redis_failure(self):
+        self.p_redis_client.side_effect = RedisConnectionError('failure')
+        self.get_clean_expenses()
+        self.get_clean_expenses()
+        self.assertEqual(self.p_clean_expenses_get.call_count, 2)
+        stats = self.get_cache_stats('clean_expenses')
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['skipped'], 1)
+        _, response = self.client.connection_stats_get()
+        self.assertFalse(response['result_cache']['available'])
@@ -7,17 +7,21 @@ import re
 import base64
 import uuid
 import hashlib
+import threading
+import time
 import cryptocode
 from urllib.parse import urlencode
 from concurrent.futures import ThreadPoolExecutor
 from cryptography.fernet import Fernet
 from datetime import datetime
 from decimal import Decimal
+from types import GeneratorType
 from string import ascii_letters, digits
 
 import json_excel_converter.xlsx.formats as ExcelFormats
 import netaddr
 from bson import ObjectId
+from etcd import EtcdEventIndexCleared
 from optscale_client.config_client.client import Client as ConfigClient
 from json_excel_converter import Converter as ExcelConverter
 from json_excel_converter.xlsx import (Writer as ExcelWriter,
@@ -38,11 +42,92 @@ import unicodedata
 MAX_32_INT = 2 ** 31 - 1
 MAX_64_INT = 2 ** 63 - 1
 BASE_POOL_EXPENSES_EXPORT_LINK_FORMAT = 'https://{0}/restapi/v2/pool_expenses_exports/{1}'
-tp_executor = ThreadPoolExecutor(30)
-tp_executor_context = ThreadPoolExecutor(30)
+EXECUTOR_WORKERS = 30
+# slow analytics queries are run on a separate executor, so they don't
+# take workers of cheap requests
+HEAVY_EXECUTOR_WORKERS = 20
 LOG = logging.getLogger(__name__)
 GB = 1024 * 1024 * 1024
+CONFIG_WATCH_RETRY_INTERVAL = 5
+# etcd locks are changed all the time and don't affect config values
+CONFIG_WATCH_SKIPPED_PREFIX = '/_locks'
 SECONDS_IN_HOUR = 60 * 60
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class MonitoredThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Thread pool executor counting tasks waiting for a free worker and the
+    time they wait
+    """
+    def __init__(self, max_workers, thread_name_prefix=''):
+        super().__init__(max_workers, thread_name_prefix=thread_name_prefix)
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._wait_time = 0
+        self._max_wait_time = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued_at = time.time()
+        started = False
+
+        def _run():
+            nonlocal started
+            wait_time = time.time() - queued_at
+            with self._stats_lock:
+                started = True
+                self._queued -= 1
+                self._active += 1
+                self._wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        def _cancelled(future):
+            if future.cancelled():
+                with self._stats_lock:
+                    if not started:
+                        self._queued -= 1
+
+        with self._stats_lock:
+            self._submitted += 1
+            self._queued += 1
+        future = super().submit(_run)
+        future.add_done_callback(_cancelled)
+        return future
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'workers': self._max_workers,
+                'active': self._active,
+                'queued': self._queued,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'wait_time': round(self._wait_time, 3),
+                'max_wait_time': round(self._max_wait_time, 3),
+            }
+
+
+tp_executor = MonitoredThreadPoolExecutor(EXECUTOR_WORKERS, 'light')
+tp_executor_heavy = MonitoredThreadPoolExecutor(
+    HEAVY_EXECUTOR_WORKERS, 'heavy')
+tp_executor_context = MonitoredThreadPoolExecutor(EXECUTOR_WORKERS, 'context')
+
+
+def executors_stats():
+    return {
+        'light': tp_executor.stats(),
+        'heavy': tp_executor_heavy.stats(),
+        'context': tp_executor_context.stats(),
+    }
 
 
 def singleton(class_):
@@ -58,47 +143,120 @@ def singleton(class_):
 
 @singleton
 class Config(object):
-
+    """
+    Etcd config shared by the process. Values are cached while the etcd
+    watcher is alive, any change in etcd (except locks) drops the cache.
+    """
     def __init__(self):
+        self.client = self._create_client()
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._generation = 0
+        self._watching = False
+        self._hits = 0
+        self._misses = 0
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    @staticmethod
+    def _create_client():
         etcd_host = os.environ.get('HX_ETCD_HOST')
         etcd_port = int(os.environ.get('HX_ETCD_PORT'))
-        self.client = ConfigClient(host=etcd_host, port=etcd_port)
+        return ConfigClient(host=etcd_host, port=etcd_port)
+
+    def _invalidate(self, watching):
+        with self._lock:
+            self._watching = watching
+            self._generation += 1
+            self._cache.clear()
+
+    def _watch(self):
+        # long polling client is not shared with config reads
+        client = self._create_client()
+        index = None
+        while True:
+            try:
+                if index is None:
+                    index = client.read('/').etcd_index + 1
+                    self._invalidate(watching=True)
+                event = client.watch('/', index=index, recursive=True)
+                index = event.modifiedIndex + 1
+                if not event.key.startswith(CONFIG_WATCH_SKIPPED_PREFIX):
+                    self._invalidate(watching=True)
+            except EtcdEventIndexCleared:
+                LOG.warning('Etcd index cleared, restarting config watcher')
+                self._invalidate(watching=False)
+                index = None
+            except Exception as exc:
+                LOG.warning('Restarting config watcher due to failure: %s',
+                            exc)
+                self._invalidate(watching=False)
+                index = None
+                time.sleep(CONFIG_WATCH_RETRY_INTERVAL)
+
+    def _get(self, name):
+        with self._lock:
+            watching = self._watching
+            generation = self._generation
+            if watching and name in self._cache:
+                self._hits += 1
+                return self._cache[name]
+            self._misses += 1
+        value = getattr(self.client, name)()
+        if watching:
+            with self._lock:
+                # value read before the last etcd change is not cached
+                if generation == self._generation:
+                    self._cache[name] = value
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'watching': self._watching,
+                'cached': len(self._cache),
+                'hits': self._hits,
+                'misses': self._misses,
+            }
 
     @property
     def auth_url(self):
-        return self.client.auth_url()
+        return self._get('auth_url')
 
     @property
     def keeper_url(self):
-        return self.client.keeper_url()
+        return self._get('keeper_url')
 
     @property
     def cluster_secret(self):
-        return self.client.cluster_secret()
+        return self._get('cluster_secret')
 
     @property
     def mongo_params(self):
-        return self.client.mongo_params()
+        return self._get('mongo_params')
 
     @property
     def katara_url(self):
-        return self.client.katara_url()
+        return self._get('katara_url')
 
     @property
     def clickhouse_params(self):
-        return self.client.clickhouse_params()
+        return self._get('clickhouse_params')
+
+    @property
+    def redis_params(self):
+        return self._get('redis_params')
 
     @property
     def arcee_url(self):
-        return self.client.arcee_url()
+        return self._get('arcee_url')
 
     @property
     def bulldozer_url(self):
-        return self.client.bulldozer_url()
+        return self._get('bulldozer_url')
 
     @property
     def insider_url(self):
-        return self.client.insider_url()
+        return self._get('insider_url')
 
 
 def humanize_storage_size(size, precision=2):
@@ -317,6 +475,85 @@ class ModelEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+def _json_key(key, encoder):
+    if isinstance(key, str):
+        return encoder.encode(key)
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if key is None:
+        return '"null"'
+    if isinstance(key, (int, float)):
+        return '"%s"' % encoder.encode(key)
+    raise TypeError('keys must be str, int, float, bool or None, '
+                    'not %s' % key.__class__.__name__)
+
+
+def iterencode_json(obj, cls=ModelEncoder, indent=None, sort_keys=False):
+    """
+    Encodes obj into json parts. Dicts and lists are encoded element by
+    element, generators can be used as dict values and are consumed only
+    when their part is encoded, so the whole document is never kept in
+    memory. The result is the same as json.dumps gives
+    """
+    encoder = cls(indent=indent, sort_keys=sort_keys)
+    item_separator = ',' if indent is not None else ', '
+
+    def _newline(level):
+        if indent is None:
+            return ''
+        return '\n' + ' ' * indent * level
+
+    def _encode(value, level, walk=True):
+        if walk and isinstance(value, (dict, list, tuple, GeneratorType)):
+            yield from _iterencode(value, level)
+            return
+        if isinstance(value, GeneratorType):
+            value = list(value)
+        encoded = encoder.encode(value)
+        if indent is not None:
+            encoded = encoded.replace('\n', _newline(level))
+        yield encoded
+
+    def _iterencode(value, level):
+        if isinstance(value, dict):
+            items = sorted(value.items()) if sort_keys else value.items()
+            start, end = '{', '}'
+            parts = ((_json_key(k, encoder) + ': ', v, True)
+                     for k, v in items)
+        else:
+            # list items are encoded entirely
+            start, end = '[', ']'
+            parts = (('', v, False) for v in value)
+        empty = True
+        for prefix, item, walk in parts:
+            yield (start if empty else item_separator) + _newline(
+                level + 1) + prefix
+            empty = False
+            yield from _encode(item, level + 1, walk)
+        if empty:
+            yield start + end
+        else:
+            yield _newline(level) + end
+
+    yield from _encode(obj, 0)
+
+
+def iter_json_chunks(obj, chunk_size=JSON_STREAM_CHUNK_SIZE, **kwargs):
+    chunk = []
+    size = 0
+    for part in iterencode_json(obj, **kwargs):
+        chunk.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
 def gen_id():
     return str(uuid.uuid4())
 
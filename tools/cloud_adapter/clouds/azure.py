@@ -1269,6 +1269,10 @@ class Azure(CloudBase):
     def set_currency(self, currency):
         self._currency = currency
 
+    @property
+    def currency(self):
+        return self._currency
+
     def start_instance(self, instance_name, group_name):
         try:
             return self.compute.virtual_machines.start(